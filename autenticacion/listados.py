@@ -0,0 +1,68 @@
+"""
+Filtros del listado de usuarios y su exportación
+
+La lista de usuarios, la exportación directa y el trabajo de exportación en
+segundo plano (sistema.trabajos) interpretan los parámetros con las mismas
+funciones, así el archivo trae lo mismo que se ve en pantalla.
+"""
+from django.db.models import Q
+
+from sistema.exportacion import Columna, Exportacion, fecha, si_no, texto_o
+
+from .models import Usuario
+
+
+def es_administrador(usuario):
+    """Superusuario o rol ADMIN: los únicos que pueden exportar usuarios"""
+    return usuario.is_superuser or bool(
+        getattr(usuario, 'rol', None) and usuario.rol.nombre == 'ADMIN'
+    )
+
+
+def filtrar_usuarios(parametros):
+    """Usuarios del listado (q, estado, rol, orden)"""
+    query = parametros.get('q', '')
+    estado_filter = parametros.get('estado', '')
+    rol_filter = parametros.get('rol', '')
+
+    usuarios = Usuario.objects.all()
+
+    if query:
+        usuarios = usuarios.filter(
+            Q(username__icontains=query) |
+            Q(nombres__icontains=query) |
+            Q(apellidos__icontains=query) |
+            Q(email__icontains=query)
+        )
+
+    if estado_filter:
+        usuarios = usuarios.filter(estado=estado_filter)
+
+    if rol_filter:
+        usuarios = usuarios.filter(rol_id=rol_filter)
+
+    return usuarios.order_by(parametros.get('orden', '-created_at'))
+
+
+def exportacion_usuarios(parametros, usuario):
+    filas = filtrar_usuarios(parametros).values(
+        'id', 'username', 'nombres', 'apellidos', 'email', 'telefono', 'rol__nombre', 'estado',
+        'is_superuser', 'ultimo_acceso', 'date_joined', 'updated_at',
+    )
+    estados = dict(Usuario.ESTADO_CHOICES)
+
+    columnas = [
+        Columna('ID', 'id', 8, 'numero'),
+        Columna('Usuario', 'username', 20),
+        Columna('Nombres', 'nombres', 22),
+        Columna('Apellidos', 'apellidos', 22),
+        Columna('Email', 'email', 30),
+        Columna('Teléfono', texto_o('telefono', 'Sin teléfono'), 16),
+        Columna('Rol', texto_o('rol__nombre', 'Sin rol'), 15),
+        Columna('Estado', lambda fila: estados.get(fila['estado'], fila['estado']), 12),
+        Columna('Es Superusuario', si_no('is_superuser'), 16, 'centro'),
+        Columna('Último Acceso', fecha('ultimo_acceso', 'Nunca'), 18),
+        Columna('Fecha Registro', fecha('date_joined'), 18),
+        Columna('Última Modificación', fecha('updated_at'), 20),
+    ]
+    return Exportacion(filas, columnas, 'usuarios', hoja='Usuarios')
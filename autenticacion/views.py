@@ -201,25 +201,18 @@ def dashboard(request):
     if not request.user.is_authenticated:
         return redirect('autenticacion:login')
     
-    # Importar modelos para estadísticas
-    from django.db import models
-    from maestros.models import Producto, Proveedor
-    from inventario.models import MovimientoInventario, StockActual, AlertaStock
-    from autenticacion.models import Usuario
+    from inventario.models import MovimientoInventario, AlertaStock
+    from inventario.resumen import obtener_resumen
     
-    # Estadísticas generales
+    # Estadísticas generales (precalculadas, una lectura)
+    resumen = obtener_resumen()
     stats = {
-        'productos_total': Producto.objects.filter(estado='ACTIVO').count(),
-        'productos_bajo_stock': Producto.objects.filter(
-            stock_actual__lte=models.F('stock_minimo'),
-            estado='ACTIVO'
-        ).count() if hasattr(Producto, 'stock_actual') else 0,
-        'proveedores_activos': Proveedor.objects.filter(estado='ACTIVO').count(),
-        'usuarios_activos': Usuario.objects.filter(estado='ACTIVO').count(),
-        'movimientos_hoy': MovimientoInventario.objects.filter(
-            fecha_movimiento__date=timezone.now().date()
-        ).count(),
-        'alertas_pendientes': AlertaStock.objects.filter(estado='ACTIVA').count(),
+        'productos_total': resumen['productos_activos'],
+        'productos_bajo_stock': resumen['productos_bajo_stock'],
+        'proveedores_activos': resumen['proveedores_activos'],
+        'usuarios_activos': resumen['usuarios_activos'],
+        'movimientos_hoy': resumen['movimientos_hoy'],
+        'alertas_pendientes': resumen['alertas_activas'],
     }
     
     # Movimientos recientes
@@ -233,12 +226,8 @@ def dashboard(request):
         prioridad__in=['CRITICA', 'ALTA']
     ).select_related('producto', 'bodega').order_by('-fecha_generacion')[:5]
     
-    # Productos más movidos
-    productos_movidos = MovimientoInventario.objects.values(
-        'producto__nombre'
-    ).annotate(
-        total_movimientos=models.Count('id')
-    ).order_by('-total_movimientos')[:5]
+    # Productos más movidos (se actualiza con el recálculo periódico del resumen)
+    productos_movidos = resumen['productos_movidos']
     
     context = {
         'usuario': request.user,
@@ -804,8 +793,9 @@ def verificar_email_existente(request):
 # ==================== GESTIÓN DE USUARIOS (CRUD) ====================
 
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.db.models import Count
 from .decorators import admin_only, permission_required, login_required_custom, estado_usuario_activo
+from .listados import es_administrador, exportacion_usuarios, filtrar_usuarios
 from .models import Rol, Sesion
 
 
@@ -818,27 +808,9 @@ def usuario_listar(request):
     rol_filter = request.GET.get('rol', '')
     per_page = request.GET.get('per_page', '10')
     
-    # Consulta base
-    usuarios = Usuario.objects.select_related('rol').all()
-    
-    # Aplicar filtros
-    if query:
-        usuarios = usuarios.filter(
-            Q(username__icontains=query) |
-            Q(nombres__icontains=query) |
-            Q(apellidos__icontains=query) |
-            Q(email__icontains=query)
-        )
-    
-    if estado_filter:
-        usuarios = usuarios.filter(estado=estado_filter)
-    
-    if rol_filter:
-        usuarios = usuarios.filter(rol_id=rol_filter)
-    
-    # Ordenar
+    # Mismos filtros y orden que la exportación (autenticacion.listados)
     ordenar = request.GET.get('orden', '-created_at')
-    usuarios = usuarios.order_by(ordenar)
+    usuarios = filtrar_usuarios(request.GET).select_related('rol')
     
     # Paginación
     try:
@@ -1455,117 +1427,19 @@ def rol_editar(request, pk):
 
 # ==================== EXPORTACIÓN A EXCEL ====================
 
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
-from datetime import datetime
-from django.http import HttpResponse
-
-
-def crear_estilos_excel():
-    """Crear estilos reutilizables para Excel"""
-    return {
-        'header': {
-            'font': Font(bold=True, color="FFFFFF", size=12),
-            'alignment': Alignment(horizontal="center", vertical="center"),
-            'fill': PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
-            'border': Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'), 
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-        },
-        'data': {
-            'alignment': Alignment(horizontal="left", vertical="center"),
-            'border': Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'), 
-                bottom=Side(style='thin')
-            )
-        }
-    }
+from sistema.exportacion import respuesta_exportacion
 
 
 @login_required
 def export_usuarios_excel(request):
     """Exportar usuarios a Excel - Solo administradores"""
     # Verificar que sea administrador
-    if not request.user.is_superuser and (not hasattr(request.user, 'rol') or not request.user.rol or request.user.rol.nombre != 'ADMIN'):
+    if not es_administrador(request.user):
         messages.error(request, 'No tienes permisos para exportar usuarios.')
         return redirect('autenticacion:usuario_listar')
     
     try:
-        # Crear workbook y worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Usuarios"
-        
-        # Estilos
-        estilos = crear_estilos_excel()
-        
-        # Encabezados
-        headers = [
-            'ID', 'Usuario', 'Nombres', 'Apellidos', 'Email', 'Teléfono',
-            'Rol', 'Estado', 'Es Superusuario', 'Último Acceso',
-            'Fecha Registro', 'Última Modificación'
-        ]
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=header)
-            cell.font = estilos['header']['font']
-            cell.alignment = estilos['header']['alignment']
-            cell.fill = estilos['header']['fill']
-            cell.border = estilos['header']['border']
-        
-        # Obtener datos
-        usuarios = Usuario.objects.select_related('rol').order_by('username')
-        
-        # Agregar datos
-        for row_num, usuario in enumerate(usuarios, 2):
-            data = [
-                usuario.id,
-                usuario.username,
-                usuario.nombres,  # Usar 'nombres' en lugar de 'first_name'
-                usuario.apellidos,  # Usar 'apellidos' en lugar de 'last_name'
-                usuario.email,
-                usuario.telefono or 'Sin teléfono',
-                usuario.rol.nombre if usuario.rol else 'Sin rol',
-                usuario.get_estado_display(),
-                'Sí' if usuario.is_superuser else 'No',
-                usuario.ultimo_acceso.strftime('%d/%m/%Y %H:%M') if usuario.ultimo_acceso else 'Nunca',
-                usuario.date_joined.strftime('%d/%m/%Y %H:%M') if usuario.date_joined else '',
-                usuario.updated_at.strftime('%d/%m/%Y %H:%M') if usuario.updated_at else ''  # Usar 'updated_at' en lugar de 'fecha_modificacion'
-            ]
-            
-            for col_num, value in enumerate(data, 1):
-                cell = ws.cell(row=row_num, column=col_num, value=value)
-                cell.alignment = estilos['data']['alignment']
-                cell.border = estilos['data']['border']
-        
-        # Ajustar ancho de columnas
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Configurar respuesta HTTP
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="usuarios_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-        
-        wb.save(response)
-        return response
-        
+        return respuesta_exportacion(request, exportacion_usuarios(request.GET, request.user))
     except Exception as e:
         messages.error(request, f'Error al exportar usuarios: {str(e)}')
         return redirect('autenticacion:usuario_listar')
@@ -5,7 +5,8 @@ from django.core.paginator import Paginator
 from .models import Catalogo
 from decimal import Decimal
 from autenticacion.decorators import login_required_custom, permission_required, estado_usuario_activo
-from maestros.models import Producto, Categoria, Marca
+from maestros.consultas import CAMPOS_TIENDA, ConsultaProductos
+from maestros.models import Categoria, Marca
 
 
 def tienda_productos(request):
@@ -15,42 +16,12 @@ def tienda_productos(request):
     marca_filter = request.GET.get('marca', '')
     orden = request.GET.get('orden', 'nombre')
     
-    # Filtrar solo productos activos con precio de venta
-    productos = Producto.objects.filter(
-        estado='ACTIVO',
-        precio_venta__isnull=False,
-        precio_venta__gt=0
+    # Solo productos activos con precio de venta; el total queda en caché
+    # mientras no cambien los productos (maestros.consultas)
+    page_obj = ConsultaProductos.de_tienda(request.GET).paginar(
+        request.GET.get('page'), 12, campos=CAMPOS_TIENDA  # 12 productos por página
     )
     
-    # Aplicar filtros
-    if query:
-        productos = productos.filter(
-            Q(nombre__icontains=query) |
-            Q(descripcion__icontains=query) |
-            Q(sku__icontains=query)
-        )
-    
-    if categoria_filter:
-        productos = productos.filter(categoria_id=categoria_filter)
-    
-    if marca_filter:
-        productos = productos.filter(marca_id=marca_filter)
-    
-    # Ordenamiento
-    orden_map = {
-        'nombre': 'nombre',
-        'nombre_desc': '-nombre',
-        'precio': 'precio_venta',
-        'precio_desc': '-precio_venta',
-        'nuevo': '-created_at',
-    }
-    productos = productos.order_by(orden_map.get(orden, 'nombre'))
-    
-    # Paginación
-    paginator = Paginator(productos, 12)  # 12 productos por página
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
     # Obtener categorías y marcas activas para filtros
     categorias = Categoria.objects.filter(activo=True).order_by('nombre')
     marcas = Marca.objects.filter(activo=True).order_by('nombre')
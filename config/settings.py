@@ -209,6 +209,70 @@ SERVER_EMAIL = DEFAULT_FROM_EMAIL
 # Configuración de negocio
 COMPANY_NAME = config('COMPANY_NAME', default='Dulcería Lilis')
 
+# Configuración de inventario
+# Diferir el recálculo de Producto.stock_actual y de alertas hasta el commit de la
+# transacción (un UPDATE agrupado por transacción en vez de uno por fila de stock)
+INVENTARIO_RECALCULO_DIFERIDO = config('INVENTARIO_RECALCULO_DIFERIDO', default=False, cast=bool)
+# Carpeta donde archivar_movimientos deja las particiones comprimidas del libro
+INVENTARIO_ARCHIVO_DIR = config('INVENTARIO_ARCHIVO_DIR', default=str(BASE_DIR / 'archivo' / 'movimientos'))
+# Carpeta donde conciliar_stock deja los reportes de diferencias
+INVENTARIO_CONCILIACION_DIR = config('INVENTARIO_CONCILIACION_DIR', default=str(BASE_DIR / 'archivo' / 'conciliacion'))
+# Minutos que dura una reserva de stock antes de que liberar_reservas_expiradas la libere
+INVENTARIO_RESERVA_TTL_MINUTOS = config('INVENTARIO_RESERVA_TTL_MINUTOS', default=30, cast=int)
+# Crear StockActual automáticamente al crear productos o bodegas; sobre este número de
+# pares (producto x bodega) la creación se hace en un hilo en segundo plano
+INVENTARIO_APROVISIONAR_STOCK = config('INVENTARIO_APROVISIONAR_STOCK', default=True, cast=bool)
+INVENTARIO_APROVISIONAMIENTO_UMBRAL = config('INVENTARIO_APROVISIONAMIENTO_UMBRAL', default=5000, cast=int)
+
+# Resumen precalculado de los dashboards: segundos que cada proceso reutiliza
+# su copia en memoria y horas tras las que se considera desactualizado (lo recalcula el cron)
+INVENTARIO_RESUMEN_CACHE_SEGUNDOS = config('INVENTARIO_RESUMEN_CACHE_SEGUNDOS', default=5, cast=int)
+INVENTARIO_RESUMEN_RECALCULO_HORAS = config('INVENTARIO_RESUMEN_RECALCULO_HORAS', default=24, cast=int)
+
+# Segundos que se reutilizan las estadísticas de la API de inventario
+# (caché de Django, por ventana de fechas y filtros)
+INVENTARIO_ESTADISTICAS_CACHE_SEGUNDOS = config('INVENTARIO_ESTADISTICAS_CACHE_SEGUNDOS', default=60, cast=int)
+
+# Stream SSE de cambios de stock y alertas (inventario:stock_eventos): publicar
+# eventos, segundos entre consultas a la tabla de eventos, duración máxima de
+# cada conexión (el navegador se reconecta solo) y horas de retención
+INVENTARIO_EVENTOS_STOCK = config('INVENTARIO_EVENTOS_STOCK', default=True, cast=bool)
+INVENTARIO_EVENTOS_INTERVALO = config('INVENTARIO_EVENTOS_INTERVALO', default=2, cast=int)
+INVENTARIO_EVENTOS_DURACION = config('INVENTARIO_EVENTOS_DURACION', default=300, cast=int)
+INVENTARIO_EVENTOS_RETENCION_HORAS = config('INVENTARIO_EVENTOS_RETENCION_HORAS', default=24, cast=int)
+
+# Máximo de claves (pares producto/bodega + productos) por consulta de stock por lotes
+INVENTARIO_STOCK_LOTE_MAXIMO = config('INVENTARIO_STOCK_LOTE_MAXIMO', default=1000, cast=int)
+
+# Búsqueda de productos (maestros.busqueda): motor ('auto' = FULLTEXT en MySQL,
+# índice en memoria en otros motores; o 'fulltext' / 'memoria'), máximo de
+# resultados del índice en memoria y segundos antes de recargarlo
+MAESTROS_BUSQUEDA_MOTOR = config('MAESTROS_BUSQUEDA_MOTOR', default='auto')
+MAESTROS_BUSQUEDA_MAXIMO = config('MAESTROS_BUSQUEDA_MAXIMO', default=1000, cast=int)
+MAESTROS_BUSQUEDA_INDICE_SEGUNDOS = config('MAESTROS_BUSQUEDA_INDICE_SEGUNDOS', default=300, cast=int)
+
+# Autocompletado de productos (maestros.autocompletar): cargar el índice al
+# arrancar cada worker y segundos entre comprobaciones de la versión publicada
+# por otros procesos
+MAESTROS_AUTOCOMPLETAR_PRECARGAR = config('MAESTROS_AUTOCOMPLETAR_PRECARGAR', default=False, cast=bool)
+MAESTROS_AUTOCOMPLETAR_VERIFICAR_SEGUNDOS = config('MAESTROS_AUTOCOMPLETAR_VERIFICAR_SEGUNDOS', default=5, cast=int)
+
+# Segundos máximos que se reutiliza el total de un listado de productos
+# (maestros.consultas); las escrituras de productos lo invalidan antes
+MAESTROS_LISTADO_CONTEO_SEGUNDOS = config('MAESTROS_LISTADO_CONTEO_SEGUNDOS', default=300, cast=int)
+
+# Exportaciones en segundo plano (sistema.trabajos, manage.py procesar_exportaciones):
+# procesos del worker, segundos entre consultas a la cola, horas que se conserva
+# cada archivo, minutos sin avances para dar un trabajo por abandonado,
+# exportaciones en curso permitidas por usuario e interrupciones (proceso
+# muerto o abandonado) tras las que el trabajo queda en ERROR
+SISTEMA_EXPORTACION_PROCESOS = config('SISTEMA_EXPORTACION_PROCESOS', default=2, cast=int)
+SISTEMA_EXPORTACION_INTERVALO = config('SISTEMA_EXPORTACION_INTERVALO', default=2, cast=int)
+SISTEMA_EXPORTACION_EXPIRACION_HORAS = config('SISTEMA_EXPORTACION_EXPIRACION_HORAS', default=24, cast=int)
+SISTEMA_EXPORTACION_ABANDONO_MINUTOS = config('SISTEMA_EXPORTACION_ABANDONO_MINUTOS', default=15, cast=int)
+SISTEMA_EXPORTACION_PENDIENTES_MAXIMO = config('SISTEMA_EXPORTACION_PENDIENTES_MAXIMO', default=3, cast=int)
+SISTEMA_EXPORTACION_INTERRUPCIONES_MAXIMO = config('SISTEMA_EXPORTACION_INTERRUPCIONES_MAXIMO', default=3, cast=int)
+
 # Configuración de archivos subidos
 FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB
 
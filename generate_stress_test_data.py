@@ -26,6 +26,8 @@ from django.utils import timezone
 from productos.models import Producto, Categoria, Marca
 from maestros.models import Proveedor, UnidadMedida
 from inventario.models import MovimientoInventario
+from inventario.sincronizacion import aprovisionamiento_suspendido, crear_stocks_faltantes
+from maestros.busqueda import reindexar
 from autenticacion.models import Usuario
 
 
@@ -59,6 +61,7 @@ class GeneradorDatosPrueba:
         
         productos_creados = 0
         lote_size = 500  # Crear en lotes para mejor performance
+        ultimo_id = Producto.objects.order_by('-id').values_list('id', flat=True).first() or 0
         
         # Nombres y adjetivos para generar variedad
         nombres_base = [
@@ -127,6 +130,15 @@ class GeneradorDatosPrueba:
             print(f"\n✅ {productos_creados} productos creados exitosamente")
             print(f"📊 Total productos en BD: {Producto.objects.count()}")
             
+            # Registros de stock de todos los productos nuevos en una sola pasada
+            resultado = crear_stocks_faltantes(solo_activos=False)
+            print(f"🏪 {resultado['creados']} registros de stock creados "
+                  f"({resultado['tiempos']['consulta'] + resultado['tiempos']['escritura']:.2f}s)")
+            
+            # bulk_create no pasa por save(): documento de búsqueda de los productos nuevos
+            indexados = reindexar(Producto.objects.filter(id__gt=ultimo_id))
+            print(f"🔎 {indexados['actualizados']} productos indexados para búsqueda")
+            
         except Exception as e:
             print(f"\n❌ Error generando productos: {e}")
             raise
@@ -349,7 +361,9 @@ def main():
 
 if __name__ == '__main__':
     inicio = datetime.now()
-    main()
+    # Las señales de maestros no crean stock fila por fila durante la carga
+    with aprovisionamiento_suspendido():
+        main()
     fin = datetime.now()
     duracion = (fin - inicio).total_seconds()
     print(f"\n⏱️  Tiempo total: {duracion:.2f} segundos")
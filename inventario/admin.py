@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Bodega, Lote, MovimientoInventario, StockActual, AlertaStock
+from .models import (
+    Bodega, Lote, MovimientoInventario, StockActual, StockSnapshot, SaldoArchivado, ReservaStock,
+    AprovisionamientoPendiente, AlertaStock, ResumenDashboard, EventoStock,
+)
 
 
 @admin.register(Bodega)
@@ -92,18 +95,77 @@ class MovimientoInventarioAdmin(admin.ModelAdmin):
 class StockActualAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'producto', 'bodega', 'cantidad_disponible',
-        'cantidad_reservada', 'cantidad_transito',
+        'cantidad_reservada', 'cantidad_transito', 'costo_promedio', 'valor_total',
         'ultimo_ingreso', 'ultima_salida'
     )
     search_fields = ('producto__sku', 'producto__nombre')
     list_filter = ('bodega', 'producto__categoria')
-    readonly_fields = ('ultimo_ingreso', 'ultima_salida', 'updated_at')
+    readonly_fields = ('costo_promedio', 'valor_total', 'ultimo_ingreso', 'ultima_salida', 'updated_at')
     ordering = ('producto',)
     list_select_related = ('producto', 'bodega')
     autocomplete_fields = ('producto', 'bodega')
     list_per_page = 25
 
 
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'fecha', 'producto', 'bodega', 'cantidad', 'created_at')
+    search_fields = ('producto__sku', 'producto__nombre')
+    list_filter = ('bodega', 'fecha')
+    date_hierarchy = 'fecha'
+    ordering = ('-fecha',)
+    list_select_related = ('producto', 'bodega')
+    list_per_page = 25
+
+
+@admin.register(SaldoArchivado)
+class SaldoArchivadoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'producto', 'bodega', 'cantidad', 'costo_promedio', 'movimientos', 'hasta', 'updated_at')
+    search_fields = ('producto__sku', 'producto__nombre')
+    list_filter = ('bodega',)
+    readonly_fields = ('updated_at',)
+    list_select_related = ('producto', 'bodega')
+    list_per_page = 25
+
+
+@admin.register(ReservaStock)
+class ReservaStockAdmin(admin.ModelAdmin):
+    list_display = ('id', 'referencia', 'producto', 'bodega', 'cantidad', 'estado', 'expira_en', 'created_at')
+    search_fields = ('referencia', 'producto__sku', 'producto__nombre')
+    list_filter = ('estado', 'bodega')
+    readonly_fields = ('created_at',)
+    ordering = ('-created_at',)
+    list_select_related = ('producto', 'bodega')
+    list_per_page = 25
+
+
+@admin.register(AprovisionamientoPendiente)
+class AprovisionamientoPendienteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'producto', 'bodega', 'created_at')
+    readonly_fields = ('created_at',)
+    list_select_related = ('producto', 'bodega')
+    list_per_page = 25
+
+
+@admin.register(ResumenDashboard)
+class ResumenDashboardAdmin(admin.ModelAdmin):
+    list_display = ('clave', 'valor', 'actualizado')
+    search_fields = ('clave',)
+    readonly_fields = ('actualizado',)
+    ordering = ('clave',)
+    list_per_page = 50
+
+
+@admin.register(EventoStock)
+class EventoStockAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'producto', 'bodega', 'created_at')
+    list_filter = ('tipo', 'created_at')
+    raw_id_fields = ('producto', 'bodega')
+    readonly_fields = ('created_at',)
+    ordering = ('-id',)
+    list_per_page = 50
+
+
 @admin.register(AlertaStock)
 class AlertaStockAdmin(admin.ModelAdmin):
     list_display = (
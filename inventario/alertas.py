@@ -0,0 +1,381 @@
+"""
+Motor de alertas de stock basado en conjuntos
+
+Calcula el estado SIN_STOCK / BAJO_STOCK de todos los pares (producto, bodega)
+con una sola consulta sobre StockActual unida a Producto, lo compara en memoria
+con las AlertaStock activas y aplica las altas, cambios y resoluciones con
+bulk_create / bulk_update. Reemplaza el recorrido producto por producto que
+hacía una consulta por fila de stock y otra por alerta.
+
+Las alertas de vencimiento de lotes siguen el mismo esquema y admiten un modo
+incremental que solo revisa los lotes que cruzaron un umbral (30, 15 o 7 días,
+o vencidos) desde el último escaneo registrado en ConfiguracionSistema.
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AlertaStock, Lote, StockActual
+from .eventos import registrar_alertas
+from .resumen import marcar_seccion
+
+
+TIPOS_ALERTA_STOCK = ('BAJO_STOCK', 'SIN_STOCK')
+TIPOS_ALERTA_VENCIMIENTO = ('POR_VENCER', 'VENCIDO')
+
+# Días antes del vencimiento en que cambia la prioridad de la alerta
+UMBRALES_VENCIMIENTO = (30, 15, 7)
+
+# Clave en ConfiguracionSistema con la fecha/hora del último escaneo de vencimientos
+CLAVE_ULTIMO_ESCANEO = 'INVENTARIO_ULTIMO_ESCANEO_VENCIMIENTOS'
+
+# Tamaño de lote para bulk_create / bulk_update
+TAMANO_LOTE = 500
+
+
+def clasificar_stock(cantidad, stock_minimo):
+    """
+    Determina la alerta que corresponde a una cantidad disponible.
+
+    Returns:
+        tuple: (tipo_alerta, prioridad) o None si el stock es normal
+    """
+    if cantidad <= 0:
+        return 'SIN_STOCK', 'CRITICA'
+    if cantidad <= stock_minimo:
+        # Prioridad según qué tan bajo está el stock
+        porcentaje_stock = (cantidad / stock_minimo) * 100 if stock_minimo > 0 else 0
+        if porcentaje_stock <= 25:
+            return 'BAJO_STOCK', 'CRITICA'
+        if porcentaje_stock <= 50:
+            return 'BAJO_STOCK', 'ALTA'
+        return 'BAJO_STOCK', 'MEDIA'
+    return None
+
+
+def generar_alertas_stock_masivo(producto_ids=None, claves=None, solo_activos=True):
+    """
+    Sincroniza las alertas de stock de un conjunto de pares (producto, bodega).
+
+    Args:
+        producto_ids: limita la revisión a estos productos (None = todos)
+        claves: limita la revisión a estos pares (producto_id, bodega_id)
+        solo_activos: revisar solo productos con estado ACTIVO
+
+    Returns:
+        dict: creadas, actualizadas, resueltas, pares revisados y tiempos por
+        fase (consulta, comparacion, escritura) en segundos
+    """
+    tiempos = {}
+    inicio = time.perf_counter()
+
+    if claves is not None:
+        claves = set(claves)
+        producto_ids = {producto_id for producto_id, _ in claves}
+
+    stocks = StockActual.objects.all()
+    alertas = AlertaStock.objects.filter(tipo_alerta__in=TIPOS_ALERTA_STOCK, estado='ACTIVA')
+    if producto_ids is not None:
+        stocks = stocks.filter(producto_id__in=producto_ids)
+        alertas = alertas.filter(producto_id__in=producto_ids)
+    if solo_activos:
+        stocks = stocks.filter(producto__estado='ACTIVO')
+
+    filas = stocks.values_list(
+        'producto_id', 'bodega_id', 'cantidad_disponible', 'producto__stock_minimo'
+    )
+    if claves is not None:
+        filas = [fila for fila in filas if (fila[0], fila[1]) in claves]
+    else:
+        filas = list(filas)
+
+    # Si hubiera más de una alerta activa por par se conserva la más antigua,
+    # igual que el .first() del recorrido anterior
+    existentes = {}
+    for alerta in alertas.order_by('-id').only(
+        'id', 'producto_id', 'bodega_id', 'lote_id', 'tipo_alerta', 'cantidad_actual',
+        'cantidad_limite', 'prioridad', 'estado',
+    ):
+        existentes[(alerta.producto_id, alerta.bodega_id)] = alerta
+    tiempos['consulta'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    ahora = timezone.now()
+    nuevas = []
+    actualizadas = []
+    resueltas = []
+    for producto_id, bodega_id, cantidad, stock_minimo in filas:
+        alerta = existentes.get((producto_id, bodega_id))
+        estado = clasificar_stock(cantidad, stock_minimo)
+
+        if estado is None:
+            # Stock normal - resolver alerta existente si la hay
+            if alerta:
+                alerta.estado = 'RESUELTA'
+                alerta.fecha_resolucion = ahora
+                alerta.motivo_resolucion = 'Stock repuesto automáticamente'
+                resueltas.append(alerta)
+            continue
+
+        tipo_alerta, prioridad = estado
+        if alerta is None:
+            nuevas.append(AlertaStock(
+                producto_id=producto_id,
+                tipo_alerta=tipo_alerta,
+                bodega_id=bodega_id,
+                cantidad_actual=cantidad,
+                cantidad_limite=stock_minimo,
+                prioridad=prioridad,
+                fecha_generacion=ahora,
+                observaciones=f'Alerta generada automáticamente por {tipo_alerta.lower().replace("_", " ")}'
+            ))
+        elif (alerta.tipo_alerta, alerta.cantidad_actual, alerta.prioridad, alerta.cantidad_limite) != (
+            tipo_alerta, cantidad, prioridad, stock_minimo
+        ):
+            # Cambió la cantidad o el tipo de alerta (ej: de BAJO_STOCK a SIN_STOCK)
+            alerta.tipo_alerta = tipo_alerta
+            alerta.cantidad_actual = cantidad
+            alerta.cantidad_limite = stock_minimo
+            alerta.prioridad = prioridad
+            alerta.fecha_generacion = ahora
+            actualizadas.append(alerta)
+    tiempos['comparacion'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with transaction.atomic():
+        if nuevas:
+            AlertaStock.objects.bulk_create(nuevas, batch_size=TAMANO_LOTE)
+        if actualizadas:
+            AlertaStock.objects.bulk_update(
+                actualizadas,
+                ['tipo_alerta', 'cantidad_actual', 'cantidad_limite', 'prioridad', 'fecha_generacion'],
+                batch_size=TAMANO_LOTE,
+            )
+        if resueltas:
+            AlertaStock.objects.bulk_update(
+                resueltas,
+                ['estado', 'fecha_resolucion', 'motivo_resolucion'],
+                batch_size=TAMANO_LOTE,
+            )
+        if nuevas or actualizadas or resueltas:
+            marcar_seccion('alertas')
+            registrar_alertas(nuevas + actualizadas + resueltas)
+    tiempos['escritura'] = time.perf_counter() - inicio
+
+    return {
+        'revisados': len(filas),
+        'creadas': len(nuevas),
+        'actualizadas': len(actualizadas),
+        'resueltas': len(resueltas),
+        'tiempos': tiempos,
+    }
+
+
+def prioridad_vencimiento(dias_vencimiento):
+    """Prioridad de una alerta POR_VENCER según los días restantes"""
+    if dias_vencimiento <= 7:
+        return 'CRITICA'
+    if dias_vencimiento <= 15:
+        return 'ALTA'
+    return 'MEDIA'
+
+
+def obtener_ultimo_escaneo():
+    """Fecha/hora del último escaneo de vencimientos o None si nunca se ejecutó"""
+    from sistema.models import ConfiguracionSistema
+
+    valor = ConfiguracionSistema.objects.filter(
+        clave=CLAVE_ULTIMO_ESCANEO
+    ).values_list('valor', flat=True).first()
+    if not valor:
+        return None
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        return None
+
+
+def guardar_ultimo_escaneo(momento):
+    """Registra la fecha/hora del escaneo de vencimientos como checkpoint"""
+    from sistema.models import ConfiguracionSistema
+
+    ConfiguracionSistema.objects.update_or_create(
+        clave=CLAVE_ULTIMO_ESCANEO,
+        defaults={
+            'valor': momento.isoformat(),
+            'descripcion': 'Último escaneo de vencimientos de lotes (generar_alertas)',
+            'tipo': 'DATE',
+            'categoria': 'INVENTARIO',
+            'editable': False,
+        },
+    )
+
+
+def _filtro_cruces(desde, hoy, checkpoint):
+    """
+    Lotes que cruzaron algún umbral entre la fecha del último escaneo (excluida)
+    y hoy (incluida), más los lotes creados o modificados desde el checkpoint.
+    Un lote cruza el umbral de N días el día fecha_vencimiento - N y pasa a
+    vencido el día siguiente a su fecha de vencimiento.
+    """
+    filtro = Q(updated_at__gte=checkpoint) | Q(created_at__gte=checkpoint)
+    for dias in UMBRALES_VENCIMIENTO:
+        filtro |= Q(
+            fecha_vencimiento__gt=desde + timedelta(days=dias),
+            fecha_vencimiento__lte=hoy + timedelta(days=dias),
+        )
+    filtro |= Q(fecha_vencimiento__gte=desde, fecha_vencimiento__lt=hoy)
+    return filtro
+
+
+def generar_alertas_vencimiento_masivo(incremental=False):
+    """
+    Sincroniza las alertas POR_VENCER / VENCIDO de los lotes activos.
+
+    Las alertas existentes se leen en una consulta por lote de ids, las nuevas
+    se insertan con bulk_create y las existentes se actualizan con bulk_update.
+    Al final los lotes vencidos pasan a estado VENCIDO con un único UPDATE.
+
+    Args:
+        incremental: revisar solo los lotes que cruzaron un umbral o cambiaron
+            desde el último escaneo; sin checkpoint previo se hace un escaneo completo
+
+    Returns:
+        dict: lotes revisados, creadas, actualizadas, resueltas, lotes marcados
+        como vencidos, si fue incremental y tiempos por fase en segundos
+    """
+    tiempos = {}
+    inicio = time.perf_counter()
+    ahora = timezone.now()
+    hoy = timezone.localdate(ahora)
+
+    checkpoint = obtener_ultimo_escaneo() if incremental else None
+    if checkpoint is not None and timezone.is_naive(checkpoint):
+        checkpoint = timezone.make_aware(checkpoint)
+
+    lotes = Lote.objects.filter(
+        fecha_vencimiento__isnull=False,
+        fecha_vencimiento__lte=hoy + timedelta(days=UMBRALES_VENCIMIENTO[0]),
+        estado='ACTIVO',
+        cantidad_disponible__gt=0,
+    )
+    if checkpoint is not None:
+        lotes = lotes.filter(_filtro_cruces(timezone.localdate(checkpoint), hoy, checkpoint))
+
+    filas = list(lotes.values_list(
+        'id', 'producto_id', 'bodega_id', 'codigo_lote', 'fecha_vencimiento', 'cantidad_disponible'
+    ))
+
+    lote_ids = [fila[0] for fila in filas]
+    existentes = {}
+    for inicio_lote in range(0, len(lote_ids), TAMANO_LOTE):
+        alertas = AlertaStock.objects.filter(
+            lote_id__in=lote_ids[inicio_lote:inicio_lote + TAMANO_LOTE],
+            tipo_alerta__in=TIPOS_ALERTA_VENCIMIENTO,
+            estado='ACTIVA',
+        ).order_by('-id').only(
+            'id', 'producto_id', 'bodega_id', 'lote_id', 'tipo_alerta', 'cantidad_actual',
+            'dias_vencimiento', 'prioridad', 'estado',
+        )
+        for alerta in alertas:
+            existentes[(alerta.lote_id, alerta.tipo_alerta)] = alerta
+    tiempos['consulta'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    nuevas = []
+    actualizadas = []
+    resueltas = []
+    for lote_id, producto_id, bodega_id, codigo_lote, fecha_vencimiento, cantidad in filas:
+        dias_vencimiento = (fecha_vencimiento - hoy).days
+
+        if dias_vencimiento < 0:
+            por_vencer = existentes.get((lote_id, 'POR_VENCER'))
+            if por_vencer:
+                por_vencer.estado = 'RESUELTA'
+                por_vencer.fecha_resolucion = ahora
+                por_vencer.motivo_resolucion = 'Lote vencido'
+                resueltas.append(por_vencer)
+            if (lote_id, 'VENCIDO') not in existentes:
+                nuevas.append(AlertaStock(
+                    producto_id=producto_id,
+                    tipo_alerta='VENCIDO',
+                    bodega_id=bodega_id,
+                    lote_id=lote_id,
+                    cantidad_actual=cantidad,
+                    fecha_vencimiento=fecha_vencimiento,
+                    prioridad='CRITICA',
+                    fecha_generacion=ahora,
+                    observaciones=f'Lote {codigo_lote} vencido desde {fecha_vencimiento}'
+                ))
+            continue
+
+        if dias_vencimiento == 0:
+            # Vence hoy: el escaneo de mañana lo marcará como vencido
+            continue
+
+        prioridad = prioridad_vencimiento(dias_vencimiento)
+        alerta = existentes.get((lote_id, 'POR_VENCER'))
+        if alerta is None:
+            nuevas.append(AlertaStock(
+                producto_id=producto_id,
+                tipo_alerta='POR_VENCER',
+                bodega_id=bodega_id,
+                lote_id=lote_id,
+                cantidad_actual=cantidad,
+                fecha_vencimiento=fecha_vencimiento,
+                dias_vencimiento=dias_vencimiento,
+                prioridad=prioridad,
+                fecha_generacion=ahora,
+                observaciones=f'Lote {codigo_lote} vence en {dias_vencimiento} días'
+            ))
+        elif (alerta.dias_vencimiento, alerta.prioridad, alerta.cantidad_actual) != (
+            dias_vencimiento, prioridad, cantidad
+        ):
+            alerta.dias_vencimiento = dias_vencimiento
+            alerta.prioridad = prioridad
+            alerta.cantidad_actual = cantidad
+            alerta.fecha_generacion = ahora
+            actualizadas.append(alerta)
+    tiempos['comparacion'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with transaction.atomic():
+        if nuevas:
+            AlertaStock.objects.bulk_create(nuevas, batch_size=TAMANO_LOTE)
+        if actualizadas:
+            AlertaStock.objects.bulk_update(
+                actualizadas,
+                ['dias_vencimiento', 'prioridad', 'cantidad_actual', 'fecha_generacion'],
+                batch_size=TAMANO_LOTE,
+            )
+        if resueltas:
+            AlertaStock.objects.bulk_update(
+                resueltas,
+                ['estado', 'fecha_resolucion', 'motivo_resolucion'],
+                batch_size=TAMANO_LOTE,
+            )
+
+        # Pasar a VENCIDO todos los lotes activos con fecha de vencimiento pasada
+        lotes_vencidos = Lote.objects.filter(
+            estado='ACTIVO',
+            fecha_vencimiento__lt=hoy,
+        ).update(estado='VENCIDO', updated_at=ahora)
+
+        if nuevas or actualizadas or resueltas:
+            marcar_seccion('alertas')
+            registrar_alertas(nuevas + actualizadas + resueltas)
+        guardar_ultimo_escaneo(ahora)
+    tiempos['escritura'] = time.perf_counter() - inicio
+
+    return {
+        'revisados': len(filas),
+        'creadas': len(nuevas),
+        'actualizadas': len(actualizadas),
+        'resueltas': len(resueltas),
+        'lotes_vencidos': lotes_vencidos,
+        'incremental': checkpoint is not None,
+        'tiempos': tiempos,
+    }
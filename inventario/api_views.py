@@ -5,16 +5,29 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from rest_framework.exceptions import NotAuthenticated, ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Sum, Count
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Sum, Count, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta
+from decimal import Decimal
+import hashlib
+import heapq
 
-from .models import MovimientoInventario, StockActual, AlertaStock, Bodega, Lote
+from .models import MovimientoInventario, StockActual, AlertaStock, Bodega, Lote, ReservaStock
+from .stock import StockInsuficienteError, registrar_movimientos_masivos
+from .paginacion import MovimientoPagination
+from .snapshots import fin_del_dia, stock_en_fecha
+from .archivo import leer_archivo, particiones
 from .serializers import (
-    MovimientoInventarioSerializer, MovimientoInventarioListSerializer,
+    MovimientoInventarioSerializer, MovimientoInventarioListSerializer, MovimientoBatchSerializer,
     StockActualSerializer, StockActualListSerializer,
-    AlertaStockSerializer, BodegaSerializer, LoteSerializer
+    AlertaStockSerializer, BodegaSerializer, LoteSerializer,
+    ReservaStockSerializer, ReservarSerializer
 )
 
 
@@ -49,6 +62,36 @@ class BodegaViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+def _cacheado(nombre, request, calcular):
+    """
+    Resultado de calcular() guardado en la caché de Django durante
+    INVENTARIO_ESTADISTICAS_CACHE_SEGUNDOS, con clave por nombre del endpoint
+    y parámetros de la consulta (ventana de fechas y filtros) en orden canónico
+    """
+    parametros = sorted(
+        (clave, valor) for clave in request.query_params for valor in request.query_params.getlist(clave)
+    )
+    clave = f'inventario:{nombre}:' + hashlib.sha1(repr(parametros).encode()).hexdigest()
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular()
+        cache.set(clave, resultado, getattr(settings, 'INVENTARIO_ESTADISTICAS_CACHE_SEGUNDOS', 60))
+    return resultado
+
+
+def _parsear_fecha(request, parametro, obligatorio=True):
+    """Lee un parámetro de query YYYY-MM-DD; None si es opcional y no viene"""
+    valor = request.query_params.get(parametro)
+    if not valor:
+        if obligatorio:
+            raise ValidationError({parametro: 'Parámetro obligatorio (YYYY-MM-DD)'})
+        return None
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValidationError({parametro: 'Formato inválido, use YYYY-MM-DD'})
+
+
 class MovimientoInventarioViewSet(viewsets.ModelViewSet):
     """ViewSet para MovimientoInventario"""
     queryset = MovimientoInventario.objects.select_related(
@@ -56,12 +99,14 @@ class MovimientoInventarioViewSet(viewsets.ModelViewSet):
     ).all()
     serializer_class = MovimientoInventarioSerializer
     permission_classes = [AllowAny]
+    # ?cursor= o ?paginacion=cursor activa la paginación por (fecha_movimiento, id)
+    pagination_class = MovimientoPagination
     
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['tipo_movimiento', 'estado', 'bodega_origen', 'bodega_destino', 'producto']
     search_fields = ['producto__nombre', 'producto__sku', 'observaciones']
-    ordering_fields = ['fecha_movimiento', 'cantidad', 'precio_unitario']
-    ordering = ['-fecha_movimiento']
+    ordering_fields = ['fecha_movimiento', 'cantidad', 'costo_unitario']
+    ordering = ['-fecha_movimiento', '-id']
     
     def get_serializer_class(self):
         """Usar serializer simplificado para listas"""
@@ -71,7 +116,37 @@ class MovimientoInventarioViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         """Asignar usuario al crear movimiento"""
-        serializer.save(usuario=self.request.user)
+        try:
+            with transaction.atomic():
+                serializer.save(usuario=self.request.user)
+        except StockInsuficienteError as e:
+            raise ValidationError({'cantidad': str(e)})
+    
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch(self, request):
+        """
+        Endpoint: /api/inventario/movimientos/batch/
+        Registra y confirma cientos de movimientos en una sola transacción:
+        bulk_create de los movimientos y un delta neto por (producto, bodega).
+        """
+        if not request.user.is_authenticated:
+            raise NotAuthenticated('La carga masiva requiere un usuario autenticado')
+        
+        serializer = MovimientoBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        try:
+            movimientos, claves = registrar_movimientos_masivos(
+                serializer.to_lineas(), request.user
+            )
+        except StockInsuficienteError as e:
+            raise ValidationError({'movimientos': str(e)})
+        
+        return Response({
+            'creados': len(movimientos),
+            'movimiento_ids': [m.id for m in movimientos if m.id is not None],
+            'stocks_afectados': len(claves),
+        }, status=status.HTTP_201_CREATED)
     
     @action(detail=False, methods=['get'])
     def ingresos(self, request):
@@ -117,35 +192,99 @@ class MovimientoInventarioViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
-    def estadisticas(self, request):
-        """Endpoint: /api/inventario/movimientos/estadisticas/"""
-        # Últimos 30 días
-        fecha_limite = timezone.now() - timedelta(days=30)
+    def archivo(self, request):
+        """
+        Endpoint: /api/inventario/movimientos/archivo/?desde=&hasta=&producto=&bodega=&tipo=&limite=
+        Movimientos archivados en disco (archivar_movimientos). Solo se leen
+        las particiones mensuales que se cruzan con el rango de fechas.
+        """
+        desde = _parsear_fecha(request, 'desde', obligatorio=False)
+        hasta = _parsear_fecha(request, 'hasta', obligatorio=False)
+        try:
+            producto_id = int(request.query_params.get('producto') or 0) or None
+            bodega_id = int(request.query_params.get('bodega') or 0) or None
+            limite = min(int(request.query_params.get('limite') or 500), 5000)
+        except ValueError:
+            raise ValidationError({'detail': 'producto, bodega y limite deben ser números'})
         
-        movimientos = self.get_queryset().filter(
-            fecha_movimiento__gte=fecha_limite,
-            estado='CONFIRMADO'
-        )
+        resultados = []
+        truncado = False
+        for movimiento in leer_archivo(
+            desde=desde,
+            hasta=hasta,
+            producto_id=producto_id,
+            bodega_id=bodega_id,
+            tipo_movimiento=request.query_params.get('tipo') or None,
+        ):
+            if len(resultados) >= limite:
+                truncado = True
+                break
+            resultados.append(movimiento)
         
-        stats = {
-            'total_movimientos': movimientos.count(),
-            'total_ingresos': movimientos.filter(tipo_movimiento='INGRESO').count(),
-            'total_salidas': movimientos.filter(tipo_movimiento='SALIDA').count(),
-            'valor_total_ingresos': movimientos.filter(
-                tipo_movimiento='INGRESO'
-            ).aggregate(
-                total=Sum('cantidad') * Sum('precio_unitario')
-            )['total'] or 0,
-            'productos_mas_movidos': movimientos.values(
-                'producto__nombre'
-            ).annotate(
-                total_movimientos=Count('id')
-            ).order_by('-total_movimientos')[:5]
-        }
+        return Response({
+            'particiones': [
+                {'particion': m['particion'], 'archivo': m['archivo'], 'filas': m['filas']}
+                for m in particiones()
+            ],
+            'resultados': resultados,
+            'truncado': truncado,
+        })
+    
+    @action(detail=False, methods=['get'])
+    def estadisticas(self, request):
+        """
+        Endpoint: /api/inventario/movimientos/estadisticas/?desde=YYYY-MM-DD&hasta=YYYY-MM-DD
+        Movimientos confirmados del rango (default: los 30 días que terminan en
+        hasta, o los últimos 30 días) con una sola consulta agrupada por
+        producto y agregados condicionales por tipo; los totales se suman en
+        memoria a partir de esas filas.
+        """
+        desde = _parsear_fecha(request, 'desde', obligatorio=False)
+        hasta = _parsear_fecha(request, 'hasta', obligatorio=False)
+        if desde and hasta and desde > hasta:
+            raise ValidationError({'desde': 'No puede ser posterior a hasta'})
         
-        return Response(stats)
-
-
+        def calcular():
+            movimientos = self.filter_queryset(self.get_queryset()).filter(estado='CONFIRMADO')
+            if desde:
+                movimientos = movimientos.filter(fecha_movimiento__gte=fin_del_dia(desde - timedelta(days=1)))
+            elif hasta:
+                # Solo hasta: los 30 días que terminan en esa fecha
+                movimientos = movimientos.filter(fecha_movimiento__gte=fin_del_dia(hasta) - timedelta(days=30))
+            else:
+                movimientos = movimientos.filter(fecha_movimiento__gte=timezone.now() - timedelta(days=30))
+            if hasta:
+                movimientos = movimientos.filter(fecha_movimiento__lt=fin_del_dia(hasta))
+            
+            por_tipo = {
+                f'total_{tipo.lower()}': Count('id', filter=Q(tipo_movimiento=tipo))
+                for tipo, _ in MovimientoInventario.TIPO_MOVIMIENTO_CHOICES
+            }
+            productos = list(movimientos.values('producto_id', 'producto__nombre').annotate(
+                total_movimientos=Count('id'),
+                valor_ingresos=Sum('costo_total', filter=Q(tipo_movimiento='INGRESO')),
+                **por_tipo,
+            ).order_by())
+            
+            stats = {
+                'desde': desde,
+                'hasta': hasta,
+                'total_movimientos': sum(p['total_movimientos'] for p in productos),
+            }
+            for campo in por_tipo:
+                stats[campo] = sum(p[campo] for p in productos)
+            stats['total_ingresos'] = stats['total_ingreso']
+            stats['total_salidas'] = stats['total_salida']
+            stats['valor_total_ingresos'] = sum((p['valor_ingresos'] or 0 for p in productos), 0)
+            stats['productos_mas_movidos'] = [
+                {'producto__nombre': p['producto__nombre'], 'total_movimientos': p['total_movimientos']}
+                for p in heapq.nlargest(5, productos, key=lambda p: (p['total_movimientos'], -p['producto_id']))
+            ]
+            return stats
+        
+        return Response(_cacheado('movimientos_estadisticas', request, calcular))
+    
+    
 class StockActualViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet de solo lectura para StockActual
@@ -200,19 +339,124 @@ class StockActualViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['get'])
     def resumen(self, request):
-        """Resumen general del stock"""
-        queryset = self.get_queryset()
-        
-        resumen = {
-            'total_productos_con_stock': queryset.filter(cantidad_disponible__gt=0).count(),
-            'total_productos_sin_stock': queryset.filter(cantidad_disponible=0).count(),
-            'productos_bajo_minimo': queryset.filter(
-                cantidad_disponible__lte=F('producto__stock_minimo')
-            ).count(),
-            'valor_total_inventario': 0,  # Requiere cálculo más complejo
-        }
+        """
+        Resumen general del stock en una sola consulta con agregados condicionales.
+        Considera todos los registros (con y sin stock) filtrados por ?producto= / ?bodega=.
+        """
+        def calcular():
+            queryset = self.filter_queryset(StockActual.objects.all())
+            return queryset.aggregate(
+                total_productos_con_stock=Count('id', filter=Q(cantidad_disponible__gt=0)),
+                total_productos_sin_stock=Count('id', filter=Q(cantidad_disponible__lte=0)),
+                productos_bajo_minimo=Count(
+                    'id', filter=Q(cantidad_disponible__lte=F('producto__stock_minimo'))
+                ),
+                valor_total_inventario=Coalesce(Sum('valor_total'), Value(Decimal('0'))),
+            )
         
-        return Response(resumen)
+        return Response(_cacheado('stock_resumen', request, calcular))
+    
+    @action(detail=False, methods=['get'])
+    def valorizacion(self, request):
+        """
+        Endpoint: /api/inventario/stock/valorizacion/?bodega=
+        Valor del inventario por bodega (suma de valor_total) en una sola consulta
+        """
+        _, bodega_ids = self._filtros_historico(request)
+        queryset = StockActual.objects.filter(cantidad_disponible__gt=0)
+        if bodega_ids:
+            queryset = queryset.filter(bodega_id__in=bodega_ids)
+        
+        bodegas = list(queryset.values('bodega_id', 'bodega__codigo', 'bodega__nombre').annotate(
+            productos=Count('id'),
+            cantidad=Sum('cantidad_disponible'),
+            valor_total=Sum('valor_total'),
+        ).order_by('bodega__nombre'))
+        
+        return Response({
+            'valor_total_inventario': sum((b['valor_total'] for b in bodegas), 0),
+            'bodegas': bodegas,
+        })
+    
+    def _filtros_historico(self, request):
+        """Filtros opcionales ?producto= y ?bodega= (ids separados por coma)"""
+        filtros = {}
+        for parametro in ('producto', 'bodega'):
+            valor = request.query_params.get(parametro)
+            if valor:
+                try:
+                    filtros[parametro] = {int(v) for v in valor.split(',') if v.strip()}
+                except ValueError:
+                    raise ValidationError({parametro: 'Debe ser una lista de ids separados por coma'})
+        return filtros.get('producto'), filtros.get('bodega')
+    
+    def _serializar_saldos(self, saldos):
+        """Lista de saldos por producto y bodega con sku y nombres"""
+        from maestros.models import Producto
+        
+        productos = Producto.objects.in_bulk({p for p, _ in saldos})
+        bodegas = Bodega.objects.in_bulk({b for _, b in saldos})
+        resultados = []
+        for (producto_id, bodega_id), cantidad in sorted(saldos.items()):
+            producto = productos.get(producto_id)
+            bodega = bodegas.get(bodega_id)
+            resultados.append({
+                'producto_id': producto_id,
+                'producto_sku': producto.sku if producto else None,
+                'producto_nombre': producto.nombre if producto else None,
+                'bodega_id': bodega_id,
+                'bodega_nombre': bodega.nombre if bodega else None,
+                'cantidad': cantidad,
+            })
+        return resultados
+    
+    @action(detail=False, methods=['get'])
+    def historico(self, request):
+        """
+        Endpoint: /api/inventario/stock/historico/?fecha=YYYY-MM-DD&producto=&bodega=
+        Stock al cierre de una fecha: último snapshot hasta esa fecha más los
+        movimientos confirmados posteriores.
+        """
+        fecha = _parsear_fecha(request, 'fecha')
+        producto_ids, bodega_ids = self._filtros_historico(request)
+        
+        saldos, snapshot = stock_en_fecha(fecha, producto_ids, bodega_ids)
+        
+        return Response({
+            'fecha': fecha,
+            'snapshot_base': snapshot,
+            'resultados': self._serializar_saldos(saldos),
+        })
+    
+    @action(detail=False, methods=['get'])
+    def rango(self, request):
+        """
+        Endpoint: /api/inventario/stock/rango/?desde=YYYY-MM-DD&hasta=YYYY-MM-DD&producto=&bodega=
+        Saldo inicial (cierre del día anterior a desde), saldo final y variación
+        por producto y bodega, para cierres de mes y auditorías.
+        """
+        desde = _parsear_fecha(request, 'desde')
+        hasta = _parsear_fecha(request, 'hasta')
+        if desde > hasta:
+            raise ValidationError({'desde': 'No puede ser posterior a hasta'})
+        producto_ids, bodega_ids = self._filtros_historico(request)
+        
+        iniciales, _ = stock_en_fecha(desde - timedelta(days=1), producto_ids, bodega_ids)
+        finales, _ = stock_en_fecha(hasta, producto_ids, bodega_ids)
+        
+        claves = set(iniciales) | set(finales)
+        resultados = self._serializar_saldos({clave: finales.get(clave, 0) for clave in claves})
+        for fila in resultados:
+            clave = (fila['producto_id'], fila['bodega_id'])
+            fila['saldo_inicial'] = iniciales.get(clave, 0)
+            fila['saldo_final'] = fila.pop('cantidad')
+            fila['variacion'] = fila['saldo_final'] - fila['saldo_inicial']
+        
+        return Response({
+            'desde': desde,
+            'hasta': hasta,
+            'resultados': resultados,
+        })
 
 
 class AlertaStockViewSet(viewsets.ModelViewSet):
@@ -283,4 +527,109 @@ class LoteViewSet(viewsets.ModelViewSet):
             activo=True
         )
         serializer = self.get_serializer(lotes_por_vencer, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+
+class ReservaStockViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Reservas temporales de stock: consulta y operaciones reservar / confirmar /
+    liberar por referencia
+    """
+    queryset = ReservaStock.objects.select_related('producto', 'bodega').all()
+    serializer_class = ReservaStockSerializer
+    permission_classes = [AllowAny]
+    
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['referencia', 'estado', 'producto', 'bodega']
+    ordering_fields = ['created_at', 'expira_en']
+    ordering = ['-created_at']
+    
+    @action(detail=False, methods=['post'])
+    def reservar(self, request):
+        """
+        Endpoint: /api/inventario/reservas/reservar/
+        {"referencia": "venta:15", "lineas": [{"producto": 1, "bodega": 1, "cantidad": 2}], "minutos": 30}
+        """
+        from .reservas import reservar
+        
+        serializer = ReservarSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        minutos = serializer.validated_data.get('minutos')
+        
+        try:
+            reservas = reservar(
+                serializer.validated_data['referencia'],
+                serializer.to_lineas(),
+                usuario=request.user if request.user.is_authenticated else None,
+                ttl=timedelta(minutes=minutos) if minutos else None,
+            )
+        except StockInsuficienteError as e:
+            raise ValidationError({'lineas': str(e)})
+        
+        return Response(
+            ReservaStockSerializer(reservas, many=True).data,
+            status=status.HTTP_201_CREATED,
+        )
+    
+    @action(detail=False, methods=['post'])
+    def confirmar(self, request):
+        """
+        Endpoint: /api/inventario/reservas/confirmar/ {"referencia": "venta:15"}
+        Convierte las reservas activas de la referencia en salidas confirmadas.
+        """
+        from .lotes import LotesInsuficientesError
+        from .reservas import ReservaInvalidaError, confirmar
+        
+        if not request.user.is_authenticated:
+            raise NotAuthenticated('Confirmar una reserva requiere un usuario autenticado')
+        referencia = request.data.get('referencia')
+        if not referencia:
+            raise ValidationError({'referencia': 'Este campo es requerido'})
+        
+        try:
+            movimientos = confirmar(
+                referencia, request.user,
+                documento_referencia=request.data.get('documento_referencia') or referencia[:50],
+            )
+        except (ReservaInvalidaError, StockInsuficienteError, LotesInsuficientesError) as e:
+            raise ValidationError({'referencia': str(e)})
+        
+        return Response({
+            'referencia': referencia,
+            'movimiento_ids': [m.id for m in movimientos if m.id is not None],
+        })
+    
+    @action(detail=False, methods=['post'])
+    def liberar(self, request):
+        """Endpoint: /api/inventario/reservas/liberar/ {"referencia": "venta:15"}"""
+        from .reservas import liberar
+        
+        referencia = request.data.get('referencia')
+        if not referencia:
+            raise ValidationError({'referencia': 'Este campo es requerido'})
+        
+        return Response({'referencia': referencia, 'liberadas': liberar(referencia)})
+    
+    @action(detail=False, methods=['get'])
+    def disponibilidad(self, request):
+        """
+        Endpoint: /api/inventario/reservas/disponibilidad/?producto=&bodega=
+        Stock libre (disponible - reservado) de un producto en una bodega
+        """
+        try:
+            producto_id = int(request.query_params['producto'])
+            bodega_id = int(request.query_params['bodega'])
+        except (KeyError, ValueError):
+            raise ValidationError({'detail': 'Se requieren producto y bodega (ids)'})
+        
+        fila = StockActual.objects.filter(
+            producto_id=producto_id, bodega_id=bodega_id
+        ).values('cantidad_disponible', 'cantidad_reservada').first() or {
+            'cantidad_disponible': 0, 'cantidad_reservada': 0,
+        }
+        return Response({
+            'producto': producto_id,
+            'bodega': bodega_id,
+            **fila,
+            'libre': fila['cantidad_disponible'] - fila['cantidad_reservada'],
+        })
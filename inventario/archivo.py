@@ -0,0 +1,437 @@
+"""
+Archivo histórico del libro de movimientos
+
+En vez de borrar MovimientoInventario para aligerar la tabla (o para poder
+eliminar un producto), los movimientos se copian a particiones mensuales
+comprimidas en disco y solo se borran de la base de datos después de verificar
+cada archivo.
+
+Estructura en INVENTARIO_ARCHIVO_DIR:
+    2025/03/movimientos_2025-03_<id_min>-<id_max>.csv.gz
+    2025/03/movimientos_2025-03_<id_min>-<id_max>.json   (manifiesto)
+
+Cada CSV tiene una fila de encabezado con los campos del modelo y usa \\N para
+los valores nulos. El manifiesto guarda la cantidad de filas, el rango de ids
+y el sha256 del archivo comprimido.
+
+Cada lote borrado suma, en la misma transacción, el efecto de sus movimientos
+confirmados a SaldoArchivado (cantidad, valor y costo promedio por producto y
+bodega). Los cálculos que recorren el libro parten de ese saldo de apertura en
+vez de asumir que el libro empieza en cero.
+Para archivos generados antes de que existiera, reconstruir_saldos_archivados()
+lo recalcula desde los archivos en disco.
+"""
+import csv
+import gzip
+import hashlib
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import MovimientoInventario, SaldoArchivado
+from .paginacion import iterar_por_lotes
+from .stock import CERO, deltas_movimiento
+
+
+NULO = '\\N'
+
+TAMANO_LOTE = 2000
+TAMANO_BORRADO = 500
+
+# Campos de SaldoArchivado que acumula _plegar()
+CAMPOS_SALDO = (
+    'cantidad', 'valor_total', 'costo_promedio', 'ultimo_ingreso', 'ultima_salida', 'hasta', 'movimientos',
+)
+
+
+class ArchivoInvalidoError(Exception):
+    """El archivo escrito no coincide con las filas leídas de la base de datos"""
+
+
+def directorio_archivo():
+    return Path(settings.INVENTARIO_ARCHIVO_DIR)
+
+
+def columnas_archivo():
+    """Campos de MovimientoInventario que se guardan, en orden"""
+    return [campo.attname for campo in MovimientoInventario._meta.concrete_fields]
+
+
+def _a_texto(valor):
+    if valor is None:
+        return NULO
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _sha256(ruta):
+    digest = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+class _Particion:
+    """Archivo comprimido de una partición mensual en escritura"""
+
+    def __init__(self, particion, columnas, saldo_apertura=True):
+        self.particion = particion
+        self.columnas = columnas
+        self.saldo_apertura = saldo_apertura
+        anio, mes = particion.split('-')
+        self.carpeta = directorio_archivo() / anio / mes
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+        self.ruta_parcial = self.carpeta / f'.movimientos_{particion}_{os.getpid()}.parcial'
+        self.gzip = gzip.open(self.ruta_parcial, 'wt', encoding='utf-8', newline='')
+        self.escritor = csv.writer(self.gzip)
+        self.escritor.writerow(columnas)
+        self.ids = []
+
+    def escribir(self, fila):
+        self.escritor.writerow([_a_texto(valor) for valor in fila])
+        self.ids.append(fila[0])
+
+    def cerrar(self):
+        """Cierra, verifica y publica el archivo. Devuelve el manifiesto."""
+        self.gzip.close()
+
+        with gzip.open(self.ruta_parcial, 'rt', encoding='utf-8', newline='') as archivo:
+            lector = csv.reader(archivo)
+            if next(lector) != self.columnas:
+                raise ArchivoInvalidoError(f'Encabezado inválido en {self.ruta_parcial}')
+            ids_leidos = [int(fila[0]) for fila in lector]
+        if ids_leidos != self.ids:
+            raise ArchivoInvalidoError(
+                f'{self.ruta_parcial}: se escribieron {len(self.ids)} filas y se leyeron {len(ids_leidos)}'
+            )
+
+        nombre = f'movimientos_{self.particion}_{min(self.ids)}-{max(self.ids)}'
+        ruta = self.carpeta / f'{nombre}.csv.gz'
+        os.replace(self.ruta_parcial, ruta)
+
+        manifiesto = {
+            'archivo': ruta.name,
+            'particion': self.particion,
+            'filas': len(self.ids),
+            'id_min': min(self.ids),
+            'id_max': max(self.ids),
+            'sha256': _sha256(ruta),
+            'saldo_apertura': self.saldo_apertura,
+            'columnas': self.columnas,
+            'creado': timezone.now().isoformat(),
+        }
+        with open(self.carpeta / f'{nombre}.json', 'w', encoding='utf-8') as archivo:
+            json.dump(manifiesto, archivo, indent=2)
+        return manifiesto
+
+    def descartar(self):
+        self.gzip.close()
+        if self.ruta_parcial.exists():
+            self.ruta_parcial.unlink()
+
+
+def _saldo_vacio():
+    return {
+        'cantidad': CERO, 'valor_total': CERO, 'costo_promedio': CERO,
+        'ultimo_ingreso': None, 'ultima_salida': None, 'hasta': None, 'movimientos': 0,
+    }
+
+
+def _plegar(saldos, movimiento):
+    """
+    Suma un movimiento confirmado a los saldos {(producto_id, bodega_id): dict
+    con CAMPOS_SALDO}, valorizado igual que el motor de stock (costos.valorizar)
+    """
+    from .costos import valorizar
+
+    fecha = movimiento.fecha_confirmacion or movimiento.fecha_movimiento
+    for producto_id, bodega_id, delta, costo in deltas_movimiento(movimiento):
+        saldo = saldos.setdefault((producto_id, bodega_id), _saldo_vacio())
+        if isinstance(costo, tuple):
+            costo = saldos.get(costo, _saldo_vacio())['costo_promedio']
+        saldo['cantidad'], saldo['valor_total'], saldo['costo_promedio'] = valorizar(
+            saldo['cantidad'], saldo['valor_total'], saldo['costo_promedio'], delta, costo
+        )
+        campo = 'ultimo_ingreso' if delta > 0 else 'ultima_salida'
+        if saldo[campo] is None or fecha > saldo[campo]:
+            saldo[campo] = fecha
+        if saldo['hasta'] is None or movimiento.fecha_movimiento > saldo['hasta']:
+            saldo['hasta'] = movimiento.fecha_movimiento
+        saldo['movimientos'] += 1
+
+
+def _guardar_saldos(saldos, existentes):
+    """Escribe los saldos plegados: bulk_update de los existentes, bulk_create de los nuevos"""
+    ahora = timezone.now()
+    cambiados, nuevos = [], []
+    for (producto_id, bodega_id), saldo in saldos.items():
+        fila = existentes.get((producto_id, bodega_id))
+        if fila is None:
+            nuevos.append(SaldoArchivado(producto_id=producto_id, bodega_id=bodega_id, **saldo))
+            continue
+        for campo, valor in saldo.items():
+            setattr(fila, campo, valor)
+        fila.updated_at = ahora
+        cambiados.append(fila)
+    SaldoArchivado.objects.bulk_update(cambiados, CAMPOS_SALDO + ('updated_at',), batch_size=TAMANO_BORRADO)
+    SaldoArchivado.objects.bulk_create(nuevos, batch_size=TAMANO_BORRADO)
+
+
+def _acumular_saldos(movimientos):
+    """
+    Suma a SaldoArchivado los movimientos confirmados del queryset, en orden
+    (fecha_movimiento, id). Debe llamarse en la transacción que los borra.
+    """
+    confirmados = list(movimientos.filter(estado='CONFIRMADO').only(
+        'id', 'fecha_movimiento', 'fecha_confirmacion', 'tipo_movimiento', 'producto_id',
+        'bodega_origen_id', 'bodega_destino_id', 'cantidad', 'costo_unitario',
+    ).order_by('fecha_movimiento', 'id'))
+    if not confirmados:
+        return
+
+    existentes = {
+        (fila.producto_id, fila.bodega_id): fila
+        for fila in SaldoArchivado.objects.select_for_update().filter(
+            producto_id__in={movimiento.producto_id for movimiento in confirmados}
+        ).order_by('producto_id', 'bodega_id')
+    }
+    saldos = {
+        clave: {campo: getattr(fila, campo) for campo in CAMPOS_SALDO}
+        for clave, fila in existentes.items()
+    }
+    for movimiento in confirmados:
+        _plegar(saldos, movimiento)
+    _guardar_saldos(saldos, existentes)
+
+
+def _borrar_por_lotes(ids, tamano_borrado):
+    for inicio in range(0, len(ids), tamano_borrado):
+        with transaction.atomic():
+            lote = MovimientoInventario.objects.filter(id__in=ids[inicio:inicio + tamano_borrado])
+            _acumular_saldos(lote)
+            lote.delete()
+
+
+def saldos_archivados(producto_ids=None, bodega_ids=None):
+    """
+    Saldo de apertura de cada (producto, bodega) con movimientos archivados.
+
+    Returns:
+        dict: {(producto_id, bodega_id): SaldoArchivado}
+    """
+    filas = SaldoArchivado.objects.all()
+    if producto_ids is not None:
+        filas = filas.filter(producto_id__in=producto_ids)
+    if bodega_ids is not None:
+        filas = filas.filter(bodega_id__in=bodega_ids)
+    return {(fila.producto_id, fila.bodega_id): fila for fila in filas}
+
+
+def reconstruir_saldos_archivados(tamano_lote=TAMANO_LOTE):
+    """
+    Recalcula SaldoArchivado desde los archivos en disco, con los movimientos
+    confirmados que ya no están en la tabla. Los archivos escritos con
+    eliminar=False (copias previas a limpiar_movimientos o a eliminar un
+    producto, que borran también su stock) no cuentan. Para archivos
+    anteriores a SaldoArchivado o tras restaurar la base de datos.
+
+    Returns:
+        dict: movimientos plegados y saldos escritos
+    """
+    saldos = {}
+    plegados = 0
+    pendientes = []
+
+    def plegar_pendientes():
+        nonlocal plegados
+        en_tabla = set(MovimientoInventario.objects.filter(
+            id__in=[movimiento['id'] for movimiento in pendientes]
+        ).values_list('id', flat=True))
+        for movimiento in pendientes:
+            if movimiento['id'] not in en_tabla:
+                _plegar(saldos, SimpleNamespace(**movimiento))
+                plegados += 1
+        pendientes.clear()
+
+    for movimiento in leer_archivo(solo_saldo=True):
+        if movimiento['estado'] != 'CONFIRMADO':
+            continue
+        pendientes.append(movimiento)
+        if len(pendientes) >= tamano_lote:
+            plegar_pendientes()
+    plegar_pendientes()
+
+    # Los productos eliminados se llevaron su stock: sin saldo de apertura
+    from maestros.models import Producto
+    from .models import Bodega
+
+    productos = set(Producto.objects.filter(
+        id__in={producto_id for producto_id, _ in saldos}
+    ).values_list('id', flat=True))
+    bodegas = set(Bodega.objects.values_list('id', flat=True))
+    saldos = {
+        clave: saldo for clave, saldo in saldos.items()
+        if clave[0] in productos and clave[1] in bodegas
+    }
+
+    with transaction.atomic():
+        SaldoArchivado.objects.all().delete()
+        _guardar_saldos(saldos, {})
+    return {'movimientos': plegados, 'saldos': len(saldos)}
+
+
+def archivar_queryset(movimientos, tamano_lote=TAMANO_LOTE, tamano_borrado=TAMANO_BORRADO,
+                      eliminar=True, progreso=None):
+    """
+    Copia los movimientos a particiones mensuales comprimidas y, una vez
+    verificado cada archivo, los borra de la base de datos en lotes pequeños.
+
+    Args:
+        movimientos: queryset de MovimientoInventario a archivar
+        tamano_lote: filas leídas por consulta
+        tamano_borrado: filas borradas por transacción
+        eliminar: borrar las filas archivadas (False = solo copiar)
+        progreso: callback opcional progreso(manifiesto) por partición cerrada
+
+    Returns:
+        list: manifiestos de los archivos generados
+    """
+    columnas = columnas_archivo()
+    indice_fecha = columnas.index('fecha_movimiento')
+    manifiestos = []
+    actual = None
+
+    def cerrar(particion):
+        manifiesto = particion.cerrar()
+        if eliminar:
+            _borrar_por_lotes(particion.ids, tamano_borrado)
+        manifiestos.append(manifiesto)
+        if progreso:
+            progreso(manifiesto)
+
+    try:
+        filas = movimientos.values_list(*columnas)
+        for lote in iterar_por_lotes(filas, tamano_lote):
+            for fila in lote:
+                nombre = timezone.localtime(fila[indice_fecha]).strftime('%Y-%m')
+                if actual is None or actual.particion != nombre:
+                    if actual is not None:
+                        cerrar(actual)
+                    actual = _Particion(nombre, columnas, saldo_apertura=eliminar)
+                actual.escribir(fila)
+        if actual is not None:
+            cerrar(actual)
+            actual = None
+    finally:
+        if actual is not None and not actual.gzip.closed:
+            actual.descartar()
+
+    return manifiestos
+
+
+def particiones():
+    """Manifiestos de todos los archivos, ordenados por partición"""
+    base = directorio_archivo()
+    if not base.exists():
+        return []
+    manifiestos = []
+    for ruta in sorted(base.glob('*/*/movimientos_*.json')):
+        with open(ruta, encoding='utf-8') as archivo:
+            manifiestos.append(json.load(archivo))
+    return manifiestos
+
+
+def _suma_saldo(ruta):
+    """Si el archivo suma al saldo de apertura según su manifiesto (los antiguos no lo indican)"""
+    manifiesto = ruta.with_name(ruta.name[:-len('.csv.gz')] + '.json')
+    if not manifiesto.exists():
+        return True
+    with open(manifiesto, encoding='utf-8') as archivo:
+        return json.load(archivo).get('saldo_apertura', True)
+
+
+def _convertidores():
+    """Función de conversión desde texto para cada columna"""
+    convertidores = {}
+    for campo in MovimientoInventario._meta.concrete_fields:
+        if isinstance(campo, models.DateTimeField):
+            convertidores[campo.attname] = datetime.fromisoformat
+        elif isinstance(campo, models.DateField):
+            convertidores[campo.attname] = date.fromisoformat
+        elif isinstance(campo, models.DecimalField):
+            convertidores[campo.attname] = Decimal
+        elif isinstance(campo, (models.AutoField, models.IntegerField, models.ForeignKey)):
+            convertidores[campo.attname] = int
+        else:
+            convertidores[campo.attname] = str
+    return convertidores
+
+
+def leer_archivo(desde=None, hasta=None, producto_id=None, bodega_id=None, tipo_movimiento=None,
+                 solo_saldo=False):
+    """
+    Recorre los movimientos archivados, abriendo solo las particiones que se
+    cruzan con el rango de fechas.
+
+    Args:
+        desde / hasta: date límite (inclusive) sobre fecha_movimiento
+        producto_id, bodega_id, tipo_movimiento: filtros opcionales
+        solo_saldo: omitir los archivos que no suman al saldo de apertura
+                    (copias con eliminar=False)
+
+    Yields:
+        dict: movimiento con los valores convertidos a su tipo
+    """
+    base = directorio_archivo()
+    if not base.exists():
+        return
+    convertidores = _convertidores()
+    desde_particion = desde.strftime('%Y-%m') if desde else None
+    hasta_particion = hasta.strftime('%Y-%m') if hasta else None
+
+    particion_actual = None
+    vistos = set()
+    for ruta in sorted(base.glob('*/*/movimientos_*.csv.gz')):
+        particion = f'{ruta.parent.parent.name}-{ruta.parent.name}'
+        if desde_particion and particion < desde_particion:
+            continue
+        if hasta_particion and particion > hasta_particion:
+            continue
+        if solo_saldo and not _suma_saldo(ruta):
+            continue
+        if particion != particion_actual:
+            particion_actual = particion
+            vistos = set()
+
+        with gzip.open(ruta, 'rt', encoding='utf-8', newline='') as archivo:
+            for fila in csv.DictReader(archivo):
+                movimiento = {
+                    columna: None if valor == NULO else convertidores.get(columna, str)(valor)
+                    for columna, valor in fila.items()
+                }
+                # Un reintento tras un fallo entre el archivo y el borrado puede duplicar filas
+                if movimiento['id'] in vistos:
+                    continue
+                vistos.add(movimiento['id'])
+
+                fecha = timezone.localtime(movimiento['fecha_movimiento']).date()
+                if desde and fecha < desde:
+                    continue
+                if hasta and fecha > hasta:
+                    continue
+                if producto_id and movimiento['producto_id'] != producto_id:
+                    continue
+                if bodega_id and bodega_id not in (movimiento['bodega_origen_id'], movimiento['bodega_destino_id']):
+                    continue
+                if tipo_movimiento and movimiento['tipo_movimiento'] != tipo_movimiento:
+                    continue
+                yield movimiento
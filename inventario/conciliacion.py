@@ -0,0 +1,268 @@
+"""
+Conciliación de StockActual contra el libro de movimientos
+
+El saldo esperado de cada (producto, bodega) es su saldo archivado
+(SaldoArchivado, los movimientos ya archivados y borrados de la tabla) más el
+efecto neto de sus movimientos confirmados, calculado con las consultas
+GROUP BY de stock.deltas_por_clave() limitadas a una bodega. Cada bodega se concilia por
+separado, así el trabajo se reparte entre procesos (ProcessPoolExecutor) y
+ninguna consulta recorre el libro completo.
+
+La lectura del libro y de StockActual de una bodega se hace en una misma
+transacción: con InnoDB (REPEATABLE READ) ambas ven la misma foto, sin
+bloquear a las cajas. Al corregir, las filas con diferencia se bloquean y su
+saldo se vuelve a calcular bajo el bloqueo antes del bulk_update, de modo que
+un movimiento registrado entre la detección y la corrección no se pierde.
+"""
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import MovimientoInventario, SaldoArchivado, StockActual
+from .stock import CERO, TAMANO_LOTE, deltas_por_clave
+
+
+COLUMNAS_REPORTE = [
+    'bodega_id', 'bodega', 'producto_id', 'sku', 'producto',
+    'stock_actual', 'esperado', 'diferencia', 'corregido',
+]
+
+
+def saldos_esperados(bodega_id, producto_ids=None):
+    """
+    Saldo según el libro de cada producto en la bodega: saldo archivado más
+    movimientos confirmados que siguen en la tabla.
+
+    Returns:
+        dict: {producto_id: Decimal} solo con productos que tienen movimientos
+        (en la tabla o archivados)
+    """
+    archivados = SaldoArchivado.objects.filter(bodega_id=bodega_id)
+    movimientos = MovimientoInventario.objects.filter(estado='CONFIRMADO').filter(
+        Q(bodega_origen_id=bodega_id) | Q(bodega_destino_id=bodega_id)
+    )
+    if producto_ids is not None:
+        archivados = archivados.filter(producto_id__in=producto_ids)
+        movimientos = movimientos.filter(producto_id__in=producto_ids)
+
+    saldos = dict(archivados.values_list('producto_id', 'cantidad'))
+    for (producto_id, bodega), total in deltas_por_clave(movimientos).items():
+        if bodega == bodega_id:
+            saldos[producto_id] = saldos.get(producto_id, CERO) + total
+    return saldos
+
+
+def diferencias_bodega(bodega_id):
+    """
+    Compara StockActual de la bodega con el libro.
+
+    Returns:
+        tuple: (registros revisados, [(producto_id, stock_actual o None, esperado)])
+    """
+    with transaction.atomic():
+        esperados = saldos_esperados(bodega_id)
+        actuales = dict(
+            StockActual.objects.filter(bodega_id=bodega_id).values_list(
+                'producto_id', 'cantidad_disponible'
+            )
+        )
+
+    diferencias = []
+    for producto_id in sorted(set(esperados) | set(actuales)):
+        actual = actuales.get(producto_id)
+        esperado = esperados.get(producto_id, CERO)
+        if (actual if actual is not None else CERO) != esperado:
+            diferencias.append((producto_id, actual, esperado))
+    return len(actuales), diferencias
+
+
+def corregir_bodega(bodega_id, producto_ids):
+    """
+    Ajusta cantidad_disponible (y valor_total al costo promedio vigente) de los
+    productos indicados al saldo del libro, recalculado bajo bloqueo.
+    Crea las filas de StockActual que falten y recalcula totales, costos y
+    alertas de los productos afectados.
+
+    Returns:
+        dict: {producto_id: (anterior, nuevo)} de las filas modificadas
+    """
+    from .alertas import generar_alertas_stock_masivo
+    from .costos import recalcular_costos_productos
+    from .eventos import registrar_stock
+    from .recalculo import recalcular_totales_productos
+    from .resumen import marcar_seccion
+    from .stock import _bloquear_o_crear
+
+    corregidos = {}
+    ahora = timezone.now()
+    for inicio in range(0, len(producto_ids), TAMANO_LOTE):
+        grupo = sorted(producto_ids[inicio:inicio + TAMANO_LOTE])
+        with transaction.atomic():
+            stocks = _bloquear_o_crear([(producto_id, bodega_id) for producto_id in grupo])
+            esperados = saldos_esperados(bodega_id, grupo)
+
+            cambiados = []
+            for (producto_id, _), stock in sorted(stocks.items()):
+                esperado = esperados.get(producto_id, CERO)
+                if stock.cantidad_disponible == esperado:
+                    continue
+                corregidos[producto_id] = (stock.cantidad_disponible, esperado)
+                stock.cantidad_disponible = esperado
+                stock.valor_total = (
+                    esperado * stock.costo_promedio if esperado > 0 else CERO
+                ).quantize(Decimal('0.000001'))
+                stock.updated_at = ahora
+                cambiados.append(stock)
+
+            if not cambiados:
+                continue
+            StockActual.objects.bulk_update(
+                cambiados, ['cantidad_disponible', 'valor_total', 'updated_at'], batch_size=TAMANO_LOTE
+            )
+            ids = [stock.producto_id for stock in cambiados]
+            recalcular_totales_productos(ids)
+            recalcular_costos_productos(ids)
+            generar_alertas_stock_masivo(claves=[(producto_id, bodega_id) for producto_id in ids], solo_activos=False)
+            marcar_seccion('stock')
+            registrar_stock([(producto_id, bodega_id) for producto_id in ids])
+    return corregidos
+
+
+def conciliar_bodega(bodega_id):
+    """
+    Detecta las diferencias de una bodega. Devuelve solo tipos simples para
+    poder viajar desde los procesos del pool.
+
+    Returns:
+        dict: bodega_id, registros, diferencias [(producto_id, actual, esperado,
+        corregido)] y duración en segundos
+    """
+    inicio = time.perf_counter()
+    registros, diferencias = diferencias_bodega(bodega_id)
+    return {
+        'bodega_id': bodega_id,
+        'registros': registros,
+        'diferencias': [(producto_id, actual, esperado, False) for producto_id, actual, esperado in diferencias],
+        'duracion': time.perf_counter() - inicio,
+    }
+
+
+def _conciliar_en_proceso(bodega_id):
+    try:
+        return conciliar_bodega(bodega_id)
+    finally:
+        connections.close_all()
+
+
+def _iniciar_proceso():
+    """Cada proceso del pool abre sus propias conexiones a la base de datos"""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    for conexion in connections.all():
+        conexion.close_if_unusable_or_obsolete()
+
+
+def _corregir(resultado):
+    """Corrige las diferencias detectadas de una bodega y las marca en el resultado"""
+    if not resultado['diferencias']:
+        return resultado
+    inicio = time.perf_counter()
+    corregidos = corregir_bodega(resultado['bodega_id'], [d[0] for d in resultado['diferencias']])
+    resultado['diferencias'] = [
+        (producto_id, actual, esperado, producto_id in corregidos)
+        for producto_id, actual, esperado, _ in resultado['diferencias']
+    ]
+    resultado['duracion'] += time.perf_counter() - inicio
+    return resultado
+
+
+def conciliar(bodega_ids, corregir=False, procesos=None, al_terminar=None):
+    """
+    Concilia las bodegas indicadas. La detección (lectura del libro) corre en
+    paralelo si procesos > 1; las correcciones, que son pocas, se aplican en
+    este proceso a medida que llegan los resultados, sin escritores concurrentes.
+
+    Args:
+        bodega_ids: bodegas a conciliar
+        corregir: ajustar las filas con diferencia
+        procesos: tamaño del pool (default: cantidad de CPUs)
+        al_terminar: callback opcional con el resultado de cada bodega
+
+    Returns:
+        list: resultados de conciliar_bodega en el orden en que terminan
+    """
+    bodega_ids = sorted(bodega_ids)
+    procesos = min(procesos or os.cpu_count() or 1, len(bodega_ids) or 1)
+    resultados = []
+
+    def terminar(resultado):
+        if corregir:
+            resultado = _corregir(resultado)
+        resultados.append(resultado)
+        if al_terminar:
+            al_terminar(resultado)
+
+    if procesos <= 1:
+        for bodega_id in bodega_ids:
+            terminar(conciliar_bodega(bodega_id))
+        return resultados
+
+    # Los procesos hijos no deben heredar conexiones abiertas del padre
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso) as pool:
+        futuros = [pool.submit(_conciliar_en_proceso, bodega_id) for bodega_id in bodega_ids]
+        for futuro in as_completed(futuros):
+            terminar(futuro.result())
+    return resultados
+
+
+def escribir_reporte(resultados, ruta=None):
+    """
+    Escribe el reporte CSV de diferencias (una fila por producto y bodega).
+
+    Returns:
+        str: ruta del archivo escrito
+    """
+    from maestros.models import Producto
+    from .models import Bodega
+
+    if ruta is None:
+        carpeta = getattr(settings, 'INVENTARIO_CONCILIACION_DIR', 'conciliacion')
+        os.makedirs(carpeta, exist_ok=True)
+        ruta = os.path.join(carpeta, f"conciliacion_stock_{timezone.localtime():%Y%m%d_%H%M%S}.csv")
+
+    bodegas = dict(Bodega.objects.filter(
+        id__in=[r['bodega_id'] for r in resultados]
+    ).values_list('id', 'codigo'))
+    producto_ids = sorted({d[0] for r in resultados for d in r['diferencias']})
+    productos = {}
+    for inicio in range(0, len(producto_ids), TAMANO_LOTE):
+        for producto_id, sku, nombre in Producto.objects.filter(
+            id__in=producto_ids[inicio:inicio + TAMANO_LOTE]
+        ).values_list('id', 'sku', 'nombre'):
+            productos[producto_id] = (sku, nombre)
+
+    with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(COLUMNAS_REPORTE)
+        for resultado in sorted(resultados, key=lambda r: r['bodega_id']):
+            bodega_id = resultado['bodega_id']
+            for producto_id, actual, esperado, corregido in resultado['diferencias']:
+                sku, nombre = productos.get(producto_id, ('', ''))
+                escritor.writerow([
+                    bodega_id, bodegas.get(bodega_id, ''), producto_id, sku, nombre,
+                    '' if actual is None else actual, esperado,
+                    esperado - (actual if actual is not None else CERO),
+                    'SI' if corregido else 'NO',
+                ])
+    return ruta
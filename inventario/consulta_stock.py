@@ -0,0 +1,170 @@
+"""
+Consulta de stock por lotes de claves (producto, bodega)
+
+Las pantallas de venta y movimientos necesitan el stock de muchas líneas a la
+vez. En lugar de una petición (y varias consultas perezosas a producto y
+unidad de medida) por línea, ConsultaStock resuelve todas las claves con una
+sola consulta: Producto LEFT JOIN stock_actual (FilteredRelation limitada a
+las bodegas pedidas) JOIN bodega y unidad de medida, devuelta con values().
+
+Cada petición guarda su ConsultaStock (consulta_de_request), así las claves
+ya leídas en la misma petición no se vuelven a consultar.
+"""
+from django.db.models import FilteredRelation, Q
+
+from maestros.models import Producto
+
+
+# Productos por consulta; listas más largas se resuelven en varias vueltas
+TAMANO_LOTE = 500
+
+CAMPOS = (
+    'id', 'sku', 'nombre', 'stock_minimo', 'uom_stock__nombre',
+    'stock_pedido__bodega_id', 'stock_pedido__bodega__nombre',
+    'stock_pedido__cantidad_disponible', 'stock_pedido__cantidad_reservada',
+    'stock_pedido__cantidad_transito',
+)
+
+
+def _stock_vacio(producto_id, bodega_id):
+    return {
+        'producto_id': producto_id,
+        'bodega_id': bodega_id,
+        'bodega_nombre': None,
+        'cantidad_disponible': 0.0,
+        'cantidad_reservada': 0.0,
+        'cantidad_transito': 0.0,
+        'cantidad_libre': 0.0,
+        'existe': False,
+    }
+
+
+class ConsultaStock:
+    """
+    Memo de stock de una petición.
+
+    obtener() recibe pares (producto_id, bodega_id) y/o productos de los que se
+    quieren todas las bodegas, consulta solo lo que no está en memoria y
+    devuelve (stocks, productos) listos para JsonResponse.
+    """
+
+    def __init__(self):
+        self.productos = {}      # producto_id -> datos del producto
+        self.stocks = {}         # (producto_id, bodega_id) -> datos del stock
+        self.bodegas = {}        # producto_id -> bodegas con fila de stock en memoria
+        self.completos = set()   # productos con todas sus bodegas en memoria
+        self.consultas = 0
+
+    def obtener(self, pares=(), producto_ids=()):
+        pares = list(dict.fromkeys((int(p), int(b)) for p, b in pares))
+        producto_ids = list(dict.fromkeys(int(p) for p in producto_ids))
+
+        faltantes_pares = {}
+        for producto_id, bodega_id in pares:
+            if producto_id in self.completos or (producto_id, bodega_id) in self.stocks:
+                continue
+            faltantes_pares.setdefault(producto_id, set()).add(bodega_id)
+        faltantes_completos = [p for p in producto_ids if p not in self.completos]
+        for producto_id in faltantes_completos:
+            faltantes_pares.pop(producto_id, None)
+
+        if faltantes_completos or faltantes_pares:
+            self._consultar(faltantes_completos, faltantes_pares)
+            for producto_id, bodegas in faltantes_pares.items():
+                if producto_id not in self.productos:
+                    continue
+                for bodega_id in bodegas:
+                    self.stocks.setdefault((producto_id, bodega_id), _stock_vacio(producto_id, bodega_id))
+
+        stocks = []
+        for producto_id in producto_ids:
+            stocks.extend(
+                self.stocks[(producto_id, bodega_id)]
+                for bodega_id in sorted(self.bodegas.get(producto_id, ()))
+            )
+        vistos = {(s['producto_id'], s['bodega_id']) for s in stocks}
+        for clave in pares:
+            if clave in self.stocks and clave not in vistos:
+                stocks.append(self.stocks[clave])
+                vistos.add(clave)
+
+        ids = {p for p, _ in pares} | set(producto_ids)
+        productos = {p: self.productos[p] for p in sorted(ids) if p in self.productos}
+        return stocks, productos
+
+    def _consultar(self, completos, pares):
+        """
+        Una consulta por lote de productos: el LEFT JOIN a stock_actual trae
+        todas las bodegas de los productos `completos` y, para el resto, solo
+        las bodegas pedidas en `pares` ({producto_id: {bodega_id}}). Los pares
+        sin fila se completan en cero.
+        """
+        producto_ids = list(completos) + sorted(pares)
+        bodega_ids = sorted(set().union(*pares.values())) if pares else []
+        for inicio in range(0, len(producto_ids), TAMANO_LOTE):
+            grupo = producto_ids[inicio:inicio + TAMANO_LOTE]
+            completos_grupo = [p for p in grupo if p not in pares]
+            condicion = Q()
+            if completos_grupo:
+                condicion |= Q(stocks__producto_id__in=completos_grupo)
+            if bodega_ids and len(completos_grupo) < len(grupo):
+                condicion |= Q(stocks__bodega_id__in=bodega_ids)
+            filas = Producto.objects.filter(id__in=grupo).annotate(
+                stock_pedido=FilteredRelation('stocks', condition=condicion)
+            ).values(*CAMPOS).order_by('id', 'stock_pedido__bodega_id')
+            self.consultas += 1
+
+            for fila in filas:
+                producto_id = fila['id']
+                self.productos[producto_id] = {
+                    'id': producto_id,
+                    'sku': fila['sku'],
+                    'nombre': fila['nombre'],
+                    'stock_minimo': float(fila['stock_minimo'] or 0),
+                    'unidad_medida': fila['uom_stock__nombre'] or '',
+                }
+                bodega_id = fila['stock_pedido__bodega_id']
+                if bodega_id is None:
+                    continue
+                disponible = fila['stock_pedido__cantidad_disponible']
+                reservada = fila['stock_pedido__cantidad_reservada']
+                self.stocks[(producto_id, bodega_id)] = {
+                    'producto_id': producto_id,
+                    'bodega_id': bodega_id,
+                    'bodega_nombre': fila['stock_pedido__bodega__nombre'],
+                    'cantidad_disponible': float(disponible),
+                    'cantidad_reservada': float(reservada),
+                    'cantidad_transito': float(fila['stock_pedido__cantidad_transito']),
+                    'cantidad_libre': float(disponible - reservada),
+                    'existe': True,
+                }
+                self.bodegas.setdefault(producto_id, set()).add(bodega_id)
+            self.completos.update(completos_grupo)
+
+
+def consulta_de_request(request):
+    """ConsultaStock de la petición, creada la primera vez que se pide"""
+    consulta = getattr(request, '_consulta_stock', None)
+    if consulta is None:
+        consulta = request._consulta_stock = ConsultaStock()
+    return consulta
+
+
+def leer_claves(datos):
+    """
+    Interpreta los parámetros de una consulta por lotes.
+
+    Acepta 'pares' como lista de [producto_id, bodega_id] o texto
+    "1:2,3:4", y 'productos' como lista de ids o texto "1,2,3" (todas las
+    bodegas). Raises: ValueError si algún id no es un entero.
+    """
+    pares = datos.get('pares') or []
+    if isinstance(pares, str):
+        pares = [par.split(':') for par in pares.split(',') if par.strip()]
+    producto_ids = datos.get('productos') or []
+    if isinstance(producto_ids, str):
+        producto_ids = [v for v in producto_ids.split(',') if v.strip()]
+
+    pares = [(int(p), int(b)) for p, b in pares]
+    producto_ids = [int(p) for p in producto_ids]
+    return pares, producto_ids
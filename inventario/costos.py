@@ -0,0 +1,173 @@
+"""
+Costo promedio ponderado y valorización del inventario
+
+Cada StockActual guarda su costo_promedio y su valor_total (cantidad x costo)
+y el motor de stock los actualiza en el mismo bulk_update que la cantidad:
+
+- Las entradas con costo (INGRESO con costo_unitario) recalculan el promedio
+  móvil: (valor + cantidad x costo) / (cantidad anterior + cantidad).
+- Las transferencias entran en destino al costo promedio de la bodega origen.
+- Las entradas sin costo y todas las salidas se valorizan al promedio vigente,
+  por lo que no lo modifican.
+
+Producto.costo_promedio es el promedio de sus bodegas (suma de valor_total /
+suma de cantidades) y la valorización total es un SUM(valor_total).
+"""
+import time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import MovimientoInventario, StockActual
+
+
+TAMANO_LOTE = 2000
+
+# Misma escala que los DecimalField(18, 6) de StockActual
+ESCALA = Decimal('0.000001')
+
+
+def valorizar(cantidad, valor, costo_promedio, delta, costo=None):
+    """
+    Aplica un delta de cantidad a un saldo valorizado.
+
+    Args:
+        cantidad, valor, costo_promedio: saldo actual de la bodega
+        delta: cantidad que entra (positiva) o sale (negativa)
+        costo: costo unitario de la entrada; None = al promedio vigente
+
+    Returns:
+        tuple: (cantidad, valor, costo_promedio) resultantes
+    """
+    if delta > 0:
+        costo = costo_promedio if costo is None else costo
+        valor = valor + delta * costo
+    else:
+        valor = valor + delta * costo_promedio
+    cantidad = cantidad + delta
+
+    if cantidad > 0:
+        valor = valor.quantize(ESCALA)
+        costo_promedio = (valor / cantidad).quantize(ESCALA)
+    else:
+        # Sin existencias no hay valor; se conserva el último costo conocido
+        valor = Decimal('0')
+    return cantidad, valor, costo_promedio
+
+
+def recalcular_costos_productos(producto_ids=None):
+    """
+    Actualiza Producto.costo_promedio con el promedio ponderado de sus bodegas
+    (suma de valor_total / suma de cantidades con stock) usando una consulta
+    agrupada y un bulk_update de los productos que cambiaron. Los productos
+    sin existencias conservan su costo.
+
+    Returns:
+        int: cantidad de productos actualizados
+    """
+    from maestros.models import Producto
+
+    stocks = StockActual.objects.filter(cantidad_disponible__gt=0)
+    productos = Producto.objects.all()
+    if producto_ids is not None:
+        stocks = stocks.filter(producto_id__in=producto_ids)
+        productos = productos.filter(id__in=producto_ids)
+
+    sumas = stocks.values('producto_id').annotate(
+        valor=Sum('valor_total'),
+        cantidad=Sum('cantidad_disponible'),
+    ).values_list('producto_id', 'valor', 'cantidad').order_by()
+    costos = {
+        producto_id: (Decimal(str(valor)) / Decimal(str(cantidad))).quantize(ESCALA)
+        for producto_id, valor, cantidad in sumas
+        if cantidad
+    }
+
+    cambiados = []
+    for producto in productos.filter(id__in=list(costos)).only('id', 'costo_promedio'):
+        if producto.costo_promedio != costos[producto.id]:
+            producto.costo_promedio = costos[producto.id]
+            cambiados.append(producto)
+    Producto.objects.bulk_update(cambiados, ['costo_promedio'], batch_size=TAMANO_LOTE)
+    return len(cambiados)
+
+
+def reconstruir_costos(tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Recalcula costo_promedio y valor_total de todo StockActual recorriendo el
+    libro de movimientos confirmados una sola vez en orden cronológico.
+
+    El recorrido parte del saldo valorizado de los movimientos ya archivados
+    (SaldoArchivado). El costo promedio resultante de cada (producto, bodega)
+    se aplica sobre la cantidad_disponible actual. Las filas sin movimientos
+    con costo toman el costo estándar del producto.
+
+    Returns:
+        dict: movimientos procesados, stocks actualizados y duración en segundos
+    """
+    from maestros.models import Producto
+    from .archivo import saldos_archivados
+    from .paginacion import iterar_por_lotes
+    from .stock import CERO, TAMANO_LOTE as TAMANO_ESCRITURA, deltas_movimiento
+
+    inicio = time.perf_counter()
+    saldos = {
+        clave: (fila.cantidad, fila.valor_total, fila.costo_promedio)
+        for clave, fila in saldos_archivados().items()
+    }
+    procesados = 0
+
+    movimientos = MovimientoInventario.objects.filter(estado='CONFIRMADO').only(
+        'id', 'fecha_movimiento', 'tipo_movimiento', 'producto_id', 'bodega_origen_id',
+        'bodega_destino_id', 'cantidad', 'costo_unitario', 'fecha_confirmacion',
+    )
+    for lote in iterar_por_lotes(movimientos, tamano_lote):
+        for movimiento in lote:
+            for producto_id, bodega_id, delta, *resto in deltas_movimiento(movimiento):
+                clave = (producto_id, bodega_id)
+                cantidad, valor, promedio = saldos.get(clave, (CERO, CERO, CERO))
+                costo = resto[0] if resto else None
+                if isinstance(costo, tuple):
+                    costo = saldos.get(costo, (CERO, CERO, CERO))[2]
+                saldos[clave] = valorizar(cantidad, valor, promedio, delta, costo)
+        procesados += len(lote)
+        if progreso:
+            progreso(procesados)
+
+    costos_estandar = dict(
+        Producto.objects.exclude(costo_estandar__isnull=True).values_list('id', 'costo_estandar')
+    )
+
+    actualizados = 0
+    with transaction.atomic():
+        pendientes = []
+        for stock in StockActual.objects.only(
+            'id', 'producto_id', 'bodega_id', 'cantidad_disponible', 'costo_promedio', 'valor_total'
+        ).iterator(chunk_size=tamano_lote):
+            saldo = saldos.get((stock.producto_id, stock.bodega_id))
+            if saldo and saldo[2]:
+                costo = saldo[2]
+            else:
+                costo = costos_estandar.get(stock.producto_id, CERO)
+            stock.costo_promedio = costo
+            stock.valor_total = (
+                (stock.cantidad_disponible * costo).quantize(ESCALA)
+                if stock.cantidad_disponible > 0 else CERO
+            )
+            pendientes.append(stock)
+            if len(pendientes) >= TAMANO_ESCRITURA:
+                StockActual.objects.bulk_update(pendientes, ['costo_promedio', 'valor_total'])
+                actualizados += len(pendientes)
+                pendientes = []
+        if pendientes:
+            StockActual.objects.bulk_update(pendientes, ['costo_promedio', 'valor_total'])
+            actualizados += len(pendientes)
+
+        recalcular_costos_productos()
+
+    return {
+        'movimientos': procesados,
+        'stocks': actualizados,
+        'duracion': time.perf_counter() - inicio,
+    }
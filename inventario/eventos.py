@@ -0,0 +1,201 @@
+"""
+Eventos de cambios de stock y alertas para el stream SSE
+
+Las escrituras de StockActual (motor de stock, reservas, señales) y de
+AlertaStock registran las claves afectadas en la transacción. Al confirmarla
+se inserta un EventoStock por clave con el estado vigente de la fila (una
+consulta y un bulk_create por transacción) y se despierta a los streams del
+proceso (_Hub). Los streams de otros procesos o servidores encuentran los
+eventos nuevos consultando la tabla por id cada INVENTARIO_EVENTOS_INTERVALO
+segundos, por lo que funciona con varios workers.
+
+Los eventos antiguos se borran con purgar_eventos_stock
+(INVENTARIO_EVENTOS_RETENCION_HORAS).
+"""
+import json
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from sistema.transacciones import al_confirmar
+from .models import EventoStock, StockActual
+
+
+# Eventos leídos por consulta en cada vuelta del stream
+TAMANO_LOTE = 500
+
+
+class _Hub:
+    """Aviso en memoria de que hay eventos nuevos, para no esperar el intervalo completo"""
+
+    def __init__(self):
+        self._condicion = threading.Condition()
+        self._version = 0
+
+    def notificar(self):
+        with self._condicion:
+            self._version += 1
+            self._condicion.notify_all()
+
+    def esperar(self, version, segundos):
+        """Espera hasta `segundos` a que la versión cambie; devuelve la versión vigente"""
+        with self._condicion:
+            if self._version == version:
+                self._condicion.wait(segundos)
+            return self._version
+
+    @property
+    def version(self):
+        return self._version
+
+
+hub = _Hub()
+
+
+def eventos_activos():
+    return getattr(settings, 'INVENTARIO_EVENTOS_STOCK', True)
+
+
+def _pendientes_vacios():
+    return {'stock': set(), 'alertas': {}}
+
+
+def _programar(agregar):
+    """Agrega a los pendientes de la transacción y programa publicar_pendientes una sola vez"""
+    if not eventos_activos():
+        return
+    al_confirmar('inventario.eventos', agregar, _pendientes_vacios, publicar_pendientes)
+
+
+def registrar_stock(claves):
+    """Publica al confirmar la transacción el estado de las claves (producto_id, bodega_id)"""
+    claves = list(claves)
+    if claves:
+        _programar(lambda pendientes: pendientes['stock'].update(claves))
+
+
+def registrar_alertas(alertas):
+    """Publica al confirmar la transacción el estado de las alertas indicadas"""
+    datos = [datos_alerta(alerta) for alerta in alertas]
+    if not datos:
+        return
+
+    def agregar(pendientes):
+        for fila in datos:
+            clave = fila['id'] or (fila['producto_id'], fila['bodega_id'], fila['tipo_alerta'])
+            pendientes['alertas'][clave] = fila
+
+    _programar(agregar)
+
+
+def datos_alerta(alerta):
+    return {
+        'id': alerta.id,
+        'producto_id': alerta.producto_id,
+        'bodega_id': alerta.bodega_id,
+        'lote_id': alerta.lote_id,
+        'tipo_alerta': alerta.tipo_alerta,
+        'prioridad': alerta.prioridad,
+        'estado': alerta.estado,
+        'cantidad_actual': float(alerta.cantidad_actual or 0),
+    }
+
+
+def _datos_stock(claves):
+    """Estado vigente de las claves, leído con una consulta por lote de productos"""
+    from django.db.models import Q
+
+    datos = []
+    claves = sorted(claves)
+    for inicio in range(0, len(claves), TAMANO_LOTE):
+        grupo = claves[inicio:inicio + TAMANO_LOTE]
+        condicion = Q()
+        for producto_id, bodega_id in grupo:
+            condicion |= Q(producto_id=producto_id, bodega_id=bodega_id)
+        for fila in StockActual.objects.filter(condicion).values(
+            'producto_id', 'bodega_id', 'cantidad_disponible', 'cantidad_reservada', 'cantidad_transito',
+        ):
+            datos.append({
+                'producto_id': fila['producto_id'],
+                'bodega_id': fila['bodega_id'],
+                'cantidad_disponible': float(fila['cantidad_disponible']),
+                'cantidad_reservada': float(fila['cantidad_reservada']),
+                'cantidad_transito': float(fila['cantidad_transito']),
+                'cantidad_libre': float(fila['cantidad_disponible'] - fila['cantidad_reservada']),
+            })
+    return datos
+
+
+def publicar_pendientes(pendientes):
+    """Inserta los eventos de la transacción confirmada y avisa a los streams del proceso"""
+    claves = pendientes['stock']
+    alertas = list(pendientes['alertas'].values())
+    if not claves and not alertas:
+        return
+
+    ahora = timezone.now()
+    eventos = [
+        EventoStock(tipo='STOCK', producto_id=fila['producto_id'], bodega_id=fila['bodega_id'],
+                    datos=fila, created_at=ahora)
+        for fila in _datos_stock(claves)
+    ]
+    eventos.extend(
+        EventoStock(tipo='ALERTA', producto_id=fila['producto_id'], bodega_id=fila['bodega_id'],
+                    datos=fila, created_at=ahora)
+        for fila in alertas
+    )
+    EventoStock.objects.bulk_create(eventos, batch_size=TAMANO_LOTE)
+    hub.notificar()
+
+
+def ultimo_evento_id():
+    return EventoStock.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+
+
+def stream_eventos(desde_id, producto_ids=None, bodega_ids=None):
+    """
+    Generador de mensajes SSE con los eventos posteriores a desde_id,
+    filtrados por productos y bodegas. Termina tras
+    INVENTARIO_EVENTOS_DURACION segundos; EventSource se reconecta solo
+    enviando Last-Event-ID, así ningún worker queda tomado indefinidamente.
+    """
+    intervalo = getattr(settings, 'INVENTARIO_EVENTOS_INTERVALO', 2)
+    fin = time.monotonic() + getattr(settings, 'INVENTARIO_EVENTOS_DURACION', 300)
+    proximo_ping = time.monotonic() + 15
+    ultimo = desde_id
+
+    yield f'retry: {intervalo * 1000}\n\n'
+    while time.monotonic() < fin:
+        version = hub.version
+        filas = list(
+            EventoStock.objects.filter(id__gt=ultimo).order_by('id').values_list(
+                'id', 'tipo', 'producto_id', 'bodega_id', 'datos'
+            )[:TAMANO_LOTE]
+        )
+        for evento_id, tipo, producto_id, bodega_id, datos in filas:
+            ultimo = evento_id
+            if producto_ids and producto_id not in producto_ids:
+                continue
+            if bodega_ids and bodega_id not in bodega_ids:
+                continue
+            yield f'id: {evento_id}\nevent: {tipo.lower()}\ndata: {json.dumps(datos)}\n\n'
+            proximo_ping = time.monotonic() + 15
+        if len(filas) == TAMANO_LOTE:
+            continue
+        if time.monotonic() >= proximo_ping:
+            # Comentario SSE: mantiene viva la conexión a través de proxies
+            yield ': ping\n\n'
+            proximo_ping = time.monotonic() + 15
+        hub.esperar(version, intervalo)
+
+
+def purgar_eventos(horas=None):
+    """Borra los eventos más antiguos que la retención. Returns: int borrados"""
+    horas = horas if horas is not None else getattr(settings, 'INVENTARIO_EVENTOS_RETENCION_HORAS', 24)
+    limite = timezone.now() - timedelta(hours=horas)
+    borrados, _ = EventoStock.objects.filter(created_at__lt=limite).delete()
+    return borrados
@@ -0,0 +1,154 @@
+"""
+Kardex de producto: libro de movimientos con saldo corrido por bodega
+
+Las filas se generan a medida que se leen los movimientos (en lotes keyset de
+paginacion.iterar_por_lotes), por lo que el consumo de memoria no depende de la
+cantidad de movimientos del producto y la exportación puede enviarse con
+StreamingHttpResponse o escribirse a un archivo línea a línea.
+
+Los saldos parten del saldo archivado (SaldoArchivado: cantidad, valor y costo
+de los movimientos ya archivados y borrados de la tabla). Con `desde`, el saldo
+inicial de cada bodega sale de stock_en_fecha() (snapshots + movimientos
+posteriores) y el costo promedio corrido se obtiene recorriendo también los
+movimientos anteriores al rango, sin emitirlos.
+
+Se pliegan los movimientos de todas las bodegas del producto aunque se pida
+una sola: una transferencia entra al costo promedio de la bodega origen, que
+depende también de los movimientos de la origen que no tocan la pedida.
+"""
+import csv
+import json
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .archivo import saldos_archivados
+from .costos import valorizar
+from .models import MovimientoInventario
+from .paginacion import iterar_por_lotes
+from .snapshots import fin_del_dia, stock_en_fecha
+from .stock import CERO, deltas_movimiento
+
+
+TAMANO_LOTE = 2000
+
+COLUMNAS_KARDEX = [
+    'fecha', 'movimiento_id', 'tipo_movimiento', 'documento_referencia',
+    'bodega_id', 'bodega_codigo', 'entrada', 'salida', 'saldo',
+    'costo_unitario', 'costo_promedio', 'valor_saldo',
+]
+
+FORMATOS_KARDEX = ('csv', 'ndjson')
+
+
+def _movimientos(producto_id):
+    return MovimientoInventario.objects.filter(
+        producto_id=producto_id,
+        estado='CONFIRMADO',
+    ).only(
+        'id', 'fecha_movimiento', 'tipo_movimiento', 'producto_id', 'bodega_origen_id',
+        'bodega_destino_id', 'cantidad', 'costo_unitario', 'documento_referencia',
+    )
+
+
+def filas_kardex(producto_id, bodega_id=None, desde=None, hasta=None, tamano_lote=TAMANO_LOTE):
+    """
+    Genera las filas del kardex de un producto en orden (fecha_movimiento, id).
+
+    Un movimiento produce una fila por bodega afectada (las transferencias
+    producen dos: salida en origen y entrada en destino).
+
+    Args:
+        producto_id: producto a consultar
+        bodega_id: limitar a una bodega (None = todas)
+        desde / hasta: date límite (inclusive) sobre fecha_movimiento
+
+    Yields:
+        dict: fila con las claves de COLUMNAS_KARDEX
+    """
+    from .models import Bodega
+
+    codigos = dict(Bodega.objects.values_list('id', 'codigo'))
+
+    # Saldo de apertura: movimientos archivados y borrados de la tabla
+    saldos = {
+        clave_bodega: (fila.cantidad, fila.valor_total, fila.costo_promedio)
+        for (_, clave_bodega), fila in saldos_archivados([producto_id]).items()
+    }
+
+    if desde is not None:
+        # Costo promedio al inicio del rango: se recorren los anteriores sin emitirlos
+        anteriores = _movimientos(producto_id).filter(fecha_movimiento__lt=fin_del_dia(desde - timedelta(days=1)))
+        for lote in iterar_por_lotes(anteriores, tamano_lote):
+            for movimiento in lote:
+                for _, clave_bodega, delta, costo in deltas_movimiento(movimiento):
+                    saldos[clave_bodega] = _valorizar(saldos, clave_bodega, delta, costo)
+
+        # Cantidades iniciales según snapshots (o saldo archivado si no hay foto)
+        iniciales, _ = stock_en_fecha(desde - timedelta(days=1), [producto_id])
+        for (_, clave_bodega), cantidad in iniciales.items():
+            _, _, promedio = saldos.get(clave_bodega, (CERO, CERO, CERO))
+            saldos[clave_bodega] = (cantidad, (cantidad * promedio) if cantidad > 0 else CERO, promedio)
+
+    movimientos = _movimientos(producto_id)
+    if desde is not None:
+        movimientos = movimientos.filter(fecha_movimiento__gte=fin_del_dia(desde - timedelta(days=1)))
+    if hasta is not None:
+        movimientos = movimientos.filter(fecha_movimiento__lt=fin_del_dia(hasta))
+
+    for lote in iterar_por_lotes(movimientos, tamano_lote):
+        for movimiento in lote:
+            for _, clave_bodega, delta, costo in deltas_movimiento(movimiento):
+                if isinstance(costo, tuple):
+                    costo = saldos.get(costo[1], (CERO, CERO, CERO))[2]
+                saldos[clave_bodega] = _valorizar(saldos, clave_bodega, delta, costo)
+                if bodega_id is not None and clave_bodega != bodega_id:
+                    continue
+                cantidad, valor, promedio = saldos[clave_bodega]
+                yield {
+                    'fecha': timezone.localtime(movimiento.fecha_movimiento),
+                    'movimiento_id': movimiento.id,
+                    'tipo_movimiento': movimiento.tipo_movimiento,
+                    'documento_referencia': movimiento.documento_referencia or '',
+                    'bodega_id': clave_bodega,
+                    'bodega_codigo': codigos.get(clave_bodega, ''),
+                    'entrada': delta if delta > 0 else CERO,
+                    'salida': -delta if delta < 0 else CERO,
+                    'saldo': cantidad,
+                    'costo_unitario': costo if costo is not None else promedio,
+                    'costo_promedio': promedio,
+                    'valor_saldo': valor,
+                }
+
+
+def _valorizar(saldos, bodega_id, delta, costo):
+    if isinstance(costo, tuple):
+        costo = saldos.get(costo[1], (CERO, CERO, CERO))[2]
+    return valorizar(*saldos.get(bodega_id, (CERO, CERO, CERO)), delta, costo)
+
+
+class _Eco:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+def lineas_kardex(filas, formato='csv'):
+    """
+    Serializa las filas del kardex como líneas de texto CSV (con encabezado)
+    o NDJSON, sin acumularlas en memoria.
+    """
+    if formato == 'ndjson':
+        for fila in filas:
+            yield json.dumps(fila, cls=DjangoJSONEncoder) + '\n'
+        return
+
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(COLUMNAS_KARDEX)
+    for fila in filas:
+        yield escritor.writerow([
+            fila[columna].isoformat() if columna == 'fecha' else fila[columna]
+            for columna in COLUMNAS_KARDEX
+        ])
@@ -0,0 +1,143 @@
+"""
+Asignación de lotes FEFO (first expired, first out) para salidas
+
+Para productos con control_por_lote una salida se reparte entre los lotes
+activos de la bodega empezando por el que vence primero. Los lotes candidatos
+se leen ya bloqueados (select_for_update, en orden FEFO) y se reparte sobre
+esas filas: una lectura con bloqueo ve lo último confirmado, así una salida
+concurrente del mismo producto espera y después ve lo que consumió la otra,
+también con REPEATABLE READ. Se descuentan con un único bulk_update. La lectura
+de candidatos usa el índice (producto, bodega, estado, fecha_vencimiento) de Lote.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Lote
+from .stock import CERO, _decimal
+
+
+class LotesInsuficientesError(Exception):
+    """
+    Se lanza cuando los lotes activos no vencidos no cubren la cantidad pedida
+    """
+
+    def __init__(self, producto_id, bodega_id, disponible, solicitado):
+        self.producto_id = producto_id
+        self.bodega_id = bodega_id
+        self.disponible = disponible
+        self.solicitado = solicitado
+        super().__init__(
+            f'Lotes insuficientes para el producto {producto_id} en la bodega {bodega_id}. '
+            f'Disponible en lotes: {disponible}, solicitado: {solicitado}'
+        )
+
+
+def _candidatos(producto_id, bodega_id, hoy):
+    """
+    Lotes consumibles bloqueados, en orden FEFO: [(Lote, libre)]. Los lotes
+    sin fecha de vencimiento van al final.
+    """
+    lotes = Lote.objects.select_for_update().filter(
+        producto_id=producto_id,
+        bodega_id=bodega_id,
+        estado='ACTIVO',
+        cantidad_disponible__gt=0,
+    ).exclude(
+        fecha_vencimiento__lt=hoy,
+    ).order_by(
+        F('fecha_vencimiento').asc(nulls_last=True), 'id'
+    )
+    return [
+        (lote, lote.cantidad_disponible - lote.cantidad_reservada)
+        for lote in lotes
+        if lote.cantidad_disponible > lote.cantidad_reservada
+    ]
+
+
+def _repartir(candidatos, cantidad):
+    """Toma lotes en orden hasta cubrir la cantidad: [(Lote, cantidad)]"""
+    asignaciones = []
+    pendiente = cantidad
+    for lote, libre in candidatos:
+        if pendiente <= 0:
+            break
+        tomado = min(libre, pendiente)
+        asignaciones.append((lote, tomado))
+        pendiente -= tomado
+    return asignaciones, pendiente
+
+
+def asignar_lotes_fefo(producto_id, bodega_id, cantidad, hoy=None):
+    """
+    Descuenta `cantidad` de los lotes del producto en la bodega en orden FEFO.
+
+    Debe llamarse dentro de la transacción que registra la salida, para que el
+    descuento de lotes se revierta junto con ella.
+
+    Returns:
+        list: [(Lote, cantidad asignada)] en orden de consumo
+
+    Raises:
+        LotesInsuficientesError si los lotes no alcanzan
+    """
+    cantidad = _decimal(cantidad)
+    hoy = hoy or timezone.localdate()
+    ahora = timezone.now()
+
+    with transaction.atomic():
+        candidatos = _candidatos(producto_id, bodega_id, hoy)
+        asignaciones, pendiente = _repartir(candidatos, cantidad)
+        if pendiente > 0:
+            raise LotesInsuficientesError(
+                producto_id, bodega_id, sum((libre for _, libre in candidatos), CERO), cantidad
+            )
+
+        resultado = []
+        for lote, tomado in asignaciones:
+            lote.cantidad_disponible -= tomado
+            if lote.cantidad_disponible <= 0:
+                lote.estado = 'AGOTADO'
+            lote.updated_at = ahora
+            resultado.append((lote, tomado))
+
+        Lote.objects.bulk_update(
+            [lote for lote, _ in resultado],
+            ['cantidad_disponible', 'estado', 'updated_at'],
+        )
+
+    return resultado
+
+
+def registrar_salida_fefo(producto, bodega_id, cantidad, usuario, **campos):
+    """
+    Registra una salida confirmada repartida entre lotes FEFO: un movimiento
+    SALIDA por lote consumido, aplicados al stock en una sola pasada del motor.
+
+    Args:
+        producto: Producto con control_por_lote
+        bodega_id: bodega de origen
+        cantidad: cantidad total a retirar
+        usuario: usuario que registra y confirma
+        **campos: documento_referencia, observaciones, costo_unitario, ...
+
+    Returns:
+        list: movimientos creados
+    """
+    from .stock import registrar_movimientos_masivos
+
+    with transaction.atomic():
+        asignaciones = asignar_lotes_fefo(producto.id, bodega_id, cantidad)
+        lineas = [
+            dict(
+                campos,
+                tipo_movimiento='SALIDA',
+                producto_id=producto.id,
+                bodega_origen_id=bodega_id,
+                cantidad=tomado,
+                lote_id=lote.id,
+            )
+            for lote, tomado in asignaciones
+        ]
+        movimientos, _ = registrar_movimientos_masivos(lineas, usuario)
+    return movimientos
@@ -0,0 +1,34 @@
+"""
+Crea los registros de StockActual encolados por el aprovisionamiento diferido
+
+Los productos o bodegas nuevos que superan INVENTARIO_APROVISIONAMIENTO_UMBRAL
+pares quedan en AprovisionamientoPendiente. Pensado para ejecutarse cada
+minuto desde cron:
+    python manage.py aprovisionar_stock
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventario.sincronizacion import TAMANO_LOTE, procesar_cola_aprovisionamiento
+
+
+class Command(BaseCommand):
+    help = 'Crea los registros de stock pendientes de productos y bodegas nuevos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Marcas y registros procesados por lote (default: {TAMANO_LOTE})',
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        resultado = procesar_cola_aprovisionamiento(tamano_lote=options['tamano_lote'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resultado['creados']} registros de stock creados para {resultado['marcas']} "
+            f"productos/bodegas pendientes en {time.perf_counter() - inicio:.2f}s"
+        ))
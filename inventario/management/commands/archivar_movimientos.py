@@ -0,0 +1,127 @@
+"""
+Archiva movimientos confirmados antiguos en particiones comprimidas
+
+Los movimientos confirmados anteriores a la fecha de corte se copian a
+INVENTARIO_ARCHIVO_DIR (un archivo .csv.gz por mes con su manifiesto) y se
+borran de la base de datos en lotes pequeños después de verificar cada archivo.
+El stock actual no cambia: el efecto de los movimientos borrados queda en
+SaldoArchivado como saldo de apertura del libro.
+
+Con --reconstruir-saldos no se archiva nada: se recalcula SaldoArchivado desde
+los archivos en disco (archivos generados antes de existir el saldo archivado).
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventario.archivo import archivar_queryset, directorio_archivo, reconstruir_saldos_archivados
+from inventario.models import MovimientoInventario
+from inventario.snapshots import fin_del_dia, ultima_fecha_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Archiva en disco los movimientos confirmados anteriores a una fecha y los quita de la tabla'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--antes-de',
+            type=str,
+            help='Archivar movimientos con fecha anterior a YYYY-MM-DD',
+        )
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=365,
+            help='Si no se indica --antes-de, archivar movimientos de más de N días (default: 365)',
+        )
+        parser.add_argument(
+            '--producto-id',
+            type=int,
+            help='Archivar solo los movimientos de este producto',
+        )
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=2000,
+            help='Filas leídas por consulta (default: 2000)',
+        )
+        parser.add_argument(
+            '--tamano-borrado',
+            type=int,
+            default=500,
+            help='Filas borradas por transacción (default: 500)',
+        )
+        parser.add_argument(
+            '--sin-eliminar',
+            action='store_true',
+            help='Solo copiar a disco, sin borrar de la base de datos',
+        )
+        parser.add_argument(
+            '--reconstruir-saldos',
+            action='store_true',
+            help='Recalcular el saldo archivado desde los archivos en disco (no archiva)',
+        )
+
+    def handle(self, *args, **options):
+        if options['reconstruir_saldos']:
+            inicio = time.perf_counter()
+            resultado = reconstruir_saldos_archivados(tamano_lote=options['tamano_lote'])
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Saldo archivado recalculado: {resultado['movimientos']} movimientos, "
+                f"{resultado['saldos']} pares producto/bodega ({time.perf_counter() - inicio:.2f}s)"
+            ))
+            return
+
+        if options['antes_de']:
+            try:
+                corte = datetime.strptime(options['antes_de'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Fecha inválida. Use el formato YYYY-MM-DD')
+        else:
+            corte = timezone.localdate() - timedelta(days=options['dias'])
+
+        movimientos = MovimientoInventario.objects.filter(
+            estado='CONFIRMADO',
+            fecha_movimiento__lt=fin_del_dia(corte - timedelta(days=1)),
+        )
+        if options['producto_id']:
+            movimientos = movimientos.filter(producto_id=options['producto_id'])
+
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(self.style.SUCCESS('ARCHIVO DE MOVIMIENTOS'))
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(f'📅 Corte: movimientos anteriores al {corte}')
+        self.stdout.write(f'📁 Destino: {directorio_archivo()}')
+
+        # Las consultas de stock a una fecha necesitan una foto posterior al corte
+        snapshot = ultima_fecha_snapshot(timezone.localdate())
+        if snapshot is None or snapshot < corte - timedelta(days=1):
+            self.stdout.write(self.style.WARNING(
+                '⚠️  No hay un snapshot de stock posterior al corte; ejecute generar_snapshot_stock '
+                'antes de eliminar para que /api/inventario/stock/historico/ siga siendo exacto'
+            ))
+        self.stdout.write('')
+
+        def progreso(manifiesto):
+            self.stdout.write(
+                f"📦 {manifiesto['particion']}: {manifiesto['filas']} movimientos -> {manifiesto['archivo']}"
+            )
+
+        inicio = time.perf_counter()
+        manifiestos = archivar_queryset(
+            movimientos,
+            tamano_lote=options['tamano_lote'],
+            tamano_borrado=options['tamano_borrado'],
+            eliminar=not options['sin_eliminar'],
+            progreso=progreso,
+        )
+
+        total = sum(m['filas'] for m in manifiestos)
+        accion = 'copiados' if options['sin_eliminar'] else 'archivados y eliminados'
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {total} movimientos {accion} en {len(manifiestos)} archivos '
+            f'({time.perf_counter() - inicio:.2f}s)'
+        ))
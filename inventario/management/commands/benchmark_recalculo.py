@@ -0,0 +1,107 @@
+"""
+Benchmark de consultas del recálculo de Producto.stock_actual
+
+Ejecuta dentro de una transacción (que luego se revierte) una recepción de
+varias líneas y una transferencia, primero con el recálculo inmediato y luego
+con INVENTARIO_RECALCULO_DIFERIDO, y compara la cantidad de consultas SQL.
+"""
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from autenticacion.models import Usuario
+from inventario.models import Bodega, MovimientoInventario
+from inventario.recalculo import procesar_pendientes
+from maestros.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Compara las consultas SQL del recálculo de stock inmediato vs diferido al commit'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lineas',
+            type=int,
+            default=10,
+            help='Líneas de la recepción simulada (default: 10)',
+        )
+        parser.add_argument(
+            '--productos',
+            type=int,
+            default=3,
+            help='Productos distintos entre las líneas (default: 3)',
+        )
+
+    def handle(self, *args, **options):
+        productos = list(Producto.objects.filter(estado='ACTIVO').order_by('id')[:options['productos']])
+        bodegas = list(Bodega.objects.filter(activo=True).order_by('id')[:2])
+        usuario = Usuario.objects.filter(is_superuser=True).first() or Usuario.objects.first()
+
+        if not productos or len(bodegas) < 2 or not usuario:
+            self.stdout.write(self.style.ERROR('❌ Se requieren productos activos, dos bodegas y un usuario'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(self.style.SUCCESS('BENCHMARK DE RECÁLCULO DE STOCK'))
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(f"📦 Recepción de {options['lineas']} líneas sobre {len(productos)} productos + 1 transferencia")
+        self.stdout.write('')
+
+        inmediato = self._medir(False, productos, bodegas, usuario, options['lineas'])
+        diferido = self._medir(True, productos, bodegas, usuario, options['lineas'])
+
+        self.stdout.write(f'🐢 Recálculo inmediato: {inmediato} consultas')
+        self.stdout.write(f'⚡ Recálculo diferido:  {diferido} consultas')
+        if inmediato:
+            reduccion = (1 - diferido / inmediato) * 100
+            self.stdout.write(self.style.SUCCESS(f'✅ Reducción: {reduccion:.1f}%'))
+
+    def _medir(self, diferido, productos, bodegas, usuario, lineas):
+        """Cuenta las consultas del escenario y revierte todos los cambios"""
+        with override_settings(INVENTARIO_RECALCULO_DIFERIDO=diferido):
+            with CaptureQueriesContext(connection) as contexto:
+                with transaction.atomic():
+                    self._escenario(productos, bodegas, usuario, lineas)
+                    # La transacción se revierte, así que se fuerza el paso del commit
+                    procesar_pendientes()
+                    transaction.set_rollback(True)
+        return len(contexto.captured_queries)
+
+    def _escenario(self, productos, bodegas, usuario, lineas):
+        ahora = timezone.now()
+        origen, destino = bodegas
+
+        for i in range(lineas):
+            producto = productos[i % len(productos)]
+            MovimientoInventario.objects.create(
+                tipo_movimiento='INGRESO',
+                fecha_movimiento=ahora,
+                producto=producto,
+                bodega_destino=origen,
+                cantidad=Decimal('10'),
+                unidad_medida_id=producto.uom_stock_id,
+                documento_referencia='BENCHMARK',
+                usuario=usuario,
+                estado='CONFIRMADO',
+                fecha_confirmacion=ahora,
+                usuario_confirmacion=usuario,
+            )
+
+        producto = productos[0]
+        MovimientoInventario.objects.create(
+            tipo_movimiento='TRANSFERENCIA',
+            fecha_movimiento=ahora,
+            producto=producto,
+            bodega_origen=origen,
+            bodega_destino=destino,
+            cantidad=Decimal('5'),
+            unidad_medida_id=producto.uom_stock_id,
+            documento_referencia='BENCHMARK',
+            usuario=usuario,
+            estado='CONFIRMADO',
+            fecha_confirmacion=ahora,
+            usuario_confirmacion=usuario,
+        )
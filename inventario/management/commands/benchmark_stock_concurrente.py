@@ -0,0 +1,161 @@
+"""
+Benchmark de contención sobre StockActual
+
+Lanza varios hilos que aplican ingresos y salidas sobre el mismo
+(producto, bodega) a través del motor inventario.stock y verifica al final
+que no se perdió ninguna actualización. Con --comparar-legado ejecuta la misma
+carga con el esquema anterior (leer, sumar y save() sin bloqueo) para mostrar
+las actualizaciones perdidas.
+
+Pensado para MySQL/InnoDB: con SQLite los hilos se serializan a nivel de
+archivo y aparecerán errores "database is locked".
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from inventario.models import Bodega, StockActual
+from inventario.stock import aplicar_deltas
+from maestros.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Mide el throughput y verifica que no haya actualizaciones perdidas de stock bajo concurrencia'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=8,
+            help='Cantidad de hilos concurrentes (default: 8)',
+        )
+        parser.add_argument(
+            '--operaciones',
+            type=int,
+            default=200,
+            help='Operaciones por hilo (default: 200)',
+        )
+        parser.add_argument(
+            '--producto-id',
+            type=int,
+            help='Producto a usar (default: primer producto activo)',
+        )
+        parser.add_argument(
+            '--bodega-id',
+            type=int,
+            help='Bodega a usar (default: primera bodega activa)',
+        )
+        parser.add_argument(
+            '--comparar-legado',
+            action='store_true',
+            help='Ejecutar también la carga con lectura-modificación-escritura sin bloqueo',
+        )
+
+    def handle(self, *args, **options):
+        producto = (
+            Producto.objects.filter(id=options['producto_id']).first()
+            if options['producto_id'] else
+            Producto.objects.filter(estado='ACTIVO').order_by('id').first()
+        )
+        bodega = (
+            Bodega.objects.filter(id=options['bodega_id']).first()
+            if options['bodega_id'] else
+            Bodega.objects.filter(activo=True).order_by('id').first()
+        )
+
+        if not producto or not bodega:
+            self.stdout.write(self.style.ERROR('❌ Se requiere al menos un producto y una bodega'))
+            return
+
+        StockActual.objects.get_or_create(producto=producto, bodega=bodega)
+
+        hilos = options['hilos']
+        operaciones = options['operaciones']
+
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(self.style.SUCCESS('BENCHMARK DE CONCURRENCIA DE STOCK'))
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(f'📦 Producto: {producto.sku} - {producto.nombre}')
+        self.stdout.write(f'🏪 Bodega: {bodega.nombre}')
+        self.stdout.write(f'🧵 Hilos: {hilos} x {operaciones} operaciones')
+        self.stdout.write('')
+
+        self._ejecutar('Motor con bloqueo', self._operacion_motor, producto, bodega, hilos, operaciones)
+
+        if options['comparar_legado']:
+            self.stdout.write('')
+            self._ejecutar('Legado sin bloqueo', self._operacion_legado, producto, bodega, hilos, operaciones)
+
+    def _ejecutar(self, nombre, operacion, producto, bodega, hilos, operaciones):
+        """Ejecuta la carga con la operación indicada y reporta resultados"""
+        inicial = self._leer_stock(producto, bodega)
+        aplicado = []
+        errores = []
+        candado = threading.Lock()
+
+        def trabajador():
+            suma = Decimal('0')
+            fallidas = 0
+            try:
+                for i in range(operaciones):
+                    # Patrón ingreso/salida: +2, -1 mantiene el saldo siempre positivo
+                    delta = Decimal('2') if i % 2 == 0 else Decimal('-1')
+                    try:
+                        operacion(producto, bodega, delta)
+                        suma += delta
+                    except Exception:
+                        # Stock insuficiente, deadlock o timeout de bloqueo
+                        fallidas += 1
+            finally:
+                connection.close()
+                with candado:
+                    aplicado.append(suma)
+                    errores.append(fallidas)
+
+        threads = [threading.Thread(target=trabajador) for _ in range(hilos)]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracion = time.perf_counter() - inicio
+
+        final = self._leer_stock(producto, bodega)
+        esperado = inicial + sum(aplicado)
+        perdidas = esperado - final
+        total_operaciones = hilos * operaciones
+        exitosas = total_operaciones - sum(errores)
+
+        self.stdout.write(self.style.SUCCESS(f'--- {nombre} ---'))
+        self.stdout.write(f'⏱️  Duración: {duracion:.2f}s')
+        self.stdout.write(f'⚡ Throughput: {exitosas / duracion:.1f} operaciones/s')
+        self.stdout.write(f'✅ Operaciones aplicadas: {exitosas}')
+        self.stdout.write(f'⚠️  Operaciones fallidas: {sum(errores)}')
+        self.stdout.write(f'📊 Stock inicial: {inicial} | esperado: {esperado} | final: {final}')
+
+        if perdidas == 0:
+            self.stdout.write(self.style.SUCCESS('✅ Sin actualizaciones perdidas'))
+        else:
+            self.stdout.write(self.style.ERROR(f'❌ Unidades perdidas por concurrencia: {perdidas}'))
+
+        # Devolver el stock a su valor inicial
+        with transaction.atomic():
+            stock = StockActual.objects.select_for_update().get(producto=producto, bodega=bodega)
+            stock.cantidad_disponible = inicial
+            stock.save()
+
+    def _leer_stock(self, producto, bodega):
+        return StockActual.objects.get(producto=producto, bodega=bodega).cantidad_disponible
+
+    def _operacion_motor(self, producto, bodega, delta):
+        aplicar_deltas([(producto.id, bodega.id, delta)])
+
+    def _operacion_legado(self, producto, bodega, delta):
+        stock = StockActual.objects.get(producto=producto, bodega=bodega)
+        stock.cantidad_disponible += delta
+        if stock.cantidad_disponible < 0:
+            stock.cantidad_disponible = 0
+        stock.save()
@@ -0,0 +1,89 @@
+"""
+Concilia StockActual contra el libro de movimientos confirmados
+
+Calcula el saldo esperado de cada producto por bodega con consultas agrupadas,
+repartiendo las bodegas entre procesos, y escribe un reporte CSV con las
+diferencias. Con --corregir ajusta las filas desviadas. Pensado para cron nocturno:
+    python manage.py conciliar_stock --procesos 4 --corregir
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.conciliacion import conciliar, escribir_reporte
+from inventario.models import Bodega
+
+
+class Command(BaseCommand):
+    help = 'Compara StockActual con el libro de movimientos por bodega y reporta (o corrige) las diferencias'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bodega-id',
+            type=int,
+            action='append',
+            dest='bodega_ids',
+            help='Conciliar solo esta bodega (repetible; default: todas)',
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Procesos que leen el libro en paralelo, una bodega cada uno (default: CPUs disponibles)',
+        )
+        parser.add_argument(
+            '--corregir',
+            action='store_true',
+            help='Ajustar cantidad_disponible de las filas con diferencia al saldo del libro',
+        )
+        parser.add_argument(
+            '--reporte',
+            help='Ruta del CSV de diferencias (default: INVENTARIO_CONCILIACION_DIR)',
+        )
+
+    def handle(self, *args, **options):
+        corregir = options['corregir']
+        bodegas = Bodega.objects.all()
+        if options['bodega_ids']:
+            bodegas = bodegas.filter(id__in=options['bodega_ids'])
+        bodegas = dict(bodegas.values_list('id', 'codigo'))
+        if not bodegas:
+            raise CommandError('No hay bodegas para conciliar')
+
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(self.style.SUCCESS('CONCILIACIÓN DE STOCK CONTRA EL LIBRO' + (' (CORRECCIÓN)' if corregir else '')))
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(f"🏪 Bodegas: {len(bodegas)} | Procesos: {min(options['procesos'], len(bodegas))}")
+        self.stdout.write('')
+
+        def al_terminar(resultado):
+            diferencias = len(resultado['diferencias'])
+            icono = '⚠️ ' if diferencias else '✓'
+            self.stdout.write(
+                f"{icono} {bodegas.get(resultado['bodega_id'], resultado['bodega_id'])}: "
+                f"{resultado['registros']} registros, {diferencias} diferencias "
+                f"({resultado['duracion']:.2f}s)"
+            )
+
+        inicio = time.perf_counter()
+        resultados = conciliar(
+            list(bodegas), corregir=corregir, procesos=options['procesos'], al_terminar=al_terminar
+        )
+        duracion = time.perf_counter() - inicio
+
+        diferencias = sum(len(r['diferencias']) for r in resultados)
+        corregidas = sum(1 for r in resultados for d in r['diferencias'] if d[3])
+        ruta = escribir_reporte(resultados, options['reporte'])
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(self.style.SUCCESS('RESUMEN'))
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(f"📊 Registros revisados: {sum(r['registros'] for r in resultados)}")
+        self.stdout.write(f"⚠️  Diferencias: {diferencias}")
+        if corregir:
+            self.stdout.write(f"🔧 Filas corregidas: {corregidas}")
+        self.stdout.write(f"📄 Reporte: {ruta}")
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f'✅ Conciliación completada en {duracion:.2f}s'))
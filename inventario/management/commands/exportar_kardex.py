@@ -0,0 +1,81 @@
+"""
+Exporta el kardex de un producto a CSV o NDJSON
+
+Las filas se escriben a medida que se leen los movimientos, por lo que sirve
+para productos con millones de movimientos:
+    python manage.py exportar_kardex SKU001 --salida kardex.csv
+    python manage.py exportar_kardex SKU001 --formato ndjson --desde 2025-01-01
+Sin --salida se escribe en la salida estándar.
+"""
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.kardex import FORMATOS_KARDEX, TAMANO_LOTE, filas_kardex, lineas_kardex
+from maestros.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Exporta el kardex (movimientos con saldo corrido por bodega) de un producto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('producto', type=str, help='SKU o id del producto')
+        parser.add_argument('--bodega-id', type=int, help='Limitar a una bodega')
+        parser.add_argument('--desde', type=str, help='Fecha inicial YYYY-MM-DD')
+        parser.add_argument('--hasta', type=str, help='Fecha final YYYY-MM-DD')
+        parser.add_argument(
+            '--formato',
+            choices=FORMATOS_KARDEX,
+            default='csv',
+            help='Formato de salida (default: csv)',
+        )
+        parser.add_argument('--salida', type=str, help='Archivo de destino (default: salida estándar)')
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Movimientos leídos por consulta (default: {TAMANO_LOTE})',
+        )
+
+    def handle(self, *args, **options):
+        producto = Producto.objects.filter(sku=options['producto']).first()
+        if producto is None and options['producto'].isdigit():
+            producto = Producto.objects.filter(pk=int(options['producto'])).first()
+        if producto is None:
+            raise CommandError(f'Producto no encontrado: {options["producto"]}')
+
+        filas = filas_kardex(
+            producto.id,
+            bodega_id=options['bodega_id'],
+            desde=self._fecha(options['desde']),
+            hasta=self._fecha(options['hasta']),
+            tamano_lote=options['tamano_lote'],
+        )
+
+        inicio = time.perf_counter()
+        if not options['salida']:
+            for linea in lineas_kardex(filas, options['formato']):
+                self.stdout.write(linea, ending='')
+            return
+
+        lineas = 0
+        with open(options['salida'], 'w', encoding='utf-8', newline='') as archivo:
+            for linea in lineas_kardex(filas, options['formato']):
+                archivo.write(linea)
+                lineas += 1
+
+        if options['formato'] == 'csv':
+            lineas -= 1
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Kardex de {producto.sku}: {lineas} filas en {options["salida"]} '
+            f'({time.perf_counter() - inicio:.2f}s)'
+        ))
+
+    def _fecha(self, valor):
+        if not valor:
+            return None
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Fecha inválida: {valor}. Use el formato YYYY-MM-DD')
@@ -1,9 +1,9 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction, models
 from django.utils import timezone
-from maestros.models import Producto
-from inventario.models import StockActual, AlertaStock, Lote
-from inventario.signals import generar_alertas_stock, generar_alertas_vencimiento
+from inventario.models import AlertaStock
+from inventario.alertas import generar_alertas_stock_masivo
+from inventario.signals import generar_alertas_vencimiento
 
 
 class Command(BaseCommand):
@@ -20,6 +20,11 @@ class Command(BaseCommand):
             action='store_true',
             help='Solo generar alertas de vencimientos (no stock)',
         )
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Revisar todos los lotes en vez de solo los que cruzaron un umbral desde el último escaneo',
+        )
         parser.add_argument(
             '--limpiar-resueltas',
             action='store_true',
@@ -47,38 +52,38 @@ class Command(BaseCommand):
             # Generar alertas de stock
             if not options['solo_vencimientos']:
                 self.stdout.write('Generando alertas de stock...')
-                productos = Producto.objects.filter(estado='ACTIVO')
-                
-                alertas_antes_stock = AlertaStock.objects.filter(
-                    tipo_alerta__in=['BAJO_STOCK', 'SIN_STOCK']
-                ).count()
+                resultado = generar_alertas_stock_masivo()
+                tiempos = resultado['tiempos']
                 
-                for producto in productos:
-                    generar_alertas_stock(producto)
-                
-                alertas_despues_stock = AlertaStock.objects.filter(
-                    tipo_alerta__in=['BAJO_STOCK', 'SIN_STOCK']
-                ).count()
-                
-                alertas_stock_nuevas = alertas_despues_stock - alertas_antes_stock
-                self.stdout.write(f'✓ Alertas de stock procesadas: {alertas_stock_nuevas} nuevas/actualizadas')
+                self.stdout.write(
+                    f'✓ Alertas de stock procesadas sobre {resultado["revisados"]} stocks: '
+                    f'{resultado["creadas"]} nuevas, {resultado["actualizadas"]} actualizadas, '
+                    f'{resultado["resueltas"]} resueltas'
+                )
+                self.stdout.write(
+                    f'  ⏱️  consulta {tiempos["consulta"]:.3f}s | '
+                    f'comparación {tiempos["comparacion"]:.3f}s | '
+                    f'escritura {tiempos["escritura"]:.3f}s'
+                )
             
             # Generar alertas de vencimiento
             if not options['solo_stock']:
                 self.stdout.write('Generando alertas de vencimiento...')
+                resultado = generar_alertas_vencimiento(incremental=not options['completo'])
+                tiempos = resultado['tiempos']
+                modo = 'incremental' if resultado['incremental'] else 'completo'
                 
-                alertas_antes_venc = AlertaStock.objects.filter(
-                    tipo_alerta__in=['POR_VENCER', 'VENCIDO']
-                ).count()
-                
-                generar_alertas_vencimiento()
-                
-                alertas_despues_venc = AlertaStock.objects.filter(
-                    tipo_alerta__in=['POR_VENCER', 'VENCIDO']
-                ).count()
-                
-                alertas_venc_nuevas = alertas_despues_venc - alertas_antes_venc
-                self.stdout.write(f'✓ Alertas de vencimiento procesadas: {alertas_venc_nuevas} nuevas/actualizadas')
+                self.stdout.write(
+                    f'✓ Alertas de vencimiento procesadas sobre {resultado["revisados"]} lotes ({modo}): '
+                    f'{resultado["creadas"]} nuevas, {resultado["actualizadas"]} actualizadas, '
+                    f'{resultado["resueltas"]} resueltas'
+                )
+                self.stdout.write(f'✓ Lotes marcados como vencidos: {resultado["lotes_vencidos"]}')
+                self.stdout.write(
+                    f'  ⏱️  consulta {tiempos["consulta"]:.3f}s | '
+                    f'comparación {tiempos["comparacion"]:.3f}s | '
+                    f'escritura {tiempos["escritura"]:.3f}s'
+                )
         
         # Mostrar resumen final
         total_alertas = AlertaStock.objects.filter(estado='ACTIVA').count()
@@ -0,0 +1,74 @@
+"""
+Genera los snapshots diarios de stock (StockSnapshot)
+
+Pensado para ejecutarse cada noche desde cron:
+    python manage.py generar_snapshot_stock
+Por defecto toma el cierre del día anterior. Con --desde se generan todos los
+días del rango, por ejemplo para la carga inicial.
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventario.snapshots import SnapshotPosteriorError, generar_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Genera la foto diaria de stock por producto y bodega (solo pares que cambiaron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fecha',
+            type=str,
+            help='Fecha de cierre YYYY-MM-DD (default: ayer)',
+        )
+        parser.add_argument(
+            '--desde',
+            type=str,
+            help='Generar todos los días desde esta fecha YYYY-MM-DD hasta --fecha',
+        )
+        parser.add_argument(
+            '--reconstruir',
+            action='store_true',
+            help='Borrar y regenerar los snapshots existentes desde la primera fecha',
+        )
+
+    def handle(self, *args, **options):
+        hasta = self._fecha(options['fecha']) if options['fecha'] else timezone.localdate() - timedelta(days=1)
+        desde = self._fecha(options['desde']) if options['desde'] else hasta
+
+        if desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --fecha')
+
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(self.style.SUCCESS('SNAPSHOT DIARIO DE STOCK'))
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+
+        inicio_total = time.perf_counter()
+        total_filas = 0
+        fecha = desde
+        reconstruir = options['reconstruir']
+        while fecha <= hasta:
+            inicio = time.perf_counter()
+            try:
+                filas = generar_snapshot(fecha, reconstruir=reconstruir)
+            except SnapshotPosteriorError as e:
+                raise CommandError(str(e))
+            # Tras borrar desde la primera fecha, los días siguientes ya no tienen fotos
+            reconstruir = False
+            total_filas += filas
+            self.stdout.write(f'📸 {fecha}: {filas} pares con cambios ({time.perf_counter() - inicio:.2f}s)')
+            fecha += timedelta(days=1)
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {total_filas} filas generadas en {time.perf_counter() - inicio_total:.2f}s'
+        ))
+
+    def _fecha(self, valor):
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Fecha inválida: {valor}. Use el formato YYYY-MM-DD')
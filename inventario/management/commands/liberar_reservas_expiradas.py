@@ -0,0 +1,31 @@
+"""
+Libera las reservas de stock vencidas
+
+Pensado para ejecutarse cada pocos minutos desde cron:
+    python manage.py liberar_reservas_expiradas
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventario.reservas import TAMANO_LOTE, liberar_expiradas
+
+
+class Command(BaseCommand):
+    help = 'Marca como expiradas las reservas de stock vencidas y devuelve su cantidad al stock libre'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Reservas procesadas por transacción (default: {TAMANO_LOTE})',
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        expiradas = liberar_expiradas(tamano_lote=options['tamano_lote'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {expiradas} reservas expiradas liberadas en {time.perf_counter() - inicio:.2f}s'
+        ))
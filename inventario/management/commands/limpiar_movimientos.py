@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from inventario.models import MovimientoInventario, StockActual
+from inventario.archivo import archivar_queryset
+from inventario.models import MovimientoInventario, SaldoArchivado, StockActual
 from maestros.models import Producto
 
 
@@ -13,6 +14,11 @@ class Command(BaseCommand):
             type=int,
             help='ID del producto específico (opcional, si no se especifica limpia todos)',
         )
+        parser.add_argument(
+            '--sin-archivar',
+            action='store_true',
+            help='No copiar los movimientos al archivo histórico antes de eliminarlos',
+        )
         parser.add_argument(
             '--confirmar',
             action='store_true',
@@ -29,6 +35,21 @@ class Command(BaseCommand):
         
         producto_id = options.get('producto_id')
         
+        # Guardar el historial en disco antes de borrarlo (ver archivar_movimientos).
+        # Solo se copia: las filas las borra la transacción de abajo, junto con el stock
+        if not options['sin_archivar']:
+            movimientos = MovimientoInventario.objects.all()
+            if producto_id:
+                movimientos = movimientos.filter(producto_id=producto_id)
+            manifiestos = archivar_queryset(movimientos, eliminar=False)
+            if manifiestos:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'Copiados al archivo {sum(m["filas"] for m in manifiestos)} movimientos '
+                        f'en {len(manifiestos)} archivos'
+                    )
+                )
+        
         try:
             with transaction.atomic():
                 if producto_id:
@@ -43,7 +64,8 @@ class Command(BaseCommand):
                             self.style.SUCCESS(f'Eliminados {count} movimientos del producto: {producto.nombre}')
                         )
                         
-                        # También limpiar stock actual del producto
+                        # También limpiar stock actual y saldo archivado del producto
+                        SaldoArchivado.objects.filter(producto=producto).delete()
                         stock_records = StockActual.objects.filter(producto=producto)
                         stock_count = stock_records.count()
                         if stock_count > 0:
@@ -66,6 +88,7 @@ class Command(BaseCommand):
                             self.style.SUCCESS(f'Eliminados {movimientos_count} movimientos de inventario')
                         )
                     
+                    SaldoArchivado.objects.all().delete()
                     if stock_count > 0:
                         StockActual.objects.all().delete()
                         self.stdout.write(
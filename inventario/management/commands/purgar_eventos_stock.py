@@ -0,0 +1,26 @@
+"""
+Borra los eventos de stock antiguos del stream SSE
+
+Pensado para ejecutarse a diario desde cron:
+    python manage.py purgar_eventos_stock
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventario.eventos import purgar_eventos
+
+
+class Command(BaseCommand):
+    help = 'Borra de EventoStock los eventos más antiguos que la retención configurada'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horas',
+            type=int,
+            default=getattr(settings, 'INVENTARIO_EVENTOS_RETENCION_HORAS', 24),
+            help='Conservar los eventos de las últimas N horas (default: INVENTARIO_EVENTOS_RETENCION_HORAS)',
+        )
+
+    def handle(self, *args, **options):
+        borrados = purgar_eventos(options['horas'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {borrados} eventos de stock borrados'))
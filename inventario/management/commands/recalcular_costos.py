@@ -0,0 +1,44 @@
+"""
+Reconstruye el costo promedio ponderado y la valorización de StockActual
+
+Recorre una sola vez el libro de movimientos confirmados en orden cronológico.
+Se usa para la carga inicial de costo_promedio / valor_total y para corregir
+la valorización tras cambios manuales; en operación normal el motor de stock
+los mantiene al aplicar cada movimiento.
+    python manage.py recalcular_costos
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from inventario.costos import TAMANO_LOTE, reconstruir_costos
+from inventario.models import StockActual
+
+
+class Command(BaseCommand):
+    help = 'Recalcula costo_promedio y valor_total de StockActual desde el libro de movimientos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Movimientos leídos por consulta (default: {TAMANO_LOTE})',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(self.style.SUCCESS('RECÁLCULO DE COSTO PROMEDIO Y VALORIZACIÓN'))
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+
+        def progreso(procesados):
+            self.stdout.write(f'📖 {procesados} movimientos leídos...')
+
+        resultado = reconstruir_costos(tamano_lote=options['tamano_lote'], progreso=progreso)
+        valor = StockActual.objects.aggregate(total=Sum('valor_total'))['total'] or 0
+
+        self.stdout.write('')
+        self.stdout.write(f'📦 Registros de stock valorizados: {resultado["stocks"]}')
+        self.stdout.write(f'💰 Valor total del inventario: ${valor:,.2f}')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {resultado["movimientos"]} movimientos procesados en {resultado["duracion"]:.2f}s'
+        ))
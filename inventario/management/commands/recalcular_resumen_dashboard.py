@@ -0,0 +1,38 @@
+"""
+Recalcula desde las tablas el resumen precalculado de los dashboards
+
+Los contadores se mantienen al registrar movimientos y cambios; este comando
+los rehace por completo y corrige cualquier desviación. Pensado para cron:
+    python manage.py recalcular_resumen_dashboard
+"""
+from django.core.management.base import BaseCommand
+
+from inventario.resumen import DIAS_MOVIMIENTOS, obtener_resumen, recalcular_resumen
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el resumen precalculado de los dashboards (ResumenDashboard)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=DIAS_MOVIMIENTOS,
+            help=f'Días de contadores de movimientos a reconstruir (default: {DIAS_MOVIMIENTOS})',
+        )
+
+    def handle(self, *args, **options):
+        resultado = recalcular_resumen(dias=options['dias'])
+        resumen = obtener_resumen()
+
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(self.style.SUCCESS('RESUMEN DE DASHBOARDS'))
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(f"📦 Productos activos: {resumen['productos_activos']} de {resumen['productos_total']}")
+        self.stdout.write(f"⚠️  Stock bajo: {resumen['stock_bajo']} registros / {resumen['productos_bajo_stock']} productos")
+        self.stdout.write(f"🔔 Alertas activas: {resumen['alertas_activas']} ({resumen['alertas_criticas']} críticas)")
+        self.stdout.write(f"🔄 Movimientos del mes: {resumen['movimientos_mes']} (hoy: {resumen['movimientos_hoy']})")
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resultado['claves']} indicadores recalculados en {resultado['duracion']:.2f}s"
+        ))
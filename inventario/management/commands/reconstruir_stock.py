@@ -0,0 +1,101 @@
+"""
+Reconstruye StockActual por completo desde el libro de movimientos confirmados
+
+Para después de importaciones o si el stock quedó corrupto. Lee el libro una
+sola vez en lotes por id, pliega los saldos en memoria y los escribe con
+upserts por lotes en una transacción:
+    python manage.py reconstruir_stock --confirmar --memoria-max-mb 2048
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.reconstruccion import (
+    TAMANO_LOTE, ArchivoConcurrenteError, MemoriaExcedidaError, memoria_mb, reconstruir_stock,
+)
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye cantidad_disponible y fechas de StockActual desde el libro de movimientos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--confirmar',
+            action='store_true',
+            help='Confirma la reescritura de StockActual (requerido salvo con --dry-run)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo calcular e informar cuántas filas cambiarían',
+        )
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Movimientos leídos por consulta (default: {TAMANO_LOTE})',
+        )
+        parser.add_argument(
+            '--costos',
+            action='store_true',
+            help='Después reconstruir también costo_promedio y valor_total (recalcular_costos)',
+        )
+        parser.add_argument(
+            '--memoria-max-mb',
+            type=int,
+            help='Abortar sin escribir si el proceso supera esta memoria (MB)',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if not dry_run and not options['confirmar']:
+            self.stdout.write(self.style.WARNING(
+                'ADVERTENCIA: Esta operación reescribe el stock de TODAS las bodegas según el libro.\n'
+                'Para revisar el efecto, usa: python manage.py reconstruir_stock --dry-run\n'
+                'Para ejecutar, usa: python manage.py reconstruir_stock --confirmar'
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(self.style.SUCCESS('RECONSTRUCCIÓN DE STOCK DESDE EL LIBRO' + (' (DRY-RUN)' if dry_run else '')))
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+
+        def progreso(procesados, saldos):
+            memoria = memoria_mb()
+            detalle = f', {memoria:.0f} MB' if memoria is not None else ''
+            self.stdout.write(f'📖 {procesados} movimientos leídos, {saldos} saldos{detalle}')
+
+        try:
+            resultado = reconstruir_stock(
+                tamano_lote=options['tamano_lote'],
+                memoria_max_mb=options['memoria_max_mb'],
+                dry_run=dry_run,
+                progreso=progreso,
+            )
+        except MemoriaExcedidaError as e:
+            raise CommandError(f'{e}. No se modificó StockActual; reduzca --tamano-lote o aumente el límite.')
+        except ArchivoConcurrenteError as e:
+            raise CommandError(f'{e}. No se modificó StockActual.')
+
+        if options['costos'] and not dry_run:
+            from inventario.costos import reconstruir_costos
+            costos = reconstruir_costos(tamano_lote=options['tamano_lote'])
+            self.stdout.write(f"💰 Costos reconstruidos: {costos['stocks']} registros ({costos['duracion']:.2f}s)")
+
+        tiempos = resultado['tiempos']
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(self.style.SUCCESS('RESUMEN'))
+        self.stdout.write(self.style.SUCCESS('=' * 70))
+        self.stdout.write(f"📖 Movimientos plegados: {resultado['movimientos']} ({tiempos['lectura']:.2f}s)")
+        if resultado['posteriores']:
+            self.stdout.write(f"➕ Confirmados durante la lectura: {resultado['posteriores']}")
+        self.stdout.write(f"📦 Saldos en el libro: {resultado['saldos']}")
+        self.stdout.write(f"🔄 Filas {'a modificar' if dry_run else 'modificadas'}: {resultado['cambiados']}")
+        self.stdout.write(f"✓ Filas {'a crear' if dry_run else 'creadas'}: {resultado['creados']}")
+        self.stdout.write(f"0️⃣  Filas sin movimientos puestas en cero: {resultado['anulados']}")
+        if resultado['negativos']:
+            self.stdout.write(self.style.WARNING(f"⚠️  Saldos negativos según el libro: {resultado['negativos']}"))
+        self.stdout.write('')
+        if dry_run:
+            self.stdout.write(self.style.WARNING('⚠️  Dry-run: no se modificó la base de datos'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ Stock reconstruido ({tiempos['escritura']:.2f}s de escritura)"))
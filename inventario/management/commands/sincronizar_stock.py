@@ -3,8 +3,8 @@ Comando para sincronizar registros de stock
 Crea registros de StockActual para todos los productos en todas las bodegas
 """
 from django.core.management.base import BaseCommand
-from django.db import transaction
 from inventario.models import StockActual, Bodega
+from inventario.sincronizacion import TAMANO_LOTE, crear_stocks_faltantes, sincronizar_totales
 from maestros.models import Producto
 
 
@@ -13,66 +13,77 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument(
-            '--force',
+            '--totales',
             action='store_true',
-            help='Forzar recreación de todos los registros',
+            help='Además recalcular el stock_actual de los productos (UPDATE agrupado)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo informar cuántos registros faltan, sin modificar nada',
+        )
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Registros insertados por consulta (default: {TAMANO_LOTE})',
         )
 
     def handle(self, *args, **options):
-        force = options['force']
-        
+        dry_run = options['dry_run']
+
         self.stdout.write(self.style.SUCCESS('=' * 70))
-        self.stdout.write(self.style.SUCCESS('SINCRONIZACIÓN DE STOCK'))
+        self.stdout.write(self.style.SUCCESS('SINCRONIZACIÓN DE STOCK' + (' (DRY-RUN)' if dry_run else '')))
         self.stdout.write(self.style.SUCCESS('=' * 70))
         self.stdout.write('')
-        
+
         # Obtener productos y bodegas
-        productos = Producto.objects.all()
-        bodegas = Bodega.objects.filter(activo=True)
-        
-        self.stdout.write(f"📦 Productos encontrados: {productos.count()}")
-        self.stdout.write(f"🏪 Bodegas activas: {bodegas.count()}")
+        total_productos = Producto.objects.count()
+        total_bodegas = Bodega.objects.filter(activo=True).count()
+
+        self.stdout.write(f"📦 Productos encontrados: {total_productos}")
+        self.stdout.write(f"🏪 Bodegas activas: {total_bodegas}")
         self.stdout.write('')
-        
-        if not bodegas.exists():
+
+        if not total_bodegas:
             self.stdout.write(self.style.ERROR('❌ No hay bodegas activas en el sistema'))
             return
-        
-        if not productos.exists():
+
+        if not total_productos:
             self.stdout.write(self.style.ERROR('❌ No hay productos en el sistema'))
             return
-        
-        # Sincronizar
-        creados = 0
-        existentes = 0
-        
-        with transaction.atomic():
-            for producto in productos:
-                for bodega in bodegas:
-                    stock, created = StockActual.objects.get_or_create(
-                        producto=producto,
-                        bodega=bodega,
-                        defaults={
-                            'cantidad_disponible': 0,
-                            'cantidad_reservada': 0,
-                            'cantidad_transito': 0,
-                        }
-                    )
-                    
-                    if created:
-                        creados += 1
-                        self.stdout.write(
-                            f"  ✓ Creado: {producto.sku} - {producto.nombre[:30]} en {bodega.nombre}"
-                        )
-                    else:
-                        existentes += 1
-        
+
+        # Pares faltantes con un anti-join e inserción por lotes
+        resultado = crear_stocks_faltantes(
+            solo_activos=False,
+            dry_run=dry_run,
+            tamano_lote=options['tamano_lote'],
+        )
+        tiempos = resultado['tiempos']
+        self.stdout.write(
+            f"🔍 Registros faltantes: {resultado['faltantes']} ({tiempos['consulta']:.2f}s)"
+        )
+        if not dry_run:
+            self.stdout.write(
+                f"✓ Registros creados: {resultado['creados']} ({tiempos['escritura']:.2f}s)"
+            )
+
+        if options['totales']:
+            totales = sincronizar_totales(dry_run=dry_run)
+            accion = 'desincronizados' if dry_run else 'recalculados'
+            self.stdout.write(
+                f"🔄 Productos {accion}: {totales['productos']} ({totales['duracion']:.2f}s)"
+            )
+
         self.stdout.write('')
         self.stdout.write(self.style.SUCCESS('=' * 70))
         self.stdout.write(self.style.SUCCESS('RESUMEN'))
         self.stdout.write(self.style.SUCCESS('=' * 70))
-        self.stdout.write(f"✅ Registros creados: {creados}")
-        self.stdout.write(f"ℹ️  Registros existentes: {existentes}")
+        self.stdout.write(f"✅ Registros creados: {resultado['creados']}")
+        self.stdout.write(f"ℹ️  Registros existentes: {total_productos * total_bodegas - resultado['faltantes']}")
         self.stdout.write(f"📊 Total registros de stock: {StockActual.objects.count()}")
         self.stdout.write('')
-        self.stdout.write(self.style.SUCCESS('✅ Sincronización completada exitosamente'))
+        if dry_run:
+            self.stdout.write(self.style.WARNING('⚠️  Dry-run: no se modificó la base de datos'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Sincronización completada exitosamente'))
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.24 on 2026-10-17 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['fecha_movimiento', 'id'], name='movimientos_fecha_m_b336fc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['estado', 'fecha_movimiento', 'id'], name='movimientos_estado_48afe0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['producto', 'fecha_movimiento', 'id'], name='movimientos_product_46d833_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['tipo_movimiento', 'fecha_movimiento', 'id'], name='movimientos_tipo_mo_7bcb29_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.24 on 2026-10-17 11:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maestros', '0004_producto_dias_vencimiento_producto_meses_vencimiento_and_more'),
+        ('inventario', '0002_indices_cursor_movimientos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Saldo al cierre de este día')),
+                ('cantidad', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots_stock', to='inventario.bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots_stock', to='maestros.producto')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Stock',
+                'verbose_name_plural': 'Snapshots de Stock',
+                'db_table': 'stock_snapshots',
+                'indexes': [models.Index(fields=['producto', 'bodega', 'fecha'], name='stock_snaps_product_883da0_idx'), models.Index(fields=['bodega', 'fecha'], name='stock_snaps_bodega__87ebfa_idx')],
+                'unique_together': {('fecha', 'producto', 'bodega')},
+            },
+        ),
+    ]
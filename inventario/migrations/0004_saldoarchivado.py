@@ -0,0 +1,36 @@
+# Generated by Django 4.2.24 on 2026-10-17 11:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maestros', '0004_producto_dias_vencimiento_producto_meses_vencimiento_and_more'),
+        ('inventario', '0003_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoArchivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.DecimalField(decimal_places=6, default=0, max_digits=18)),
+                ('ultimo_ingreso', models.DateTimeField(blank=True, null=True)),
+                ('ultima_salida', models.DateTimeField(blank=True, null=True)),
+                ('hasta', models.DateTimeField(blank=True, help_text='fecha_movimiento del último movimiento archivado', null=True)),
+                ('movimientos', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_archivados', to='inventario.bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_archivados', to='maestros.producto')),
+            ],
+            options={
+                'verbose_name': 'Saldo Archivado',
+                'verbose_name_plural': 'Saldos Archivados',
+                'db_table': 'saldos_archivados',
+                'indexes': [models.Index(fields=['bodega'], name='saldos_arch_bodega__62fcb2_idx')],
+                'unique_together': {('producto', 'bodega')},
+            },
+        ),
+    ]
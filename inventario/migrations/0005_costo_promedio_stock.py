@@ -0,0 +1,33 @@
+# Generated by Django 4.2.24 on 2026-10-17 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0004_saldoarchivado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saldoarchivado',
+            name='costo_promedio',
+            field=models.DecimalField(decimal_places=6, default=0, max_digits=18),
+        ),
+        migrations.AddField(
+            model_name='saldoarchivado',
+            name='valor_total',
+            field=models.DecimalField(decimal_places=6, default=0, max_digits=18),
+        ),
+        migrations.AddField(
+            model_name='stockactual',
+            name='costo_promedio',
+            field=models.DecimalField(decimal_places=6, default=0, help_text='Costo promedio ponderado en esta bodega', max_digits=18),
+        ),
+        migrations.AddField(
+            model_name='stockactual',
+            name='valor_total',
+            field=models.DecimalField(decimal_places=6, default=0, help_text='cantidad_disponible x costo_promedio', max_digits=18),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-17 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0005_costo_promedio_stock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(fields=['producto', 'bodega', 'estado', 'fecha_vencimiento'], name='lotes_product_cc855e_idx'),
+        ),
+    ]
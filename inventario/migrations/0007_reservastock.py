@@ -0,0 +1,38 @@
+# Generated by Django 4.2.24 on 2026-10-17 11:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('maestros', '0004_producto_dias_vencimiento_producto_meses_vencimiento_and_more'),
+        ('inventario', '0006_indice_lotes_fefo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('referencia', models.CharField(help_text='Origen de la reserva, ej: venta:15 o carrito:<sesión>', max_length=64)),
+                ('estado', models.CharField(choices=[('ACTIVA', 'Activa'), ('CONFIRMADA', 'Confirmada'), ('LIBERADA', 'Liberada'), ('EXPIRADA', 'Expirada')], default='ACTIVA', max_length=10)),
+                ('expira_en', models.DateTimeField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_stock', to='inventario.bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_stock', to='maestros.producto')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservas_stock', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Reserva de Stock',
+                'verbose_name_plural': 'Reservas de Stock',
+                'db_table': 'reservas_stock',
+                'indexes': [models.Index(fields=['estado', 'expira_en'], name='reservas_st_estado_677587_idx'), models.Index(fields=['referencia', 'estado'], name='reservas_st_referen_95dbc6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.24 on 2026-10-17 11:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maestros', '0004_producto_dias_vencimiento_producto_meses_vencimiento_and_more'),
+        ('inventario', '0007_reservastock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AprovisionamientoPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bodega', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='aprovisionamientos_pendientes', to='inventario.bodega')),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='aprovisionamientos_pendientes', to='maestros.producto')),
+            ],
+            options={
+                'verbose_name': 'Aprovisionamiento Pendiente',
+                'verbose_name_plural': 'Aprovisionamientos Pendientes',
+                'db_table': 'aprovisionamientos_pendientes',
+            },
+        ),
+    ]
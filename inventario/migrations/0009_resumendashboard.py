@@ -0,0 +1,29 @@
+# Generated by Django 4.2.24 on 2026-10-17 12:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_aprovisionamientopendiente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDashboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=100, unique=True)),
+                ('valor', models.DecimalField(decimal_places=6, default=0, max_digits=18)),
+                ('datos', models.JSONField(blank=True, null=True)),
+                ('actualizado', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Dashboard',
+                'verbose_name_plural': 'Resúmenes de Dashboard',
+                'db_table': 'resumen_dashboard',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.24 on 2026-10-17 12:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maestros', '0004_producto_dias_vencimiento_producto_meses_vencimiento_and_more'),
+        ('inventario', '0009_resumendashboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('STOCK', 'Stock'), ('ALERTA', 'Alerta')], max_length=10)),
+                ('datos', models.JSONField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bodega', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='eventos_stock', to='inventario.bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos_stock', to='maestros.producto')),
+            ],
+            options={
+                'verbose_name': 'Evento de Stock',
+                'verbose_name_plural': 'Eventos de Stock',
+                'db_table': 'eventos_stock',
+                'indexes': [models.Index(fields=['created_at'], name='eventos_sto_created_7145c5_idx')],
+            },
+        ),
+    ]
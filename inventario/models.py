@@ -70,6 +70,8 @@ class Lote(models.Model):
             models.Index(fields=['producto']),
             models.Index(fields=['fecha_vencimiento']),
             models.Index(fields=['estado']),
+            # Asignación FEFO: lotes activos de un producto en una bodega por vencimiento
+            models.Index(fields=['producto', 'bodega', 'estado', 'fecha_vencimiento']),
         ]
 
     def __str__(self):
@@ -158,11 +160,23 @@ class MovimientoInventario(models.Model):
             models.Index(fields=['documento_padre_tipo']),
             models.Index(fields=['lote']),
             models.Index(fields=['unidad_medida']),
+            # Paginación por cursor (fecha_movimiento, id) del historial y la API
+            models.Index(fields=['fecha_movimiento', 'id']),
+            models.Index(fields=['estado', 'fecha_movimiento', 'id']),
+            models.Index(fields=['producto', 'fecha_movimiento', 'id']),
+            models.Index(fields=['tipo_movimiento', 'fecha_movimiento', 'id']),
         ]
 
     def __str__(self):
         return f"{self.tipo_movimiento} - {self.producto.nombre} - {self.fecha_movimiento}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado leído de la BD: evita aplicar dos veces al stock un movimiento ya confirmado
+        instance._estado_original = instance.__dict__.get('estado')
+        return instance
+
 
 class StockActual(models.Model):
     """
@@ -173,6 +187,10 @@ class StockActual(models.Model):
     cantidad_disponible = models.DecimalField(max_digits=18, decimal_places=6, default=0)
     cantidad_reservada = models.DecimalField(max_digits=18, decimal_places=6, default=0)
     cantidad_transito = models.DecimalField(max_digits=18, decimal_places=6, default=0)
+    costo_promedio = models.DecimalField(max_digits=18, decimal_places=6, default=0,
+                                         help_text='Costo promedio ponderado en esta bodega')
+    valor_total = models.DecimalField(max_digits=18, decimal_places=6, default=0,
+                                      help_text='cantidad_disponible x costo_promedio')
     ultimo_ingreso = models.DateTimeField(null=True, blank=True)
     ultima_salida = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -191,6 +209,121 @@ class StockActual(models.Model):
         return f"{self.producto.nombre} - {self.bodega.nombre}: {self.cantidad_disponible}"
 
 
+class StockSnapshot(models.Model):
+    """
+    Foto diaria del stock por producto y bodega según el libro de movimientos.
+    Solo se guarda una fila cuando el saldo cambió respecto de la foto anterior,
+    así el saldo de un par en una fecha es el de su última fila hasta esa fecha.
+    """
+    fecha = models.DateField(help_text='Saldo al cierre de este día')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='snapshots_stock')
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name='snapshots_stock')
+    cantidad = models.DecimalField(max_digits=18, decimal_places=6)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'stock_snapshots'
+        verbose_name = 'Snapshot de Stock'
+        verbose_name_plural = 'Snapshots de Stock'
+        unique_together = ['fecha', 'producto', 'bodega']
+        indexes = [
+            models.Index(fields=['producto', 'bodega', 'fecha']),
+            models.Index(fields=['bodega', 'fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.producto_id}/{self.bodega_id}: {self.cantidad}"
+
+
+class SaldoArchivado(models.Model):
+    """
+    Saldo de apertura del libro por producto y bodega: efecto acumulado de los
+    movimientos confirmados archivados y borrados de la tabla (ver
+    inventario.archivo). El saldo según el libro es este saldo más los
+    movimientos que siguen en movimientos_inventario.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='saldos_archivados')
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name='saldos_archivados')
+    cantidad = models.DecimalField(max_digits=18, decimal_places=6, default=0)
+    valor_total = models.DecimalField(max_digits=18, decimal_places=6, default=0)
+    costo_promedio = models.DecimalField(max_digits=18, decimal_places=6, default=0)
+    ultimo_ingreso = models.DateTimeField(null=True, blank=True)
+    ultima_salida = models.DateTimeField(null=True, blank=True)
+    hasta = models.DateTimeField(null=True, blank=True,
+                                 help_text='fecha_movimiento del último movimiento archivado')
+    movimientos = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'saldos_archivados'
+        verbose_name = 'Saldo Archivado'
+        verbose_name_plural = 'Saldos Archivados'
+        unique_together = ['producto', 'bodega']
+        indexes = [
+            models.Index(fields=['bodega']),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id}/{self.bodega_id}: {self.cantidad} ({self.movimientos} movimientos)"
+
+
+class ReservaStock(models.Model):
+    """
+    Reserva temporal de stock de un producto en una bodega.
+    Mientras está ACTIVA su cantidad se suma a StockActual.cantidad_reservada.
+    """
+    ESTADO_CHOICES = [
+        ('ACTIVA', 'Activa'),
+        ('CONFIRMADA', 'Confirmada'),
+        ('LIBERADA', 'Liberada'),
+        ('EXPIRADA', 'Expirada'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas_stock')
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name='reservas_stock')
+    cantidad = models.DecimalField(max_digits=18, decimal_places=6)
+    referencia = models.CharField(max_length=64,
+                                  help_text='Origen de la reserva, ej: venta:15 o carrito:<sesión>')
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='ACTIVA')
+    expira_en = models.DateTimeField()
+    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='reservas_stock')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'reservas_stock'
+        verbose_name = 'Reserva de Stock'
+        verbose_name_plural = 'Reservas de Stock'
+        indexes = [
+            models.Index(fields=['estado', 'expira_en']),
+            models.Index(fields=['referencia', 'estado']),
+        ]
+
+    def __str__(self):
+        return f"{self.referencia} - {self.producto_id}/{self.bodega_id}: {self.cantidad} ({self.estado})"
+
+
+class AprovisionamientoPendiente(models.Model):
+    """
+    Producto o bodega nuevos cuyos registros de StockActual son demasiados
+    para crearlos al confirmar la transacción: los crea el comando
+    aprovisionar_stock (ver inventario.sincronizacion)
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='aprovisionamientos_pendientes')
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, null=True, blank=True,
+                               related_name='aprovisionamientos_pendientes')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'aprovisionamientos_pendientes'
+        verbose_name = 'Aprovisionamiento Pendiente'
+        verbose_name_plural = 'Aprovisionamientos Pendientes'
+
+    def __str__(self):
+        return f"producto {self.producto_id} / bodega {self.bodega_id}"
+
+
 class AlertaStock(models.Model):
     """
     Alertas de stock
@@ -258,3 +391,52 @@ class AlertaStock(models.Model):
 
     def __str__(self):
         return f"{self.tipo_alerta} - {self.producto.nombre}"
+
+
+class ResumenDashboard(models.Model):
+    """
+    Indicador precalculado de los dashboards (ver inventario.resumen).
+    Los contadores usan valor y se actualizan incrementalmente con F();
+    las listas (top de productos, por categoría, ...) se guardan en datos.
+    """
+    clave = models.CharField(max_length=100, unique=True)
+    valor = models.DecimalField(max_digits=18, decimal_places=6, default=0)
+    datos = models.JSONField(null=True, blank=True)
+    actualizado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'resumen_dashboard'
+        verbose_name = 'Resumen de Dashboard'
+        verbose_name_plural = 'Resúmenes de Dashboard'
+
+    def __str__(self):
+        return f"{self.clave}: {self.valor}"
+
+
+class EventoStock(models.Model):
+    """
+    Cambio de StockActual o AlertaStock publicado para el stream SSE
+    (ver inventario.eventos). Los procesos leen los eventos nuevos por id.
+    """
+    TIPO_CHOICES = [
+        ('STOCK', 'Stock'),
+        ('ALERTA', 'Alerta'),
+    ]
+
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='eventos_stock')
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, null=True, blank=True,
+                               related_name='eventos_stock')
+    datos = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'eventos_stock'
+        verbose_name = 'Evento de Stock'
+        verbose_name_plural = 'Eventos de Stock'
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.id} {self.tipo} - {self.producto_id}/{self.bodega_id}"
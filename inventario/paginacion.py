@@ -0,0 +1,241 @@
+"""
+Paginación por cursor (keyset) para el libro de movimientos
+
+La paginación con Paginator usa OFFSET y un COUNT(*) sobre la consulta filtrada,
+por lo que cada página profunda recorre todas las anteriores. Aquí cada página
+continúa desde el último (fecha_movimiento, id) visto, apoyada en los índices
+compuestos de MovimientoInventario, y el total es opcional o estimado.
+"""
+import base64
+from datetime import datetime
+
+from django.db import connection
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+TAMANO_PAGINA = 25
+
+# Orden del libro: más reciente primero, id como desempate
+ORDEN_MOVIMIENTOS = ('-fecha_movimiento', '-id')
+
+
+class CursorInvalidoError(ValueError):
+    """El cursor recibido no pudo decodificarse"""
+
+
+def codificar_cursor(fecha, pk, direccion='s'):
+    """
+    Codifica una posición (fecha_movimiento, id) en un token para la URL.
+    direccion: 's' = páginas siguientes (más antiguas), 'a' = anteriores
+    """
+    texto = f'{direccion}|{fecha.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (direccion, fecha, id) o lanza CursorInvalidoError"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        texto = base64.urlsafe_b64decode(cursor + relleno).decode()
+        direccion, fecha, pk = texto.split('|')
+        if direccion not in ('s', 'a'):
+            raise ValueError(direccion)
+        return direccion, datetime.fromisoformat(fecha), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise CursorInvalidoError(f'Cursor inválido: {cursor}') from e
+
+
+def total_estimado(modelo):
+    """
+    Cantidad aproximada de filas de la tabla según las estadísticas del motor
+    (information_schema en MySQL). None si el motor no las expone.
+    """
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT TABLE_ROWS FROM information_schema.TABLES '
+            'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+            [modelo._meta.db_table],
+        )
+        fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
+class PaginaCursor:
+    """
+    Página de resultados paginados por cursor.
+
+    Expone la parte de la interfaz de Page que usan las plantillas
+    (iteración, object_list, has_next, has_previous, has_other_pages)
+    más los cursores de navegación y el total si se calculó.
+    """
+
+    def __init__(self, object_list, cursor_siguiente, cursor_anterior, total=None, total_estimado=False):
+        self.object_list = object_list
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+        self.total = total
+        self.total_estimado = total_estimado
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginar_por_cursor(queryset, cursor=None, tamano=TAMANO_PAGINA, contar=False):
+    """
+    Pagina un queryset de MovimientoInventario en orden (fecha_movimiento, id)
+    descendente usando el cursor recibido.
+
+    Args:
+        queryset: movimientos ya filtrados (se ignora su orden previo)
+        cursor: token de codificar_cursor o None para la primera página
+        tamano: filas por página
+        contar: calcular el total exacto con COUNT(*); si es False solo se
+            informa una estimación cuando la consulta no tiene filtros
+
+    Returns:
+        PaginaCursor
+    """
+    direccion, fecha, pk = decodificar_cursor(cursor) if cursor else ('s', None, None)
+
+    if fecha is None:
+        filas = list(queryset.order_by(*ORDEN_MOVIMIENTOS)[:tamano + 1])
+        hay_mas = len(filas) > tamano
+        filas = filas[:tamano]
+        hay_previas = False
+    elif direccion == 's':
+        filas = list(queryset.filter(
+            Q(fecha_movimiento__lt=fecha) | Q(fecha_movimiento=fecha, id__lt=pk)
+        ).order_by(*ORDEN_MOVIMIENTOS)[:tamano + 1])
+        hay_mas = len(filas) > tamano
+        filas = filas[:tamano]
+        hay_previas = True
+    else:
+        filas = list(queryset.filter(
+            Q(fecha_movimiento__gt=fecha) | Q(fecha_movimiento=fecha, id__gt=pk)
+        ).order_by('fecha_movimiento', 'id')[:tamano + 1])
+        hay_previas = len(filas) > tamano
+        filas = filas[:tamano][::-1]
+        hay_mas = True
+
+    cursor_siguiente = None
+    cursor_anterior = None
+    if filas and hay_mas:
+        cursor_siguiente = codificar_cursor(filas[-1].fecha_movimiento, filas[-1].pk, 's')
+    if filas and hay_previas:
+        cursor_anterior = codificar_cursor(filas[0].fecha_movimiento, filas[0].pk, 'a')
+
+    if contar:
+        return PaginaCursor(filas, cursor_siguiente, cursor_anterior, total=queryset.count())
+    if not queryset.query.where:
+        total = total_estimado(queryset.model)
+        return PaginaCursor(filas, cursor_siguiente, cursor_anterior, total=total, total_estimado=True)
+    return PaginaCursor(filas, cursor_siguiente, cursor_anterior)
+
+
+def iterar_por_lotes(queryset, tamano=2000, campos=('fecha_movimiento', 'id')):
+    """
+    Recorre un queryset en orden ascendente por `campos` en lotes de `tamano`,
+    continuando cada consulta desde la última clave vista (keyset).
+
+    A diferencia de iterator(), que con MySQL carga todo el resultado en el
+    cliente, cada lote es una consulta corta e independiente, por lo que se
+    pueden borrar o modificar filas ya procesadas durante el recorrido.
+    Los campos deben formar una clave única (el último suele ser 'id').
+
+    Yields:
+        list: lote de elementos del queryset (instancias, dicts o tuplas)
+    """
+    queryset = queryset.order_by(*campos)
+    ultima = None
+    while True:
+        lote = queryset
+        if ultima is not None:
+            condicion = Q()
+            for i, campo in enumerate(campos):
+                iguales = {campos[j]: ultima[j] for j in range(i)}
+                condicion |= Q(**iguales, **{f'{campo}__gt': ultima[i]})
+            lote = lote.filter(condicion)
+        filas = list(lote[:tamano])
+        if not filas:
+            return
+        yield filas
+        if len(filas) < tamano:
+            return
+        ultima = _clave_fila(filas[-1], campos, queryset)
+
+
+def _clave_fila(fila, campos, queryset):
+    """Valores de `campos` de una fila, sea instancia, dict o tupla de values_list()"""
+    if isinstance(fila, dict):
+        return [fila[campo] for campo in campos]
+    if isinstance(fila, tuple):
+        nombres = list(queryset.query.values_select)
+        return [fila[nombres.index(campo)] for campo in campos]
+    return [getattr(fila, campo) for campo in campos]
+
+
+class MovimientoCursorPagination(CursorPagination):
+    """
+    Paginación por cursor de DRF sobre (fecha_movimiento, id).
+    El total solo se incluye con ?contar=1.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ORDEN_MOVIMIENTOS
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.total = queryset.count() if request.query_params.get('contar') == '1' else None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        # El cursor necesita un orden total y estable, se ignora ?ordering=
+        return self.ordering
+
+    def get_paginated_response(self, data):
+        respuesta = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.total is not None:
+            respuesta['count'] = self.total
+        return Response(respuesta)
+
+
+class MovimientoPagination(PageNumberPagination):
+    """
+    Mantiene la paginación por número de página y cambia a cursor cuando la
+    petición trae ?cursor= o ?paginacion=cursor
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        parametros = request.query_params
+        if 'cursor' in parametros or parametros.get('paginacion') == 'cursor':
+            self.cursor = MovimientoCursorPagination()
+            return self.cursor.paginate_queryset(queryset, request, view)
+        self.cursor = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor is not None:
+            return self.cursor.get_paginated_response(data)
+        return super().get_paginated_response(data)
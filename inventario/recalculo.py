@@ -0,0 +1,89 @@
+"""
+Recálculo diferido de Producto.stock_actual
+
+Con INVENTARIO_RECALCULO_DIFERIDO activo, cada cambio de StockActual solo
+marca el producto como "sucio". Al confirmar la transacción
+(transaction.on_commit) se recalculan todos los productos marcados con un
+único UPDATE agrupado y se sincronizan sus alertas en una sola pasada,
+en vez de re-sumar el producto por cada fila de stock guardada.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from sistema.transacciones import al_confirmar, procesar_ahora
+from .models import StockActual
+
+
+PENDIENTES = 'inventario.recalculo'
+
+
+def recalculo_diferido_activo():
+    """Indica si el recálculo de totales se difiere hasta el commit"""
+    return getattr(settings, 'INVENTARIO_RECALCULO_DIFERIDO', False)
+
+
+def marcar_cambios(claves):
+    """
+    Marca claves (producto_id, bodega_id) para recalcular al confirmar la transacción.
+    Fuera de un bloque atómico el recálculo se ejecuta de inmediato.
+    """
+    claves = list(claves)
+    al_confirmar(PENDIENTES, lambda pendientes: pendientes.update(claves), set, recalcular_marcados)
+
+
+def procesar_pendientes():
+    """Recalcula ya lo marcado en la transacción en curso, sin esperar el commit"""
+    procesar_ahora(PENDIENTES)
+
+
+def recalcular_marcados(claves):
+    """
+    Recalcula los productos marcados: un UPDATE agrupado para los totales,
+    otro para el costo promedio y una pasada del motor de alertas para los
+    (producto, bodega) tocados
+    """
+    from .alertas import generar_alertas_stock_masivo
+    from .costos import recalcular_costos_productos
+
+    claves = sorted(claves)
+    if not claves:
+        return
+
+    producto_ids = sorted({producto_id for producto_id, _ in claves})
+    recalcular_totales_productos(producto_ids)
+    recalcular_costos_productos(producto_ids)
+    generar_alertas_stock_masivo(claves=claves, solo_activos=False)
+
+
+def recalcular_totales_productos(producto_ids=None):
+    """
+    Actualiza Producto.stock_actual con la suma de sus bodegas en un solo UPDATE.
+
+    Args:
+        producto_ids: ids a recalcular; None recalcula todos los productos
+
+    Returns:
+        int: cantidad de productos actualizados
+    """
+    from maestros.models import Producto
+
+    total = StockActual.objects.filter(
+        producto=OuterRef('pk')
+    ).values('producto').annotate(
+        total=Sum('cantidad_disponible')
+    ).values('total')
+
+    productos = Producto.objects.all()
+    if producto_ids is not None:
+        productos = productos.filter(id__in=producto_ids)
+
+    return productos.update(
+        stock_actual=Coalesce(
+            Subquery(total),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=18, decimal_places=6),
+        )
+    )
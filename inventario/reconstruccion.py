@@ -0,0 +1,224 @@
+"""
+Reconstrucción completa de StockActual desde el libro de movimientos
+
+Para cargas de datos o stock corrupto: recorre una vez los movimientos
+confirmados en orden de id (lotes keyset, ver paginacion.iterar_por_lotes:
+con MySQL iterator() trae todo el resultado al cliente) y pliega en memoria
+el saldo y las fechas de último ingreso / salida de cada (producto, bodega).
+El resultado se escribe en una sola transacción con upserts por lotes
+(bulk_create con update_conflicts: INSERT ... ON DUPLICATE KEY UPDATE).
+
+El plegado parte del saldo archivado (SaldoArchivado: movimientos ya
+archivados y borrados de la tabla, ver inventario.archivo). Si se archiva
+durante la reconstrucción, la escritura se cancela (ArchivoConcurrenteError).
+
+Los movimientos confirmados mientras se leía el libro (id posterior al corte
+o confirmados después del inicio) no se pliegan: se suman al final, ya dentro
+de la transacción de escritura y después de bloquear StockActual, con
+deltas_por_clave().
+"""
+import time
+
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .archivo import saldos_archivados
+from .models import MovimientoInventario, SaldoArchivado, StockActual
+from .paginacion import iterar_por_lotes
+from .stock import CERO, deltas_movimiento, deltas_por_clave
+
+
+TAMANO_LOTE = 5000
+TAMANO_ESCRITURA = 1000
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class MemoriaExcedidaError(Exception):
+    """El plegado del libro superó el límite de memoria indicado"""
+
+
+class ArchivoConcurrenteError(Exception):
+    """Se archivaron movimientos mientras se leía el libro"""
+
+
+def _firma_archivo():
+    """Cambia cada vez que se archivan (o se limpian) movimientos"""
+    return tuple(SaldoArchivado.objects.aggregate(
+        filas=Count('id'), movimientos=Sum('movimientos'), actualizado=Max('updated_at'),
+    ).values())
+
+
+def memoria_mb():
+    """Memoria residente máxima del proceso en MB, o None si no se puede medir"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def plegar_libro(movimientos, tamano_lote=TAMANO_LOTE, memoria_max_mb=None, progreso=None, saldos=None):
+    """
+    Pliega los movimientos en {(producto_id, bodega_id): [saldo, ultimo_ingreso, ultima_salida]},
+    a partir de los saldos iniciales indicados (default: vacío).
+
+    Raises:
+        MemoriaExcedidaError si la memoria del proceso supera memoria_max_mb
+    """
+    saldos = {} if saldos is None else saldos
+    procesados = 0
+    filas = movimientos.values_list(
+        'id', 'tipo_movimiento', 'producto_id', 'bodega_origen_id', 'bodega_destino_id',
+        'cantidad', 'costo_unitario', 'fecha_movimiento', 'fecha_confirmacion', named=True,
+    )
+    for lote in iterar_por_lotes(filas, tamano_lote, campos=('id',)):
+        for movimiento in lote:
+            fecha = movimiento.fecha_confirmacion or movimiento.fecha_movimiento
+            for producto_id, bodega_id, delta, _ in deltas_movimiento(movimiento):
+                saldo = saldos.get((producto_id, bodega_id))
+                if saldo is None:
+                    saldo = saldos[(producto_id, bodega_id)] = [CERO, None, None]
+                saldo[0] += delta
+                indice = 1 if delta > 0 else 2
+                if saldo[indice] is None or fecha > saldo[indice]:
+                    saldo[indice] = fecha
+        procesados += len(lote)
+        if progreso:
+            progreso(procesados, len(saldos))
+        if memoria_max_mb:
+            usada = memoria_mb()
+            if usada is not None and usada > memoria_max_mb:
+                raise MemoriaExcedidaError(
+                    f'Memoria usada {usada:.0f} MB supera el límite de {memoria_max_mb} MB '
+                    f'tras {procesados} movimientos y {len(saldos)} saldos'
+                )
+    return saldos, procesados
+
+
+def reconstruir_stock(tamano_lote=TAMANO_LOTE, memoria_max_mb=None, dry_run=False, progreso=None):
+    """
+    Reconstruye cantidad_disponible, ultimo_ingreso y ultima_salida de todo
+    StockActual desde el libro. valor_total se recalcula al costo_promedio
+    vigente de cada fila (recalcular_costos reconstruye también el costo).
+
+    Args:
+        tamano_lote: movimientos leídos por consulta
+        memoria_max_mb: abortar antes de escribir si el proceso supera este tamaño
+        dry_run: solo plegar y contar las filas que cambiarían
+        progreso: callback(movimientos procesados, saldos en memoria)
+
+    Returns:
+        dict: movimientos, posteriores, saldos, cambiados, creados, anulados
+        (filas sin movimientos que vuelven a cero), negativos y tiempos (lectura / escritura) en segundos
+    """
+    from .alertas import generar_alertas_stock_masivo
+    from .costos import ESCALA, recalcular_costos_productos
+    from .recalculo import recalcular_totales_productos
+    from .resumen import marcar_seccion
+
+    tiempos = {}
+    inicio = time.perf_counter()
+    comienzo = timezone.now()
+    corte = MovimientoInventario.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+    confirmados = MovimientoInventario.objects.filter(estado='CONFIRMADO')
+    leidos = confirmados.filter(id__lte=corte).filter(
+        Q(fecha_confirmacion__isnull=True) | Q(fecha_confirmacion__lt=comienzo)
+    )
+    firma = _firma_archivo()
+    iniciales = {
+        clave: [fila.cantidad, fila.ultimo_ingreso, fila.ultima_salida]
+        for clave, fila in saldos_archivados().items()
+    }
+    saldos, procesados = plegar_libro(leidos, tamano_lote, memoria_max_mb, progreso, saldos=iniciales)
+    tiempos['lectura'] = time.perf_counter() - inicio
+
+    resultado = {
+        'movimientos': procesados,
+        'posteriores': 0,
+        'saldos': len(saldos),
+        'cambiados': 0,
+        'creados': 0,
+        'anulados': 0,
+        'negativos': 0,
+        'tiempos': tiempos,
+    }
+
+    inicio = time.perf_counter()
+    with transaction.atomic():
+        # Primero los bloqueos: un movimiento confirmado antes de obtenerlos ya
+        # está en StockActual y también en la lectura de posteriores de abajo
+        existentes = {}
+        for fila in StockActual.objects.select_for_update().values_list(
+            'producto_id', 'bodega_id', 'cantidad_disponible', 'costo_promedio',
+            'ultimo_ingreso', 'ultima_salida',
+        ).order_by('producto_id', 'bodega_id').iterator(chunk_size=TAMANO_ESCRITURA):
+            existentes[(fila[0], fila[1])] = fila[2:]
+
+        if _firma_archivo() != firma:
+            raise ArchivoConcurrenteError(
+                'Se archivaron movimientos durante la lectura del libro; vuelva a ejecutar la reconstrucción'
+            )
+
+        # Movimientos confirmados durante la lectura
+        posteriores = confirmados.filter(
+            Q(id__gt=corte) | Q(fecha_confirmacion__gte=comienzo)
+        )
+        resultado['posteriores'] = posteriores.count()
+        if resultado['posteriores']:
+            for clave, delta in deltas_por_clave(posteriores).items():
+                saldos.setdefault(clave, [CERO, None, None])[0] += delta
+
+        ahora = timezone.now()
+        filas = []
+        for clave in sorted(set(saldos) | set(existentes)):
+            saldo, ultimo_ingreso, ultima_salida = saldos.get(clave, (CERO, None, None))
+            if saldo < 0:
+                # El libro deja la clave en negativo: se escribe igual y se informa
+                resultado['negativos'] += 1
+            actual = existentes.get(clave)
+            if actual is None:
+                resultado['creados'] += 1
+                costo = CERO
+            else:
+                cantidad, costo, ingreso_actual, salida_actual = actual
+                if (cantidad, ingreso_actual, salida_actual) == (saldo, ultimo_ingreso, ultima_salida):
+                    continue
+                if clave not in saldos:
+                    resultado['anulados'] += 1
+                resultado['cambiados'] += 1
+            filas.append(StockActual(
+                producto_id=clave[0],
+                bodega_id=clave[1],
+                cantidad_disponible=saldo,
+                cantidad_reservada=0,
+                cantidad_transito=0,
+                costo_promedio=costo,
+                valor_total=(saldo * costo).quantize(ESCALA) if saldo > 0 else CERO,
+                ultimo_ingreso=ultimo_ingreso,
+                ultima_salida=ultima_salida,
+                updated_at=ahora,
+            ))
+
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            for inicio_lote in range(0, len(filas), TAMANO_ESCRITURA):
+                StockActual.objects.bulk_create(
+                    filas[inicio_lote:inicio_lote + TAMANO_ESCRITURA],
+                    update_conflicts=True,
+                    unique_fields=['producto', 'bodega'],
+                    update_fields=[
+                        'cantidad_disponible', 'valor_total',
+                        'ultimo_ingreso', 'ultima_salida', 'updated_at',
+                    ],
+                )
+            if filas:
+                recalcular_totales_productos()
+                recalcular_costos_productos()
+                generar_alertas_stock_masivo(solo_activos=False)
+                marcar_seccion('stock', 'alertas')
+    tiempos['escritura'] = time.perf_counter() - inicio
+    return resultado
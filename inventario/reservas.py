@@ -0,0 +1,251 @@
+"""
+Reservas temporales de stock
+
+Una venta en borrador o un carrito puede apartar stock sin moverlo: reservar()
+suma la cantidad a StockActual.cantidad_reservada con un UPDATE condicional
+(F() sobre la misma fila), así dos reservas simultáneas no pueden prometer el
+mismo stock y la disponibilidad es siempre cantidad_disponible - cantidad_reservada
+de una sola fila, sin recorrer ventas abiertas.
+
+Cada reserva tiene un vencimiento (INVENTARIO_RESERVA_TTL_MINUTOS). Al
+confirmarla se convierte en movimientos SALIDA; al liberarla o al expirar
+(liberar_expiradas, ejecutado periódicamente) se descuenta de la reservada.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .eventos import registrar_stock
+from .models import ReservaStock, StockActual
+from .stock import CERO, StockInsuficienteError, _decimal
+
+
+TAMANO_LOTE = 500
+
+
+class ReservaInvalidaError(Exception):
+    """La referencia no tiene reservas activas (no existen, se liberaron o expiraron)"""
+
+
+def ttl_reserva():
+    return timedelta(minutes=getattr(settings, 'INVENTARIO_RESERVA_TTL_MINUTOS', 30))
+
+
+def stock_libre(producto_id, bodega_id):
+    """Stock disponible no reservado de un producto en una bodega (una fila por clave única)"""
+    fila = StockActual.objects.filter(
+        producto_id=producto_id, bodega_id=bodega_id
+    ).values_list('cantidad_disponible', 'cantidad_reservada').first()
+    if fila is None:
+        return CERO
+    return fila[0] - fila[1]
+
+
+def reservar(referencia, lineas, usuario=None, ttl=None):
+    """
+    Reserva stock para una referencia (ej: 'venta:15', 'carrito:<sesión>').
+
+    Todas las líneas se reservan o ninguna. Las claves se actualizan en orden
+    (producto, bodega) para que dos reservas cruzadas no se bloqueen entre sí.
+
+    Args:
+        referencia: identificador del documento que reserva
+        lineas: iterable de (producto_id, bodega_id, cantidad)
+        usuario: usuario que reserva (opcional)
+        ttl: timedelta de vigencia (default: INVENTARIO_RESERVA_TTL_MINUTOS)
+
+    Returns:
+        list: reservas creadas
+
+    Raises:
+        StockInsuficienteError si alguna línea supera el stock libre
+    """
+    cantidades = {}
+    for producto_id, bodega_id, cantidad in lineas:
+        cantidad = _decimal(cantidad)
+        if cantidad <= 0:
+            continue
+        clave = (int(producto_id), int(bodega_id))
+        cantidades[clave] = cantidades.get(clave, CERO) + cantidad
+
+    expira_en = timezone.now() + (ttl or ttl_reserva())
+    reservas = []
+    with transaction.atomic():
+        for (producto_id, bodega_id), cantidad in sorted(cantidades.items()):
+            actualizadas = StockActual.objects.filter(
+                producto_id=producto_id,
+                bodega_id=bodega_id,
+                cantidad_disponible__gte=F('cantidad_reservada') + cantidad,
+            ).update(cantidad_reservada=F('cantidad_reservada') + cantidad)
+            if not actualizadas:
+                raise StockInsuficienteError(
+                    producto_id, bodega_id, stock_libre(producto_id, bodega_id), cantidad
+                )
+            reservas.append(ReservaStock(
+                producto_id=producto_id,
+                bodega_id=bodega_id,
+                cantidad=cantidad,
+                referencia=referencia,
+                expira_en=expira_en,
+                usuario=usuario,
+            ))
+        ReservaStock.objects.bulk_create(reservas)
+        registrar_stock(cantidades)
+    return reservas
+
+
+def _descontar_reservadas(filas):
+    """
+    Resta de cantidad_reservada la suma de las reservas indicadas, con un
+    UPDATE por (producto, bodega) en orden. filas: [(producto_id, bodega_id, cantidad)]
+    """
+    totales = {}
+    for producto_id, bodega_id, cantidad in filas:
+        clave = (producto_id, bodega_id)
+        totales[clave] = totales.get(clave, CERO) + cantidad
+    for (producto_id, bodega_id), total in sorted(totales.items()):
+        StockActual.objects.filter(producto_id=producto_id, bodega_id=bodega_id).update(
+            cantidad_reservada=Greatest(F('cantidad_reservada') - total, CERO)
+        )
+    registrar_stock(totales)
+
+
+def _cerrar(reservas, estado):
+    """
+    Pasa las reservas [(id, producto_id, bodega_id, cantidad)] a `estado` y
+    devuelve su cantidad al stock libre
+    """
+    ReservaStock.objects.filter(id__in=[r[0] for r in reservas]).update(estado=estado)
+    _descontar_reservadas([r[1:] for r in reservas])
+
+
+def _activas(referencia):
+    """Bloquea todas las reservas activas de la referencia, vigentes o no"""
+    reservas = list(
+        ReservaStock.objects.select_for_update().filter(
+            referencia=referencia, estado='ACTIVA',
+        ).order_by('id')
+    )
+    if not reservas:
+        raise ReservaInvalidaError(f'No hay reservas activas para {referencia}')
+    return reservas
+
+
+def confirmar(referencia, usuario, **campos):
+    """
+    Convierte las reservas activas de la referencia en salidas confirmadas.
+
+    La reserva se descuenta y la salida se aplica en la misma transacción; los
+    productos con control_por_lote consumen lotes en orden FEFO.
+
+    Args:
+        referencia: identificador usado al reservar
+        usuario: usuario que confirma
+        **campos: documento_referencia, observaciones, ... de los movimientos
+
+    Returns:
+        list: movimientos SALIDA creados
+
+    Raises:
+        ReservaInvalidaError: sin reservas activas, o alguna ya venció. Se
+        confirma todo o nada: las líneas vencidas se marcan EXPIRADA (y se
+        libera su cantidad) y no se crea ninguna salida.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        reservas = _activas(referencia)
+        vencidas = [
+            (r.id, r.producto_id, r.bodega_id, r.cantidad) for r in reservas if r.expira_en < ahora
+        ]
+        if vencidas:
+            _cerrar(vencidas, 'EXPIRADA')
+        else:
+            movimientos = _confirmar_reservas(reservas, usuario, campos)
+    if vencidas:
+        raise ReservaInvalidaError(
+            f'{len(vencidas)} de las {len(reservas)} reservas de {referencia} vencieron; '
+            f'se liberaron y no se confirmó ninguna'
+        )
+    return movimientos
+
+
+def _confirmar_reservas(reservas, usuario, campos):
+    """Descuenta las reservas bloqueadas y registra sus salidas (dentro de la transacción de confirmar)"""
+    from maestros.models import Producto
+    from .lotes import asignar_lotes_fefo
+    from .stock import registrar_movimientos_masivos
+
+    ReservaStock.objects.filter(id__in=[r.id for r in reservas]).update(estado='CONFIRMADA')
+    _descontar_reservadas([(r.producto_id, r.bodega_id, r.cantidad) for r in reservas])
+
+    por_lote = set(Producto.objects.filter(
+        id__in={r.producto_id for r in reservas}, control_por_lote=True
+    ).values_list('id', flat=True))
+
+    lineas = []
+    for reserva in reservas:
+        linea = dict(
+            campos,
+            tipo_movimiento='SALIDA',
+            producto_id=reserva.producto_id,
+            bodega_origen_id=reserva.bodega_id,
+        )
+        if reserva.producto_id in por_lote:
+            for lote, tomado in asignar_lotes_fefo(reserva.producto_id, reserva.bodega_id, reserva.cantidad):
+                lineas.append(dict(linea, cantidad=tomado, lote_id=lote.id))
+        else:
+            lineas.append(dict(linea, cantidad=reserva.cantidad))
+
+    movimientos, _ = registrar_movimientos_masivos(lineas, usuario)
+    return movimientos
+
+
+def liberar(referencia):
+    """
+    Libera las reservas activas de la referencia (venta cancelada, carrito vaciado).
+
+    Returns:
+        int: cantidad de reservas liberadas
+    """
+    with transaction.atomic():
+        reservas = list(
+            ReservaStock.objects.select_for_update().filter(
+                referencia=referencia, estado='ACTIVA'
+            ).order_by('id').values_list('id', 'producto_id', 'bodega_id', 'cantidad')
+        )
+        if not reservas:
+            return 0
+        _cerrar(reservas, 'LIBERADA')
+    return len(reservas)
+
+
+def liberar_expiradas(tamano_lote=TAMANO_LOTE, ahora=None):
+    """
+    Marca como EXPIRADA las reservas activas vencidas y devuelve su cantidad
+    al stock libre, en lotes: un UPDATE de estado por lote y un UPDATE por
+    (producto, bodega) afectado.
+
+    Returns:
+        int: cantidad de reservas expiradas
+    """
+    ahora = ahora or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            reservas = list(
+                ReservaStock.objects.select_for_update().filter(
+                    estado='ACTIVA', expira_en__lt=ahora
+                ).order_by('expira_en', 'id').values_list(
+                    'id', 'producto_id', 'bodega_id', 'cantidad'
+                )[:tamano_lote]
+            )
+            if not reservas:
+                return total
+            _cerrar(reservas, 'EXPIRADA')
+        total += len(reservas)
+        if len(reservas) < tamano_lote:
+            return total
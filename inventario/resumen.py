@@ -0,0 +1,446 @@
+"""
+Resumen precalculado de los dashboards
+
+Los dashboards de inventario, autenticación y sistema mostraban entre 6 y 10
+COUNT/SUM sobre tablas completas en cada carga. Los indicadores se guardan
+ahora en ResumenDashboard y obtener_resumen() los lee con una sola consulta
+(la tabla tiene unas pocas cientos de filas), con una caché en memoria del
+proceso de INVENTARIO_RESUMEN_CACHE_SEGUNDOS.
+
+Mantenimiento:
+- Movimientos confirmados: contadores por día y tipo ('mov:<fecha>:<tipo>' y
+  'movcant:<fecha>:<tipo>') que se incrementan con F() al confirmar la
+  transacción (registrar_movimientos, llamado por el motor de stock).
+- Stock bajo: aplicar_deltas informa el saldo anterior y nuevo de cada
+  (producto, bodega) y del total de cada producto, leídos en su transacción,
+  y solo se suman/restan los cruces del stock mínimo (registrar_cambios_stock).
+- Catálogo, alertas y cambios de stock fuera del motor: marcar_seccion() deja
+  la sección pendiente y se recalcula (consultas indexadas) en la siguiente
+  lectura, una sola vez aunque hayan ocurrido muchas escrituras.
+- recalcular_resumen() rehace todo desde las tablas (comando
+  recalcular_resumen_dashboard, pensado para cron) y corrige cualquier
+  desviación de los contadores. Si el último recálculo tiene más de
+  INVENTARIO_RESUMEN_RECALCULO_HORAS la lectura solo lo informa
+  ('desactualizado'); la lectura nunca lanza el recálculo completo.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from datetime import time as hora
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from sistema.transacciones import al_confirmar
+from .models import ResumenDashboard
+
+
+# Días de contadores de movimientos que se conservan (el mes en curso y los últimos 30 días)
+DIAS_MOVIMIENTOS = 40
+
+PREFIJO_CANTIDAD = 'movcant:'
+PREFIJO_MOVIMIENTOS = 'mov:'
+PREFIJO_PENDIENTE = 'pendiente:'
+CLAVE_RECALCULO = 'recalculo'
+
+SECCIONES = ('catalogo', 'alertas', 'stock')
+
+_cache = {'datos': None, 'leido': 0.0}
+_cache_lock = threading.Lock()
+
+
+# Cálculo desde las tablas
+
+def _seccion_catalogo():
+    from autenticacion.models import Usuario
+    from maestros.models import Categoria, Marca, Producto, Proveedor
+    from .models import Bodega
+
+    return {
+        'productos_total': Producto.objects.count(),
+        'productos_activos': Producto.objects.filter(estado='ACTIVO').count(),
+        'productos_por_estado': list(
+            Producto.objects.values('estado').annotate(total=Count('id')).order_by('-total')
+        ),
+        'productos_por_categoria': list(
+            Categoria.objects.filter(activo=True)
+            .annotate(total_productos=Count('productos'))
+            .values('nombre', 'total_productos')
+            .order_by('-total_productos')[:5]
+        ),
+        'categorias_activas': Categoria.objects.filter(activo=True).count(),
+        'marcas_activas': Marca.objects.filter(activo=True).count(),
+        'usuarios_activos': Usuario.objects.filter(estado='ACTIVO').count(),
+        'proveedores_activos': Proveedor.objects.filter(estado='ACTIVO').count(),
+        'bodegas_activas': Bodega.objects.filter(activo=True).count(),
+    }
+
+
+def _seccion_alertas():
+    from .models import AlertaStock
+
+    activas = AlertaStock.objects.filter(estado='ACTIVA')
+    return {
+        'alertas_activas': activas.count(),
+        'alertas_criticas': activas.filter(prioridad='CRITICA').count(),
+    }
+
+
+def _seccion_stock():
+    from maestros.models import Producto
+    from .models import StockActual
+
+    return {
+        'stock_bajo': StockActual.objects.filter(
+            cantidad_disponible__lte=F('producto__stock_minimo'),
+            producto__estado='ACTIVO',
+        ).count(),
+        'productos_bajo_stock': Producto.objects.filter(
+            stock_actual__lte=F('stock_minimo'),
+            estado='ACTIVO',
+        ).count(),
+    }
+
+
+def _productos_movidos():
+    from .models import MovimientoInventario
+
+    return {
+        'productos_movidos': list(
+            MovimientoInventario.objects.values('producto__nombre')
+            .annotate(total_movimientos=Count('id'))
+            .order_by('-total_movimientos')[:5]
+        ),
+    }
+
+
+CALCULOS = {
+    'catalogo': _seccion_catalogo,
+    'alertas': _seccion_alertas,
+    'stock': _seccion_stock,
+}
+
+
+def _guardar(valores, ahora):
+    """Escribe (insertando si falta) cada clave: números en valor, listas en datos"""
+    for clave, valor in sorted(valores.items()):
+        if isinstance(valor, (list, dict)):
+            campos = {'valor': 0, 'datos': valor, 'actualizado': ahora}
+        else:
+            campos = {'valor': valor, 'datos': None, 'actualizado': ahora}
+        ResumenDashboard.objects.update_or_create(clave=clave, defaults=campos)
+
+
+def _contadores_movimientos(dias, hoy):
+    """
+    Contadores por día y tipo de los movimientos confirmados de los últimos
+    días, con una consulta agrupada por tipo para cada día (rango indexado
+    sobre fecha_movimiento, sin depender de las tablas de zona horaria).
+    """
+    from .models import MovimientoInventario
+
+    contadores = {}
+    for atras in range(dias):
+        dia = hoy - timedelta(days=atras)
+        inicio = timezone.make_aware(datetime.combine(dia, hora.min))
+        filas = MovimientoInventario.objects.filter(
+            estado='CONFIRMADO',
+            fecha_movimiento__gte=inicio,
+            fecha_movimiento__lt=inicio + timedelta(days=1),
+        ).values('tipo_movimiento').annotate(
+            total=Count('id'), cantidad=Sum('cantidad')
+        ).order_by()
+        for fila in filas:
+            sufijo = f"{dia.isoformat()}:{fila['tipo_movimiento']}"
+            contadores[PREFIJO_MOVIMIENTOS + sufijo] = fila['total']
+            contadores[PREFIJO_CANTIDAD + sufijo] = fila['cantidad'] or 0
+    return contadores
+
+
+def recalcular_resumen(dias=DIAS_MOVIMIENTOS):
+    """
+    Recalcula todos los indicadores desde las tablas y reemplaza los
+    contadores de movimientos por los de los últimos `dias` días.
+
+    Returns:
+        dict: claves escritas y duración en segundos
+    """
+    inicio = time.perf_counter()
+    ahora = timezone.now()
+    hoy = timezone.localdate()
+
+    with transaction.atomic():
+        # Las marcas se limpian antes de calcular: una escritura concurrente
+        # vuelve a dejarlas pendientes
+        ResumenDashboard.objects.filter(clave__startswith=PREFIJO_PENDIENTE).update(valor=0)
+
+        valores = {}
+        for calcular in CALCULOS.values():
+            valores.update(calcular())
+        valores.update(_productos_movidos())
+        contadores = _contadores_movimientos(dias, hoy)
+
+        _guardar(valores, ahora)
+        ResumenDashboard.objects.filter(clave__startswith=PREFIJO_MOVIMIENTOS).delete()
+        ResumenDashboard.objects.filter(clave__startswith=PREFIJO_CANTIDAD).delete()
+        ResumenDashboard.objects.bulk_create([
+            ResumenDashboard(clave=clave, valor=valor, actualizado=ahora)
+            for clave, valor in sorted(contadores.items())
+        ])
+        _guardar({CLAVE_RECALCULO: 1}, ahora)
+
+    invalidar_cache()
+    return {
+        'claves': len(valores) + len(contadores),
+        'duracion': time.perf_counter() - inicio,
+    }
+
+
+def _recalcular_secciones(secciones):
+    """Recalcula las secciones marcadas como pendientes"""
+    ahora = timezone.now()
+    with transaction.atomic():
+        ResumenDashboard.objects.filter(
+            clave__in=[PREFIJO_PENDIENTE + seccion for seccion in secciones]
+        ).update(valor=0, actualizado=ahora)
+        valores = {}
+        for seccion in secciones:
+            valores.update(CALCULOS[seccion]())
+        _guardar(valores, ahora)
+
+
+# Lectura
+
+def invalidar_cache():
+    """Descarta la copia en memoria del resumen de este proceso"""
+    with _cache_lock:
+        _cache['datos'] = None
+
+
+def _leer_filas():
+    return {
+        fila.clave: fila
+        for fila in ResumenDashboard.objects.only('clave', 'valor', 'datos', 'actualizado')
+    }
+
+
+def _armar(filas, hoy):
+    """Convierte las filas del resumen en el dict que usan las vistas"""
+    def numero(clave):
+        fila = filas.get(clave)
+        return int(fila.valor) if fila else 0
+
+    def lista(clave):
+        fila = filas.get(clave)
+        return (fila.datos or []) if fila else []
+
+    inicio_mes = hoy.replace(day=1).isoformat()
+    hace_30_dias = (hoy - timedelta(days=30)).isoformat()
+    hoy_iso = hoy.isoformat()
+
+    movimientos_hoy = 0
+    movimientos_mes = 0
+    por_tipo = {}
+    for clave, fila in filas.items():
+        if clave.startswith(PREFIJO_MOVIMIENTOS):
+            dia, tipo = clave[len(PREFIJO_MOVIMIENTOS):].split(':', 1)
+            total = int(fila.valor)
+            if dia == hoy_iso:
+                movimientos_hoy += total
+            if dia >= inicio_mes:
+                movimientos_mes += total
+            if dia >= hace_30_dias:
+                por_tipo.setdefault(tipo, {'tipo_movimiento': tipo, 'total': 0, 'cantidad_total': 0})
+                por_tipo[tipo]['total'] += total
+        elif clave.startswith(PREFIJO_CANTIDAD):
+            dia, tipo = clave[len(PREFIJO_CANTIDAD):].split(':', 1)
+            if dia >= hace_30_dias:
+                por_tipo.setdefault(tipo, {'tipo_movimiento': tipo, 'total': 0, 'cantidad_total': 0})
+                por_tipo[tipo]['cantidad_total'] += fila.valor
+
+    recalculo = filas.get(CLAVE_RECALCULO)
+    return {
+        'productos_total': numero('productos_total'),
+        'productos_activos': numero('productos_activos'),
+        'productos_por_estado': lista('productos_por_estado'),
+        'productos_por_categoria': lista('productos_por_categoria'),
+        'productos_movidos': lista('productos_movidos'),
+        'productos_bajo_stock': numero('productos_bajo_stock'),
+        'stock_bajo': numero('stock_bajo'),
+        'categorias_activas': numero('categorias_activas'),
+        'marcas_activas': numero('marcas_activas'),
+        'usuarios_activos': numero('usuarios_activos'),
+        'proveedores_activos': numero('proveedores_activos'),
+        'bodegas_activas': numero('bodegas_activas'),
+        'alertas_activas': numero('alertas_activas'),
+        'alertas_criticas': numero('alertas_criticas'),
+        'movimientos_hoy': movimientos_hoy,
+        'movimientos_mes': movimientos_mes,
+        'stats_movimientos': sorted(por_tipo.values(), key=lambda fila: fila['tipo_movimiento']),
+        'recalculado': recalculo.actualizado if recalculo else None,
+        'desactualizado': recalculo is None or timezone.now() - recalculo.actualizado > timedelta(
+            hours=getattr(settings, 'INVENTARIO_RESUMEN_RECALCULO_HORAS', 24)
+        ),
+    }
+
+
+def obtener_resumen():
+    """
+    Indicadores de los dashboards.
+
+    Una consulta a ResumenDashboard (o ninguna si la copia en memoria está
+    vigente). La primera vez, o con secciones pendientes, recalcula lo
+    necesario antes de responder.
+    """
+    segundos = getattr(settings, 'INVENTARIO_RESUMEN_CACHE_SEGUNDOS', 5)
+    with _cache_lock:
+        if _cache['datos'] is not None and time.monotonic() - _cache['leido'] < segundos:
+            return _cache['datos']
+
+    filas = _leer_filas()
+    if CLAVE_RECALCULO not in filas:
+        recalcular_resumen()
+        filas = _leer_filas()
+    else:
+        pendientes = [
+            seccion for seccion in SECCIONES
+            if (fila := filas.get(PREFIJO_PENDIENTE + seccion)) is not None and fila.valor
+        ]
+        if pendientes:
+            _recalcular_secciones(pendientes)
+            filas = _leer_filas()
+
+    datos = _armar(filas, timezone.localdate())
+    with _cache_lock:
+        _cache['datos'] = datos
+        _cache['leido'] = time.monotonic()
+    return datos
+
+
+# Mantenimiento incremental desde las escrituras
+
+def _pendientes_vacios():
+    return {'movimientos': {}, 'stock': {}, 'productos': {}, 'secciones': set()}
+
+
+def _programar(agregar):
+    """
+    Agrega a los pendientes de la transacción con agregar(pendientes) y
+    programa procesar_resumen una sola vez. Fuera de un bloque atómico se
+    procesa de inmediato.
+    """
+    al_confirmar('inventario.resumen', agregar, _pendientes_vacios, procesar_resumen)
+
+
+def registrar_movimientos(movimientos):
+    """Suma movimientos confirmados a los contadores por día y tipo al confirmar la transacción"""
+    if not movimientos:
+        return
+
+    def agregar(pendientes):
+        contadores = pendientes['movimientos']
+        for movimiento in movimientos:
+            fecha = movimiento.fecha_movimiento
+            dia = timezone.localdate(fecha) if timezone.is_aware(fecha) else fecha.date()
+            clave = f"{dia.isoformat()}:{movimiento.tipo_movimiento}"
+            total, cantidad = contadores.get(clave, (0, 0))
+            contadores[clave] = (total + 1, cantidad + Decimal(str(movimiento.cantidad)))
+
+    _programar(agregar)
+
+
+def registrar_cambios_stock(cambios, totales=None):
+    """
+    Registra saldos {(producto_id, bodega_id): (anterior, nuevo)} y totales
+    {producto_id: (anterior, nuevo)} para ajustar los contadores de stock bajo
+    al confirmar la transacción
+    """
+    if not cambios and not totales:
+        return
+
+    def agregar(pendientes):
+        # Si la clave ya cambió en la transacción se conserva el saldo inicial
+        for destino, valores in ((pendientes['stock'], cambios), (pendientes['productos'], totales or {})):
+            for clave, (anterior, nuevo) in valores.items():
+                destino[clave] = (destino[clave][0] if clave in destino else anterior, nuevo)
+
+    _programar(agregar)
+
+
+def marcar_seccion(*secciones):
+    """Deja secciones del resumen pendientes de recálculo (ver SECCIONES)"""
+    _programar(lambda pendientes: pendientes['secciones'].update(secciones))
+
+
+def _incrementar(deltas, ahora):
+    """Suma deltas {clave: número} con UPDATE ... F(), creando las claves que falten"""
+    for clave, delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        if ResumenDashboard.objects.filter(clave=clave).update(valor=F('valor') + delta, actualizado=ahora):
+            continue
+        try:
+            with transaction.atomic():
+                ResumenDashboard.objects.create(clave=clave, valor=delta, actualizado=ahora)
+        except IntegrityError:
+            ResumenDashboard.objects.filter(clave=clave).update(valor=F('valor') + delta, actualizado=ahora)
+
+
+def _deltas_stock_bajo(cambios, totales):
+    """
+    Variación de stock_bajo (filas de StockActual) y productos_bajo_stock
+    (Producto.stock_actual) según los saldos que cruzaron el stock mínimo
+    """
+    from maestros.models import Producto
+
+    producto_ids = sorted({producto_id for producto_id, _ in cambios} | set(totales))
+    minimos = dict(
+        Producto.objects.filter(id__in=producto_ids, estado='ACTIVO').values_list('id', 'stock_minimo')
+    )
+    if not minimos:
+        return {}
+
+    stock_bajo = 0
+    for (producto_id, _), (anterior, nuevo) in cambios.items():
+        if producto_id in minimos:
+            minimo = minimos[producto_id]
+            stock_bajo += (nuevo <= minimo) - (anterior <= minimo)
+
+    productos_bajo_stock = 0
+    for producto_id, (anterior, nuevo) in totales.items():
+        if producto_id in minimos:
+            minimo = minimos[producto_id]
+            productos_bajo_stock += (nuevo <= minimo) - (anterior <= minimo)
+
+    return {'stock_bajo': stock_bajo, 'productos_bajo_stock': productos_bajo_stock}
+
+
+def procesar_resumen(pendientes):
+    """Aplica al resumen lo registrado en la transacción confirmada"""
+    movimientos = pendientes['movimientos']
+    cambios = pendientes['stock']
+    totales = pendientes['productos']
+    secciones = pendientes['secciones']
+    if not (movimientos or cambios or totales or secciones):
+        return
+
+    ahora = timezone.now()
+    deltas = {}
+    for sufijo, (total, cantidad) in movimientos.items():
+        deltas[PREFIJO_MOVIMIENTOS + sufijo] = total
+        deltas[PREFIJO_CANTIDAD + sufijo] = cantidad
+    if cambios or totales:
+        deltas.update(_deltas_stock_bajo(cambios, totales))
+
+    with transaction.atomic():
+        _incrementar(deltas, ahora)
+        for seccion in sorted(secciones):
+            clave = PREFIJO_PENDIENTE + seccion
+            if not ResumenDashboard.objects.filter(clave=clave).update(valor=1, actualizado=ahora):
+                ResumenDashboard.objects.get_or_create(
+                    clave=clave, defaults={'valor': 1, 'actualizado': ahora}
+                )
+    invalidar_cache()
@@ -2,7 +2,7 @@
 Serializers para el módulo inventario - Django REST Framework
 """
 from rest_framework import serializers
-from .models import MovimientoInventario, StockActual, AlertaStock, Bodega, Lote
+from .models import MovimientoInventario, StockActual, AlertaStock, Bodega, Lote, ReservaStock
 from maestros.serializers import ProductoListSerializer, ProveedorListSerializer
 
 
@@ -37,7 +37,7 @@ class StockActualSerializer(serializers.ModelSerializer):
     class Meta:
         model = StockActual
         fields = '__all__'
-        read_only_fields = ('updated_at',)
+        read_only_fields = ('costo_promedio', 'valor_total', 'updated_at')
     
     def get_stock_total(self, obj):
         """Calcular stock total (disponible + reservado + tránsito)"""
@@ -63,8 +63,8 @@ class MovimientoInventarioSerializer(serializers.ModelSerializer):
     
     def get_valor_total(self, obj):
         """Calcular valor total del movimiento"""
-        if obj.cantidad and obj.precio_unitario:
-            return float(obj.cantidad) * float(obj.precio_unitario)
+        if obj.cantidad and obj.costo_unitario:
+            return float(obj.cantidad) * float(obj.costo_unitario)
         return 0
     
     def validate(self, data):
@@ -133,8 +133,8 @@ class MovimientoInventarioListSerializer(serializers.ModelSerializer):
                  'fecha_movimiento', 'estado']
     
     def get_valor_total(self, obj):
-        if obj.cantidad and obj.precio_unitario:
-            return float(obj.cantidad) * float(obj.precio_unitario)
+        if obj.cantidad and obj.costo_unitario:
+            return float(obj.cantidad) * float(obj.costo_unitario)
         return 0
 
 
@@ -147,4 +147,153 @@ class StockActualListSerializer(serializers.ModelSerializer):
     class Meta:
         model = StockActual
         fields = ['id', 'producto_sku', 'producto_nombre', 'bodega_nombre',
-                 'cantidad_disponible', 'cantidad_reservada', 'cantidad_transito']
\ No newline at end of file
+                 'cantidad_disponible', 'cantidad_reservada', 'cantidad_transito',
+                 'costo_promedio', 'valor_total']
+
+# Serializers para carga masiva de movimientos
+class MovimientoBatchItemSerializer(serializers.Serializer):
+    """Línea de una carga masiva de movimientos (referencias por id)"""
+    tipo_movimiento = serializers.ChoiceField(choices=MovimientoInventario.TIPO_MOVIMIENTO_CHOICES)
+    producto = serializers.IntegerField()
+    cantidad = serializers.DecimalField(max_digits=18, decimal_places=6)
+    bodega_origen = serializers.IntegerField(required=False, allow_null=True)
+    bodega_destino = serializers.IntegerField(required=False, allow_null=True)
+    proveedor = serializers.IntegerField(required=False, allow_null=True)
+    lote = serializers.IntegerField(required=False, allow_null=True)
+    costo_unitario = serializers.DecimalField(max_digits=18, decimal_places=6,
+                                              required=False, allow_null=True)
+    fecha_movimiento = serializers.DateTimeField(required=False)
+    documento_referencia = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    motivo_ajuste = serializers.CharField(required=False, allow_blank=True)
+    observaciones = serializers.CharField(required=False, allow_blank=True)
+    
+    def validate_cantidad(self, value):
+        """Validar que la cantidad sea positiva"""
+        if value <= 0:
+            raise serializers.ValidationError("La cantidad debe ser mayor a 0")
+        return value
+    
+    def validate(self, data):
+        """Mismas reglas de bodegas que MovimientoInventarioSerializer"""
+        tipo_movimiento = data['tipo_movimiento']
+        bodega_origen = data.get('bodega_origen')
+        bodega_destino = data.get('bodega_destino')
+        
+        if tipo_movimiento == 'SALIDA' and not bodega_origen:
+            raise serializers.ValidationError(
+                "Los movimientos de salida requieren bodega origen"
+            )
+        if tipo_movimiento == 'INGRESO' and not bodega_destino:
+            raise serializers.ValidationError(
+                "Los movimientos de ingreso requieren bodega destino"
+            )
+        if tipo_movimiento in ('AJUSTE', 'DEVOLUCION') and not (bodega_origen or bodega_destino):
+            raise serializers.ValidationError(
+                "Los ajustes y devoluciones requieren bodega origen o destino"
+            )
+        if tipo_movimiento == 'TRANSFERENCIA':
+            if not bodega_origen or not bodega_destino:
+                raise serializers.ValidationError(
+                    "Las transferencias requieren bodega origen y destino"
+                )
+            if bodega_origen == bodega_destino:
+                raise serializers.ValidationError(
+                    "Las bodegas origen y destino deben ser diferentes"
+                )
+        return data
+
+
+class MovimientoBatchSerializer(serializers.Serializer):
+    """
+    Carga masiva de movimientos.
+    Las referencias se validan con una consulta por tabla, no una por línea.
+    """
+    MAX_MOVIMIENTOS = 2000
+    
+    movimientos = MovimientoBatchItemSerializer(many=True, allow_empty=False)
+    
+    def validate_movimientos(self, lineas):
+        if len(lineas) > self.MAX_MOVIMIENTOS:
+            raise serializers.ValidationError(
+                f"Se permiten como máximo {self.MAX_MOVIMIENTOS} movimientos por carga"
+            )
+        
+        from maestros.models import Producto, Proveedor
+        referencias = [
+            ('producto', Producto, ('producto',)),
+            ('bodega', Bodega, ('bodega_origen', 'bodega_destino')),
+            ('proveedor', Proveedor, ('proveedor',)),
+            ('lote', Lote, ('lote',)),
+        ]
+        errores = {}
+        for nombre, modelo, campos in referencias:
+            ids = {linea[campo] for linea in lineas for campo in campos if linea.get(campo)}
+            if not ids:
+                continue
+            existentes = set(modelo.objects.filter(id__in=ids).values_list('id', flat=True))
+            for indice, linea in enumerate(lineas):
+                for campo in campos:
+                    valor = linea.get(campo)
+                    if valor and valor not in existentes:
+                        errores.setdefault(indice, {})[campo] = f"No existe {nombre} con id {valor}"
+        
+        if errores:
+            raise serializers.ValidationError([errores.get(i, {}) for i in range(len(lineas))])
+        return lineas
+    
+    def to_lineas(self):
+        """Convierte los datos validados al formato de registrar_movimientos_masivos"""
+        lineas = []
+        for linea in self.validated_data['movimientos']:
+            lineas.append({
+                'tipo_movimiento': linea['tipo_movimiento'],
+                'producto_id': linea['producto'],
+                'cantidad': linea['cantidad'],
+                'bodega_origen_id': linea.get('bodega_origen'),
+                'bodega_destino_id': linea.get('bodega_destino'),
+                'proveedor_id': linea.get('proveedor'),
+                'lote_id': linea.get('lote'),
+                'costo_unitario': linea.get('costo_unitario'),
+                'fecha_movimiento': linea.get('fecha_movimiento'),
+                'documento_referencia': linea.get('documento_referencia'),
+                'motivo_ajuste': linea.get('motivo_ajuste'),
+                'observaciones': linea.get('observaciones'),
+            })
+        return lineas
+
+
+# Serializers para reservas de stock
+class ReservaStockSerializer(serializers.ModelSerializer):
+    """Serializer de solo lectura para ReservaStock"""
+    producto_sku = serializers.CharField(source='producto.sku', read_only=True)
+    bodega_nombre = serializers.CharField(source='bodega.nombre', read_only=True)
+    
+    class Meta:
+        model = ReservaStock
+        fields = '__all__'
+
+
+class ReservaLineaSerializer(serializers.Serializer):
+    """Línea de una reserva (referencias por id)"""
+    producto = serializers.IntegerField()
+    bodega = serializers.IntegerField()
+    cantidad = serializers.DecimalField(max_digits=18, decimal_places=6)
+    
+    def validate_cantidad(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("La cantidad debe ser mayor a 0")
+        return value
+
+
+class ReservarSerializer(serializers.Serializer):
+    """Reserva de varias líneas para una referencia (ej: venta:15)"""
+    referencia = serializers.CharField(max_length=64)
+    lineas = ReservaLineaSerializer(many=True, allow_empty=False)
+    minutos = serializers.IntegerField(required=False, min_value=1, max_value=7 * 24 * 60,
+                                       help_text='Vigencia en minutos (default: INVENTARIO_RESERVA_TTL_MINUTOS)')
+    
+    def to_lineas(self):
+        return [
+            (linea['producto'], linea['bodega'], linea['cantidad'])
+            for linea in self.validated_data['lineas']
+        ]
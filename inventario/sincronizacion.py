@@ -0,0 +1,308 @@
+"""
+Sincronización masiva de registros de StockActual
+
+Cada (producto, bodega activa) debe tener su fila de StockActual. En vez de
+recorrer productos x bodegas con get_or_create (una o dos consultas por par),
+los pares faltantes se obtienen con un anti-join (producto CROSS JOIN bodega
+LEFT JOIN stock_actual ... IS NULL) paginado por keyset y se insertan lote a
+lote con bulk_create(ignore_conflicts=True). Los totales de Producto se
+recalculan con un UPDATE agrupado (recalculo.recalcular_totales_productos).
+
+Las señales de maestros (producto o bodega nuevos) no crean las filas en el
+momento: programar_aprovisionamiento() acumula los ids de la transacción y
+los procesa una vez al confirmarla, en lotes de TAMANO_LOTE. Si el lote
+estimado supera INVENTARIO_APROVISIONAMIENTO_UMBRAL pares (p. ej. una bodega
+nueva con todo el catálogo) no se crea nada en la petición: los ids quedan en
+AprovisionamientoPendiente y el comando `aprovisionar_stock` (cron) los
+procesa en lotes. Las cargas masivas pueden desactivarlo con
+aprovisionamiento_suspendido() y sincronizar al final.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from maestros.models import Producto
+from sistema.transacciones import al_confirmar
+from .models import AprovisionamientoPendiente, Bodega, StockActual
+from .recalculo import recalcular_totales_productos
+from .resumen import marcar_seccion
+
+
+TAMANO_LOTE = 1000
+
+
+def _consulta_faltantes(producto_ids=None, bodega_ids=None, solo_activos=True, desde=None, limite=TAMANO_LOTE):
+    """
+    SQL y parámetros del anti-join de pares (producto_id, bodega_id) sin
+    StockActual: los primeros `limite` posteriores al par `desde`
+    """
+    productos = connection.ops.quote_name(Producto._meta.db_table)
+    bodegas = connection.ops.quote_name(Bodega._meta.db_table)
+    stock = connection.ops.quote_name(StockActual._meta.db_table)
+
+    condiciones = ['b.activo = %s', 's.id IS NULL']
+    parametros = [True]
+    if solo_activos:
+        condiciones.append('p.estado = %s')
+        parametros.append('ACTIVO')
+    for alias, ids in (('p', producto_ids), ('b', bodega_ids)):
+        if ids is not None:
+            ids = list(ids)
+            if not ids:
+                return None, None
+            condiciones.append(f'{alias}.id IN ({", ".join(["%s"] * len(ids))})')
+            parametros.extend(ids)
+    if desde is not None:
+        condiciones.append('(p.id > %s OR (p.id = %s AND b.id > %s))')
+        parametros.extend([desde[0], desde[0], desde[1]])
+
+    sql = (
+        f'SELECT p.id, b.id FROM {productos} p '
+        f'CROSS JOIN {bodegas} b '
+        f'LEFT JOIN {stock} s ON s.producto_id = p.id AND s.bodega_id = b.id '
+        f'WHERE {" AND ".join(condiciones)} '
+        f'ORDER BY p.id, b.id LIMIT %s'
+    )
+    parametros.append(limite)
+    return sql, parametros
+
+
+def pares_faltantes(producto_ids=None, bodega_ids=None, solo_activos=True, tamano_lote=TAMANO_LOTE):
+    """
+    Recorre en lotes los pares (producto_id, bodega_id) de productos y bodegas
+    activas que no tienen registro de StockActual. Cada lote es una consulta
+    que continúa desde el último par visto, así nunca se cargan todos.
+
+    Yields:
+        list: lote de tuplas (producto_id, bodega_id)
+    """
+    desde = None
+    while True:
+        sql, parametros = _consulta_faltantes(producto_ids, bodega_ids, solo_activos, desde, tamano_lote)
+        if sql is None:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(sql, parametros)
+            lote = [tuple(fila) for fila in cursor.fetchall()]
+        if not lote:
+            return
+        yield lote
+        if len(lote) < tamano_lote:
+            return
+        desde = lote[-1]
+
+
+def _contar_stocks(lote):
+    """Registros de StockActual existentes entre los productos y bodegas del lote"""
+    return StockActual.objects.filter(
+        producto_id__in={producto_id for producto_id, _ in lote},
+        bodega_id__in={bodega_id for _, bodega_id in lote},
+    ).count()
+
+
+def crear_stocks_faltantes(producto_ids=None, bodega_ids=None, solo_activos=True,
+                           dry_run=False, tamano_lote=TAMANO_LOTE):
+    """
+    Crea los registros de StockActual (en cero) que faltan, lote a lote.
+
+    Args:
+        producto_ids / bodega_ids: limitar a estos ids (None = todos)
+        solo_activos: solo productos en estado ACTIVO
+        dry_run: solo contar los pares faltantes, sin insertar
+        tamano_lote: pares por consulta y por bulk_create
+
+    Returns:
+        dict: faltantes, creados y tiempos (consulta / escritura) en segundos
+    """
+    resultado = {'faltantes': 0, 'creados': 0, 'tiempos': {'consulta': 0.0, 'escritura': 0.0}}
+
+    lotes = pares_faltantes(producto_ids, bodega_ids, solo_activos, tamano_lote)
+    while True:
+        inicio = time.perf_counter()
+        lote = next(lotes, None)
+        resultado['tiempos']['consulta'] += time.perf_counter() - inicio
+        if lote is None:
+            break
+        resultado['faltantes'] += len(lote)
+        if dry_run:
+            continue
+
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            # bulk_create(ignore_conflicts=True) devuelve todos los objetos
+            # recibidos, también los que ya existían: se cuentan las filas
+            antes = _contar_stocks(lote)
+            StockActual.objects.bulk_create(
+                [
+                    StockActual(
+                        producto_id=producto_id,
+                        bodega_id=bodega_id,
+                        cantidad_disponible=0,
+                        cantidad_reservada=0,
+                        cantidad_transito=0,
+                    )
+                    for producto_id, bodega_id in lote
+                ],
+                ignore_conflicts=True,
+            )
+            resultado['creados'] += _contar_stocks(lote) - antes
+        resultado['tiempos']['escritura'] += time.perf_counter() - inicio
+
+    if resultado['creados']:
+        # Las filas nuevas (en cero) cuentan como stock bajo
+        marcar_seccion('stock')
+    return resultado
+
+
+def sincronizar_totales(producto_ids=None, solo_activos=True, dry_run=False):
+    """
+    Cuenta los productos cuyo stock_actual difiere de la suma de sus bodegas y,
+    salvo en dry_run, recalcula esos productos con un UPDATE agrupado por
+    lote. Con solo_activos solo se consideran los productos en estado ACTIVO.
+
+    Returns:
+        dict: productos desincronizados y tiempo en segundos
+    """
+    inicio = time.perf_counter()
+    total = StockActual.objects.filter(producto=OuterRef('pk')).values('producto').annotate(
+        total=Sum('cantidad_disponible')
+    ).values('total')
+    productos = Producto.objects.all()
+    if producto_ids is not None:
+        productos = productos.filter(id__in=producto_ids)
+    if solo_activos:
+        productos = productos.filter(estado='ACTIVO')
+    desincronizados = productos.annotate(
+        total_bodegas=Coalesce(
+            Subquery(total), Value(0),
+            output_field=DecimalField(max_digits=18, decimal_places=6),
+        )
+    ).exclude(stock_actual=F('total_bodegas')).values_list('id', flat=True).order_by('id')
+    desincronizados = list(desincronizados)
+
+    if desincronizados and not dry_run:
+        for inicio_lote in range(0, len(desincronizados), TAMANO_LOTE):
+            recalcular_totales_productos(desincronizados[inicio_lote:inicio_lote + TAMANO_LOTE])
+        marcar_seccion('stock')
+    return {'productos': len(desincronizados), 'duracion': time.perf_counter() - inicio}
+
+
+# Aprovisionamiento diferido desde las señales de maestros
+
+_estado = threading.local()
+
+
+@contextmanager
+def aprovisionamiento_suspendido():
+    """
+    Desactiva en el hilo actual la creación automática de StockActual al crear
+    productos o bodegas. Para cargas masivas, que luego llaman a
+    crear_stocks_faltantes() una sola vez.
+    """
+    anterior = getattr(_estado, 'suspendido', False)
+    _estado.suspendido = True
+    try:
+        yield
+    finally:
+        _estado.suspendido = anterior
+
+
+def aprovisionamiento_activo():
+    """Indica si las señales deben programar la creación de StockActual"""
+    if getattr(_estado, 'suspendido', False):
+        return False
+    return getattr(settings, 'INVENTARIO_APROVISIONAR_STOCK', True)
+
+
+def _aprovisionamiento_vacio():
+    return {'productos': set(), 'bodegas': set()}
+
+
+def programar_aprovisionamiento(producto_ids=(), bodega_ids=()):
+    """
+    Marca productos nuevos (a crear en todas las bodegas activas) y bodegas
+    nuevas (a crear para todos los productos activos) para aprovisionar su
+    StockActual al confirmar la transacción. Fuera de un bloque atómico se
+    procesa de inmediato.
+    """
+    producto_ids = list(producto_ids)
+    bodega_ids = list(bodega_ids)
+
+    def agregar(pendientes):
+        pendientes['productos'].update(producto_ids)
+        pendientes['bodegas'].update(bodega_ids)
+
+    al_confirmar('inventario.aprovisionamiento', agregar, _aprovisionamiento_vacio, procesar_aprovisionamiento)
+
+
+def aprovisionar(producto_ids=(), bodega_ids=(), tamano_lote=TAMANO_LOTE):
+    """Crea las filas de StockActual de los productos y bodegas indicados"""
+    creados = 0
+    if producto_ids:
+        creados += crear_stocks_faltantes(
+            producto_ids=sorted(producto_ids), solo_activos=False, tamano_lote=tamano_lote,
+        )['creados']
+    if bodega_ids:
+        creados += crear_stocks_faltantes(bodega_ids=sorted(bodega_ids), tamano_lote=tamano_lote)['creados']
+    return creados
+
+
+def procesar_aprovisionamiento(pendientes):
+    """
+    Aprovisiona lo marcado en la transacción. Si el lote estimado de pares
+    supera el umbral se encola para el comando aprovisionar_stock.
+    """
+    producto_ids = pendientes['productos']
+    bodega_ids = pendientes['bodegas']
+    if not producto_ids and not bodega_ids:
+        return
+
+    pares = 0
+    if producto_ids:
+        pares += len(producto_ids) * Bodega.objects.filter(activo=True).count()
+    if bodega_ids:
+        pares += len(bodega_ids) * Producto.objects.filter(estado='ACTIVO').count()
+
+    if pares > getattr(settings, 'INVENTARIO_APROVISIONAMIENTO_UMBRAL', 5000):
+        AprovisionamientoPendiente.objects.bulk_create(
+            [AprovisionamientoPendiente(producto_id=producto_id) for producto_id in sorted(producto_ids)]
+            + [AprovisionamientoPendiente(bodega_id=bodega_id) for bodega_id in sorted(bodega_ids)]
+        )
+    else:
+        aprovisionar(producto_ids, bodega_ids)
+
+
+def procesar_cola_aprovisionamiento(tamano_lote=TAMANO_LOTE):
+    """
+    Crea los StockActual de los productos y bodegas encolados en
+    AprovisionamientoPendiente, TAMANO_LOTE marcas y pares a la vez. Cada
+    marca se borra después de crear sus filas, así un corte a mitad de camino
+    solo deja marcas que se vuelven a procesar (los pares ya creados no son
+    faltantes).
+
+    Returns:
+        dict: marcas procesadas y registros creados
+    """
+    resultado = {'marcas': 0, 'creados': 0}
+    ultimo = 0
+    while True:
+        marcas = list(
+            AprovisionamientoPendiente.objects.filter(id__gt=ultimo).order_by('id').values_list(
+                'id', 'producto_id', 'bodega_id'
+            )[:tamano_lote]
+        )
+        if not marcas:
+            return resultado
+        ultimo = marcas[-1][0]
+        resultado['creados'] += aprovisionar(
+            {producto_id for _, producto_id, _ in marcas if producto_id},
+            {bodega_id for _, _, bodega_id in marcas if bodega_id},
+            tamano_lote,
+        )
+        AprovisionamientoPendiente.objects.filter(id__in=[marca[0] for marca in marcas]).delete()
+        resultado['marcas'] += len(marcas)
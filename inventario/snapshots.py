@@ -0,0 +1,189 @@
+"""
+Snapshots diarios de stock para consultas a una fecha
+
+StockSnapshot guarda el saldo al cierre del día de cada (producto, bodega) cuyo
+saldo cambió desde la foto anterior. El stock en una fecha D se obtiene de la
+última foto hasta D más el efecto neto de los movimientos confirmados
+posteriores a esa foto, en vez de re-sumar todo el libro de movimientos.
+
+El saldo se calcula por fecha_movimiento. Si se registran movimientos con fecha
+anterior a fotos ya generadas, hay que regenerarlas desde esa fecha
+(generar_snapshot_stock --desde ... --reconstruir).
+
+Sin una foto anterior, el punto de partida es el saldo archivado
+(SaldoArchivado) en vez de cero: los movimientos archivados y borrados de la
+tabla siguen contando. Para fechas dentro del período archivado hace falta
+una foto generada antes de archivar.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import MovimientoInventario, SaldoArchivado, StockSnapshot
+from .stock import CERO, deltas_por_clave
+
+
+TAMANO_LOTE = 1000
+
+
+class SnapshotPosteriorError(Exception):
+    """Ya existen snapshots en o después de la fecha que se quiere generar"""
+
+
+def fin_del_dia(fecha):
+    """Instante (con zona horaria) en que termina el día indicado"""
+    return timezone.make_aware(datetime.combine(fecha + timedelta(days=1), time.min))
+
+
+def ultima_fecha_snapshot(hasta):
+    """Fecha de la última foto generada hasta la fecha indicada (incluida) o None"""
+    return StockSnapshot.objects.filter(fecha__lte=hasta).aggregate(
+        ultima=Max('fecha')
+    )['ultima']
+
+
+def saldos_snapshot(fecha, producto_ids=None, bodega_ids=None):
+    """
+    Saldo de cada (producto, bodega) según su última fila hasta la fecha,
+    en una sola consulta.
+
+    Returns:
+        dict: {(producto_id, bodega_id): Decimal}
+    """
+    ultima = StockSnapshot.objects.filter(
+        producto=OuterRef('producto'),
+        bodega=OuterRef('bodega'),
+        fecha__lte=fecha,
+    ).order_by('-fecha').values('fecha')[:1]
+
+    filas = StockSnapshot.objects.filter(fecha__lte=fecha)
+    if producto_ids is not None:
+        filas = filas.filter(producto_id__in=producto_ids)
+    if bodega_ids is not None:
+        filas = filas.filter(bodega_id__in=bodega_ids)
+    filas = filas.filter(fecha=Subquery(ultima))
+
+    return {
+        (producto_id, bodega_id): cantidad
+        for producto_id, bodega_id, cantidad in filas.values_list('producto_id', 'bodega_id', 'cantidad')
+    }
+
+
+def saldos_apertura(producto_ids=None, bodega_ids=None):
+    """
+    Saldo archivado de cada (producto, bodega): punto de partida cuando no hay foto.
+
+    Returns:
+        dict: {(producto_id, bodega_id): Decimal}
+    """
+    filas = SaldoArchivado.objects.all()
+    if producto_ids is not None:
+        filas = filas.filter(producto_id__in=producto_ids)
+    if bodega_ids is not None:
+        filas = filas.filter(bodega_id__in=bodega_ids)
+    return {
+        (producto_id, bodega_id): cantidad
+        for producto_id, bodega_id, cantidad in filas.values_list('producto_id', 'bodega_id', 'cantidad')
+    }
+
+
+def _movimientos_entre(desde, hasta, producto_ids=None, bodega_ids=None):
+    """
+    Movimientos confirmados con fecha_movimiento posterior al cierre de `desde`
+    (si se indica) y hasta el cierre de `hasta`
+    """
+    movimientos = MovimientoInventario.objects.filter(
+        estado='CONFIRMADO',
+        fecha_movimiento__lt=fin_del_dia(hasta),
+    )
+    if desde is not None:
+        movimientos = movimientos.filter(fecha_movimiento__gte=fin_del_dia(desde))
+    if producto_ids is not None:
+        movimientos = movimientos.filter(producto_id__in=producto_ids)
+    if bodega_ids is not None:
+        movimientos = movimientos.filter(
+            Q(bodega_origen_id__in=bodega_ids) | Q(bodega_destino_id__in=bodega_ids)
+        )
+    return movimientos
+
+
+def stock_en_fecha(fecha, producto_ids=None, bodega_ids=None):
+    """
+    Stock de cada (producto, bodega) al cierre de la fecha indicada.
+
+    Args:
+        fecha: date a consultar
+        producto_ids / bodega_ids: filtros opcionales
+
+    Returns:
+        tuple: ({(producto_id, bodega_id): Decimal}, fecha de la foto usada o None)
+    """
+    base_fecha = ultima_fecha_snapshot(fecha)
+    if base_fecha:
+        saldos = saldos_snapshot(base_fecha, producto_ids, bodega_ids)
+    else:
+        saldos = saldos_apertura(producto_ids, bodega_ids)
+
+    netos = deltas_por_clave(_movimientos_entre(base_fecha, fecha, producto_ids, bodega_ids))
+    for clave, neto in netos.items():
+        if bodega_ids is not None and clave[1] not in bodega_ids:
+            continue
+        saldos[clave] = saldos.get(clave, CERO) + neto
+
+    return saldos, base_fecha
+
+
+def generar_snapshot(fecha, reconstruir=False):
+    """
+    Genera la foto de stock al cierre de la fecha.
+
+    Parte de la foto anterior, suma los movimientos del intervalo agrupados en
+    SQL y solo inserta (bulk_create) los pares cuyo saldo cambió.
+
+    Args:
+        fecha: date del cierre
+        reconstruir: borrar las fotos en o después de la fecha antes de generar
+
+    Returns:
+        int: cantidad de filas insertadas
+    """
+    with transaction.atomic():
+        posteriores = StockSnapshot.objects.filter(fecha__gte=fecha)
+        if reconstruir:
+            posteriores.delete()
+        elif posteriores.exists():
+            raise SnapshotPosteriorError(
+                f'Ya existen snapshots desde el {fecha}; use --reconstruir para regenerarlos'
+            )
+
+        anterior = ultima_fecha_snapshot(fecha - timedelta(days=1))
+        netos = deltas_por_clave(_movimientos_entre(anterior, fecha))
+        if anterior:
+            cambios = {clave: neto for clave, neto in netos.items() if neto != 0}
+            saldos = saldos_snapshot(anterior, producto_ids={p for p, _ in cambios}) if cambios else {}
+        else:
+            # Primera foto: incluye los pares que solo tienen saldo archivado
+            saldos = saldos_apertura()
+            cambios = {
+                clave: netos.get(clave, CERO)
+                for clave in set(netos) | set(saldos)
+                if saldos.get(clave, CERO) + netos.get(clave, CERO) != 0
+            }
+        if not cambios:
+            return 0
+
+        ahora = timezone.now()
+        filas = [
+            StockSnapshot(
+                fecha=fecha,
+                producto_id=producto_id,
+                bodega_id=bodega_id,
+                cantidad=saldos.get((producto_id, bodega_id), CERO) + neto,
+                created_at=ahora,
+            )
+            for (producto_id, bodega_id), neto in sorted(cambios.items())
+        ]
+        StockSnapshot.objects.bulk_create(filas, batch_size=TAMANO_LOTE)
+        return len(filas)
@@ -0,0 +1,391 @@
+"""
+Motor de aplicación de stock para movimientos confirmados
+
+Todas las modificaciones de StockActual.cantidad_disponible derivadas de
+movimientos pasan por aplicar_deltas(), que bloquea las filas afectadas con
+select_for_update en orden determinista (producto, bodega). Así dos cajas que
+registran salidas del mismo producto al mismo tiempo se serializan en vez de
+pisarse, y dos transferencias cruzadas no pueden provocar un deadlock.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, When
+from django.utils import timezone
+
+from .models import MovimientoInventario, StockActual
+
+
+# Tamaño máximo de claves por consulta de bloqueo / bulk_update
+TAMANO_LOTE = 500
+
+CERO = Decimal('0')
+
+
+class StockInsuficienteError(Exception):
+    """
+    Se lanza cuando aplicar un delta dejaría stock negativo en una bodega
+    """
+
+    def __init__(self, producto_id, bodega_id, disponible, solicitado):
+        self.producto_id = producto_id
+        self.bodega_id = bodega_id
+        self.disponible = disponible
+        self.solicitado = solicitado
+        super().__init__(
+            f'Stock insuficiente para el producto {producto_id} en la bodega {bodega_id}. '
+            f'Stock disponible: {disponible}, solicitado: {solicitado}'
+        )
+
+
+def _decimal(valor):
+    """Convierte cantidades (str, float, Decimal) a Decimal sin perder precisión"""
+    if isinstance(valor, Decimal):
+        return valor
+    return Decimal(str(valor))
+
+
+def deltas_movimiento(movimiento):
+    """
+    Traduce un movimiento a la lista de deltas (producto_id, bodega_id, delta, costo)
+    que produce sobre el stock.
+
+    - INGRESO: suma en bodega destino
+    - SALIDA: resta en bodega origen
+    - AJUSTE: suma la cantidad (con signo) en bodega destino o, si no hay, en origen
+    - DEVOLUCION: suma en bodega destino (cliente) o resta en origen (proveedor)
+    - TRANSFERENCIA: resta en origen y suma en destino
+
+    El costo con que se valoriza una entrada es el costo_unitario del INGRESO,
+    la clave de la bodega origen en una TRANSFERENCIA (entra a su costo
+    promedio) o None (al costo promedio vigente de la bodega).
+    """
+    cantidad = _decimal(movimiento.cantidad)
+    producto_id = movimiento.producto_id
+    origen_id = movimiento.bodega_origen_id
+    destino_id = movimiento.bodega_destino_id
+    tipo = movimiento.tipo_movimiento
+
+    if tipo == 'INGRESO' and destino_id:
+        costo = movimiento.costo_unitario
+        return [(producto_id, destino_id, cantidad, _decimal(costo) if costo is not None else None)]
+    if tipo == 'SALIDA' and origen_id:
+        return [(producto_id, origen_id, -cantidad, None)]
+    if tipo == 'AJUSTE' and (destino_id or origen_id):
+        return [(producto_id, destino_id or origen_id, cantidad, None)]
+    if tipo == 'DEVOLUCION':
+        if destino_id:
+            return [(producto_id, destino_id, cantidad, None)]
+        if origen_id:
+            return [(producto_id, origen_id, -cantidad, None)]
+    if tipo == 'TRANSFERENCIA' and origen_id and destino_id:
+        return [
+            (producto_id, origen_id, -cantidad, None),
+            (producto_id, destino_id, cantidad, (producto_id, origen_id)),
+        ]
+    return []
+
+
+def deltas_por_clave(movimientos):
+    """
+    Versión agrupada en SQL de deltas_movimiento(): suma el efecto neto de un
+    queryset de movimientos por (producto_id, bodega_id) con dos consultas
+    GROUP BY (lado destino y lado origen), sin traer los movimientos a memoria.
+
+    Returns:
+        dict: {(producto_id, bodega_id): Decimal} solo con las claves afectadas
+    """
+    destino = movimientos.filter(bodega_destino__isnull=False).filter(
+        Q(tipo_movimiento__in=['INGRESO', 'AJUSTE', 'DEVOLUCION']) |
+        Q(tipo_movimiento='TRANSFERENCIA', bodega_origen__isnull=False)
+    ).values('producto_id', 'bodega_destino_id').annotate(
+        total=Sum('cantidad')
+    ).values_list('producto_id', 'bodega_destino_id', 'total').order_by()
+
+    origen = movimientos.filter(bodega_origen__isnull=False).filter(
+        Q(tipo_movimiento='SALIDA') |
+        Q(tipo_movimiento='TRANSFERENCIA', bodega_destino__isnull=False) |
+        Q(tipo_movimiento__in=['AJUSTE', 'DEVOLUCION'], bodega_destino__isnull=True)
+    ).values('producto_id', 'bodega_origen_id').annotate(
+        total=Sum(Case(
+            When(tipo_movimiento='AJUSTE', then=F('cantidad')),
+            default=-F('cantidad'),
+        ))
+    ).values_list('producto_id', 'bodega_origen_id', 'total').order_by()
+
+    netos = {}
+    for producto_id, bodega_id, total in list(destino) + list(origen):
+        clave = (producto_id, bodega_id)
+        netos[clave] = netos.get(clave, CERO) + _decimal(total or 0)
+    return netos
+
+
+def _bloquear(claves):
+    """
+    Bloquea (SELECT ... FOR UPDATE) las filas de StockActual de las claves dadas,
+    en orden (producto_id, bodega_id). Devuelve {clave: StockActual}.
+    """
+    bloqueados = {}
+    for inicio in range(0, len(claves), TAMANO_LOTE):
+        grupo = claves[inicio:inicio + TAMANO_LOTE]
+        condicion = Q()
+        for producto_id, bodega_id in grupo:
+            condicion |= Q(producto_id=producto_id, bodega_id=bodega_id)
+        filas = StockActual.objects.select_for_update().filter(condicion).order_by(
+            'producto_id', 'bodega_id'
+        )
+        for stock in filas:
+            bloqueados[(stock.producto_id, stock.bodega_id)] = stock
+    return bloqueados
+
+
+def _bloquear_o_crear(claves):
+    """
+    Bloquea las filas existentes y crea (INSERT IGNORE) las que falten.
+
+    Las filas existentes se bloquean primero para no mezclar el bloqueo
+    compartido de un INSERT duplicado con el bloqueo exclusivo posterior.
+    """
+    bloqueados = _bloquear(claves)
+    faltantes = [clave for clave in claves if clave not in bloqueados]
+    if faltantes:
+        StockActual.objects.bulk_create(
+            [
+                StockActual(
+                    producto_id=producto_id,
+                    bodega_id=bodega_id,
+                    cantidad_disponible=0,
+                    cantidad_reservada=0,
+                    cantidad_transito=0,
+                )
+                for producto_id, bodega_id in faltantes
+            ],
+            ignore_conflicts=True,
+        )
+        bloqueados.update(_bloquear(faltantes))
+    return bloqueados
+
+
+def _totales_productos(netos):
+    """
+    Stock total {producto_id: (anterior, nuevo)} de los productos de netos,
+    leído dentro de la transacción que acaba de aplicarlos
+    """
+    por_producto = {}
+    for (producto_id, _), neto in netos.items():
+        por_producto[producto_id] = por_producto.get(producto_id, CERO) + neto
+
+    producto_ids = sorted(por_producto)
+    totales = {}
+    for inicio in range(0, len(producto_ids), TAMANO_LOTE):
+        totales.update(
+            StockActual.objects.filter(producto_id__in=producto_ids[inicio:inicio + TAMANO_LOTE])
+            .values('producto_id').annotate(total=Sum('cantidad_disponible'))
+            .values_list('producto_id', 'total').order_by()
+        )
+    return {
+        producto_id: (totales.get(producto_id, CERO) - neto, totales.get(producto_id, CERO))
+        for producto_id, neto in por_producto.items()
+    }
+
+
+def aplicar_deltas(deltas, fecha=None):
+    """
+    Aplica de forma atómica una colección de deltas (producto_id, bodega_id, delta)
+    o (producto_id, bodega_id, delta, costo) como los de deltas_movimiento().
+
+    Los deltas de una misma clave se suman antes de tocar la base de datos, las
+    filas se bloquean en orden determinista y se escriben con un único
+    bulk_update. Si alguna clave quedaría negativa, o una salida tomaría stock
+    reservado (cantidad_reservada), se lanza StockInsuficienteError y no se
+    aplica ningún cambio.
+
+    costo_promedio y valor_total se actualizan en el mismo bulk_update
+    recorriendo los deltas en su orden original (ver costos.valorizar).
+
+    Returns:
+        dict: {(producto_id, bodega_id): StockActual} con los registros actualizados
+    """
+    from .costos import valorizar
+    from .eventos import registrar_stock
+    from .resumen import registrar_cambios_stock
+
+    netos = {}
+    entradas = set()
+    salidas = set()
+    secuencia = []
+    for producto_id, bodega_id, delta, *costo in deltas:
+        delta = _decimal(delta)
+        if delta == 0:
+            continue
+        clave = (producto_id, bodega_id)
+        secuencia.append((clave, delta, costo[0] if costo else None))
+        netos[clave] = netos.get(clave, CERO) + delta
+        if delta > 0:
+            entradas.add(clave)
+        else:
+            salidas.add(clave)
+
+    if not netos:
+        return {}
+
+    fecha = fecha or timezone.now()
+    ahora = timezone.now()
+    claves = sorted(netos)
+
+    with transaction.atomic():
+        stocks = _bloquear_o_crear(claves)
+
+        for clave in claves:
+            stock = stocks[clave]
+            nuevo = stock.cantidad_disponible + netos[clave]
+            if nuevo < 0:
+                raise StockInsuficienteError(
+                    clave[0], clave[1], stock.cantidad_disponible, -netos[clave]
+                )
+            # Una salida no puede tomar stock apartado por reservas activas
+            if netos[clave] < 0 and nuevo < stock.cantidad_reservada:
+                raise StockInsuficienteError(
+                    clave[0], clave[1],
+                    max(stock.cantidad_disponible - stock.cantidad_reservada, CERO), -netos[clave]
+                )
+            stock.cantidad_disponible = nuevo
+            if clave in entradas:
+                stock.ultimo_ingreso = fecha
+            if clave in salidas:
+                stock.ultima_salida = fecha
+            stock.updated_at = ahora
+
+        saldos = {
+            clave: (stock.cantidad_disponible - netos[clave], stock.valor_total, stock.costo_promedio)
+            for clave, stock in stocks.items()
+        }
+        for clave, delta, costo in secuencia:
+            if isinstance(costo, tuple):
+                costo = saldos[costo][2] if costo in saldos else None
+            saldos[clave] = valorizar(*saldos[clave], delta, costo)
+        for clave in claves:
+            _, stocks[clave].valor_total, stocks[clave].costo_promedio = saldos[clave]
+
+        StockActual.objects.bulk_update(
+            [stocks[clave] for clave in claves],
+            ['cantidad_disponible', 'costo_promedio', 'valor_total',
+             'ultimo_ingreso', 'ultima_salida', 'updated_at'],
+            batch_size=TAMANO_LOTE,
+        )
+
+        registrar_stock(claves)
+        registrar_cambios_stock(
+            {
+                clave: (stocks[clave].cantidad_disponible - netos[clave], stocks[clave].cantidad_disponible)
+                for clave in claves
+            },
+            _totales_productos(netos),
+        )
+        procesar_cambios_stock(claves)
+
+    return stocks
+
+
+def aplicar_movimiento(movimiento):
+    """
+    Aplica sobre StockActual el efecto de un movimiento confirmado
+    """
+    from .resumen import registrar_movimientos
+
+    with transaction.atomic():
+        stocks = aplicar_deltas(
+            deltas_movimiento(movimiento),
+            fecha=movimiento.fecha_confirmacion or movimiento.fecha_movimiento,
+        )
+        registrar_movimientos([movimiento])
+    return stocks
+
+
+def procesar_cambios_stock(claves):
+    """
+    Ejecuta el recálculo posterior a un cambio de stock: el total del producto
+    una sola vez por producto afectado y las alertas de cada bodega tocada.
+
+    bulk_update no dispara post_save, por lo que este paso reemplaza a la
+    señal actualizar_stock_producto_desde_inventario para los cambios hechos
+    por el motor. Con INVENTARIO_RECALCULO_DIFERIDO activo solo se marcan las
+    claves y el recálculo se hace una vez al confirmar la transacción.
+    """
+    from maestros.models import Producto
+    from .recalculo import marcar_cambios, recalculo_diferido_activo
+    from .alertas import generar_alertas_stock_masivo
+    from .signals import actualizar_total_producto
+
+    if recalculo_diferido_activo():
+        marcar_cambios(claves)
+        return
+
+    productos = Producto.objects.in_bulk(sorted({producto_id for producto_id, _ in claves}))
+    for producto in productos.values():
+        actualizar_total_producto(producto)
+
+    generar_alertas_stock_masivo(claves=claves, solo_activos=False)
+
+
+def registrar_movimientos_masivos(lineas, usuario):
+    """
+    Crea y aplica en una sola transacción un conjunto de movimientos confirmados.
+
+    Los movimientos se insertan con bulk_create (sin disparar post_save por
+    cada uno) y su efecto se colapsa en un delta neto por (producto, bodega)
+    que se aplica con aplicar_deltas(). Si alguna bodega queda sin stock
+    suficiente se revierte el lote completo.
+
+    Args:
+        lineas: lista de dicts con los campos de MovimientoInventario usando ids
+            (tipo_movimiento, producto_id, cantidad, bodega_origen_id, ...)
+        usuario: usuario que registra y confirma los movimientos
+
+    Returns:
+        tuple: (movimientos creados, claves (producto_id, bodega_id) afectadas)
+    """
+    from maestros.models import Producto
+    from .resumen import registrar_movimientos
+
+    producto_ids = {linea['producto_id'] for linea in lineas}
+    unidades = dict(
+        Producto.objects.filter(id__in=producto_ids).values_list('id', 'uom_stock_id')
+    )
+
+    ahora = timezone.now()
+    movimientos = []
+    for linea in lineas:
+        cantidad = _decimal(linea['cantidad'])
+        costo_unitario = linea.get('costo_unitario')
+        movimientos.append(MovimientoInventario(
+            tipo_movimiento=linea['tipo_movimiento'],
+            fecha_movimiento=linea.get('fecha_movimiento') or ahora,
+            producto_id=linea['producto_id'],
+            proveedor_id=linea.get('proveedor_id'),
+            bodega_origen_id=linea.get('bodega_origen_id'),
+            bodega_destino_id=linea.get('bodega_destino_id'),
+            cantidad=cantidad,
+            unidad_medida_id=unidades[linea['producto_id']],
+            costo_unitario=costo_unitario,
+            costo_total=cantidad * _decimal(costo_unitario) if costo_unitario is not None else None,
+            lote_id=linea.get('lote_id'),
+            documento_referencia=linea.get('documento_referencia'),
+            motivo_ajuste=linea.get('motivo_ajuste'),
+            observaciones=linea.get('observaciones'),
+            usuario=usuario,
+            estado='CONFIRMADO',
+            fecha_confirmacion=ahora,
+            usuario_confirmacion=usuario,
+        ))
+
+    deltas = []
+    for movimiento in movimientos:
+        deltas.extend(deltas_movimiento(movimiento))
+
+    with transaction.atomic():
+        MovimientoInventario.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE)
+        stocks = aplicar_deltas(deltas, fecha=ahora)
+        registrar_movimientos(movimientos)
+
+    return movimientos, sorted(stocks)
@@ -26,6 +26,7 @@ urlpatterns = [
     
     # Historial
     path('historial/', views.historial_movimientos, name='historial_movimientos'),
+    path('kardex/exportar/', views.kardex_exportar, name='kardex_exportar'),
     
     # Alertas de stock
     path('alertas/', views.alerta_listar, name='alerta_listar'),
@@ -34,7 +35,10 @@ urlpatterns = [
     
     # API endpoints básicos
     path('api/stock-producto/', views.obtener_stock_producto, name='obtener_stock_producto'),
+    path('api/stock-lote/', views.stock_lote, name='stock_lote'),
+    path('api/stock-eventos/', views.stock_eventos, name='stock_eventos'),
     path('api/productos/search/', views.productos_search_api, name='productos_search_api'),
+    path('api/productos/ean/', views.producto_por_ean, name='producto_por_ean'),
     path('api/bodegas/', views.bodegas_api, name='bodegas_api'),
     path('api/proveedores/', views.proveedores_api, name='proveedores_api'),
 ]
\ No newline at end of file
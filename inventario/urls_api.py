@@ -5,7 +5,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .api_views import (
     MovimientoInventarioViewSet, StockActualViewSet, 
-    AlertaStockViewSet, BodegaViewSet, LoteViewSet
+    AlertaStockViewSet, BodegaViewSet, LoteViewSet, ReservaStockViewSet
 )
 
 # Router para endpoints automáticos
@@ -17,19 +17,24 @@ router.register(r'stock', StockActualViewSet, basename='stock')
 router.register(r'alertas', AlertaStockViewSet, basename='alerta')
 router.register(r'bodegas', BodegaViewSet, basename='bodega')
 router.register(r'lotes', LoteViewSet, basename='lote')
+router.register(r'reservas', ReservaStockViewSet, basename='reserva')
 
 # URLs generadas automáticamente:
 # /api/inventario/movimientos/              -> GET, POST
 # /api/inventario/movimientos/{id}/         -> GET, PUT, PATCH, DELETE
+# /api/inventario/movimientos/batch/        -> POST (carga masiva confirmada)
 # /api/inventario/movimientos/ingresos/     -> GET (personalizado)
 # /api/inventario/movimientos/salidas/      -> GET (personalizado)
 # /api/inventario/movimientos/estadisticas/ -> GET (personalizado)
+# /api/inventario/movimientos/archivo/      -> GET (movimientos archivados en disco)
 #
 # /api/inventario/stock/                    -> GET (solo lectura)
 # /api/inventario/stock/{id}/               -> GET (solo lectura)
 # /api/inventario/stock/bajo_minimo/        -> GET (personalizado)
 # /api/inventario/stock/sin_stock/          -> GET (personalizado)
 # /api/inventario/stock/resumen/            -> GET (personalizado)
+# /api/inventario/stock/historico/          -> GET (stock a una fecha, ?fecha=)
+# /api/inventario/stock/rango/              -> GET (saldos inicial/final, ?desde=&hasta=)
 #
 # /api/inventario/alertas/                  -> GET, POST
 # /api/inventario/alertas/{id}/             -> GET, PUT, PATCH, DELETE
@@ -44,6 +49,12 @@ router.register(r'lotes', LoteViewSet, basename='lote')
 # /api/inventario/lotes/                    -> GET, POST
 # /api/inventario/lotes/{id}/               -> GET, PUT, PATCH, DELETE
 # /api/inventario/lotes/por_vencer/         -> GET (personalizado)
+#
+# /api/inventario/reservas/                 -> GET (solo lectura)
+# /api/inventario/reservas/reservar/        -> POST (aparta stock con vencimiento)
+# /api/inventario/reservas/confirmar/       -> POST (convierte en salidas)
+# /api/inventario/reservas/liberar/         -> POST (devuelve el stock apartado)
+# /api/inventario/reservas/disponibilidad/  -> GET (?producto=&bodega=)
 
 urlpatterns = [
     path('', include(router.urls)),
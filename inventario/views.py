@@ -1,18 +1,23 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count, F
-from django.db import models
+from django.db.models import Q, F
+from django.db import models, transaction
 from django.utils import timezone
-from datetime import datetime, timedelta
+from django.views.decorators.http import require_http_methods
+from datetime import datetime
 import json
 
 from autenticacion.decorators import login_required_custom, permission_required, estado_usuario_activo
 from .models import (
     MovimientoInventario, Bodega, Lote, StockActual, AlertaStock
 )
+from .stock import StockInsuficienteError
+from .lotes import LotesInsuficientesError, registrar_salida_fefo
+from .paginacion import CursorInvalidoError, paginar_por_cursor
 from maestros.models import Producto, Proveedor
 
 
@@ -22,28 +27,14 @@ from maestros.models import Producto, Proveedor
 def dashboard_inventario(request):
     """Dashboard principal del módulo de inventario"""
     try:
-        # Estadísticas generales
-        total_productos = Producto.objects.filter(estado='ACTIVO').count()
-        total_bodegas = Bodega.objects.filter(activo=True).count()
-        
-        # Movimientos del mes actual
-        inicio_mes = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        movimientos_mes = MovimientoInventario.objects.filter(
-            fecha_movimiento__gte=inicio_mes,
-            estado='CONFIRMADO'
-        ).count()
-        
-        # Stock crítico
-        alertas_criticas = AlertaStock.objects.filter(
-            estado='ACTIVA',
-            prioridad='CRITICA'
-        ).count()
-        
-        # Productos con stock bajo
-        productos_stock_bajo = StockActual.objects.filter(
-            cantidad_disponible__lte=F('producto__stock_minimo'),
-            producto__estado='ACTIVO'
-        ).count() if hasattr(StockActual, 'objects') else 0
+        # Indicadores precalculados (una lectura de ResumenDashboard)
+        from .resumen import obtener_resumen
+        resumen = obtener_resumen()
+        total_productos = resumen['productos_activos']
+        total_bodegas = resumen['bodegas_activas']
+        movimientos_mes = resumen['movimientos_mes']
+        alertas_criticas = resumen['alertas_criticas']
+        productos_stock_bajo = resumen['stock_bajo']
         
         # Últimos movimientos
         ultimos_movimientos = MovimientoInventario.objects.select_related(
@@ -56,14 +47,7 @@ def dashboard_inventario(request):
         ).filter(estado='ACTIVA').order_by('-fecha_generacion')[:5]
         
         # Estadísticas de movimientos por tipo (últimos 30 días)
-        hace_30_dias = timezone.now() - timedelta(days=30)
-        stats_movimientos = MovimientoInventario.objects.filter(
-            fecha_movimiento__gte=hace_30_dias,
-            estado='CONFIRMADO'
-        ).values('tipo_movimiento').annotate(
-            total=Count('id'),
-            cantidad_total=Sum('cantidad')
-        )
+        stats_movimientos = resumen['stats_movimientos']
         
         context = {
             'total_productos': total_productos,
@@ -124,22 +108,26 @@ def registrar_ingreso(request):
             # Obtener el producto para la unidad de medida
             producto = Producto.objects.get(id=producto_id)
             
-            # Crear el movimiento
-            movimiento = MovimientoInventario.objects.create(
-                tipo_movimiento='INGRESO',
-                producto=producto,
-                cantidad=cantidad,
-                unidad_medida=producto.uom_stock,
-                costo_unitario=precio_unitario if precio_unitario else None,
-                costo_total=float(cantidad) * float(precio_unitario) if precio_unitario else None,
-                bodega_destino_id=bodega_id,
-                proveedor_id=proveedor_id,
-                documento_referencia=documento_referencia,
-                observaciones=observaciones,
-                usuario=request.user,
-                estado='CONFIRMADO',
-                fecha_movimiento=timezone.now()
-            )
+            # Crear el movimiento (el stock se aplica en la misma transacción)
+            ahora = timezone.now()
+            with transaction.atomic():
+                movimiento = MovimientoInventario.objects.create(
+                    tipo_movimiento='INGRESO',
+                    producto=producto,
+                    cantidad=cantidad,
+                    unidad_medida=producto.uom_stock,
+                    costo_unitario=precio_unitario if precio_unitario else None,
+                    costo_total=float(cantidad) * float(precio_unitario) if precio_unitario else None,
+                    bodega_destino_id=bodega_id,
+                    proveedor_id=proveedor_id,
+                    documento_referencia=documento_referencia,
+                    observaciones=observaciones,
+                    usuario=request.user,
+                    estado='CONFIRMADO',
+                    fecha_movimiento=ahora,
+                    fecha_confirmacion=ahora,
+                    usuario_confirmacion=request.user
+                )
             
             messages.success(request, f'Ingreso registrado correctamente: {movimiento.producto.nombre}')
             
@@ -235,21 +223,46 @@ def registrar_salida(request):
             # Obtener el producto para la unidad de medida
             producto = Producto.objects.get(id=producto_id)
             
-            # Crear el movimiento
-            movimiento = MovimientoInventario.objects.create(
-                tipo_movimiento='SALIDA',
-                producto=producto,
-                cantidad=cantidad,
-                unidad_medida=producto.uom_stock,
-                costo_unitario=precio_unitario if precio_unitario else None,
-                costo_total=float(cantidad) * float(precio_unitario) if precio_unitario else None,
-                bodega_origen_id=bodega_id,
-                documento_referencia=documento_referencia,
-                observaciones=observaciones,
-                usuario=request.user,
-                estado='CONFIRMADO',
-                fecha_movimiento=timezone.now()
-            )
+            # Crear el movimiento. El motor de stock vuelve a validar con la fila
+            # bloqueada; si otra caja vendió antes, se revierte el movimiento.
+            ahora = timezone.now()
+            try:
+                with transaction.atomic():
+                    if producto.control_por_lote:
+                        # Se reparte entre lotes FEFO: un movimiento por lote consumido
+                        movimiento = registrar_salida_fefo(
+                            producto, int(bodega_id), cantidad, request.user,
+                            costo_unitario=precio_unitario if precio_unitario else None,
+                            documento_referencia=documento_referencia,
+                            observaciones=observaciones,
+                            fecha_movimiento=ahora,
+                        )[0]
+                    else:
+                        movimiento = MovimientoInventario.objects.create(
+                            tipo_movimiento='SALIDA',
+                            producto=producto,
+                            cantidad=cantidad,
+                            unidad_medida=producto.uom_stock,
+                            costo_unitario=precio_unitario if precio_unitario else None,
+                            costo_total=float(cantidad) * float(precio_unitario) if precio_unitario else None,
+                            bodega_origen_id=bodega_id,
+                            documento_referencia=documento_referencia,
+                            observaciones=observaciones,
+                            usuario=request.user,
+                            estado='CONFIRMADO',
+                            fecha_movimiento=ahora,
+                            fecha_confirmacion=ahora,
+                            usuario_confirmacion=request.user
+                        )
+            except (StockInsuficienteError, LotesInsuficientesError) as e:
+                mensaje = f'Stock insuficiente para realizar la salida. Stock disponible: {e.disponible}'
+                if request.content_type == 'application/json':
+                    return JsonResponse({
+                        'success': False,
+                        'message': mensaje
+                    })
+                messages.error(request, mensaje)
+                return redirect('inventario:registrar_salida')
             
             messages.success(request, f'Salida registrada correctamente: {movimiento.producto.nombre}')
             
@@ -439,13 +452,12 @@ def historial_movimientos(request):
                 Q(observaciones__icontains=buscar)
             )
         
-        # Ordenar por fecha más reciente
-        movimientos = movimientos.order_by('-fecha_movimiento')
-        
-        # Paginación
-        paginator = Paginator(movimientos, 25)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        # Paginación por cursor sobre (fecha_movimiento, id), más reciente primero
+        contar = request.GET.get('contar') == '1'
+        try:
+            page_obj = paginar_por_cursor(movimientos, request.GET.get('cursor'), contar=contar)
+        except CursorInvalidoError:
+            page_obj = paginar_por_cursor(movimientos, contar=contar)
         
         # Datos adicionales
         productos = Producto.objects.filter(estado='ACTIVO')
@@ -460,6 +472,7 @@ def historial_movimientos(request):
             'is_paginated': page_obj.has_other_pages(),
             'page_obj': page_obj,
             'filtro_tipo': filtro_tipo,
+            'filtro_producto': filtro_producto,
             'filtro_bodega': filtro_bodega,
             'fecha_desde': fecha_desde,
             'fecha_hasta': fecha_hasta,
@@ -473,6 +486,36 @@ def historial_movimientos(request):
         return render(request, 'inventario/historial_movimientos.html', {})
 
 
+@login_required_custom
+@estado_usuario_activo
+@permission_required('inventario.view')
+def kardex_exportar(request):
+    """
+    Exporta el kardex de un producto (movimientos con saldo corrido por bodega)
+    en streaming. Parámetros: producto (requerido), bodega, fecha_desde,
+    fecha_hasta y formato=csv|ndjson.
+    """
+    from .kardex import FORMATOS_KARDEX, filas_kardex, lineas_kardex
+
+    producto = get_object_or_404(Producto, pk=request.GET.get('producto') or 0)
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS_KARDEX:
+        return JsonResponse({'error': f'Formato inválido: {formato}'}, status=400)
+
+    try:
+        bodega_id = int(request.GET['bodega']) if request.GET.get('bodega') else None
+        desde = datetime.strptime(request.GET['fecha_desde'], '%Y-%m-%d').date() if request.GET.get('fecha_desde') else None
+        hasta = datetime.strptime(request.GET['fecha_hasta'], '%Y-%m-%d').date() if request.GET.get('fecha_hasta') else None
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos. Use bodega=<id> y fechas YYYY-MM-DD'}, status=400)
+
+    filas = filas_kardex(producto.id, bodega_id=bodega_id, desde=desde, hasta=hasta)
+    tipo_contenido = 'application/x-ndjson' if formato == 'ndjson' else 'text/csv; charset=utf-8'
+    response = StreamingHttpResponse(lineas_kardex(filas, formato), content_type=tipo_contenido)
+    response['Content-Disposition'] = f'attachment; filename="kardex_{producto.sku}.{formato}"'
+    return response
+
+
 @login_required_custom
 @estado_usuario_activo
 @permission_required('inventario.add')
@@ -507,34 +550,113 @@ def alerta_resolver(request, pk):
 @estado_usuario_activo
 @permission_required('inventario.view')
 def obtener_stock_producto(request):
-    """API endpoint para obtener stock de un producto en una bodega"""
+    """
+    API endpoint para obtener el stock de un producto.
+    
+    Con bodega_id devuelve esa bodega (cantidad, stock_minimo, unidad_medida);
+    sin bodega_id, todas sus bodegas. En ambos casos incluye la lista
+    'stocks' por bodega que usa el formulario de movimientos.
+    """
+    from .consulta_stock import consulta_de_request
+    
     producto_id = request.GET.get('producto_id')
     bodega_id = request.GET.get('bodega_id')
     
-    if not producto_id or not bodega_id:
-        return JsonResponse({'error': 'Parámetros requeridos: producto_id y bodega_id'})
+    if not producto_id:
+        return JsonResponse({'error': 'Parámetro requerido: producto_id'}, status=400)
     
     try:
-        stock = StockActual.objects.filter(
-            producto_id=producto_id,
-            bodega_id=bodega_id
-        ).first()
-        
-        if stock:
-            return JsonResponse({
-                'cantidad': float(stock.cantidad_disponible),
-                'stock_minimo': float(stock.producto.stock_minimo or 0),
-                'unidad_medida': stock.producto.uom_stock.nombre if stock.producto.uom_stock else '',
-            })
+        consulta = consulta_de_request(request)
+        if bodega_id:
+            stocks, productos = consulta.obtener(pares=[(producto_id, bodega_id)])
         else:
-            return JsonResponse({
-                'cantidad': 0,
-                'stock_minimo': 0,
-                'unidad_medida': '',
-            })
-            
-    except Exception as e:
-        return JsonResponse({'error': str(e)})
+            stocks, productos = consulta.obtener(producto_ids=[producto_id])
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    
+    producto = productos.get(int(producto_id))
+    if producto is None:
+        return JsonResponse({'error': 'Producto no encontrado'}, status=404)
+    
+    return JsonResponse({
+        'cantidad': sum(stock['cantidad_disponible'] for stock in stocks),
+        'stock_minimo': producto['stock_minimo'],
+        'unidad_medida': producto['unidad_medida'],
+        'stocks': stocks,
+    })
+
+
+@login_required_custom
+@estado_usuario_activo
+@permission_required('inventario.view')
+@require_http_methods(["GET", "POST"])
+def stock_lote(request):
+    """
+    Stock de muchas líneas en una sola petición y una sola consulta.
+    
+    GET ?pares=1:2,3:2&productos=5,6 o POST JSON
+    {"pares": [[1, 2], [3, 2]], "productos": [5, 6]}: 'pares' son
+    (producto_id, bodega_id) y 'productos' pide todas las bodegas del
+    producto. Responde {"stocks": [...], "productos": {id: {...}}}; los
+    pares sin registro vienen en cero con existe=false.
+    """
+    from .consulta_stock import consulta_de_request, leer_claves
+    
+    if request.method == 'POST':
+        try:
+            datos = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'JSON inválido'}, status=400)
+    else:
+        datos = request.GET
+    
+    try:
+        pares, producto_ids = leer_claves(datos)
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Parámetros pares / productos inválidos'}, status=400)
+    
+    limite = getattr(settings, 'INVENTARIO_STOCK_LOTE_MAXIMO', 1000)
+    if len(pares) + len(producto_ids) > limite:
+        return JsonResponse({'error': f'Máximo {limite} claves por consulta'}, status=400)
+    
+    stocks, productos = consulta_de_request(request).obtener(pares, producto_ids)
+    return JsonResponse({'stocks': stocks, 'productos': productos})
+
+
+@login_required_custom
+@estado_usuario_activo
+@permission_required('inventario.view')
+def stock_eventos(request):
+    """
+    Stream SSE (text/event-stream) de cambios de stock y alertas.
+    
+    Parámetros opcionales ?producto= y ?bodega= (ids separados por coma).
+    Eventos 'stock' (cantidades vigentes de un producto en una bodega) y
+    'alerta'. Al reconectar, EventSource envía Last-Event-ID y el stream
+    continúa desde ese evento.
+    """
+    from .eventos import stream_eventos, ultimo_evento_id
+    
+    filtros = {}
+    for parametro in ('producto', 'bodega'):
+        try:
+            filtros[parametro] = {int(v) for v in request.GET.get(parametro, '').split(',') if v.strip()}
+        except ValueError:
+            return JsonResponse({'error': f'Parámetro {parametro} inválido'}, status=400)
+    
+    desde = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('desde')
+    try:
+        desde_id = int(desde) if desde else ultimo_evento_id()
+    except ValueError:
+        desde_id = ultimo_evento_id()
+    
+    response = StreamingHttpResponse(
+        stream_eventos(desde_id, filtros['producto'], filtros['bodega']),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 # API endpoints para formularios dinámicos
@@ -542,23 +664,44 @@ def obtener_stock_producto(request):
 @estado_usuario_activo
 @permission_required('inventario.view')
 def productos_search_api(request):
-    """API para búsqueda de productos"""
-    query = request.GET.get('q', '')
-    productos = Producto.objects.filter(
-        Q(nombre__icontains=query) | Q(sku__icontains=query),
-        estado='ACTIVO'
-    )[:20]
+    """
+    API para búsqueda de productos (autocompletado).
     
-    data = [{
-        'id': p.id,
-        'text': f"{p.sku} - {p.nombre}",
-        'nombre': p.nombre,
-        'sku': p.sku,
-        'unidad_medida': p.uom_stock.nombre if p.uom_stock else '',
-        'stock_minimo': float(p.stock_minimo or 0),
-    } for p in productos]
+    Responde desde el índice en memoria de maestros.autocompletar: prefijos de
+    SKU, EAN y palabras del nombre, sin consultar la base de datos. Un código
+    numérico de 8 a 14 dígitos se busca primero como EAN/UPC exacto.
+    """
+    from maestros.autocompletar import indice
     
-    return JsonResponse({'results': data})
+    query = request.GET.get('q', '').strip()
+    try:
+        limite = min(max(int(request.GET.get('limite', 20)), 1), 50)
+    except ValueError:
+        limite = 20
+    
+    if query.isdigit() and 8 <= len(query) <= 14:
+        producto = indice.por_ean(query)
+        if producto:
+            return JsonResponse({'results': [producto]})
+    
+    return JsonResponse({'results': indice.buscar(query, limite)})
+
+
+@login_required_custom
+@estado_usuario_activo
+@permission_required('inventario.view')
+def producto_por_ean(request):
+    """API para lectores de código de barras: producto activo con el EAN/UPC exacto"""
+    from maestros.autocompletar import indice
+    
+    codigo = request.GET.get('codigo', '').strip()
+    if not codigo:
+        return JsonResponse({'error': 'Parámetro requerido: codigo'}, status=400)
+    
+    producto = indice.por_ean(codigo)
+    if producto is None:
+        return JsonResponse({'error': 'Producto no encontrado'}, status=404)
+    return JsonResponse(producto)
 
 
 @login_required_custom
@@ -642,13 +785,12 @@ def movimiento_listar(request):
                 Q(observaciones__icontains=buscar)
             )
         
-        # Ordenar por fecha más reciente
-        movimientos = movimientos.order_by('-fecha_movimiento')
-        
-        # Paginación
-        paginator = Paginator(movimientos, 25)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        # Paginación por cursor sobre (fecha_movimiento, id), más reciente primero
+        contar = request.GET.get('contar') == '1'
+        try:
+            page_obj = paginar_por_cursor(movimientos, request.GET.get('cursor'), contar=contar)
+        except CursorInvalidoError:
+            page_obj = paginar_por_cursor(movimientos, contar=contar)
         
         # Datos para filtros
         productos = Producto.objects.filter(estado='ACTIVO').order_by('nombre')
@@ -792,23 +934,26 @@ def movimiento_confirmar(request, pk):
     """Confirmar movimiento de inventario"""
     if request.method == 'POST':
         try:
-            movimiento = get_object_or_404(MovimientoInventario, pk=pk)
-            
-            if movimiento.estado != 'PENDIENTE':
-                messages.error(request, 'Solo se pueden confirmar movimientos pendientes')
-                return redirect('inventario:movimiento_detalle', pk=pk)
-            
-            # Confirmar movimiento
-            movimiento.estado = 'CONFIRMADO'
-            movimiento.fecha_confirmacion = timezone.now()
-            movimiento.usuario_confirmacion = request.user
-            movimiento.save()
-            
-            # Aquí se ejecutaría la lógica de actualización de stock
-            # Por simplicidad, se omite en este ejemplo
+            with transaction.atomic():
+                # Bloquear el movimiento: dos confirmaciones simultáneas no deben aplicarlo dos veces
+                movimiento = get_object_or_404(
+                    MovimientoInventario.objects.select_for_update(), pk=pk
+                )
+                
+                if movimiento.estado != 'PENDIENTE':
+                    messages.error(request, 'Solo se pueden confirmar movimientos pendientes')
+                    return redirect('inventario:movimiento_detalle', pk=pk)
+                
+                # Confirmar movimiento (la señal aplica el stock dentro de la transacción)
+                movimiento.estado = 'CONFIRMADO'
+                movimiento.fecha_confirmacion = timezone.now()
+                movimiento.usuario_confirmacion = request.user
+                movimiento.save()
             
             messages.success(request, 'Movimiento confirmado exitosamente')
             
+        except StockInsuficienteError as e:
+            messages.error(request, f'No se puede confirmar el movimiento: {str(e)}')
         except Exception as e:
             messages.error(request, f'Error al confirmar movimiento: {str(e)}')
     
@@ -1015,13 +1160,11 @@ def alerta_regenerar(request):
     """Regenerar alertas de stock vía AJAX"""
     if request.method == 'POST':
         try:
-            from .signals import generar_alertas_stock, generar_alertas_vencimiento
-            from maestros.models import Producto
+            from .alertas import generar_alertas_stock_masivo
+            from .signals import generar_alertas_vencimiento
             
-            # Generar alertas de stock
-            productos = Producto.objects.filter(estado='ACTIVO')
-            for producto in productos:
-                generar_alertas_stock(producto)
+            # Generar alertas de stock de todos los productos activos
+            generar_alertas_stock_masivo()
             
             # Generar alertas de vencimiento
             generar_alertas_vencimiento()
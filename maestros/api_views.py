@@ -7,8 +7,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
 
+from .busqueda import buscar_productos
 from .models import Producto, Categoria, Marca, UnidadMedida, Proveedor
 from .serializers import (
     ProductoSerializer, ProductoListSerializer, 
@@ -90,11 +90,8 @@ class ProductoViewSet(viewsets.ModelViewSet):
         if not query:
             return Response({'error': 'Parámetro q requerido'}, status=400)
         
-        productos = self.get_queryset().filter(
-            Q(sku__icontains=query) | 
-            Q(nombre__icontains=query) |
-            Q(descripcion__icontains=query)
-        )
+        # Resultados ordenados por relevancia (maestros.busqueda)
+        productos = buscar_productos(self.get_queryset(), query)
         
         serializer = ProductoListSerializer(productos, many=True)
         return Response(serializer.data)
@@ -7,3 +7,8 @@ class MaestrosConfig(AppConfig):
     
     def ready(self):
         import maestros.signals
+        
+        from django.conf import settings
+        if getattr(settings, 'MAESTROS_AUTOCOMPLETAR_PRECARGAR', False):
+            from .autocompletar import precargar_en_segundo_plano
+            precargar_en_segundo_plano()
@@ -0,0 +1,361 @@
+"""
+Índice de autocompletado de productos (typeahead y lectores de código de barras)
+
+Mantiene en memoria del proceso, para los productos activos:
+
+- una lista ordenada de (clave, producto_id) con el SKU, el EAN y cada
+  palabra normalizada del nombre, recorrida por prefijo con bisect;
+- un diccionario EAN/UPC -> producto para la lectura exacta de códigos;
+- el resultado ya armado de cada producto (texto, unidad, stock mínimo),
+  así una búsqueda no toca la base de datos.
+
+El índice se carga al arrancar el proceso si MAESTROS_AUTOCOMPLETAR_PRECARGAR
+está activo, o en la primera consulta. Las señales de
+Producto y UnidadMedida lo actualizan al confirmar la transacción y publican
+una nueva versión en ConfiguracionSistema (CLAVE_VERSION); cada proceso
+compara esa versión como máximo cada MAESTROS_AUTOCOMPLETAR_VERIFICAR_SEGUNDOS
+y recarga el índice si otro worker lo cambió.
+"""
+import bisect
+import heapq
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from sistema.transacciones import al_confirmar
+from .busqueda import normalizar, palabras
+
+
+CLAVE_VERSION = 'MAESTROS_AUTOCOMPLETAR_VERSION'
+
+TAMANO_LOTE = 5000
+
+# Prefijos muy cortos coinciden con miles de productos: se ordenan a lo más
+# estos candidatos (los primeros en orden alfabético de la palabra)
+MAXIMO_CANDIDATOS = 2000
+
+# Orden de los resultados: código exacto, prefijo de código, palabra exacta, prefijo de palabra
+CODIGO_EXACTO, CODIGO_PREFIJO, PALABRA_EXACTA, PALABRA_PREFIJO = range(4)
+
+
+def clave_sku(sku):
+    """SKU normalizado y sin separadores: 'SKU-001' -> 'sku001'"""
+    return normalizar(sku).replace(' ', '')
+
+
+def _resultado(fila):
+    producto_id, sku, nombre, ean_upc, uom_nombre, stock_minimo = fila
+    return {
+        'id': producto_id,
+        'text': f"{sku} - {nombre}",
+        'nombre': nombre,
+        'sku': sku,
+        'ean_upc': ean_upc or '',
+        'unidad_medida': uom_nombre or '',
+        'stock_minimo': float(stock_minimo or 0),
+    }
+
+
+def _filas(producto_ids=None):
+    """Filas de productos activos leídas por lotes keyset, con la unidad ya unida"""
+    from .models import Producto
+
+    productos = Producto.objects.filter(estado='ACTIVO')
+    if producto_ids is not None:
+        productos = productos.filter(id__in=producto_ids)
+    ultimo = 0
+    while True:
+        filas = list(
+            productos.filter(id__gt=ultimo).order_by('id').values_list(
+                'id', 'sku', 'nombre', 'ean_upc', 'uom_stock__nombre', 'stock_minimo',
+            )[:TAMANO_LOTE]
+        )
+        if not filas:
+            return
+        ultimo = filas[-1][0]
+        yield from filas
+
+
+def version_publicada():
+    from sistema.models import ConfiguracionSistema
+
+    return ConfiguracionSistema.objects.filter(
+        clave=CLAVE_VERSION
+    ).values_list('valor', flat=True).first() or ''
+
+
+def publicar_version():
+    """
+    Registra una versión nueva del catálogo para que los demás procesos recarguen.
+
+    La versión se reemplaza con compare-and-swap sobre la leída: si otro
+    proceso publicó entre la lectura y la escritura, la anterior ya no
+    identifica el catálogo que tenía este proceso y se devuelve None en su
+    lugar (el índice local debe invalidarse, no adoptar la nueva).
+
+    Returns:
+        tuple: (versión anterior, o None si hubo otra publicación; versión nueva)
+    """
+    from sistema.models import ConfiguracionSistema
+
+    anterior = version_publicada()
+    version = uuid.uuid4().hex
+    configuraciones = ConfiguracionSistema.objects.filter(clave=CLAVE_VERSION)
+    if configuraciones.filter(valor=anterior).update(valor=version):
+        return anterior, version
+    if not anterior:
+        _, creada = ConfiguracionSistema.objects.get_or_create(
+            clave=CLAVE_VERSION,
+            defaults={
+                'valor': version,
+                'descripcion': 'Versión del índice de autocompletado de productos',
+                'tipo': 'STRING',
+                'categoria': 'MAESTROS',
+                'editable': False,
+            },
+        )
+        if creada:
+            return anterior, version
+    # Otro proceso publicó entretanto: igual se publica una versión posterior
+    # a este commit para que los demás recarguen lo que acaba de confirmarse
+    configuraciones.update(valor=version)
+    return None, version
+
+
+class IndicePrefijos:
+    """Índice de prefijos en memoria; seguro entre hilos del mismo proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._claves = []        # [(clave, producto_id)] ordenada
+        self._productos = {}     # producto_id -> (resultado, claves, nombre normalizado)
+        self._ean = {}           # ean_upc -> producto_id
+        self._sku = {}           # sku normalizado -> producto_id
+        self._por_nombre = None  # ids ordenados por nombre (consultas sin texto)
+        self._version = None
+        self._verificado = 0.0
+
+    # Carga y versión
+
+    def _cargar(self):
+        claves = []
+        productos = {}
+        ean = {}
+        sku = {}
+        for fila in _filas():
+            entrada = self._entrada(fila)
+            productos[fila[0]] = entrada
+            claves.extend((clave, fila[0]) for clave in entrada[1])
+            if fila[3]:
+                ean[fila[3]] = fila[0]
+            sku[clave_sku(fila[1])] = fila[0]
+        claves.sort()
+        self._claves, self._productos, self._ean, self._sku = claves, productos, ean, sku
+        self._por_nombre = None
+
+    @staticmethod
+    def _entrada(fila):
+        producto_id, sku, nombre, ean_upc = fila[:4]
+        claves = {clave_sku(sku)}
+        claves.update(palabras(nombre))
+        if ean_upc:
+            claves.add(ean_upc)
+        return _resultado(fila), tuple(sorted(claves)), normalizar(nombre)
+
+    def _asegurar_vigente(self):
+        """Carga el índice o lo recarga si otro proceso publicó una versión nueva"""
+        ahora = time.monotonic()
+        segundos = getattr(settings, 'MAESTROS_AUTOCOMPLETAR_VERIFICAR_SEGUNDOS', 5)
+        if self._version is not None and ahora - self._verificado < segundos:
+            return
+        version = version_publicada()
+        if version != self._version:
+            self._cargar()
+            self._version = version
+        self._verificado = ahora
+
+    def invalidar(self):
+        with self._lock:
+            self._version = None
+
+    def precargar(self):
+        """Carga el índice antes de la primera consulta (arranque de los workers)"""
+        with self._lock:
+            self._asegurar_vigente()
+
+    # Actualización local desde las señales
+
+    def _quitar(self, producto_id):
+        entrada = self._productos.pop(producto_id, None)
+        if entrada is None:
+            return
+        for clave in entrada[1]:
+            posicion = bisect.bisect_left(self._claves, (clave, producto_id))
+            if posicion < len(self._claves) and self._claves[posicion] == (clave, producto_id):
+                del self._claves[posicion]
+        resultado = entrada[0]
+        if resultado['ean_upc'] and self._ean.get(resultado['ean_upc']) == producto_id:
+            del self._ean[resultado['ean_upc']]
+        codigo = clave_sku(resultado['sku'])
+        if self._sku.get(codigo) == producto_id:
+            del self._sku[codigo]
+
+    def actualizar(self, producto_ids, anterior, version):
+        """
+        Vuelve a leer los productos indicados (los inactivos o borrados salen
+        del índice) y adopta la versión recién publicada por este proceso. Si
+        la versión anterior no era la cargada (o es None porque la publicación
+        se cruzó con otra), otro proceso cambió el catálogo entretanto y el
+        índice se recarga completo en la próxima consulta.
+        """
+        with self._lock:
+            if self._version is None:
+                return
+            if anterior is None or anterior != self._version:
+                self._version = None
+                return
+        filas = {fila[0]: fila for fila in _filas(producto_ids)}
+        with self._lock:
+            if self._version != anterior:
+                return
+            for producto_id in producto_ids:
+                self._quitar(producto_id)
+                fila = filas.get(producto_id)
+                if fila is None:
+                    continue
+                entrada = self._entrada(fila)
+                self._productos[producto_id] = entrada
+                for clave in entrada[1]:
+                    bisect.insort(self._claves, (clave, producto_id))
+                if fila[3]:
+                    self._ean[fila[3]] = producto_id
+                self._sku[clave_sku(fila[1])] = producto_id
+            self._por_nombre = None
+            self._version = version
+
+    # Consultas
+
+    def por_ean(self, codigo):
+        """Resultado del producto activo con ese EAN/UPC exacto, o None"""
+        codigo = (codigo or '').strip()
+        with self._lock:
+            self._asegurar_vigente()
+            producto_id = self._ean.get(codigo)
+            return self._productos[producto_id][0] if producto_id is not None else None
+
+    def _prefijo(self, termino):
+        """{producto_id: nivel} de las claves que empiezan con el término"""
+        encontrados = {}
+        posicion = bisect.bisect_left(self._claves, (termino,))
+        while posicion < len(self._claves) and len(encontrados) < MAXIMO_CANDIDATOS:
+            clave, producto_id = self._claves[posicion]
+            if not clave.startswith(termino):
+                break
+            resultado = self._productos[producto_id][0]
+            es_codigo = clave == resultado['ean_upc'] or self._sku.get(clave) == producto_id
+            if clave == termino:
+                nivel = CODIGO_EXACTO if es_codigo else PALABRA_EXACTA
+            else:
+                nivel = CODIGO_PREFIJO if es_codigo else PALABRA_PREFIJO
+            if nivel < encontrados.get(producto_id, PALABRA_PREFIJO + 1):
+                encontrados[producto_id] = nivel
+            posicion += 1
+        return encontrados
+
+    def _cantidad(self, termino):
+        """Claves que empiezan con el término (dos búsquedas binarias)"""
+        return (bisect.bisect_left(self._claves, (termino + '\uffff',))
+                - bisect.bisect_left(self._claves, (termino,)))
+
+    def _nivel(self, producto_id, termino):
+        resultado, claves, _ = self._productos[producto_id]
+        codigos = {clave_sku(resultado['sku']), resultado['ean_upc']}
+        mejor = PALABRA_PREFIJO
+        for clave in claves:
+            if clave.startswith(termino):
+                if clave == termino:
+                    nivel = CODIGO_EXACTO if clave in codigos else PALABRA_EXACTA
+                else:
+                    nivel = CODIGO_PREFIJO if clave in codigos else PALABRA_PREFIJO
+                mejor = min(mejor, nivel)
+        return mejor
+
+    def buscar(self, texto, limite=20):
+        """
+        Los `limite` mejores productos cuyas claves empiezan con cada palabra
+        del texto, ordenados por nivel de coincidencia y nombre. Sin texto,
+        los primeros productos por nombre.
+
+        Returns:
+            list: resultados listos para JSON
+        """
+        terminos = palabras(texto)
+        compacto = clave_sku(texto)
+
+        with self._lock:
+            self._asegurar_vigente()
+            if not terminos:
+                if self._por_nombre is None:
+                    self._por_nombre = sorted(self._productos, key=lambda p: (self._productos[p][2], p))
+                return [self._productos[producto_id][0] for producto_id in self._por_nombre[:limite]]
+            # SKU con separadores ('SKU-001') se buscan también sin espacios
+            candidatos = self._prefijo(compacto) if len(terminos) > 1 else {}
+            if not candidatos:
+                # Se recorre el término con menos claves; los demás se comprueban
+                # contra las claves de cada candidato
+                terminos = sorted(terminos, key=self._cantidad)
+                candidatos = self._prefijo(terminos[0])
+                for termino in terminos[1:]:
+                    candidatos = {
+                        producto_id: max(nivel, self._nivel(producto_id, termino))
+                        for producto_id, nivel in candidatos.items()
+                        if any(clave.startswith(termino) for clave in self._productos[producto_id][1])
+                    }
+            mejores = heapq.nsmallest(
+                limite, candidatos.items(),
+                key=lambda item: (item[1], self._productos[item[0]][2], item[0]),
+            )
+            return [self._productos[producto_id][0] for producto_id, _ in mejores]
+
+
+indice = IndicePrefijos()
+
+
+def precargar_en_segundo_plano():
+    """Hilo de arranque: carga el índice sin demorar el inicio del proceso"""
+    from django.db import DatabaseError, connection
+
+    def cargar():
+        try:
+            indice.precargar()
+        except DatabaseError:
+            # Base sin migrar (por ejemplo durante migrate): se carga en la primera consulta
+            pass
+        finally:
+            connection.close()
+
+    threading.Thread(target=cargar, name='precarga-autocompletar', daemon=True).start()
+
+
+# Mantenimiento desde las señales
+
+def _publicar_pendientes(producto_ids):
+    if not producto_ids:
+        return
+    anterior, version = publicar_version()
+    if None in producto_ids or anterior is None:
+        # Cambio que afecta a todo el índice (unidades de medida) o
+        # publicación cruzada con otro proceso: se recarga completo
+        indice.invalidar()
+    else:
+        indice.actualizar(producto_ids, anterior, version)
+
+
+def programar_actualizacion(producto_id=None):
+    """
+    Actualiza el índice y publica la versión al confirmar la transacción
+    (una sola vez por transacción). producto_id=None recarga todo el índice.
+    """
+    al_confirmar('maestros.autocompletar', lambda pendientes: pendientes.add(producto_id), set, _publicar_pendientes)
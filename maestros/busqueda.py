@@ -0,0 +1,359 @@
+"""
+Búsqueda de texto completo de productos
+
+Cada producto guarda en texto_busqueda un documento desnormalizado y sin
+acentos (SKU, EAN, nombre, modelo, marca, categoría y descripción), que se
+recalcula al guardarlo (señal pre_save) y al renombrar su categoría o marca.
+Así la búsqueda consulta una sola columna, sin los JOIN ni los LIKE '%...%'
+sobre siete campos.
+
+- MySQL: índice FULLTEXT sobre texto_busqueda (migración 0005) y
+  MATCH ... AGAINST en modo booleano: cada palabra es obligatoria y se busca
+  como prefijo (+palabra*), con la relevancia de MySQL como puntaje.
+- Otros motores (SQLite en desarrollo): índice invertido en memoria del
+  proceso (IndiceInvertido), cargado en la primera búsqueda, actualizado por
+  las señales al confirmar cada transacción y recargado cada
+  MAESTROS_BUSQUEDA_INDICE_SEGUNDOS para ver los cambios de otros procesos.
+
+buscar_productos() anota 'relevancia' en el queryset; con ordenar=True lo
+ordena por relevancia. El comando reindexar_busqueda_productos reconstruye
+los documentos tras cargas masivas con update() o SQL directo.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from sistema.transacciones import al_confirmar
+
+
+TAMANO_LOTE = 1000
+
+# Peso extra cuando el texto buscado es exactamente el SKU o el EAN
+PESO_CODIGO = 10.0
+
+# Palabras vacías de InnoDB que aparecen en nombres de productos: con + serían
+# obligatorias y el índice FULLTEXT no las contiene
+PALABRAS_VACIAS = frozenset({'a', 'de', 'en', 'la', 'y', 'the', 'of', 'and', 'with', 'for', 'con', 'por'})
+
+# innodb_ft_min_token_size: las palabras más cortas no entran al índice FULLTEXT
+LARGO_MINIMO_FULLTEXT = 3
+
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos ni signos: 'Pañal Bebé-XL' -> 'panal bebe xl'"""
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def palabras(texto):
+    """Palabras normalizadas de un texto, sin repetir y en orden"""
+    return list(dict.fromkeys(normalizar(texto).split()))
+
+
+def documento(sku, ean_upc, nombre, modelo, marca, categoria, descripcion):
+    """Documento de búsqueda de un producto (los códigos primero)"""
+    return ' '.join(
+        parte for parte in (
+            normalizar(valor) for valor in (sku, ean_upc, nombre, modelo, marca, categoria, descripcion)
+        ) if parte
+    )
+
+
+def documento_producto(producto):
+    """Documento de una instancia de Producto (usa categoria y marca ya cargadas si las hay)"""
+    from .models import Categoria, Marca
+
+    def nombre_relacion(campo, modelo):
+        relacionado_id = getattr(producto, f'{campo}_id')
+        if not relacionado_id:
+            return ''
+        cache = producto._state.fields_cache
+        if campo in cache and cache[campo] is not None and cache[campo].pk == relacionado_id:
+            return cache[campo].nombre
+        return modelo.objects.filter(pk=relacionado_id).values_list('nombre', flat=True).first() or ''
+
+    return documento(
+        producto.sku, producto.ean_upc, producto.nombre, producto.modelo,
+        nombre_relacion('marca', Marca), nombre_relacion('categoria', Categoria),
+        producto.descripcion,
+    )
+
+
+def reindexar(productos=None, tamano_lote=TAMANO_LOTE):
+    """
+    Recalcula texto_busqueda de los productos indicados (queryset; None = todos)
+    con lecturas por lotes keyset y bulk_update. Solo escribe los que cambian.
+
+    Returns:
+        dict: revisados, actualizados
+    """
+    from .models import Producto
+
+    if productos is None:
+        productos = Producto.objects.all()
+    resultado = {'revisados': 0, 'actualizados': 0}
+    ultimo = 0
+    while True:
+        filas = list(
+            productos.filter(id__gt=ultimo).order_by('id').values_list(
+                'id', 'sku', 'ean_upc', 'nombre', 'modelo', 'marca__nombre',
+                'categoria__nombre', 'descripcion', 'texto_busqueda',
+            )[:tamano_lote]
+        )
+        if not filas:
+            break
+        ultimo = filas[-1][0]
+        cambiados = []
+        for fila in filas:
+            texto = documento(*fila[1:8])
+            if texto != fila[8]:
+                cambiados.append(Producto(id=fila[0], texto_busqueda=texto))
+        if cambiados:
+            with transaction.atomic():
+                Producto.objects.bulk_update(cambiados, ['texto_busqueda'])
+            indice.actualizar({p.id: p.texto_busqueda for p in cambiados})
+        resultado['revisados'] += len(filas)
+        resultado['actualizados'] += len(cambiados)
+    return resultado
+
+
+def usa_fulltext():
+    motor = getattr(settings, 'MAESTROS_BUSQUEDA_MOTOR', 'auto')
+    if motor == 'auto':
+        return connection.vendor == 'mysql'
+    return motor == 'fulltext'
+
+
+def buscar_productos(productos, texto, ordenar=True, extra=None):
+    """
+    Filtra un queryset de Producto por el texto buscado y anota 'relevancia'.
+
+    Args:
+        productos: queryset base (con los filtros de la vista)
+        texto: lo que escribió el usuario
+        ordenar: ordenar por relevancia (y nombre como desempate)
+        extra: Q opcional que también acepta la fila aunque no coincida el
+               texto (por ejemplo precio igual a un número buscado)
+
+    Returns:
+        QuerySet
+    """
+    terminos = palabras(texto)
+    if not terminos:
+        return productos
+
+    exacto = texto.strip()
+    bonus = Case(
+        When(Q(sku__iexact=exacto) | Q(ean_upc=exacto), then=Value(PESO_CODIGO)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+    if usa_fulltext():
+        utiles = [t for t in terminos if t not in PALABRAS_VACIAS]
+        largos = [t for t in utiles if len(t) >= LARGO_MINIMO_FULLTEXT]
+        cortos = [t for t in utiles if len(t) < LARGO_MINIMO_FULLTEXT]
+        if largos:
+            consulta = ' '.join(f'+{t}*' for t in largos)
+        elif cortos:
+            consulta = None
+        else:
+            consulta = ' '.join(f'{t}*' for t in terminos)
+
+        if consulta:
+            tabla = connection.ops.quote_name(productos.model._meta.db_table)
+            coincidencia = RawSQL(
+                f'MATCH({tabla}.texto_busqueda) AGAINST (%s IN BOOLEAN MODE)', (consulta,),
+                output_field=FloatField(),
+            )
+            # El filtro usa MATCH solo, para que MySQL resuelva con el índice FULLTEXT
+            productos = productos.annotate(coincidencia=coincidencia, relevancia=coincidencia + bonus)
+            condicion = Q(coincidencia__gt=0)
+        else:
+            productos = productos.annotate(relevancia=bonus)
+            condicion = Q()
+        # Las palabras más cortas que innodb_ft_min_token_size no están en el
+        # índice: se exigen como prefijo de alguna palabra del documento
+        for termino in cortos:
+            condicion &= Q(texto_busqueda__startswith=termino) | Q(texto_busqueda__contains=f' {termino}')
+    else:
+        puntajes = indice.buscar(terminos)
+        if puntajes:
+            # CASE simple armado como texto: compilar un Case() de Django con
+            # cientos de When cuesta más que la consulta
+            tabla = connection.ops.quote_name(productos.model._meta.db_table)
+            ramas = ' '.join(['WHEN %s THEN %s'] * len(puntajes))
+            parametros = [valor for item in puntajes.items() for valor in item]
+            coincidencia = RawSQL(
+                f'CASE {tabla}.id {ramas} ELSE 0 END', parametros, output_field=FloatField(),
+            )
+        else:
+            coincidencia = Value(0.0, output_field=FloatField())
+        productos = productos.annotate(relevancia=coincidencia + bonus)
+        condicion = Q(id__in=list(puntajes))
+
+    if extra is not None:
+        condicion |= extra
+    productos = productos.filter(condicion)
+    if ordenar:
+        productos = productos.order_by('-relevancia', 'nombre')
+    return productos
+
+
+class IndiceInvertido:
+    """
+    Índice invertido en memoria: palabra -> {producto_id}, con la
+    lista ordenada de palabras para resolver prefijos con bisect. Las
+    consultas exigen todas las palabras (como +palabra* en FULLTEXT) y el
+    puntaje suma el idf de la mejor palabra encontrada para cada término (un
+    prefijo vale menos que la palabra completa).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._palabras = []
+        self._documentos = {}
+        self._cargado = 0.0
+
+    def _cargar(self):
+        from .models import Producto
+
+        postings = {}
+        documentos = {}
+        ultimo = 0
+        while True:
+            filas = list(
+                Producto.objects.filter(id__gt=ultimo).order_by('id').values_list(
+                    'id', 'texto_busqueda'
+                )[:TAMANO_LOTE * 10]
+            )
+            if not filas:
+                break
+            ultimo = filas[-1][0]
+            for producto_id, texto in filas:
+                tokens = set((texto or '').split())
+                documentos[producto_id] = tokens
+                for token in tokens:
+                    postings.setdefault(token, set()).add(producto_id)
+        self._postings = postings
+        self._palabras = sorted(postings)
+        self._documentos = documentos
+        self._cargado = time.monotonic()
+
+    def _vigente(self):
+        segundos = getattr(settings, 'MAESTROS_BUSQUEDA_INDICE_SEGUNDOS', 300)
+        return self._cargado and time.monotonic() - self._cargado < segundos
+
+    def invalidar(self):
+        with self._lock:
+            self._cargado = 0.0
+
+    def actualizar(self, documentos):
+        """Reemplaza (texto) o quita (None) documentos: {producto_id: texto o None}"""
+        with self._lock:
+            if not self._cargado:
+                return
+            for producto_id, texto in documentos.items():
+                for token in self._documentos.pop(producto_id, ()):
+                    lista = self._postings.get(token)
+                    if lista is not None:
+                        lista.discard(producto_id)
+                        if not lista:
+                            del self._postings[token]
+                            indice_palabra = bisect.bisect_left(self._palabras, token)
+                            if indice_palabra < len(self._palabras) and self._palabras[indice_palabra] == token:
+                                del self._palabras[indice_palabra]
+                if texto is None:
+                    continue
+                tokens = set(texto.split())
+                self._documentos[producto_id] = tokens
+                for token in tokens:
+                    if token not in self._postings:
+                        self._postings[token] = set()
+                        bisect.insort(self._palabras, token)
+                    self._postings[token].add(producto_id)
+
+    def _coincidencias(self, termino, total):
+        """{producto_id: puntaje} de los productos con palabras que empiezan con el término"""
+        palabras = []
+        inicio = bisect.bisect_left(self._palabras, termino)
+        for posicion in range(inicio, len(self._palabras)):
+            palabra = self._palabras[posicion]
+            if not palabra.startswith(termino):
+                break
+            lista = self._postings[palabra]
+            peso = math.log(1 + total / len(lista)) * (1.0 if palabra == termino else 0.8)
+            palabras.append((peso, lista))
+
+        # De menor a mayor peso: cada producto queda con el de su mejor palabra
+        resultado = {}
+        for peso, lista in sorted(palabras, key=lambda item: item[0]):
+            resultado.update(dict.fromkeys(lista, peso))
+        return resultado
+
+    def buscar(self, terminos):
+        """
+        Returns:
+            dict: {producto_id: puntaje} de los mejores MAESTROS_BUSQUEDA_MAXIMO
+        """
+        with self._lock:
+            if not self._vigente():
+                self._cargar()
+            total = len(self._documentos) or 1
+            resultado = None
+            # Primero los términos más largos, que suelen ser los más selectivos
+            for termino in sorted(terminos, key=len, reverse=True):
+                coincidencias = self._coincidencias(termino, total)
+                if resultado is None:
+                    resultado = coincidencias
+                else:
+                    if len(coincidencias) < len(resultado):
+                        resultado, coincidencias = coincidencias, resultado
+                    resultado = {
+                        producto_id: puntaje + coincidencias[producto_id]
+                        for producto_id, puntaje in resultado.items()
+                        if producto_id in coincidencias
+                    }
+                if not resultado:
+                    return {}
+
+        maximo = getattr(settings, 'MAESTROS_BUSQUEDA_MAXIMO', 1000)
+        if len(resultado) > maximo:
+            resultado = dict(heapq.nlargest(maximo, resultado.items(), key=lambda item: item[1]))
+        return {producto_id: round(puntaje, 6) for producto_id, puntaje in resultado.items()}
+
+
+indice = IndiceInvertido()
+
+
+# Mantenimiento desde las señales
+
+def _publicar_pendientes(documentos):
+    if documentos:
+        indice.actualizar(documentos)
+
+
+def programar_indice(producto_id, texto):
+    """Actualiza el índice en memoria al confirmar la transacción (texto None = borrado)"""
+    if usa_fulltext():
+        return
+
+    def agregar(pendientes):
+        pendientes[producto_id] = texto
+
+    al_confirmar('maestros.busqueda', agregar, dict, _publicar_pendientes)
@@ -0,0 +1,265 @@
+"""
+Consulta compartida de los listados de productos
+
+Los listados de productos (maestros:producto_listar, productos:lista y la
+tienda pública), sus exportaciones y los trabajos en segundo plano filtran y
+ordenan lo mismo, pero cada pantalla nombra distinto los parámetros
+(query / busqueda / q, orden / ordenar + direccion). ConsultaProductos los
+normaliza a una sola especificación con clave canónica:
+
+- queryset(campos) arma la consulta con el índice de búsqueda
+  (maestros.busqueda), select_related de las relaciones pedidas y .only()
+  con los campos que muestra cada pantalla.
+- contar() guarda el total en la caché de Django por clave canónica de los
+  filtros (el orden no cambia el total), así paginar o reordenar la misma
+  búsqueda no vuelve a contar. Las señales de Producto cambian la versión de
+  los conteos al confirmar cada escritura.
+
+Con la caché local por proceso (LocMemCache, la default) los demás procesos
+ven los cambios a más tardar en MAESTROS_LISTADO_CONTEO_SEGUNDOS.
+"""
+import hashlib
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q
+
+from .busqueda import buscar_productos, palabras
+from .models import Producto
+
+
+# Orden por parámetro en cada pantalla
+ORDEN_MAESTROS = {
+    'nombre': 'nombre',
+    'nombre_desc': '-nombre',
+    'sku': 'sku',
+    'sku_desc': '-sku',
+    'categoria': 'categoria__nombre',
+    'categoria_desc': '-categoria__nombre',
+    'marca': 'marca__nombre',
+    'marca_desc': '-marca__nombre',
+    'precio': 'precio_venta',
+    'precio_desc': '-precio_venta',
+    'stock': 'stock_minimo',
+    'stock_desc': '-stock_minimo',
+    'fecha': 'created_at',
+    'fecha_desc': '-created_at',
+}
+
+ORDEN_CATALOGO = {
+    'sku': 'sku',
+    'nombre': 'nombre',
+    'categoria': 'categoria__nombre',
+    'marca': 'marca__nombre',
+    'precio_venta': 'precio_venta',
+    'costo_estandar': 'costo_estandar',
+    'estado': 'estado',
+    'created_at': 'created_at'
+}
+
+ORDEN_TIENDA = {
+    'nombre': 'nombre',
+    'nombre_desc': '-nombre',
+    'precio': 'precio_venta',
+    'precio_desc': '-precio_venta',
+    'nuevo': '-created_at',
+}
+
+# Campos que muestra cada listado (las plantillas no deben pedir otros: cada
+# campo diferido es una consulta por fila)
+CAMPOS_MAESTROS = (
+    'sku', 'ean_upc', 'nombre', 'descripcion', 'imagen_url', 'precio_venta', 'stock_minimo', 'estado',
+    'categoria', 'categoria__nombre', 'marca', 'marca__nombre',
+)
+CAMPOS_CATALOGO = (
+    'sku', 'nombre', 'imagen_url', 'precio_venta', 'estado',
+    'categoria', 'categoria__nombre', 'marca', 'marca__nombre',
+)
+CAMPOS_TIENDA = (
+    'sku', 'nombre', 'descripcion', 'imagen', 'precio_venta', 'marca', 'marca__nombre',
+)
+
+CLAVE_VERSION = 'maestros:productos:conteos'
+
+
+def _entero(valor):
+    """Id de un filtro; vacío o inválido se ignora"""
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _clave(*partes):
+    return hashlib.sha1(repr(partes).encode()).hexdigest()
+
+
+class _Paginador(Paginator):
+    """Paginator con el total ya calculado (sin su propio COUNT)"""
+
+    def __init__(self, object_list, per_page, total, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.total = total
+
+    @property
+    def count(self):
+        return self.total
+
+
+class ConsultaProductos:
+    """
+    Filtros y orden de un listado de productos.
+
+    Args:
+        texto: lo buscado (índice de texto de maestros.busqueda)
+        numero: también acepta productos con ese precio de venta o stock mínimo
+        categoria, marca: ids
+        estado: estado exacto
+        venta: solo productos activos con precio (tienda)
+        orden: campos de order_by; None = relevancia si hay búsqueda, si no nombre
+    """
+
+    def __init__(self, texto='', numero=None, categoria=None, marca=None, estado='', venta=False, orden=None):
+        self.texto = (texto or '').strip()
+        self.palabras = palabras(self.texto)
+        self.numero = numero
+        self.categoria = categoria
+        self.marca = marca
+        self.estado = estado or ''
+        self.venta = venta
+        self.orden = tuple(orden) if orden else None
+
+    @classmethod
+    def de_maestros(cls, parametros):
+        """Parámetros de maestros:producto_listar (query, categoria, marca, estado, orden)"""
+        texto = (parametros.get('query') or '').strip()
+        try:
+            numero = Decimal(texto) if texto else None
+        except (ValueError, InvalidOperation):
+            numero = None
+        orden = None
+        if not texto or 'orden' in parametros:
+            orden = [ORDEN_MAESTROS.get(parametros.get('orden', 'nombre'), 'nombre')]
+        return cls(
+            texto, numero,
+            categoria=_entero(parametros.get('categoria')),
+            marca=_entero(parametros.get('marca')),
+            estado=parametros.get('estado', ''),
+            orden=orden,
+        )
+
+    @classmethod
+    def de_catalogo(cls, parametros):
+        """Parámetros de productos:lista (busqueda, categoria, marca, estado, ordenar, direccion)"""
+        texto = parametros.get('busqueda', '')
+        orden = None
+        if not texto or 'ordenar' in parametros:
+            campo = ORDEN_CATALOGO.get(parametros.get('ordenar', 'nombre'), 'nombre')
+            orden = [f'-{campo}' if parametros.get('direccion', 'asc') == 'desc' else campo]
+        return cls(
+            texto,
+            categoria=_entero(parametros.get('categoria')),
+            marca=_entero(parametros.get('marca')),
+            estado=parametros.get('estado', ''),
+            orden=orden,
+        )
+
+    @classmethod
+    def de_tienda(cls, parametros):
+        """Parámetros de la tienda pública (q, categoria, marca, orden)"""
+        texto = parametros.get('q', '')
+        orden = None
+        if not texto or 'orden' in parametros:
+            orden = [ORDEN_TIENDA.get(parametros.get('orden', 'nombre'), 'nombre')]
+        return cls(
+            texto,
+            categoria=_entero(parametros.get('categoria')),
+            marca=_entero(parametros.get('marca')),
+            venta=True,
+            orden=orden,
+        )
+
+    @property
+    def clave_filtros(self):
+        """Clave canónica de los filtros: misma clave, mismas filas"""
+        numero = None if self.numero is None else self.numero.normalize()
+        return _clave(tuple(self.palabras), numero, self.categoria, self.marca, self.estado, self.venta)
+
+    @property
+    def clave(self):
+        """Clave canónica de filtros y orden"""
+        return _clave(self.clave_filtros, self.orden_por())
+
+    def orden_por(self):
+        if self.orden:
+            return self.orden
+        return ('-relevancia', 'nombre') if self.palabras else ('nombre',)
+
+    def _filtrados(self):
+        productos = Producto.objects.all()
+
+        if self.venta:
+            productos = productos.filter(estado='ACTIVO', precio_venta__isnull=False, precio_venta__gt=0)
+
+        if self.texto:
+            extra = None
+            if self.numero is not None:
+                extra = Q(precio_venta=self.numero) | Q(stock_minimo=self.numero)
+            productos = buscar_productos(productos, self.texto, ordenar=False, extra=extra)
+
+        if self.categoria is not None:
+            productos = productos.filter(categoria_id=self.categoria)
+
+        if self.marca is not None:
+            productos = productos.filter(marca_id=self.marca)
+
+        if self.estado:
+            productos = productos.filter(estado=self.estado)
+
+        return productos
+
+    def queryset(self, campos=None):
+        """
+        Productos filtrados y ordenados. Con campos, solo carga esos campos
+        (.only()) y hace select_related de las relaciones que incluyen.
+        """
+        productos = self._filtrados()
+        if campos:
+            relaciones = sorted({campo.split('__')[0] for campo in campos if '__' in campo})
+            productos = productos.select_related(*relaciones).only(*campos)
+        return productos.order_by(*self.orden_por())
+
+    def contar(self):
+        """Total de productos con estos filtros, guardado en caché hasta la próxima escritura"""
+        clave = f'maestros:productos:conteo:{version_conteos()}:{self.clave_filtros}'
+        total = cache.get(clave)
+        if total is None:
+            total = self._filtrados().count()
+            cache.set(clave, total, getattr(settings, 'MAESTROS_LISTADO_CONTEO_SEGUNDOS', 300))
+        return total
+
+    def paginar(self, pagina, por_pagina, campos=None):
+        """Página pedida (Paginator.get_page) usando el total en caché"""
+        paginator = _Paginador(self.queryset(campos), por_pagina, self.contar())
+        return paginator.get_page(pagina)
+
+
+def version_conteos():
+    return cache.get_or_set(CLAVE_VERSION, time.time_ns, None)
+
+
+def invalidar_conteos():
+    """
+    Descarta todos los totales en caché. La versión es un instante y no un
+    contador, así si la caché la pierde la nueva nunca repite una anterior.
+    """
+    cache.set(CLAVE_VERSION, time.time_ns(), None)
+
+
+def programar_invalidacion():
+    """Invalida los totales al confirmar la transacción en curso"""
+    transaction.on_commit(invalidar_conteos)
@@ -0,0 +1,146 @@
+"""
+Filtros de los listados de maestros y sus exportaciones
+
+El listado en pantalla, la exportación directa y el trabajo de exportación en
+segundo plano (sistema.trabajos) interpretan los parámetros con las mismas
+funciones, así el archivo trae las mismas filas y el mismo orden que se ven en
+pantalla. `parametros` es el querystring del listado: request.GET o el dict
+guardado en el trabajo.
+"""
+from datetime import datetime
+
+from django.db.models import Count, Q
+
+from sistema.exportacion import Columna, Exportacion, fecha, numero, si_no, texto_o
+
+from .consultas import ConsultaProductos
+from .models import Categoria, Marca, Proveedor
+
+
+def filtrar_productos(parametros):
+    """Productos del listado de maestros, con su filtro y orden (ConsultaProductos.de_maestros)"""
+    return ConsultaProductos.de_maestros(parametros).queryset()
+
+
+def exportacion_productos(parametros, usuario):
+    columnas = [
+        Columna('SKU', 'sku', 15),
+        Columna('Nombre', 'nombre', 35),
+        Columna('Categoría', texto_o('categoria__nombre', ''), 20),
+        Columna('Marca', texto_o('marca__nombre', ''), 20),
+        Columna('Precio Venta', numero('precio_venta'), 15, 'moneda'),
+        Columna('Stock Mínimo', numero('stock_minimo'), 12, 'numero'),
+        Columna('UOM Compra', texto_o('uom_compra__codigo', ''), 12),
+        Columna('UOM Venta', texto_o('uom_venta__codigo', ''), 12),
+        Columna('UOM Stock', texto_o('uom_stock__codigo', ''), 12),
+        Columna('Estado', 'estado', 12),
+        Columna('Perecible', si_no('perishable'), 10, 'centro'),
+        Columna('Control Lote', si_no('control_por_lote'), 12, 'centro'),
+        Columna('Control Serie', si_no('control_por_serie'), 13, 'centro'),
+        Columna('Fecha Creación', fecha('created_at'), 18),
+    ]
+    filas = filtrar_productos(parametros).values(
+        'sku', 'nombre', 'categoria__nombre', 'marca__nombre', 'precio_venta', 'stock_minimo',
+        'uom_compra__codigo', 'uom_venta__codigo', 'uom_stock__codigo', 'estado',
+        'perishable', 'control_por_lote', 'control_por_serie', 'created_at',
+    )
+    exportado_por = usuario.get_full_name() or usuario.username
+
+    def pie(total):
+        return [
+            f"Total de productos: {total}",
+            f"Fecha de exportación: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}",
+            f"Exportado por: {exportado_por}",
+        ]
+
+    return Exportacion(
+        filas, columnas, 'productos_dulceria_lilis', hoja='Productos', pie=pie, color_encabezado='D32F2F',
+    )
+
+
+def filtrar_proveedores(parametros):
+    """Proveedores del listado (query sobre RUT, razón social y nombre de fantasía; estado)"""
+    query = parametros.get('query', '')
+    estado = parametros.get('estado', '')
+
+    proveedores = Proveedor.objects.all().order_by('razon_social')
+
+    if query:
+        proveedores = proveedores.filter(
+            Q(rut_nif__icontains=query) |
+            Q(razon_social__icontains=query) |
+            Q(nombre_fantasia__icontains=query)
+        )
+
+    if estado:
+        proveedores = proveedores.filter(estado=estado)
+
+    return proveedores
+
+
+def exportacion_proveedores(parametros, usuario):
+    filas = filtrar_proveedores(parametros).annotate(
+        total_productos=Count('productos')
+    ).values(
+        'id', 'razon_social', 'rut_nif', 'email', 'telefono', 'direccion', 'ciudad', 'pais',
+        'contacto_principal_nombre', 'estado', 'condiciones_pago', 'total_productos',
+        'created_at', 'updated_at',
+    )
+    condiciones_pago = dict(Proveedor.CONDICIONES_PAGO_CHOICES)
+
+    columnas = [
+        Columna('ID', 'id', 8, 'numero'),
+        Columna('Razón Social', 'razon_social', 35),
+        Columna('RUT/NIF', 'rut_nif', 15),
+        Columna('Email', 'email', 30),
+        Columna('Teléfono', texto_o('telefono', 'Sin teléfono'), 16),
+        Columna('Dirección', texto_o('direccion', 'Sin dirección'), 35),
+        Columna('Ciudad', texto_o('ciudad', 'Sin ciudad'), 18),
+        Columna('País', 'pais', 12),
+        Columna('Código Postal', lambda fila: 'Sin código postal', 18),  # No existe en el modelo
+        Columna('Contacto Principal', texto_o('contacto_principal_nombre', 'Sin contacto'), 25),
+        Columna('Estado', lambda fila: 'Activo' if fila['estado'] == 'ACTIVO' else 'Inactivo', 12),
+        Columna('Condiciones de Pago',
+                lambda fila: condiciones_pago.get(fila['condiciones_pago'], fila['condiciones_pago']), 20),
+        Columna('Productos Asociados', 'total_productos', 20, 'numero'),
+        Columna('Fecha Creación', fecha('created_at'), 18),
+        Columna('Última Modificación', fecha('updated_at'), 20),
+    ]
+    return Exportacion(filas, columnas, 'proveedores', hoja='Proveedores')
+
+
+def exportacion_marcas(parametros, usuario):
+    filas = Marca.objects.annotate(
+        total_productos=Count('productos')
+    ).order_by('nombre').values('id', 'nombre', 'descripcion', 'activo', 'total_productos', 'created_at')
+
+    columnas = [
+        Columna('ID', 'id', 8, 'numero'),
+        Columna('Nombre', 'nombre', 30),
+        Columna('Descripción', texto_o('descripcion', 'Sin descripción'), 50),
+        Columna('Estado', lambda fila: 'Activa' if fila['activo'] else 'Inactiva', 12),
+        Columna('Productos Asociados', 'total_productos', 20, 'numero'),
+        Columna('Fecha Creación', fecha('created_at'), 18),
+        Columna('Última Modificación', lambda fila: 'Sin fecha modificación', 22),  # No existe campo fecha_modificacion
+    ]
+    return Exportacion(filas, columnas, 'marcas', hoja='Marcas')
+
+
+def exportacion_categorias(parametros, usuario):
+    filas = Categoria.objects.annotate(
+        total_productos=Count('productos')
+    ).order_by('nombre').values(
+        'id', 'nombre', 'descripcion', 'categoria_padre__nombre', 'activo', 'total_productos', 'created_at',
+    )
+
+    columnas = [
+        Columna('ID', 'id', 8, 'numero'),
+        Columna('Nombre', 'nombre', 30),
+        Columna('Descripción', texto_o('descripcion', 'Sin descripción'), 50),
+        Columna('Categoría Padre', texto_o('categoria_padre__nombre', 'Categoría Principal'), 25),
+        Columna('Estado', lambda fila: 'Activa' if fila['activo'] else 'Inactiva', 12),
+        Columna('Productos Asociados', 'total_productos', 20, 'numero'),
+        Columna('Fecha Creación', fecha('created_at'), 18),
+        Columna('Última Modificación', lambda fila: 'Sin fecha modificación', 22),  # No existe campo fecha_modificacion
+    ]
+    return Exportacion(filas, columnas, 'categorias', hoja='Categorías')
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from maestros.busqueda import indice, reindexar
+from maestros.consultas import invalidar_conteos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el documento de búsqueda (texto_busqueda) de los productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=1000,
+            help='Productos leídos y actualizados por lote',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recalculando documentos de búsqueda...')
+        inicio = time.perf_counter()
+        resultado = reindexar(tamano_lote=options['tamano_lote'])
+        indice.invalidar()
+        invalidar_conteos()
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['actualizados']} de {resultado['revisados']} productos actualizados "
+            f"({time.perf_counter() - inicio:.2f}s)"
+        ))
@@ -24,26 +24,41 @@ class Command(BaseCommand):
             action='store_true',
             help='Ejecuta todas las operaciones de sincronización',
         )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo informa lo que se haría, sin modificar nada',
+        )
 
     def handle(self, *args, **options):
         if options['todo']:
             options['crear_stocks'] = True
             options['sincronizar'] = True
         
+        dry_run = options['dry_run']
+        
         with transaction.atomic():
             if options['crear_stocks']:
                 self.stdout.write('Creando registros de stock faltantes...')
-                stocks_creados = crear_stocks_faltantes()
-                self.stdout.write(
-                    self.style.SUCCESS(f'Se crearon {stocks_creados} registros de stock')
-                )
+                resultado = crear_stocks_faltantes(dry_run=dry_run)
+                tiempos = resultado['tiempos']
+                if dry_run:
+                    mensaje = f"Faltan {resultado['faltantes']} registros de stock ({tiempos['consulta']:.2f}s)"
+                else:
+                    mensaje = (
+                        f"Se crearon {resultado['creados']} registros de stock "
+                        f"(consulta {tiempos['consulta']:.2f}s, escritura {tiempos['escritura']:.2f}s)"
+                    )
+                self.stdout.write(self.style.SUCCESS(mensaje))
             
             if options['sincronizar']:
                 self.stdout.write('Sincronizando stocks...')
-                sincronizar_todos_los_stocks()
-                self.stdout.write(
-                    self.style.SUCCESS('Stocks sincronizados correctamente')
-                )
+                totales = sincronizar_todos_los_stocks(dry_run=dry_run)
+                if dry_run:
+                    mensaje = f"{totales['productos']} productos con stock desincronizado"
+                else:
+                    mensaje = f"Stocks sincronizados correctamente ({totales['productos']} productos corregidos)"
+                self.stdout.write(self.style.SUCCESS(f"{mensaje} ({totales['duracion']:.2f}s)"))
         
         # Mostrar resumen final
         productos_count = Producto.objects.filter(estado='ACTIVO').count()
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.24 on 2026-10-17 12:13
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Copia de maestros.busqueda.normalizar/documento al crear la migración: la
+# migración no debe cambiar si el módulo cambia después
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar(texto):
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def documento(*valores):
+    return ' '.join(parte for parte in (normalizar(valor) for valor in valores) if parte)
+
+
+def llenar_texto_busqueda(apps, schema_editor):
+    Producto = apps.get_model('maestros', 'Producto')
+    ultimo = 0
+    while True:
+        filas = list(
+            Producto.objects.filter(id__gt=ultimo).order_by('id').values_list(
+                'id', 'sku', 'ean_upc', 'nombre', 'modelo', 'marca__nombre',
+                'categoria__nombre', 'descripcion',
+            )[:1000]
+        )
+        if not filas:
+            break
+        ultimo = filas[-1][0]
+        Producto.objects.bulk_update(
+            [Producto(id=fila[0], texto_busqueda=documento(*fila[1:])) for fila in filas],
+            ['texto_busqueda'],
+        )
+
+
+def crear_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE productos ADD FULLTEXT INDEX productos_texto_busqueda_ft (texto_busqueda)'
+        )
+
+
+def borrar_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('ALTER TABLE productos DROP INDEX productos_texto_busqueda_ft')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maestros', '0004_producto_dias_vencimiento_producto_meses_vencimiento_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='texto_busqueda',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Documento de búsqueda sin acentos, recalculado al guardar'),
+        ),
+        migrations.RunPython(llenar_texto_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_fulltext, borrar_indice_fulltext),
+    ]
@@ -146,6 +146,11 @@ class Producto(models.Model):
     ficha_tecnica_url = models.URLField(max_length=500, null=True, blank=True)
     
     estado = models.CharField(max_length=15, choices=ESTADO_CHOICES, default='ACTIVO')
+    
+    # Búsqueda (ver maestros.busqueda)
+    texto_busqueda = models.TextField(blank=True, default='', editable=False,
+                                      help_text='Documento de búsqueda sin acentos, recalculado al guardar')
+    
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
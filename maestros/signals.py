@@ -1,56 +1,121 @@
 from django.db import models
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.db import transaction
-from .models import Producto
+from .models import Categoria, Marca, Producto, UnidadMedida
+from . import autocompletar, busqueda, consultas
 from inventario.models import StockActual, Bodega
+from inventario.sincronizacion import aprovisionamiento_activo, programar_aprovisionamiento
 
 
 @receiver(post_save, sender=Producto)
 def crear_stock_inicial_producto(sender, instance, created, **kwargs):
     """
-    Cuando se crea un nuevo producto, crear registros de stock en todas las bodegas activas
+    Cuando se crea un nuevo producto, crear registros de stock en todas las bodegas activas.
+    Se hace en lote al confirmar la transacción (ver inventario.sincronizacion).
     """
-    if created:
-        # Obtener todas las bodegas activas
-        bodegas_activas = Bodega.objects.filter(activo=True)
-        
-        # Crear registros de stock para cada bodega
-        for bodega in bodegas_activas:
-            StockActual.objects.get_or_create(
-                producto=instance,
-                bodega=bodega,
-                defaults={
-                    'cantidad_disponible': 0,
-                    'cantidad_reservada': 0,
-                    'cantidad_transito': 0,
-                }
-            )
+    if created and aprovisionamiento_activo():
+        programar_aprovisionamiento(producto_ids=[instance.pk])
 
 
 @receiver(post_save, sender=Bodega)
 def crear_stock_productos_nueva_bodega(sender, instance, created, **kwargs):
     """
-    Cuando se crea una nueva bodega, crear registros de stock para todos los productos activos
+    Cuando se crea una nueva bodega, crear registros de stock para todos los productos activos.
+    Con muchos productos se encola para el comando aprovisionar_stock.
     """
-    if created and instance.activo:
-        # Obtener todos los productos activos
-        productos_activos = Producto.objects.filter(estado='ACTIVO')
-        
-        # Crear registros de stock para cada producto
-        stock_records = []
-        for producto in productos_activos:
-            stock_record, created_stock = StockActual.objects.get_or_create(
-                producto=producto,
-                bodega=instance,
-                defaults={
-                    'cantidad_disponible': 0,
-                    'cantidad_reservada': 0,
-                    'cantidad_transito': 0,
-                }
-            )
-            if created_stock:
-                stock_records.append(stock_record)
+    if created and instance.activo and aprovisionamiento_activo():
+        programar_aprovisionamiento(bodega_ids=[instance.pk])
+
+
+# Campos que forman el documento de búsqueda del producto
+CAMPOS_BUSQUEDA = {'sku', 'ean_upc', 'nombre', 'modelo', 'descripcion', 'categoria', 'marca'}
+
+
+@receiver(pre_save, sender=Producto)
+def preparar_texto_busqueda(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Recalcula el documento de búsqueda en los guardados completos"""
+    if raw or update_fields is not None:
+        return
+    instance.texto_busqueda = busqueda.documento_producto(instance)
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """
+    Mantiene el índice de búsqueda. Los guardados con update_fields que tocan
+    campos del documento lo recalculan con un UPDATE de una columna; los demás
+    (stock_actual, costo_promedio...) no lo tocan.
+    """
+    if raw:
+        return
+    if update_fields is not None:
+        if not CAMPOS_BUSQUEDA.intersection(update_fields) or 'texto_busqueda' in update_fields:
+            return
+        instance.texto_busqueda = busqueda.documento_producto(instance)
+        Producto.objects.filter(pk=instance.pk).update(texto_busqueda=instance.texto_busqueda)
+    busqueda.programar_indice(instance.pk, instance.texto_busqueda)
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, **kwargs):
+    busqueda.programar_indice(instance.pk, None)
+
+
+# Campos que muestra el autocompletado (maestros.autocompletar)
+CAMPOS_AUTOCOMPLETAR = {'sku', 'ean_upc', 'nombre', 'uom_stock', 'stock_minimo', 'estado'}
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def actualizar_autocompletar(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Actualiza el índice de autocompletado y publica su versión al confirmar"""
+    if raw or (update_fields is not None and not CAMPOS_AUTOCOMPLETAR.intersection(update_fields)):
+        return
+    autocompletar.programar_actualizacion(instance.pk)
+
+
+# Campos que deciden en qué listados aparece un producto y cuántos hay
+# (totales en caché de maestros.consultas)
+CAMPOS_LISTADO = CAMPOS_BUSQUEDA | {'texto_busqueda', 'estado', 'precio_venta', 'stock_minimo'}
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_conteos_listado(sender, instance, update_fields=None, **kwargs):
+    """Descarta los totales de los listados al confirmar (incluye cargas de fixtures)"""
+    if update_fields is not None and not CAMPOS_LISTADO.intersection(update_fields):
+        return
+    consultas.programar_invalidacion()
+
+
+@receiver(post_save, sender=UnidadMedida)
+def recargar_autocompletar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        autocompletar.programar_actualizacion()
+
+
+@receiver(pre_save, sender=Categoria)
+@receiver(pre_save, sender=Marca)
+def recordar_nombre_anterior(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._nombre_anterior = sender.objects.filter(pk=instance.pk).values_list('nombre', flat=True).first()
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=Marca)
+def reindexar_por_nombre(sender, instance, created, raw=False, **kwargs):
+    """Al renombrar una categoría o marca se recalculan los documentos de sus productos"""
+    if created or raw or getattr(instance, '_nombre_anterior', instance.nombre) == instance.nombre:
+        return
+    campo = 'categoria_id' if sender is Categoria else 'marca_id'
+    productos = Producto.objects.filter(**{campo: instance.pk})
+
+    def reindexar():
+        busqueda.reindexar(productos)
+        consultas.invalidar_conteos()
+
+    transaction.on_commit(reindexar)
 
 
 def sincronizar_stock_producto(producto):
@@ -70,37 +135,20 @@ def sincronizar_stock_producto(producto):
     return total_stock
 
 
-def sincronizar_todos_los_stocks():
+def sincronizar_todos_los_stocks(dry_run=False):
     """
-    Función utilitaria para sincronizar todos los stocks
+    Función utilitaria para sincronizar todos los stocks con un UPDATE agrupado
     """
-    from django.db import models
+    from inventario.sincronizacion import sincronizar_totales
     
-    productos = Producto.objects.filter(estado='ACTIVO')
-    for producto in productos:
-        sincronizar_stock_producto(producto)
+    return sincronizar_totales(dry_run=dry_run)
 
 
-def crear_stocks_faltantes():
+def crear_stocks_faltantes(dry_run=False):
     """
-    Crear registros de stock faltantes para productos y bodegas existentes
+    Crear registros de stock faltantes para productos activos y bodegas activas
+    (anti-join + bulk_create por lotes). Retorna el detalle con conteos y tiempos.
     """
-    productos = Producto.objects.filter(estado='ACTIVO')
-    bodegas = Bodega.objects.filter(activo=True)
-    
-    stocks_creados = 0
-    for producto in productos:
-        for bodega in bodegas:
-            stock_record, created = StockActual.objects.get_or_create(
-                producto=producto,
-                bodega=bodega,
-                defaults={
-                    'cantidad_disponible': 0,
-                    'cantidad_reservada': 0,
-                    'cantidad_transito': 0,
-                }
-            )
-            if created:
-                stocks_creados += 1
+    from inventario.sincronizacion import crear_stocks_faltantes as crear_faltantes
     
-    return stocks_creados
\ No newline at end of file
+    return crear_faltantes(dry_run=dry_run)
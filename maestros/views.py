@@ -1,7 +1,6 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt, csrf_protect
@@ -11,11 +10,13 @@ from decimal import Decimal, InvalidOperation
 from autenticacion.decorators import login_required_custom, permission_required, estado_usuario_activo, permiso_requerido
 # Importar modelos desde maestros donde están definidos
 from .models import Producto, Proveedor, Categoria, Marca, UnidadMedida
+from .listados import (
+    exportacion_categorias, exportacion_marcas, exportacion_productos, exportacion_proveedores,
+    filtrar_proveedores,
+)
+from .consultas import CAMPOS_MAESTROS, ConsultaProductos
 # Para exportación a Excel
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
-from datetime import datetime
+from sistema.exportacion import respuesta_exportacion
 # Para manejo de imágenes
 from PIL import Image
 import os
@@ -53,80 +54,18 @@ def producto_listar(request):
     # Guardar selección en sesión
     request.session['productos_items_per_page'] = str(items_per_page)
     
-    # Query base con relaciones mejoradas
-    productos = Producto.objects.select_related('categoria', 'marca', 'uom_compra', 'uom_venta', 'uom_stock').all()
-    
-    # Aplicar filtros mejorados con búsqueda por precio y stock
-    if query:
-        # Intentar convertir query a número para búsqueda por precio/stock
-        try:
-            query_num = Decimal(query)
-            productos = productos.filter(
-                Q(sku__icontains=query) |
-                Q(nombre__icontains=query) |
-                Q(descripcion__icontains=query) |
-                Q(categoria__nombre__icontains=query) |
-                Q(marca__nombre__icontains=query) |
-                Q(modelo__icontains=query) |
-                Q(precio_venta=query_num) |
-                Q(stock_minimo=query_num) |
-                Q(ean_upc__icontains=query)
-            )
-        except (ValueError, InvalidOperation):
-            # Si no es número, buscar solo en campos de texto
-            productos = productos.filter(
-                Q(sku__icontains=query) |
-                Q(nombre__icontains=query) |
-                Q(descripcion__icontains=query) |
-                Q(categoria__nombre__icontains=query) |
-                Q(marca__nombre__icontains=query) |
-                Q(modelo__icontains=query) |
-                Q(ean_upc__icontains=query)
-            )
-    
-    if categoria_id:
-        productos = productos.filter(categoria_id=categoria_id)
-    
-    if marca_id:
-        productos = productos.filter(marca_id=marca_id)
-    
-    if estado:
-        productos = productos.filter(estado=estado)
-    
-    # Aplicar ordenamiento
-    orden_mapping = {
-        'nombre': 'nombre',
-        'nombre_desc': '-nombre',
-        'sku': 'sku',
-        'sku_desc': '-sku',
-        'categoria': 'categoria__nombre',
-        'categoria_desc': '-categoria__nombre',
-        'marca': 'marca__nombre',
-        'marca_desc': '-marca__nombre',
-        'precio': 'precio_venta',
-        'precio_desc': '-precio_venta',
-        'stock': 'stock_minimo',
-        'stock_desc': '-stock_minimo',
-        'fecha': 'created_at',
-        'fecha_desc': '-created_at',
-    }
-    
-    if orden in orden_mapping:
-        productos = productos.order_by(orden_mapping[orden])
-    else:
-        productos = productos.order_by('nombre')
-    
-    # Paginación
-    paginator = Paginator(productos, items_per_page)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Mismos filtros y orden que las exportaciones; el total queda en caché
+    # mientras no cambien los productos (maestros.consultas)
+    page_obj = ConsultaProductos.de_maestros(request.GET).paginar(
+        request.GET.get('page'), items_per_page, campos=CAMPOS_MAESTROS
+    )
     
     # Datos para filtros
     categorias = Categoria.objects.filter(activo=True).order_by('nombre')
     marcas = Marca.objects.filter(activo=True).order_by('nombre')
     
     # Estadísticas
-    total_productos = productos.count()
+    total_productos = page_obj.paginator.count
     
     context = {
         'page_obj': page_obj,
@@ -727,8 +666,13 @@ def producto_eliminar(request, pk):
             if "protected foreign keys" in error_message or "FOREIGN KEY constraint" in error_message:
                 # Intentar limpieza automática de registros de inventario
                 try:
+                    from inventario.archivo import archivar_queryset
                     from inventario.models import MovimientoInventario, StockActual
                     
+                    # Conservar el historial en el archivo en disco; las filas se borran
+                    # solo dentro de la transacción, junto con el producto
+                    archivar_queryset(MovimientoInventario.objects.filter(producto=producto), eliminar=False)
+                    
                     with transaction.atomic():
                         # Eliminar movimientos y stock
                         movimientos_eliminados = MovimientoInventario.objects.filter(producto=producto).count()
@@ -849,17 +793,7 @@ def proveedor_listar(request):
         items_per_page = 15
     request.session['proveedores_items_per_page'] = str(items_per_page)
     
-    proveedores = Proveedor.objects.all().order_by('razon_social')
-    
-    if query:
-        proveedores = proveedores.filter(
-            Q(rut_nif__icontains=query) |
-            Q(razon_social__icontains=query) |
-            Q(nombre_fantasia__icontains=query)
-        )
-    
-    if estado:
-        proveedores = proveedores.filter(estado=estado)
+    proveedores = filtrar_proveedores(request.GET)
     
     paginator = Paginator(proveedores, items_per_page)
     page_number = request.GET.get('page')
@@ -1387,179 +1321,7 @@ def marca_eliminar(request, pk):
 @estado_usuario_activo
 def productos_exportar_excel(request):
     """Exportar productos a Excel con formato profesional"""
-    
-    # Aplicar los mismos filtros que en la vista de listado
-    query = request.GET.get('query', '').strip()
-    categoria_id = request.GET.get('categoria', '')
-    marca_id = request.GET.get('marca', '')
-    estado = request.GET.get('estado', '')
-    orden = request.GET.get('orden', 'nombre')
-    
-    # Query base con relaciones
-    productos = Producto.objects.select_related('categoria', 'marca', 'uom_compra', 'uom_venta', 'uom_stock').all()
-    
-    # Aplicar filtros
-    if query:
-        productos = productos.filter(
-            Q(sku__icontains=query) |
-            Q(nombre__icontains=query) |
-            Q(categoria__nombre__icontains=query) |
-            Q(marca__nombre__icontains=query)
-        )
-    
-    if categoria_id:
-        productos = productos.filter(categoria_id=categoria_id)
-    
-    if marca_id:
-        productos = productos.filter(marca_id=marca_id)
-    
-    if estado:
-        productos = productos.filter(estado=estado)
-    
-    # Aplicar ordenamiento
-    orden_mapping = {
-        'nombre': 'nombre',
-        'nombre_desc': '-nombre',
-        'sku': 'sku',
-        'sku_desc': '-sku',
-        'categoria': 'categoria__nombre',
-        'categoria_desc': '-categoria__nombre',
-        'marca': 'marca__nombre',
-        'marca_desc': '-marca__nombre',
-        'precio': 'precio_venta',
-        'precio_desc': '-precio_venta',
-        'stock': 'stock_minimo',
-        'stock_desc': '-stock_minimo',
-        'fecha': 'created_at',
-        'fecha_desc': '-created_at',
-    }
-    
-    if orden in orden_mapping:
-        productos = productos.order_by(orden_mapping[orden])
-    else:
-        productos = productos.order_by('nombre')
-    
-    # Crear workbook y worksheet
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Productos"
-    
-    # Configurar estilos
-    header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='D32F2F', end_color='D32F2F', fill_type='solid')
-    header_alignment = Alignment(horizontal='center', vertical='center')
-    
-    data_font = Font(name='Arial', size=10)
-    data_alignment = Alignment(horizontal='left', vertical='center')
-    number_alignment = Alignment(horizontal='right', vertical='center')
-    center_alignment = Alignment(horizontal='center', vertical='center')
-    
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    
-    # Definir encabezados
-    headers = [
-        'SKU',
-        'Nombre',
-        'Categoría',
-        'Marca',
-        'Precio Venta',
-        'Stock Mínimo',
-        'UOM Compra',
-        'UOM Venta',
-        'UOM Stock',
-        'Estado',
-        'Perecible',
-        'Control Lote',
-        'Control Serie',
-        'Fecha Creación'
-    ]
-    
-    # Escribir encabezados
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = border
-    
-    # Escribir datos
-    for row, producto in enumerate(productos, 2):
-        data = [
-            producto.sku,
-            producto.nombre,
-            producto.categoria.nombre if producto.categoria else '',
-            producto.marca.nombre if producto.marca else '',
-            float(producto.precio_venta) if producto.precio_venta else 0,
-            float(producto.stock_minimo) if producto.stock_minimo else 0,
-            producto.uom_compra.codigo if producto.uom_compra else '',
-            producto.uom_venta.codigo if producto.uom_venta else '',
-            producto.uom_stock.codigo if producto.uom_stock else '',
-            producto.estado,
-            'Sí' if producto.perishable else 'No',
-            'Sí' if producto.control_por_lote else 'No',
-            'Sí' if producto.control_por_serie else 'No',
-            producto.created_at.strftime('%d/%m/%Y %H:%M') if producto.created_at else ''
-        ]
-        
-        for col, value in enumerate(data, 1):
-            cell = ws.cell(row=row, column=col, value=value)
-            cell.font = data_font
-            cell.border = border
-            
-            # Aplicar alineación específica según el tipo de dato
-            if col in [5, 6]:  # Precios y stock
-                cell.alignment = number_alignment
-                if col == 5 and value:  # Precio
-                    cell.number_format = '"$"#,##0.00'
-            elif col in [11, 12, 13]:  # Booleanos
-                cell.alignment = center_alignment
-            else:
-                cell.alignment = data_alignment
-    
-    # Ajustar ancho de columnas
-    column_widths = {
-        1: 15,  # SKU
-        2: 35,  # Nombre
-        3: 20,  # Categoría
-        4: 20,  # Marca
-        5: 15,  # Precio
-        6: 12,  # Stock
-        7: 12,  # UOM Compra
-        8: 12,  # UOM Venta
-        9: 12,  # UOM Stock
-        10: 12, # Estado
-        11: 10, # Perecible
-        12: 12, # Control Lote
-        13: 13, # Control Serie
-        14: 18  # Fecha
-    }
-    
-    for col, width in column_widths.items():
-        ws.column_dimensions[get_column_letter(col)].width = width
-    
-    # Agregar información adicional
-    total_productos = productos.count()
-    ws.cell(row=total_productos + 3, column=1, value=f"Total de productos: {total_productos}")
-    ws.cell(row=total_productos + 4, column=1, value=f"Fecha de exportación: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
-    ws.cell(row=total_productos + 5, column=1, value=f"Exportado por: {request.user.get_full_name() or request.user.username}")
-    
-    # Configurar respuesta HTTP
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    
-    # Nombre del archivo con timestamp
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'productos_dulceria_lilis_{timestamp}.xlsx'
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    # Guardar workbook en la respuesta
-    wb.save(response)
-    
-    return response
+    return respuesta_exportacion(request, exportacion_productos(request.GET, request.user))
 
 
 @login_required_custom
@@ -1709,103 +1471,13 @@ def proveedor_eliminar(request, pk):
 
 # ==================== EXPORTACIONES A EXCEL ====================
 
-def crear_estilos_excel():
-    """Crear estilos reutilizables para Excel"""
-    return {
-        'header': {
-            'font': Font(bold=True, color="FFFFFF", size=12),
-            'alignment': Alignment(horizontal="center", vertical="center"),
-            'fill': PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
-            'border': Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'), 
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-        },
-        'data': {
-            'alignment': Alignment(horizontal="left", vertical="center"),
-            'border': Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'), 
-                bottom=Side(style='thin')
-            )
-        }
-    }
-
-
 @login_required_custom
 @estado_usuario_activo
 @permiso_requerido('marcas', 'leer')
 def export_marcas_excel(request):
     """Exportar marcas a Excel"""
     try:
-        # Crear workbook y worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Marcas"
-        
-        # Estilos
-        estilos = crear_estilos_excel()
-        
-        # Encabezados
-        headers = [
-            'ID', 'Nombre', 'Descripción', 'Estado', 
-            'Productos Asociados', 'Fecha Creación', 'Última Modificación'
-        ]
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=header)
-            cell.font = estilos['header']['font']
-            cell.alignment = estilos['header']['alignment']
-            cell.fill = estilos['header']['fill']
-            cell.border = estilos['header']['border']
-        
-        # Obtener datos
-        marcas = Marca.objects.annotate(
-            total_productos=Count('productos')
-        ).order_by('nombre')
-        
-        # Agregar datos
-        for row_num, marca in enumerate(marcas, 2):
-            data = [
-                marca.id,
-                marca.nombre,
-                marca.descripcion or 'Sin descripción',
-                'Activa' if marca.activo else 'Inactiva',
-                marca.total_productos,
-                marca.created_at.strftime('%d/%m/%Y %H:%M') if marca.created_at else '',
-                'Sin fecha modificación'  # No existe campo fecha_modificacion
-            ]
-            
-            for col_num, value in enumerate(data, 1):
-                cell = ws.cell(row=row_num, column=col_num, value=value)
-                cell.alignment = estilos['data']['alignment']
-                cell.border = estilos['data']['border']
-        
-        # Ajustar ancho de columnas
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Configurar respuesta HTTP
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="marcas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-        
-        wb.save(response)
-        return response
-        
+        return respuesta_exportacion(request, exportacion_marcas(request.GET, request.user))
     except Exception as e:
         messages.error(request, f'Error al exportar marcas: {str(e)}')
         return redirect('maestros:marca_listar')
@@ -1817,72 +1489,7 @@ def export_marcas_excel(request):
 def export_categorias_excel(request):
     """Exportar categorías a Excel"""
     try:
-        # Crear workbook y worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Categorías"
-        
-        # Estilos
-        estilos = crear_estilos_excel()
-        
-        # Encabezados
-        headers = [
-            'ID', 'Nombre', 'Descripción', 'Categoría Padre', 
-            'Estado', 'Productos Asociados', 'Fecha Creación', 'Última Modificación'
-        ]
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=header)
-            cell.font = estilos['header']['font']
-            cell.alignment = estilos['header']['alignment']
-            cell.fill = estilos['header']['fill']
-            cell.border = estilos['header']['border']
-        
-        # Obtener datos
-        categorias = Categoria.objects.annotate(
-            total_productos=Count('productos')
-        ).select_related('categoria_padre').order_by('nombre')
-        
-        # Agregar datos
-        for row_num, categoria in enumerate(categorias, 2):
-            data = [
-                categoria.id,
-                categoria.nombre,
-                categoria.descripcion or 'Sin descripción',
-                categoria.categoria_padre.nombre if categoria.categoria_padre else 'Categoría Principal',
-                'Activa' if categoria.activo else 'Inactiva',
-                categoria.total_productos,
-                categoria.created_at.strftime('%d/%m/%Y %H:%M') if categoria.created_at else '',
-                'Sin fecha modificación'  # No existe campo fecha_modificacion
-            ]
-            
-            for col_num, value in enumerate(data, 1):
-                cell = ws.cell(row=row_num, column=col_num, value=value)
-                cell.alignment = estilos['data']['alignment']
-                cell.border = estilos['data']['border']
-        
-        # Ajustar ancho de columnas
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Configurar respuesta HTTP
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="categorias_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-        
-        wb.save(response)
-        return response
-        
+        return respuesta_exportacion(request, exportacion_categorias(request.GET, request.user))
     except Exception as e:
         messages.error(request, f'Error al exportar categorías: {str(e)}')
         return redirect('maestros:categoria_listar')
@@ -1894,81 +1501,7 @@ def export_categorias_excel(request):
 def export_proveedores_excel(request):
     """Exportar proveedores a Excel"""
     try:
-        # Crear workbook y worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Proveedores"
-        
-        # Estilos
-        estilos = crear_estilos_excel()
-        
-        # Encabezados
-        headers = [
-            'ID', 'Razón Social', 'RUT/NIF', 'Email', 'Teléfono',
-            'Dirección', 'Ciudad', 'País', 'Código Postal',
-            'Contacto Principal', 'Estado', 'Condiciones de Pago',
-            'Productos Asociados', 'Fecha Creación', 'Última Modificación'
-        ]
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=header)
-            cell.font = estilos['header']['font']
-            cell.alignment = estilos['header']['alignment']
-            cell.fill = estilos['header']['fill']
-            cell.border = estilos['header']['border']
-        
-        # Obtener datos
-        proveedores = Proveedor.objects.annotate(
-            total_productos=Count('productos')
-        ).order_by('razon_social')
-        
-        # Agregar datos
-        for row_num, proveedor in enumerate(proveedores, 2):
-            data = [
-                proveedor.id,
-                proveedor.razon_social,
-                proveedor.rut_nif,
-                proveedor.email,
-                proveedor.telefono or 'Sin teléfono',
-                proveedor.direccion or 'Sin dirección',
-                proveedor.ciudad or 'Sin ciudad',
-                proveedor.pais,
-                'Sin código postal',  # No existe en el modelo
-                proveedor.contacto_principal_nombre or 'Sin contacto',
-                'Activo' if proveedor.estado == 'ACTIVO' else 'Inactivo',
-                proveedor.get_condiciones_pago_display(),
-                proveedor.total_productos,
-                proveedor.created_at.strftime('%d/%m/%Y %H:%M') if proveedor.created_at else '',
-                proveedor.updated_at.strftime('%d/%m/%Y %H:%M') if proveedor.updated_at else ''
-            ]
-            
-            for col_num, value in enumerate(data, 1):
-                cell = ws.cell(row=row_num, column=col_num, value=value)
-                cell.alignment = estilos['data']['alignment']
-                cell.border = estilos['data']['border']
-        
-        # Ajustar ancho de columnas
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Configurar respuesta HTTP
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="proveedores_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-        
-        wb.save(response)
-        return response
-        
+        return respuesta_exportacion(request, exportacion_proveedores(request.GET, request.user))
     except Exception as e:
         messages.error(request, f'Error al exportar proveedores: {str(e)}')
         return redirect('maestros:proveedor_listar')
@@ -0,0 +1,39 @@
+"""
+Filtros del catálogo de productos y su exportación
+
+La lista (productos:lista), la exportación directa y el trabajo de exportación
+en segundo plano (sistema.trabajos) interpretan los parámetros con las mismas
+funciones, así el archivo trae lo mismo que se ve en pantalla.
+"""
+from maestros.consultas import ConsultaProductos
+from sistema.exportacion import Columna, Exportacion, fecha, numero, si_no, texto_o
+
+
+def filtrar_productos(parametros):
+    """Productos del catálogo, con su filtro y orden (ConsultaProductos.de_catalogo)"""
+    return ConsultaProductos.de_catalogo(parametros).queryset()
+
+
+def exportacion_productos(parametros, usuario):
+    columnas = [
+        Columna('SKU', 'sku', 15),
+        Columna('Nombre', 'nombre', 35),
+        Columna('Descripción', texto_o('descripcion', ''), 50),
+        Columna('Categoría', texto_o('categoria__nombre', ''), 20),
+        Columna('Marca', texto_o('marca__nombre', ''), 20),
+        Columna('Modelo', texto_o('modelo', ''), 18),
+        Columna('Precio Venta', numero('precio_venta'), 15, 'moneda'),
+        Columna('Costo Estándar', numero('costo_estandar'), 15, 'moneda'),
+        Columna('IVA %', numero('impuesto_iva'), 8, 'numero'),
+        Columna('Estado', 'estado', 12),
+        Columna('Perecedero', si_no('perishable'), 12, 'centro'),
+        Columna('Control Lote', si_no('control_por_lote'), 12, 'centro'),
+        Columna('Control Serie', si_no('control_por_serie'), 13, 'centro'),
+        Columna('Fecha Creación', fecha('created_at'), 18),
+    ]
+    filas = filtrar_productos(parametros).values(
+        'sku', 'nombre', 'descripcion', 'categoria__nombre', 'marca__nombre', 'modelo',
+        'precio_venta', 'costo_estandar', 'impuesto_iva', 'estado',
+        'perishable', 'control_por_lote', 'control_por_serie', 'created_at',
+    )
+    return Exportacion(filas, columnas, 'productos_dulceria_lilis', hoja='Productos', color_encabezado='366092')
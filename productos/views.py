@@ -1,19 +1,17 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Q
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from autenticacion.decorators import permission_required, role_required
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment
-from datetime import datetime
 import json
 
 from maestros.models import Categoria, Marca, UnidadMedida, Producto
 from inventario.models import Bodega, StockActual
+from sistema.exportacion import respuesta_exportacion
+from maestros.consultas import CAMPOS_CATALOGO, ConsultaProductos
+from .listados import exportacion_productos
 
 
 @login_required
@@ -33,56 +31,20 @@ def lista_productos(request):
     items_por_pagina = request.GET.get('items_por_pagina', request.session.get('items_por_pagina', 15))
     request.session['items_por_pagina'] = int(items_por_pagina)
     
-    # Consulta base
-    productos = Producto.objects.select_related('categoria', 'marca').all()
-    
-    # Aplicar filtros de búsqueda
-    if busqueda:
-        productos = productos.filter(
-            Q(sku__icontains=busqueda) |
-            Q(nombre__icontains=busqueda) |
-            Q(descripcion__icontains=busqueda)
-        )
-    
-    if categoria_id:
-        productos = productos.filter(categoria_id=categoria_id)
-    
-    if marca_id:
-        productos = productos.filter(marca_id=marca_id)
-    
-    if estado:
-        productos = productos.filter(estado=estado)
-    
-    # Aplicar ordenamiento
-    campos_ordenamiento = {
-        'sku': 'sku',
-        'nombre': 'nombre',
-        'categoria': 'categoria__nombre',
-        'marca': 'marca__nombre',
-        'precio_venta': 'precio_venta',
-        'costo_estandar': 'costo_estandar',
-        'estado': 'estado',
-        'created_at': 'created_at'
-    }
-    
-    campo_orden = campos_ordenamiento.get(ordenar_por, 'nombre')
-    if direccion == 'desc':
-        campo_orden = f'-{campo_orden}'
-    
-    productos = productos.order_by(campo_orden)
-    
-    # Paginación
-    paginator = Paginator(productos, int(items_por_pagina))
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # Mismos filtros y orden que la exportación; el total queda en caché
+    # mientras no cambien los productos (maestros.consultas)
+    page_obj = ConsultaProductos.de_catalogo(request.GET).paginar(
+        request.GET.get('page', 1), int(items_por_pagina), campos=CAMPOS_CATALOGO
+    )
+    paginator = page_obj.paginator
     
     # Datos para los filtros
     categorias = Categoria.objects.filter(activo=True).order_by('nombre')
     marcas = Marca.objects.filter(activo=True).order_by('nombre')
     
     # Estadísticas generales
-    total_productos = Producto.objects.count()
-    productos_activos = Producto.objects.filter(estado='ACTIVO').count()
+    total_productos = ConsultaProductos().contar()
+    productos_activos = ConsultaProductos(estado='ACTIVO').contar()
     total_categorias = Categoria.objects.filter(activo=True).count()
     total_marcas = Marca.objects.filter(activo=True).count()
     
@@ -441,115 +403,7 @@ def exportar_productos(request):
     """Vista para exportar productos a Excel"""
     
     try:
-        # Obtener los mismos filtros que la lista
-        busqueda = request.GET.get('busqueda', '')
-        categoria_id = request.GET.get('categoria', '')
-        marca_id = request.GET.get('marca', '')
-        estado = request.GET.get('estado', '')
-        ordenar_por = request.GET.get('ordenar', 'nombre')
-        direccion = request.GET.get('direccion', 'asc')
-        
-        # Aplicar filtros
-        productos = Producto.objects.select_related('categoria', 'marca').all()
-        
-        if busqueda:
-            productos = productos.filter(
-                Q(sku__icontains=busqueda) |
-                Q(nombre__icontains=busqueda) |
-                Q(descripcion__icontains=busqueda)
-            )
-        
-        if categoria_id:
-            productos = productos.filter(categoria_id=categoria_id)
-        
-        if marca_id:
-            productos = productos.filter(marca_id=marca_id)
-        
-        if estado:
-            productos = productos.filter(estado=estado)
-        
-        # Aplicar ordenamiento
-        campos_ordenamiento = {
-            'sku': 'sku',
-            'nombre': 'nombre',
-            'categoria': 'categoria__nombre',
-            'marca': 'marca__nombre',
-            'precio_venta': 'precio_venta',
-            'costo_estandar': 'costo_estandar',
-            'estado': 'estado',
-            'created_at': 'created_at'
-        }
-        
-        campo_orden = campos_ordenamiento.get(ordenar_por, 'nombre')
-        if direccion == 'desc':
-            campo_orden = f'-{campo_orden}'
-        
-        productos = productos.order_by(campo_orden)
-        
-        # Crear el archivo Excel
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Productos"
-        
-        # Estilos
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Encabezados
-        headers = [
-            'SKU', 'Nombre', 'Descripción', 'Categoría', 'Marca', 'Modelo',
-            'Precio Venta', 'Costo Estándar', 'IVA %', 'Estado', 
-            'Perecedero', 'Control Lote', 'Control Serie', 'Fecha Creación'
-        ]
-        
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Datos
-        for row, producto in enumerate(productos, 2):
-            ws.cell(row=row, column=1, value=producto.sku)
-            ws.cell(row=row, column=2, value=producto.nombre)
-            ws.cell(row=row, column=3, value=producto.descripcion or '')
-            ws.cell(row=row, column=4, value=producto.categoria.nombre if producto.categoria else '')
-            ws.cell(row=row, column=5, value=producto.marca.nombre if producto.marca else '')
-            ws.cell(row=row, column=6, value=producto.modelo or '')
-            ws.cell(row=row, column=7, value=float(producto.precio_venta) if producto.precio_venta else 0)
-            ws.cell(row=row, column=8, value=float(producto.costo_estandar) if producto.costo_estandar else 0)
-            ws.cell(row=row, column=9, value=float(producto.impuesto_iva))
-            ws.cell(row=row, column=10, value=producto.estado)
-            ws.cell(row=row, column=11, value='Sí' if producto.perishable else 'No')
-            ws.cell(row=row, column=12, value='Sí' if producto.control_por_lote else 'No')
-            ws.cell(row=row, column=13, value='Sí' if producto.control_por_serie else 'No')
-            ws.cell(row=row, column=14, value=producto.created_at.strftime('%d/%m/%Y %H:%M'))
-        
-        # Ajustar ancho de columnas
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Preparar respuesta
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        fecha_actual = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'productos_dulceria_lilis_{fecha_actual}.xlsx'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        wb.save(response)
-        return response
-        
+        return respuesta_exportacion(request, exportacion_productos(request.GET, request.user))
     except Exception as e:
         messages.error(request, f'Error al exportar productos: {str(e)}')
         return redirect('productos:lista')
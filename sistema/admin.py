@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ConfiguracionSistema, ReglaNegocio, AuditoriaLog
+from .models import ConfiguracionSistema, ReglaNegocio, AuditoriaLog, TrabajoExportacion
 
 
 @admin.register(ConfiguracionSistema)
@@ -76,3 +76,16 @@ class AuditoriaLogAdmin(admin.ModelAdmin):
     def has_change_permission(self, request, obj=None):
         """Evita modificar registros de auditoría."""
         return False
+
+
+@admin.register(TrabajoExportacion)
+class TrabajoExportacionAdmin(admin.ModelAdmin):
+    """Administración de trabajos de exportación en segundo plano."""
+    list_display = ['id', 'tipo', 'formato', 'estado', 'progreso', 'filas_total', 'usuario', 'created_at', 'expira_at']
+    list_filter = ['estado', 'tipo', 'formato']
+    search_fields = ['usuario__username', 'nombre_descarga']
+    readonly_fields = ['interrupciones', 'created_at', 'iniciado_at', 'actualizado_at', 'finalizado_at']
+    raw_id_fields = ['usuario']
+    list_select_related = ['usuario']
+    ordering = ['-created_at']
+    list_per_page = 25
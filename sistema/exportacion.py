@@ -0,0 +1,279 @@
+"""
+Motor común de exportación de listados a Excel y CSV
+
+Los listados se exportan desde un queryset con .values() recorrido con
+iterator(chunk_size=...), sin instanciar modelos ni cargar todo el resultado:
+
+- XLSX: Workbook(write_only=True) de openpyxl, que escribe cada fila al
+  archivo temporal de la hoja en vez de mantener las celdas en memoria. Los
+  formatos son estilos con nombre registrados una vez en el libro (no una
+  fuente y un borde por celda) y los anchos de columna vienen definidos en
+  las columnas, sin recorrer las celdas al final. El libro se guarda en un
+  archivo temporal que se envía con FileResponse.
+- CSV (?formato=csv): StreamingHttpResponse línea a línea, el camino más
+  rápido para listados grandes.
+
+Las filas de pie (totales, fecha, usuario) se escriben al final con la
+cantidad de filas contada durante la escritura, sin un count() adicional.
+
+Cada listado arma su Exportacion a partir de los parámetros del listado en
+pantalla; la misma definición sirve para la descarga directa
+(respuesta_exportacion) y para los trabajos en segundo plano (sistema.trabajos).
+"""
+import csv
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+
+TAMANO_LOTE = 2000
+
+FORMATOS = ('xlsx', 'csv')
+
+CONTENT_TYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+FORMATO_FECHA = '%d/%m/%Y %H:%M'
+
+
+def _borde():
+    lado = Side(style='thin')
+    return Border(left=lado, right=lado, top=lado, bottom=lado)
+
+
+def _estilos(color_encabezado):
+    """Estilos con nombre del libro: encabezado y uno por tipo de columna"""
+    datos = Font(name='Arial', size=10)
+    return [
+        NamedStyle(
+            name='encabezado',
+            font=Font(name='Arial', size=12, bold=True, color='FFFFFF'),
+            fill=PatternFill(start_color=color_encabezado, end_color=color_encabezado, fill_type='solid'),
+            alignment=Alignment(horizontal='center', vertical='center'),
+            border=_borde(),
+        ),
+        NamedStyle(name='texto', font=datos, border=_borde(),
+                   alignment=Alignment(horizontal='left', vertical='center')),
+        NamedStyle(name='numero', font=datos, border=_borde(),
+                   alignment=Alignment(horizontal='right', vertical='center')),
+        NamedStyle(name='moneda', font=datos, border=_borde(), number_format='"$"#,##0.00',
+                   alignment=Alignment(horizontal='right', vertical='center')),
+        NamedStyle(name='centro', font=datos, border=_borde(),
+                   alignment=Alignment(horizontal='center', vertical='center')),
+        NamedStyle(name='pie', font=Font(name='Arial', size=10, italic=True)),
+    ]
+
+
+class Exportacion:
+    """
+    Definición de una exportación: filas (queryset con .values()), columnas
+    y presentación del archivo.
+
+    Args:
+        base: prefijo del nombre del archivo
+        pie: función(total_filas) -> lista de textos para las filas finales (solo XLSX)
+    """
+
+    def __init__(self, filas, columnas, base, hoja='Datos', pie=None, color_encabezado='4472C4'):
+        self.filas = filas
+        self.columnas = columnas
+        self.base = base
+        self.hoja = hoja
+        self.pie = pie
+        self.color_encabezado = color_encabezado
+
+    def contar(self):
+        if isinstance(self.filas, (list, tuple)):
+            return len(self.filas)
+        return self.filas.count()
+
+
+class Columna:
+    """
+    Columna de una exportación.
+
+    Args:
+        titulo: encabezado
+        campo: clave de la fila (.values()) o función fila -> valor
+        ancho: ancho de la columna en Excel
+        estilo: texto | numero | moneda | centro
+    """
+
+    def __init__(self, titulo, campo, ancho=15, estilo='texto'):
+        self.titulo = titulo
+        self.valor = campo if callable(campo) else (lambda fila, clave=campo: fila[clave])
+        self.ancho = ancho
+        self.estilo = estilo
+
+
+# Conversores habituales para Columna(campo=...)
+
+def si_no(clave):
+    return lambda fila: 'Sí' if fila[clave] else 'No'
+
+
+def numero(clave):
+    return lambda fila: float(fila[clave]) if fila[clave] else 0
+
+
+def fecha(clave, vacio=''):
+    def valor(fila):
+        momento = fila[clave]
+        if not momento:
+            return vacio
+        if isinstance(momento, datetime) and timezone.is_aware(momento):
+            momento = timezone.localtime(momento)
+        return momento.strftime(FORMATO_FECHA)
+    return valor
+
+
+def texto_o(clave, vacio):
+    return lambda fila: fila[clave] or vacio
+
+
+def _valor_csv(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return format(valor, 'f')
+    return valor
+
+
+class _Eco:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+def _filas(filas, tamano_lote):
+    """Recorre un queryset en lotes del servidor; otras secuencias tal cual"""
+    if hasattr(filas, 'iterator'):
+        return filas.iterator(chunk_size=tamano_lote)
+    return iter(filas)
+
+
+def lineas_csv(filas, columnas, tamano_lote=TAMANO_LOTE):
+    """Líneas CSV (con BOM y encabezado para que Excel reconozca UTF-8)"""
+    escritor = csv.writer(_Eco())
+    yield '\ufeff' + escritor.writerow([columna.titulo for columna in columnas])
+    for fila in _filas(filas, tamano_lote):
+        yield escritor.writerow([_valor_csv(columna.valor(fila)) for columna in columnas])
+
+
+def escribir_xlsx(destino, filas, columnas, hoja='Datos', pie=None, color_encabezado='4472C4',
+                  tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Escribe el libro en `destino` (ruta o archivo) en modo write_only.
+
+    Args:
+        pie: función(total_filas) -> lista de textos para las filas finales
+        progreso: callback opcional(filas escritas) cada tamano_lote filas
+
+    Returns:
+        int: filas de datos escritas
+    """
+    libro = Workbook(write_only=True)
+    for estilo in _estilos(color_encabezado):
+        libro.add_named_style(estilo)
+    hoja_datos = libro.create_sheet(hoja[:31])
+    for indice, columna in enumerate(columnas, 1):
+        hoja_datos.column_dimensions[get_column_letter(indice)].width = columna.ancho
+
+    # Índices de estilo resueltos una vez; cada celda solo copia el arreglo
+    arreglos = {}
+    for estilo in ['encabezado', 'pie'] + [columna.estilo for columna in columnas]:
+        if estilo not in arreglos:
+            prototipo = WriteOnlyCell(hoja_datos)
+            prototipo.style = estilo
+            arreglos[estilo] = prototipo._style
+
+    def celda(valor, estilo):
+        return Cell(hoja_datos, row=1, column=1, value=valor, style_array=arreglos[estilo])
+
+    hoja_datos.append([celda(columna.titulo, 'encabezado') for columna in columnas])
+    estilos_fila = [arreglos[columna.estilo] for columna in columnas]
+    valores = [columna.valor for columna in columnas]
+    total = 0
+    for fila in _filas(filas, tamano_lote):
+        hoja_datos.append([
+            Cell(hoja_datos, row=1, column=1, value=valor(fila), style_array=estilo)
+            for valor, estilo in zip(valores, estilos_fila)
+        ])
+        total += 1
+        if progreso and total % tamano_lote == 0:
+            progreso(total)
+
+    if pie:
+        hoja_datos.append([])
+        for linea in pie(total):
+            hoja_datos.append([celda(linea, 'pie')])
+    libro.save(destino)
+    return total
+
+
+def escribir_csv(destino, filas, columnas, tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Escribe las líneas CSV en `destino` (archivo de texto abierto con newline='').
+
+    Returns:
+        int: filas de datos escritas
+    """
+    total = -1
+    for linea in lineas_csv(filas, columnas, tamano_lote):
+        destino.write(linea)
+        total += 1
+        if progreso and total and total % tamano_lote == 0:
+            progreso(total)
+    return total
+
+
+def escribir(ruta, exportacion, formato, progreso=None):
+    """Escribe la exportación en el archivo `ruta` en el formato indicado"""
+    if formato == 'csv':
+        with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+            return escribir_csv(archivo, exportacion.filas, exportacion.columnas, progreso=progreso)
+    return escribir_xlsx(
+        ruta, exportacion.filas, exportacion.columnas, hoja=exportacion.hoja, pie=exportacion.pie,
+        color_encabezado=exportacion.color_encabezado, progreso=progreso,
+    )
+
+
+def nombre_archivo(base, formato):
+    return f"{base}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+
+
+def formato_de(parametros):
+    formato = parametros.get('formato', 'xlsx')
+    return formato if formato in FORMATOS else 'xlsx'
+
+
+def respuesta_exportacion(request, exportacion):
+    """
+    Respuesta de descarga en el formato pedido (?formato=xlsx|csv, xlsx por
+    defecto) con nombre <base>_<fecha>.<formato>.
+    """
+    formato = formato_de(request.GET)
+    nombre = nombre_archivo(exportacion.base, formato)
+
+    if formato == 'csv':
+        response = StreamingHttpResponse(
+            lineas_csv(exportacion.filas, exportacion.columnas), content_type='text/csv; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        return response
+
+    # El archivo temporal se borra al cerrarse, cuando termina la respuesta
+    archivo = tempfile.TemporaryFile(suffix='.xlsx')
+    escribir_xlsx(
+        archivo, exportacion.filas, exportacion.columnas, hoja=exportacion.hoja, pie=exportacion.pie,
+        color_encabezado=exportacion.color_encabezado,
+    )
+    archivo.seek(0)
+    return FileResponse(archivo, as_attachment=True, filename=nombre, content_type=CONTENT_TYPE_XLSX)
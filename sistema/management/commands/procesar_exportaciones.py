@@ -0,0 +1,62 @@
+"""
+Worker de exportaciones en segundo plano (sistema.trabajos)
+
+Procesa la cola de TrabajoExportacion en un pool de procesos, recupera los
+trabajos abandonados y borra los archivos vencidos. Pensado para correr como
+servicio (systemd/supervisor) junto al servidor web:
+    python manage.py procesar_exportaciones --procesos 2
+Con --una-vez procesa lo pendiente y termina (útil desde cron).
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sistema.trabajos import ejecutar
+
+
+class Command(BaseCommand):
+    help = 'Procesa los trabajos de exportación pendientes en un pool de procesos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=getattr(settings, 'SISTEMA_EXPORTACION_PROCESOS', 2),
+            help='Exportaciones simultáneas (default: SISTEMA_EXPORTACION_PROCESOS)',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=getattr(settings, 'SISTEMA_EXPORTACION_INTERVALO', 2),
+            help='Segundos entre consultas a la cola (default: SISTEMA_EXPORTACION_INTERVALO)',
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Terminar cuando no queden trabajos pendientes',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f"🚀 Worker de exportaciones iniciado ({options['procesos']} procesos)"
+        ))
+
+        def al_terminar(resultado):
+            if resultado['estado'] == 'COMPLETADO':
+                self.stdout.write(self.style.SUCCESS(
+                    f"✓ Trabajo {resultado['id']} ({resultado['tipo']}): "
+                    f"{resultado['filas']} filas ({resultado['duracion']:.2f}s)"
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"❌ Trabajo {resultado['id']} terminó con error"))
+
+        try:
+            ejecutar(
+                procesos=options['procesos'],
+                intervalo=options['intervalo'],
+                una_vez=options['una_vez'],
+                al_terminar=al_terminar,
+            )
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Worker detenido'))
+            return
+        self.stdout.write(self.style.SUCCESS('✅ Sin trabajos pendientes'))
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.24 on 2026-10-17 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('sistema', '0002_alter_auditorialog_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoExportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(help_text='Listado exportado (ver sistema.trabajos.TIPOS)', max_length=50)),
+                ('parametros', models.JSONField(blank=True, default=dict, help_text='Filtros del listado')),
+                ('formato', models.CharField(choices=[('xlsx', 'Excel'), ('csv', 'CSV')], default='xlsx', max_length=4)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('COMPLETADO', 'Completado'), ('ERROR', 'Error')], default='PENDIENTE', max_length=12)),
+                ('progreso', models.PositiveSmallIntegerField(default=0, help_text='Porcentaje completado')),
+                ('filas_total', models.PositiveIntegerField(blank=True, null=True)),
+                ('filas_procesadas', models.PositiveIntegerField(default=0)),
+                ('archivo', models.FileField(blank=True, max_length=255, null=True, upload_to='exportaciones/')),
+                ('nombre_descarga', models.CharField(blank=True, default='', max_length=150)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('iniciado_at', models.DateTimeField(blank=True, null=True)),
+                ('actualizado_at', models.DateTimeField(blank=True, help_text='Último avance informado por el proceso', null=True)),
+                ('finalizado_at', models.DateTimeField(blank=True, null=True)),
+                ('expira_at', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trabajos_exportacion', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Trabajo de Exportación',
+                'verbose_name_plural': 'Trabajos de Exportación',
+                'db_table': 'trabajos_exportacion',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['estado', 'created_at'], name='trabajos_ex_estado_e10f59_idx'), models.Index(fields=['usuario', '-created_at'], name='trabajos_ex_usuario_8b86e4_idx'), models.Index(fields=['expira_at'], name='trabajos_ex_expira__ce0c99_idx')],
+            },
+        ),
+    ]
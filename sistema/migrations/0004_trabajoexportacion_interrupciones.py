@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-17 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema', '0003_trabajoexportacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoexportacion',
+            name='interrupciones',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Veces que el proceso murió o se abandonó con el trabajo en curso'),
+        ),
+    ]
@@ -181,3 +181,56 @@ class AuditoriaLog(models.Model):
         
         log.save()
         return log
+
+
+class TrabajoExportacion(models.Model):
+    """
+    Exportación de un listado procesada en segundo plano por
+    `manage.py procesar_exportaciones` (ver sistema.trabajos). El archivo
+    queda en MEDIA_ROOT/exportaciones/ hasta expira_at.
+    """
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('COMPLETADO', 'Completado'),
+        ('ERROR', 'Error'),
+    ]
+
+    FORMATO_CHOICES = [
+        ('xlsx', 'Excel'),
+        ('csv', 'CSV'),
+    ]
+
+    tipo = models.CharField(max_length=50, help_text='Listado exportado (ver sistema.trabajos.TIPOS)')
+    parametros = models.JSONField(default=dict, blank=True, help_text='Filtros del listado')
+    formato = models.CharField(max_length=4, choices=FORMATO_CHOICES, default='xlsx')
+    estado = models.CharField(max_length=12, choices=ESTADO_CHOICES, default='PENDIENTE')
+    progreso = models.PositiveSmallIntegerField(default=0, help_text='Porcentaje completado')
+    filas_total = models.PositiveIntegerField(null=True, blank=True)
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    interrupciones = models.PositiveSmallIntegerField(
+        default=0, help_text='Veces que el proceso murió o se abandonó con el trabajo en curso')
+    archivo = models.FileField(upload_to='exportaciones/', max_length=255, null=True, blank=True)
+    nombre_descarga = models.CharField(max_length=150, blank=True, default='')
+    error = models.TextField(null=True, blank=True)
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='trabajos_exportacion')
+    created_at = models.DateTimeField(default=timezone.now)
+    iniciado_at = models.DateTimeField(null=True, blank=True)
+    actualizado_at = models.DateTimeField(null=True, blank=True,
+                                          help_text='Último avance informado por el proceso')
+    finalizado_at = models.DateTimeField(null=True, blank=True)
+    expira_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'trabajos_exportacion'
+        verbose_name = 'Trabajo de Exportación'
+        verbose_name_plural = 'Trabajos de Exportación'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['estado', 'created_at']),
+            models.Index(fields=['usuario', '-created_at']),
+            models.Index(fields=['expira_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.id} {self.tipo} ({self.estado})"
@@ -0,0 +1,416 @@
+"""
+Trabajos de exportación en segundo plano
+
+Las exportaciones grandes no caben en el tiempo de una petición detrás del
+proxy. La vista solo crea un TrabajoExportacion con los parámetros del listado
+y el worker (`manage.py procesar_exportaciones`) lo procesa en un pool de
+procesos:
+
+- Cada trabajo se reclama con un UPDATE condicionado al estado PENDIENTE, así
+  varios workers pueden compartir la cola sin tomar el mismo trabajo.
+- La definición de la exportación es la misma función que usa la descarga
+  directa (TIPOS -> exportacion_* de cada listado), por lo que el archivo trae
+  las filas del listado en pantalla.
+- El avance (filas y porcentaje) se guarda cada lote de filas; la página lo
+  consulta con un endpoint barato mientras tanto.
+- El archivo queda en MEDIA_ROOT/exportaciones/ con un nombre aleatorio y se
+  descarga por una vista que verifica el dueño. Al vencer
+  SISTEMA_EXPORTACION_EXPIRACION_HORAS el worker borra archivo y registro.
+- Un trabajo PROCESANDO sin avances por SISTEMA_EXPORTACION_ABANDONO_MINUTOS
+  (worker caído) vuelve a la cola, igual que los que estaban en curso cuando
+  murió un proceso del pool (el pool se recrea). Tras
+  SISTEMA_EXPORTACION_INTERRUPCIONES_MAXIMO interrupciones queda en ERROR.
+"""
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# Los modelos se importan dentro de las funciones: los procesos del pool
+# ('spawn') importan este módulo antes de ejecutar django.setup()
+from .exportacion import FORMATOS, escribir, nombre_archivo
+
+
+CARPETA = 'exportaciones'
+
+# tipo -> definición (parametros, usuario) -> Exportacion y permiso necesario:
+# (modulo, accion) para tiene_permiso, 'admin' o None (cualquier usuario)
+TIPOS = {
+    'maestros_productos': {
+        'definicion': 'maestros.listados.exportacion_productos',
+        'permiso': None,
+    },
+    'maestros_proveedores': {
+        'definicion': 'maestros.listados.exportacion_proveedores',
+        'permiso': ('proveedores', 'leer'),
+    },
+    'maestros_marcas': {
+        'definicion': 'maestros.listados.exportacion_marcas',
+        'permiso': ('marcas', 'leer'),
+    },
+    'maestros_categorias': {
+        'definicion': 'maestros.listados.exportacion_categorias',
+        'permiso': ('categorias', 'leer'),
+    },
+    'productos_catalogo': {
+        'definicion': 'productos.listados.exportacion_productos',
+        'permiso': ('productos', 'exportar'),
+    },
+    'usuarios': {
+        'definicion': 'autenticacion.listados.exportacion_usuarios',
+        'permiso': 'admin',
+    },
+}
+
+# Parámetros del listado que no afectan las filas exportadas
+PARAMETROS_IGNORADOS = ('page', 'formato', 'items_per_page', 'items_por_pagina', 'per_page')
+
+
+class ErrorTrabajo(Exception):
+    """Solicitud de exportación rechazada (tipo, permiso o límite de pendientes)"""
+
+
+def puede_exportar(usuario, tipo):
+    from autenticacion.decorators import tiene_permiso
+    from autenticacion.listados import es_administrador
+
+    permiso = TIPOS[tipo]['permiso']
+    if permiso is None:
+        return usuario.is_authenticated
+    if permiso == 'admin':
+        return usuario.is_authenticated and es_administrador(usuario)
+    return tiene_permiso(usuario, *permiso)
+
+
+def crear_trabajo(tipo, parametros, formato, usuario):
+    """
+    Encola la exportación del listado `tipo` con los filtros `parametros`.
+
+    Raises:
+        ErrorTrabajo: tipo desconocido, sin permiso o demasiados pendientes
+    """
+    from .models import TrabajoExportacion
+
+    if tipo not in TIPOS:
+        raise ErrorTrabajo(f'Exportación desconocida: {tipo}')
+    if not puede_exportar(usuario, tipo):
+        raise ErrorTrabajo('No tienes permisos para exportar este listado.')
+
+    maximo = getattr(settings, 'SISTEMA_EXPORTACION_PENDIENTES_MAXIMO', 3)
+    en_cola = TrabajoExportacion.objects.filter(
+        usuario=usuario, estado__in=['PENDIENTE', 'PROCESANDO']
+    ).count()
+    if en_cola >= maximo:
+        raise ErrorTrabajo(f'Ya tienes {en_cola} exportaciones en curso. Espera a que terminen.')
+
+    return TrabajoExportacion.objects.create(
+        tipo=tipo,
+        parametros={
+            clave: valor for clave, valor in parametros.items()
+            if clave not in PARAMETROS_IGNORADOS
+        },
+        formato=formato if formato in FORMATOS else 'xlsx',
+        usuario=usuario,
+    )
+
+
+CAMPOS_ESTADO = (
+    'id', 'estado', 'progreso', 'filas_total', 'filas_procesadas',
+    'nombre_descarga', 'error', 'expira_at',
+)
+
+
+def estado_trabajo(datos):
+    """Datos para el endpoint de estado a partir de una fila .values()"""
+    return {
+        'id': datos['id'],
+        'estado': datos['estado'],
+        'progreso': datos['progreso'],
+        'filas_total': datos['filas_total'],
+        'filas_procesadas': datos['filas_procesadas'],
+        'nombre': datos['nombre_descarga'],
+        'error': datos['error'],
+        'expira_at': datos['expira_at'].isoformat() if datos['expira_at'] else None,
+    }
+
+
+def ruta_archivo(trabajo):
+    return os.path.join(settings.MEDIA_ROOT, trabajo.archivo.name)
+
+
+def _vencimiento(momento):
+    return momento + timedelta(hours=getattr(settings, 'SISTEMA_EXPORTACION_EXPIRACION_HORAS', 24))
+
+
+def reclamar_pendientes(limite):
+    """
+    Toma hasta `limite` trabajos pendientes (los más antiguos primero).
+
+    Returns:
+        list: ids reclamados por este worker
+    """
+    from .models import TrabajoExportacion
+
+    reclamados = []
+    candidatos = TrabajoExportacion.objects.filter(
+        estado='PENDIENTE'
+    ).order_by('created_at').values_list('id', flat=True)[:limite * 2]
+    for trabajo_id in candidatos:
+        ahora = timezone.now()
+        tomado = TrabajoExportacion.objects.filter(id=trabajo_id, estado='PENDIENTE').update(
+            estado='PROCESANDO', iniciado_at=ahora, actualizado_at=ahora,
+        )
+        if tomado:
+            reclamados.append(trabajo_id)
+            if len(reclamados) >= limite:
+                break
+    return reclamados
+
+
+def procesar_trabajo(trabajo_id):
+    """
+    Genera el archivo de un trabajo ya reclamado.
+
+    Returns:
+        dict: id, estado, filas y duración
+    """
+    from .models import TrabajoExportacion
+
+    inicio = time.perf_counter()
+    trabajo = TrabajoExportacion.objects.select_related('usuario').get(id=trabajo_id)
+    ruta = None
+    try:
+        exportacion = import_string(TIPOS[trabajo.tipo]['definicion'])(trabajo.parametros, trabajo.usuario)
+        total = exportacion.contar()
+        TrabajoExportacion.objects.filter(id=trabajo_id).update(filas_total=total, actualizado_at=timezone.now())
+
+        def progreso(filas):
+            TrabajoExportacion.objects.filter(id=trabajo_id).update(
+                filas_procesadas=filas,
+                progreso=min(99, filas * 100 // total) if total else 0,
+                actualizado_at=timezone.now(),
+            )
+
+        nombre = f"{CARPETA}/{uuid.uuid4().hex}.{trabajo.formato}"
+        ruta = os.path.join(settings.MEDIA_ROOT, nombre)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        filas = escribir(ruta, exportacion, trabajo.formato, progreso=progreso)
+
+        ahora = timezone.now()
+        TrabajoExportacion.objects.filter(id=trabajo_id).update(
+            estado='COMPLETADO',
+            progreso=100,
+            filas_total=filas,
+            filas_procesadas=filas,
+            archivo=nombre,
+            nombre_descarga=nombre_archivo(exportacion.base, trabajo.formato),
+            actualizado_at=ahora,
+            finalizado_at=ahora,
+            expira_at=_vencimiento(ahora),
+        )
+        estado = 'COMPLETADO'
+    except Exception as e:
+        if ruta and os.path.exists(ruta):
+            os.remove(ruta)
+        ahora = timezone.now()
+        TrabajoExportacion.objects.filter(id=trabajo_id).update(
+            estado='ERROR',
+            error=str(e)[:1000],
+            actualizado_at=ahora,
+            finalizado_at=ahora,
+            expira_at=_vencimiento(ahora),
+        )
+        estado = 'ERROR'
+        filas = 0
+
+    return {
+        'id': trabajo_id,
+        'tipo': trabajo.tipo,
+        'estado': estado,
+        'filas': filas,
+        'duracion': time.perf_counter() - inicio,
+    }
+
+
+def devolver_interrumpidos(trabajos):
+    """
+    Devuelve a la cola los trabajos PROCESANDO del queryset `trabajos`, cuyo
+    proceso murió o dejó de informar avances. Los que ya suman
+    SISTEMA_EXPORTACION_INTERRUPCIONES_MAXIMO interrupciones quedan en ERROR,
+    así un trabajo que mata a su proceso no vuelve a la cola para siempre.
+
+    Returns:
+        tuple: (devueltos a la cola, ids marcados con error)
+    """
+    maximo = getattr(settings, 'SISTEMA_EXPORTACION_INTERRUPCIONES_MAXIMO', 3)
+    trabajos = trabajos.filter(estado='PROCESANDO')
+    agotados = list(trabajos.filter(interrupciones__gte=maximo - 1).values_list('id', flat=True))
+    if agotados:
+        ahora = timezone.now()
+        trabajos.filter(id__in=agotados).update(
+            estado='ERROR',
+            error=f'El proceso se interrumpió {maximo} veces con este trabajo en curso',
+            interrupciones=F('interrupciones') + 1,
+            finalizado_at=ahora,
+            expira_at=_vencimiento(ahora),
+        )
+    devueltos = trabajos.exclude(id__in=agotados).update(
+        estado='PENDIENTE', progreso=0, filas_procesadas=0, interrupciones=F('interrupciones') + 1,
+    )
+    return devueltos, agotados
+
+
+def recuperar_abandonados():
+    """Devuelve a la cola los trabajos PROCESANDO sin avances recientes"""
+    from .models import TrabajoExportacion
+
+    minutos = getattr(settings, 'SISTEMA_EXPORTACION_ABANDONO_MINUTOS', 15)
+    limite = timezone.now() - timedelta(minutes=minutos)
+    devueltos, _ = devolver_interrumpidos(TrabajoExportacion.objects.filter(actualizado_at__lt=limite))
+    return devueltos
+
+
+def purgar_expirados():
+    """
+    Borra los trabajos vencidos y sus archivos.
+
+    Returns:
+        int: trabajos borrados
+    """
+    from .models import TrabajoExportacion
+
+    vencidos = list(TrabajoExportacion.objects.filter(
+        expira_at__lt=timezone.now()
+    ).values_list('id', 'archivo'))
+    for _, archivo in vencidos:
+        if archivo:
+            ruta = os.path.join(settings.MEDIA_ROOT, archivo)
+            if os.path.exists(ruta):
+                os.remove(ruta)
+    TrabajoExportacion.objects.filter(id__in=[trabajo_id for trabajo_id, _ in vencidos]).delete()
+    return len(vencidos)
+
+
+def _procesar_en_proceso(trabajo_id):
+    try:
+        return procesar_trabajo(trabajo_id)
+    finally:
+        connections.close_all()
+
+
+def _iniciar_proceso():
+    """Cada proceso del pool configura Django y abre sus propias conexiones"""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def _crear_pool(procesos):
+    # 'spawn': los procesos no heredan las conexiones abiertas del worker
+    contexto = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=_iniciar_proceso)
+
+
+def _resultado_error(trabajo_id):
+    return {'id': trabajo_id, 'tipo': None, 'estado': 'ERROR', 'filas': 0, 'duracion': 0}
+
+
+def ejecutar(procesos=None, intervalo=None, una_vez=False, al_terminar=None):
+    """
+    Bucle del worker: reclama trabajos pendientes mientras haya procesos
+    libres, recoge los resultados y cada minuto recupera abandonados y purga
+    vencidos.
+
+    Si un proceso del pool muere (BrokenProcessPool) el pool se descarta y se
+    crea otro; los trabajos que estaban en curso vuelven a la cola con una
+    interrupción más (ver devolver_interrumpidos).
+
+    Args:
+        procesos: tamaño del pool (default: SISTEMA_EXPORTACION_PROCESOS)
+        intervalo: segundos entre consultas a la cola (default: SISTEMA_EXPORTACION_INTERVALO)
+        una_vez: terminar cuando la cola quede vacía
+        al_terminar: callback opcional con el resultado de cada trabajo
+    """
+    from .models import TrabajoExportacion
+
+    procesos = procesos or getattr(settings, 'SISTEMA_EXPORTACION_PROCESOS', 2)
+    intervalo = intervalo or getattr(settings, 'SISTEMA_EXPORTACION_INTERVALO', 2)
+    en_curso = {}
+    ultima_limpieza = None
+
+    pool = _crear_pool(procesos)
+    try:
+        while True:
+            if ultima_limpieza is None or time.monotonic() - ultima_limpieza >= 60:
+                recuperar_abandonados()
+                purgar_expirados()
+                ultima_limpieza = time.monotonic()
+
+            roto = False
+            interrumpidos = []
+
+            libres = procesos - len(en_curso)
+            if libres > 0:
+                reclamados = reclamar_pendientes(libres)
+                for posicion, trabajo_id in enumerate(reclamados):
+                    try:
+                        en_curso[pool.submit(_procesar_en_proceso, trabajo_id)] = trabajo_id
+                    except BrokenProcessPool:
+                        # No llegaron a ejecutarse: vuelven a la cola sin contar interrupción
+                        TrabajoExportacion.objects.filter(
+                            id__in=reclamados[posicion:], estado='PROCESANDO'
+                        ).update(estado='PENDIENTE')
+                        roto = True
+                        break
+
+            if not en_curso and not roto:
+                if una_vez:
+                    return
+                time.sleep(intervalo)
+                continue
+
+            if en_curso:
+                terminados, _ = wait(list(en_curso), timeout=intervalo, return_when=FIRST_COMPLETED)
+            else:
+                terminados = []
+            for futuro in terminados:
+                trabajo_id = en_curso.pop(futuro)
+                try:
+                    resultado = futuro.result()
+                except BrokenProcessPool:
+                    interrumpidos.append(trabajo_id)
+                    roto = True
+                    continue
+                except Exception as e:
+                    # El proceso terminó sin registrar el resultado
+                    ahora = timezone.now()
+                    TrabajoExportacion.objects.filter(id=trabajo_id).update(
+                        estado='ERROR', error=str(e)[:1000], finalizado_at=ahora, expira_at=_vencimiento(ahora),
+                    )
+                    resultado = _resultado_error(trabajo_id)
+                if al_terminar:
+                    al_terminar(resultado)
+
+            if roto:
+                # Con el pool roto ninguno de los trabajos en curso va a terminar
+                interrumpidos.extend(en_curso.values())
+                en_curso.clear()
+                _, agotados = devolver_interrumpidos(TrabajoExportacion.objects.filter(id__in=interrumpidos))
+                if al_terminar:
+                    for trabajo_id in agotados:
+                        al_terminar(_resultado_error(trabajo_id))
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = _crear_pool(procesos)
+    finally:
+        pool.shutdown()
@@ -0,0 +1,107 @@
+"""
+Trabajo diferido hasta la confirmación de la transacción
+
+Varios módulos acumulan cambios durante una transacción (por ejemplo los
+productos a recalcular) y los procesan una sola vez al confirmarla.
+al_confirmar() lo resuelve para todos sin mirar la estructura interna de
+connection.run_on_commit:
+
+- Lo agregado se guarda en un grupo por nivel de savepoint y cada grupo se
+  registra con transaction.on_commit desde su propio nivel. Si el savepoint
+  se revierte Django descarta su callback, y con él el grupo: nada de lo
+  agregado ahí llega al commit ni a la transacción siguiente.
+- El registro de grupos de la conexión es un WeakValueDictionary; la cola
+  on_commit es la única referencia fuerte, así un grupo revertido (o de una
+  transacción revertida) deja de encontrarse y se abre uno nuevo.
+- Al confirmar, el primer callback de un nombre junta los grupos que siguen
+  vivos, aplica sus agregados en el orden en que se hicieron sobre un estado
+  nuevo y llama a procesar una sola vez. Los demás callbacks del nombre no
+  hacen nada.
+
+Fuera de un bloque atómico se procesa de inmediato, igual que
+transaction.on_commit.
+"""
+import itertools
+import weakref
+
+from django.db import transaction
+
+
+_secuencia = itertools.count()
+
+
+class _Grupo:
+    """Agregados de un nombre en un nivel de savepoint; es el callback on_commit"""
+
+    def __init__(self, conexion, nombre, fabrica, procesar):
+        self.conexion = conexion
+        self.nombre = nombre
+        self.fabrica = fabrica
+        self.procesar = procesar
+        self.agregados = []
+        self.procesado = False
+
+    def __call__(self):
+        if not self.procesado:
+            _procesar(self.conexion, self.nombre, self)
+
+
+def _grupos(conexion):
+    if not hasattr(conexion, '_sistema_diferidos'):
+        conexion._sistema_diferidos = weakref.WeakValueDictionary()
+    return conexion._sistema_diferidos
+
+
+def _procesar(conexion, nombre, grupo=None):
+    registro = _grupos(conexion)
+    claves = [clave for clave in list(registro.keys()) if clave[0] == nombre]
+    grupos = [registro.pop(clave, None) for clave in claves]
+    grupos = [g for g in grupos if g is not None]
+    if grupo is not None and grupo not in grupos:
+        grupos.append(grupo)
+    if not grupos:
+        return
+
+    agregados = []
+    for g in grupos:
+        g.procesado = True
+        agregados.extend(g.agregados)
+    agregados.sort(key=lambda item: item[0])
+
+    estado = grupos[0].fabrica()
+    for _, agregar in agregados:
+        agregar(estado)
+    grupos[0].procesar(estado)
+
+
+def al_confirmar(nombre, agregar, fabrica, procesar):
+    """
+    Agrega a los pendientes `nombre` de la transacción en curso y programa
+    procesar(estado) una sola vez al confirmarla.
+
+    Args:
+        nombre: identifica los pendientes (uno por módulo)
+        agregar: agregar(estado) suma lo de esta llamada al estado
+        fabrica: crea un estado vacío
+        procesar: recibe el estado con todo lo agregado en la transacción
+    """
+    conexion = transaction.get_connection()
+    if not conexion.in_atomic_block:
+        estado = fabrica()
+        agregar(estado)
+        procesar(estado)
+        return
+
+    registro = _grupos(conexion)
+    clave = (nombre, tuple(conexion.savepoint_ids))
+    grupo = registro.get(clave)
+    if grupo is None or grupo.procesado:
+        grupo = _Grupo(conexion, nombre, fabrica, procesar)
+        registro[clave] = grupo
+        transaction.on_commit(grupo)
+    grupo.agregados.append((next(_secuencia), agregar))
+
+
+def procesar_ahora(nombre):
+    """Procesa ya los pendientes `nombre` de la transacción en curso (mediciones)"""
+    _procesar(transaction.get_connection(), nombre)
@@ -24,4 +24,9 @@ urlpatterns = [
     path('notificaciones/marcar-leida/<int:notif_id>/', views.notificaciones_marcar_leida, name='notificaciones_marcar_leida'),
     path('notificaciones/limpiar/', views.notificaciones_limpiar, name='notificaciones_limpiar'),
     path('notificaciones/count/', views.notificaciones_count, name='notificaciones_count'),
+    
+    # Exportaciones en segundo plano
+    path('exportaciones/<int:trabajo_id>/', views.exportacion_estado, name='exportacion_estado'),
+    path('exportaciones/<int:trabajo_id>/descargar/', views.exportacion_descargar, name='exportacion_descargar'),
+    path('exportaciones/<str:tipo>/', views.exportacion_crear, name='exportacion_crear'),
 ]
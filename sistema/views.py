@@ -1,41 +1,34 @@
-from django.shortcuts import render
-from django.http import JsonResponse
+from django.shortcuts import render, get_object_or_404
+from django.http import FileResponse, Http404, JsonResponse
+from django.urls import reverse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from autenticacion.decorators import login_required_custom
 from django.utils import timezone
-from django.db.models import Count
-from maestros.models import Producto, Categoria, Marca
-from autenticacion.models import Usuario
+from maestros.models import Producto
 from decimal import Decimal
 import json
+import os
 
 
 @login_required_custom
 def dashboard(request):
     """Vista principal del dashboard"""
     
-    # Estadísticas básicas
-    total_productos = Producto.objects.count()
-    productos_activos = Producto.objects.filter(estado='ACTIVO').count()
-    total_categorias = Categoria.objects.filter(activo=True).count()
-    total_marcas = Marca.objects.filter(activo=True).count()
-    total_usuarios = Usuario.objects.filter(estado='ACTIVO').count()
+    # Estadísticas básicas (precalculadas, una lectura)
+    from inventario.resumen import obtener_resumen
+    resumen = obtener_resumen()
+    total_productos = resumen['productos_total']
+    productos_activos = resumen['productos_activos']
+    total_categorias = resumen['categorias_activas']
+    total_marcas = resumen['marcas_activas']
+    total_usuarios = resumen['usuarios_activos']
     
     # Productos por categoría
-    productos_por_categoria = list(
-        Categoria.objects.filter(activo=True)
-        .annotate(total_productos=Count('productos'))
-        .values('nombre', 'total_productos')
-        .order_by('-total_productos')[:5]
-    )
+    productos_por_categoria = resumen['productos_por_categoria']
     
     # Productos por estado
-    productos_por_estado = list(
-        Producto.objects.values('estado')
-        .annotate(total=Count('id'))
-        .order_by('-total')
-    )
+    productos_por_estado = resumen['productos_por_estado']
     
     # Productos recientes
     productos_recientes = Producto.objects.select_related('categoria', 'marca').order_by('-created_at')[:5]
@@ -371,3 +364,60 @@ def notificaciones_count(request):
     notificaciones = request.session.get('notificaciones', [])
     count = len([n for n in notificaciones if not n['leida']])
     return JsonResponse({'count': count})
+
+
+# ============= EXPORTACIONES EN SEGUNDO PLANO =============
+
+@login_required_custom
+@require_http_methods(["POST"])
+def exportacion_crear(request, tipo):
+    """Encolar la exportación de un listado con los filtros del querystring"""
+    from .exportacion import formato_de
+    from .trabajos import ErrorTrabajo, crear_trabajo
+
+    try:
+        trabajo = crear_trabajo(tipo, request.GET.dict(), formato_de(request.GET), request.user)
+    except ErrorTrabajo as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'trabajo': {'id': trabajo.id, 'estado': trabajo.estado, 'progreso': 0},
+        'estado_url': reverse('api:exportacion_estado', args=[trabajo.id]),
+    }, status=202)
+
+
+@require_http_methods(["GET"])
+def exportacion_estado(request, trabajo_id):
+    """Estado de un trabajo de exportación (consulta liviana para el polling)"""
+    from .models import TrabajoExportacion
+    from .trabajos import CAMPOS_ESTADO, estado_trabajo
+
+    if not request.user.is_authenticated:
+        return JsonResponse({'success': False, 'error': 'Sesión expirada'}, status=401)
+
+    datos = TrabajoExportacion.objects.filter(
+        id=trabajo_id, usuario_id=request.user.id
+    ).values(*CAMPOS_ESTADO).first()
+    if datos is None:
+        return JsonResponse({'success': False, 'error': 'Exportación no encontrada o expirada'}, status=404)
+
+    trabajo = estado_trabajo(datos)
+    if trabajo['estado'] == 'COMPLETADO':
+        trabajo['url'] = reverse('api:exportacion_descargar', args=[trabajo_id])
+    return JsonResponse({'success': True, 'trabajo': trabajo})
+
+
+@login_required_custom
+def exportacion_descargar(request, trabajo_id):
+    """Descargar el archivo de un trabajo de exportación completado"""
+    from .models import TrabajoExportacion
+    from .trabajos import ruta_archivo
+
+    trabajo = get_object_or_404(
+        TrabajoExportacion, id=trabajo_id, usuario=request.user, estado='COMPLETADO'
+    )
+    ruta = ruta_archivo(trabajo)
+    if not os.path.exists(ruta):
+        raise Http404('El archivo de la exportación ya no está disponible')
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=trabajo.nombre_descarga)